@@ -0,0 +1,176 @@
+"""
+Indice de API keys y cuotas por clave.
+
+verify_api_key volvia a partir y limpiar la cadena VALID_API_KEYS en
+cada peticion y la comparaba con 'in' sobre un set. Aqui las claves se
+cargan una vez en un indice por huella (sha256): se busca la huella de
+la clave recibida y se confirma con hmac.compare_digest, cuyo tiempo no
+depende de cuantos caracteres coinciden. En memoria no queda ninguna
+clave en claro. El indice se reconstruye solo si cambia la configuracion.
+
+Cada clave tiene ademas un cubo de tokens (token bucket): se rellena a
+razon de 'por_minuto' tokens por minuto hasta 'rafaga', y cada peticion
+gasta uno. Asi una integracion pesada se frena por su clave sin castigar
+a todos los que comparten su IP (una NAT corporativa). Las cuotas se
+configuran con API_KEY_RATE_PER_MINUTE/API_KEY_BURST (por defecto para
+todas) y API_KEY_QUOTAS (excepciones por clave, con su id):
+
+    API_KEY_QUOTAS=3f2a9c1d0b7e:600:100,7c0e4b2a91f3:30:5
+
+El id de una clave es el principio de su huella y es lo unico que se
+publica (en /api/v1/dashboard/api-keys y en los logs):
+
+    python -c "from api.api_keys import id_clave; print(id_clave('la-clave'))"
+
+Los cubos y contadores son del proceso, como el rate limiter en memoria.
+"""
+import hashlib
+import hmac
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+# Caracteres hexadecimales de la huella que forman el id publico.
+LARGO_ID = 12
+
+
+def huella(clave: str) -> bytes:
+    return hashlib.sha256(clave.encode()).digest()
+
+
+def id_clave(clave: str) -> str:
+    """Identificador publicable de una clave (no permite recuperarla)."""
+    return huella(clave).hex()[:LARGO_ID]
+
+
+@dataclass
+class CuotaClave:
+    """Cubo de tokens y contadores de uso de una clave."""
+    id: str
+    huella: bytes
+    por_minuto: int  # 0: sin cuota
+    rafaga: int
+    tokens: float = 0.0
+    actualizado: float = 0.0
+    admitidas: int = 0
+    rechazadas: int = 0
+    ultimo_uso: Optional[float] = None  # epoch, para el informe
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def consumir(self, ahora: float) -> float:
+        """
+        Gasta un token si hay; devuelve 0 si se admite o los segundos
+        que faltan para el siguiente token si se rechaza.
+        """
+        with self._lock:
+            self.ultimo_uso = time.time()
+            if self.por_minuto <= 0:
+                self.admitidas += 1
+                return 0.0
+            ritmo = self.por_minuto / 60
+            self.tokens = min(self.rafaga, self.tokens + (ahora - self.actualizado) * ritmo)
+            self.actualizado = ahora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.admitidas += 1
+                return 0.0
+            self.rechazadas += 1
+            return (1 - self.tokens) / ritmo
+
+    def uso(self) -> dict:
+        return {
+            "id": self.id,
+            "por_minuto": self.por_minuto or None,
+            "rafaga": self.rafaga or None,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "tokens_disponibles": math.floor(self.tokens) if self.por_minuto > 0 else None,
+            "ultimo_uso": (datetime.fromtimestamp(self.ultimo_uso, timezone.utc).isoformat()
+                           if self.ultimo_uso is not None else None),
+        }
+
+
+def _parsear_cuotas(texto: str) -> dict[str, tuple[int, int]]:
+    """'id:por_minuto:rafaga,...' -> {id: (por_minuto, rafaga)}."""
+    cuotas = {}
+    for parte in filter(None, (p.strip() for p in texto.split(","))):
+        campos = parte.split(":")
+        if len(campos) not in (2, 3):
+            raise ValueError(f"Cuota mal formada en API_KEY_QUOTAS: {parte!r} (id:por_minuto[:rafaga])")
+        por_minuto = int(campos[1])
+        cuotas[campos[0]] = (por_minuto, int(campos[2]) if len(campos) == 3 else por_minuto)
+    return cuotas
+
+
+class IndiceClaves:
+    """Claves validas por huella, con su cuota."""
+
+    def __init__(
+        self,
+        claves: set[str],
+        *,
+        por_minuto: int = 0,
+        rafaga: int = 0,
+        cuotas: str = "",
+        reloj: Callable[[], float] = time.monotonic,
+    ):
+        self._reloj = reloj
+        especificas = _parsear_cuotas(cuotas)
+        self._por_huella: dict[bytes, CuotaClave] = {}
+        for clave in claves:
+            h = huella(clave)
+            ident = h.hex()[:LARGO_ID]
+            pm, raf = especificas.get(ident, (por_minuto, rafaga or por_minuto))
+            # El cubo empieza lleno: la primera rafaga se admite entera.
+            self._por_huella[h] = CuotaClave(ident, h, pm, raf, tokens=raf, actualizado=reloj())
+
+    def __len__(self) -> int:
+        return len(self._por_huella)
+
+    def buscar(self, clave: Optional[str]) -> Optional[CuotaClave]:
+        """La cuota de la clave si es valida; None si no."""
+        if not clave:
+            return None
+        h = huella(clave)
+        candidata = self._por_huella.get(h)
+        if candidata is None or not hmac.compare_digest(candidata.huella, h):
+            return None
+        return candidata
+
+    def consumir(self, cuota: CuotaClave) -> float:
+        return cuota.consumir(self._reloj())
+
+    def uso(self) -> list[dict]:
+        return sorted((c.uso() for c in self._por_huella.values()), key=lambda u: u["id"])
+
+
+_indice: Optional[IndiceClaves] = None
+_origen: Optional[tuple] = None
+_indice_lock = threading.Lock()
+
+
+def indice(settings) -> IndiceClaves:
+    """
+    El indice de la configuracion actual.
+
+    Se construye una vez y solo se rehace si cambian VALID_API_KEYS o las
+    cuotas (comparar cuatro valores es mucho mas barato que partir la
+    cadena en cada peticion, y permite cambiarlas en caliente o en tests).
+    """
+    global _indice, _origen
+    origen = (settings.VALID_API_KEYS, settings.API_KEY_RATE_PER_MINUTE,
+              settings.API_KEY_BURST, settings.API_KEY_QUOTAS)
+    if origen != _origen:
+        with _indice_lock:
+            if origen != _origen:
+                _indice = IndiceClaves(
+                    settings.get_valid_api_keys(),
+                    por_minuto=settings.API_KEY_RATE_PER_MINUTE,
+                    rafaga=settings.API_KEY_BURST,
+                    cuotas=settings.API_KEY_QUOTAS,
+                )
+                _origen = origen
+    return _indice
@@ -2,7 +2,11 @@ from fastapi import Header, HTTPException, Depends, status
 from typing import Optional, Annotated
 from sqlalchemy.orm import Session
 import logging
+import math
 
+from api import api_keys
+from api.rate_limit import RateLimiter, crear_rate_limiter  # noqa: F401
+from api.response_cache import crear_cache_respuestas
 from core.config import settings
 from database.connection import SessionLocal
 
@@ -52,16 +56,26 @@ async def verify_api_key(
             detail="API Key requerida. Incluir header: X-API-Key"
         )
     
-    # 🔧 MEJORADO: Usa el método de settings
-    valid_keys = settings.get_valid_api_keys()
+    # Indice por huella, construido una vez (api/api_keys.py)
+    cuota = api_keys.indice(settings).buscar(x_api_key)
     
-    if x_api_key not in valid_keys:
-        logger.warning(f"Intento de acceso con API key inválida: {x_api_key[:10]}...")
+    if cuota is None:
+        logger.warning("Intento de acceso con API key inválida (huella %s)", api_keys.id_clave(x_api_key))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API Key inválida"
         )
     
+    # Cuota propia de la clave (token bucket)
+    espera = api_keys.indice(settings).consumir(cuota)
+    if espera:
+        logger.warning("Cuota de la API key %s agotada", cuota.id)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Cuota de la API key agotada ({cuota.por_minuto} peticiones/min, ráfaga {cuota.rafaga}).",
+            headers={"Retry-After": str(math.ceil(espera))}
+        )
+    
     return x_api_key
 
 
@@ -147,63 +161,23 @@ async def validate_longitude(lon: float) -> float:
 
 # ==================== RATE LIMITING ====================
 
-class RateLimiter:
-    """
-    Rate limiter simple en memoria
-    
-    Nota: Para producción, usar Redis para compartir estado
-    entre múltiples instancias de la API
-    """
-    def __init__(self):
-        self.requests = {}
-    
-    def check_rate_limit(
-        self, 
-        key: str, 
-        max_requests: int = 100, 
-        window_seconds: int = 60
-    ) -> bool:
-        """
-        Verifica si se excedió el límite de requests
-        
-        Args:
-            key: Identificador único (ej: IP del cliente)
-            max_requests: Máximo número de requests permitidos
-            window_seconds: Ventana de tiempo en segundos
-            
-        Returns:
-            True si está dentro del límite, False si lo excedió
-        """
-        import time
-        
-        current_time = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        # Limpiar requests fuera de la ventana de tiempo
-        self.requests[key] = [
-            req_time for req_time in self.requests[key]
-            if current_time - req_time < window_seconds
-        ]
-        
-        # Verificar si excedió el límite
-        if len(self.requests[key]) >= max_requests:
-            return False
-        
-        # Agregar request actual
-        self.requests[key].append(current_time)
-        return True
-    
-    def get_remaining_requests(self, key: str, max_requests: int = 100) -> int:
-        """Retorna cuántos requests quedan disponibles"""
-        if key not in self.requests:
-            return max_requests
-        return max(0, max_requests - len(self.requests[key]))
-
-
-# Instancia global del rate limiter
-rate_limiter = RateLimiter()
+# El limiter y sus backends (memoria, SQLite, Redis) viven en
+# api/rate_limit.py; RateLimiter se reexporta aqui por compatibilidad.
+# Instancia global, con el backend de RATE_LIMIT_BACKEND.
+rate_limiter = crear_rate_limiter(
+    settings.RATE_LIMIT_BACKEND,
+    ruta_sqlite=settings.BASE_DIR / settings.RATE_LIMIT_SQLITE_PATH,
+    url_redis=settings.RATE_LIMIT_REDIS_URL,
+)
+
+# Cache de respuestas GET (api/response_cache.py), con el backend de
+# RESPONSE_CACHE_BACKEND. La aplica el middleware de main.py.
+cache_respuestas = crear_cache_respuestas(
+    settings.RESPONSE_CACHE_BACKEND,
+    max_entradas=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ruta_sqlite=settings.BASE_DIR / settings.RESPONSE_CACHE_SQLITE_PATH,
+    url_redis=settings.RESPONSE_CACHE_REDIS_URL,
+)
 
 
 async def check_rate_limit(
@@ -224,14 +198,15 @@ async def check_rate_limit(
     # Obtener IP del cliente (prioriza headers de proxy)
     client_ip = x_forwarded_for or x_real_ip or "unknown"
     
-    if not rate_limiter.check_rate_limit(
+    if not await rate_limiter.check_rate_limit_async(
         key=f"ip:{client_ip}",
         max_requests=settings.MAX_REQUESTS_PER_MINUTE,
         window_seconds=60
     ):
-        remaining = rate_limiter.get_remaining_requests(
+        remaining = await rate_limiter.get_remaining_requests_async(
             f"ip:{client_ip}", 
-            settings.MAX_REQUESTS_PER_MINUTE
+            settings.MAX_REQUESTS_PER_MINUTE,
+            window_seconds=60
         )
         
         raise HTTPException(
@@ -0,0 +1,57 @@
+"""
+Respuestas JSON serializadas con orjson.
+
+Es la clase de respuesta por defecto de la app (default_response_class
+en main.py). orjson serializa en C y entiende de por si datetime, UUID,
+enums y, con OPT_SERIALIZE_NUMPY, los escalares y arrays de NumPy que se
+escapan de predict_batch (np.float64, np.int64, np.bool_). Lo que no
+entiende pasa por _por_defecto.
+
+Ademas hay una diferencia de comportamiento con JSONResponse de
+Starlette: un NaN sale como null en vez de hacer fallar la respuesta.
+
+FastAPI pasa lo que devuelve una ruta sin response_model por
+jsonable_encoder, que recorre y copia todo el contenido antes de
+serializarlo. Las rutas que ya devuelven solo tipos primitivos se lo
+ahorran devolviendo RespuestaJSON(contenido) directamente.
+"""
+import math
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPCIONES = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _por_defecto(valor: Any) -> Any:
+    """Lo que orjson no serializa por si solo."""
+    # pd.Timestamp es una subclase de datetime que orjson no acepta;
+    # pd.NaT tambien lo es y su isoformat() es "NaT".
+    if isinstance(valor, datetime):
+        return None if valor != valor else valor.isoformat()
+    if isinstance(valor, BaseModel):
+        return valor.model_dump(mode="json")
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    # Escalares de NumPy que OPT_SERIALIZE_NUMPY no cubre (np.float16...).
+    if hasattr(valor, "item"):
+        item = valor.item()
+        return None if isinstance(item, float) and math.isnan(item) else item
+    raise TypeError(f"{type(valor).__name__} no es serializable a JSON")
+
+
+def a_json(contenido: Any) -> bytes:
+    return orjson.dumps(contenido, default=_por_defecto, option=OPCIONES)
+
+
+class RespuestaJSON(JSONResponse):
+    """JSONResponse que serializa con orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
@@ -0,0 +1,461 @@
+"""
+Rate limiting con estado intercambiable.
+
+El limite es una ventana deslizante aproximada: se cuentan los requests
+de ventanas fijas alineadas al reloj (minuto 0, 1, 2... si la ventana es
+de 60 s) y lo que hay en la ventana deslizante se estima suponiendo que
+los de la ventana anterior se repartieron por igual:
+
+    estimado = anterior * (1 - fraccion transcurrida de la actual) + actual
+
+Por clave bastan dos contadores, asi que el coste y la memoria son
+constantes. Las ventanas van alineadas al reloj de pared (time.time) y
+no a la primera peticion de cada clave para que todos los procesos que
+comparten estado esten de acuerdo en cual es la ventana actual.
+
+Donde viven los contadores lo decide RATE_LIMIT_BACKEND:
+
+  - "memoria": en el proceso (RateLimiter). Con N workers de uvicorn el
+    limite real es N x MAX_REQUESTS_PER_MINUTE.
+  - "sqlite": una base SQLite en disco local (SQLiteRateLimiter),
+    compartida por todos los workers de la maquina. Cada request es una
+    sola transaccion.
+  - "redis": un servidor que hable el protocolo de Redis (RESP)
+    (RedisRateLimiter), compartido entre replicas. Los comandos de cada
+    request viajan juntos en un pipeline: un solo viaje de ida y vuelta.
+
+Si el almacen compartido no responde, el request se deja pasar y se
+registra el fallo: que se caiga el rate limit no debe tumbar la API.
+Tras un fallo, el almacen no se vuelve a intentar durante
+ESPERA_TRAS_FALLO segundos (Disyuntor): mientras tanto cada request pasa
+al momento, sin esperar otro timeout.
+
+Los backends con E/S (bloqueante = True) no se llaman directamente desde
+el bucle de eventos: check_rate_limit_async los pasa al pool de hilos.
+"""
+import logging
+import math
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memoria", "sqlite", "redis")
+
+# Segundos sin volver a intentar un almacen compartido que acaba de fallar.
+ESPERA_TRAS_FALLO = 5.0
+
+
+def _estimado(actual: float, anterior: float, fraccion: float) -> float:
+    return anterior * (1 - fraccion) + actual
+
+
+class EnEspera(ConnectionError):
+    """El almacen fallo hace menos de la espera: ni se intenta."""
+
+
+class Disyuntor:
+    """
+    Corta los intentos contra un almacen que acaba de fallar.
+
+    Tras fallo(), comprobar() lanza EnEspera durante 'espera' segundos;
+    pasados, el siguiente intento vuelve a ir al almacen y, si falla
+    otra vez, abre una nueva espera.
+    """
+    def __init__(self, espera: float = ESPERA_TRAS_FALLO, reloj: Callable[[], float] = time.monotonic):
+        self.espera = espera
+        self._reloj = reloj
+        self._hasta = 0.0
+
+    def comprobar(self) -> None:
+        if self._reloj() < self._hasta:
+            raise EnEspera(f"almacen caido, se reintenta en {self._hasta - self._reloj():.1f} s")
+
+    def fallo(self) -> None:
+        self._hasta = self._reloj() + self.espera
+
+
+class BaseRateLimiter(ABC):
+    """
+    Interfaz comun: check_rate_limit() y get_remaining_requests().
+
+    Las subclases solo guardan contadores; la cuenta de ventanas y la
+    decision estan aqui.
+    """
+    # True si guardar los contadores hace E/S (disco o red).
+    bloqueante = False
+
+    def __init__(self, reloj: Callable[[], float] = time.time):
+        self._reloj = reloj
+
+    def _ventana(self, window_seconds: int) -> tuple[int, float]:
+        """Indice de la ventana fija actual y fraccion transcurrida de ella."""
+        ventanas = self._reloj() / window_seconds
+        indice = math.floor(ventanas)
+        return indice, ventanas - indice
+
+    def check_rate_limit(
+        self,
+        key: str,
+        max_requests: int = 100,
+        window_seconds: int = 60
+    ) -> bool:
+        """
+        Verifica si se excedió el límite de requests y, si no, lo cuenta.
+
+        Args:
+            key: Identificador único (ej: IP del cliente)
+            max_requests: Máximo número de requests permitidos
+            window_seconds: Ventana de tiempo en segundos
+
+        Returns:
+            True si está dentro del límite, False si lo excedió
+        """
+        # Una ventana vacia no retiene nada: todo request entra.
+        if window_seconds <= 0:
+            return True
+        indice, fraccion = self._ventana(window_seconds)
+        return self._admitir(key, indice, fraccion, max_requests, window_seconds)
+
+    async def _sin_bloquear(self, funcion, *args):
+        """
+        Si el backend hace E/S, funcion(*args) va al pool de hilos para no
+        parar el bucle de eventos; el de memoria se llama directamente
+        (cuesta menos que el salto de hilo y no es seguro entre hilos).
+        """
+        if not self.bloqueante:
+            return funcion(*args)
+        return await run_in_threadpool(funcion, *args)
+
+    async def check_rate_limit_async(self, key: str, max_requests: int = 100, window_seconds: int = 60) -> bool:
+        """check_rate_limit() para codigo async."""
+        return await self._sin_bloquear(self.check_rate_limit, key, max_requests, window_seconds)
+
+    def get_remaining_requests(self, key: str, max_requests: int = 100, window_seconds: int = 60) -> int:
+        """Retorna cuántos requests quedan disponibles"""
+        if window_seconds <= 0:
+            return max_requests
+        indice, fraccion = self._ventana(window_seconds)
+        actual, anterior = self._contadores(key, indice, window_seconds)
+        return max(0, max_requests - math.ceil(_estimado(actual, anterior, fraccion)))
+
+    async def get_remaining_requests_async(self, key: str, max_requests: int = 100,
+                                           window_seconds: int = 60) -> int:
+        """get_remaining_requests() para codigo async."""
+        return await self._sin_bloquear(self.get_remaining_requests, key, max_requests, window_seconds)
+
+    @abstractmethod
+    def _admitir(self, key: str, indice: int, fraccion: float, limite: int, ventana: int) -> bool:
+        """Decide sobre el request y, si entra, lo cuenta en la ventana 'indice'."""
+
+    @abstractmethod
+    def _contadores(self, key: str, indice: int, ventana: int) -> tuple[int, int]:
+        """(actual, anterior) de la clave, sin contar nada."""
+
+
+class RateLimiter(BaseRateLimiter):
+    """
+    Contadores en memoria del proceso.
+
+    Cada clave guarda [indice de ventana, actual, anterior, duracion]. Las
+    claves se mantienen en orden de ultimo uso (OrderedDict), de modo que
+    las inactivas -dos ventanas sin requests, cuando ya no cuentan- se
+    desalojan desde el principio en cada llamada sin recorrer las demas.
+    """
+    def __init__(self, reloj: Callable[[], float] = time.time):
+        super().__init__(reloj)
+        self.requests: OrderedDict[str, list] = OrderedDict()
+
+    def _desalojar(self) -> None:
+        """Borra las claves inactivas, empezando por las de uso mas antiguo."""
+        ahora = self._reloj()
+        while self.requests:
+            clave, estado = next(iter(self.requests.items()))
+            if ahora / estado[3] < estado[0] + 2:
+                break
+            del self.requests[clave]
+
+    @staticmethod
+    def _avanzar(estado: list, indice: int) -> None:
+        """Lleva el estado a la ventana 'indice'."""
+        pasadas = indice - estado[0]
+        if pasadas >= 1:
+            # Si pasaron dos o mas ventanas, la anterior quedo vacia.
+            estado[0], estado[1], estado[2] = indice, 0, estado[1] if pasadas == 1 else 0
+
+    def _admitir(self, key, indice, fraccion, limite, ventana):
+        self._desalojar()
+        estado = self.requests.get(key)
+        if estado is None or estado[3] != ventana:
+            estado = self.requests[key] = [indice, 0, 0, ventana]
+        else:
+            self.requests.move_to_end(key)
+            self._avanzar(estado, indice)
+
+        if _estimado(estado[1], estado[2], fraccion) >= limite:
+            return False
+        estado[1] += 1
+        return True
+
+    def get_remaining_requests(self, key: str, max_requests: int = 100, window_seconds: Optional[int] = None) -> int:
+        # En memoria cada clave sabe su ventana; no hace falta pasarla.
+        estado = self.requests.get(key)
+        if estado is None:
+            return max_requests
+        return super().get_remaining_requests(key, max_requests, window_seconds or estado[3])
+
+    def _contadores(self, key, indice, ventana):
+        estado = list(self.requests[key])
+        self._avanzar(estado, indice)
+        return estado[1], estado[2]
+
+
+class SQLiteRateLimiter(BaseRateLimiter):
+    """
+    Contadores en una base SQLite local, compartida por los workers.
+
+    Una fila por (clave, ventana). Leer los dos contadores, decidir y
+    sumar va en una sola transaccion BEGIN IMMEDIATE, que toma el cerrojo
+    de escritura: dos workers no pueden admitir a la vez el ultimo hueco.
+    Con WAL y synchronous=OFF la base no espera al disco (si la maquina
+    se apaga se pierde, como mucho, la cuenta del ultimo minuto).
+    """
+    bloqueante = True
+
+    # Cada cuantos requests se borran los contadores caducados.
+    PURGA_CADA = 1000
+
+    def __init__(self, ruta: Path, reloj: Callable[[], float] = time.time):
+        super().__init__(reloj)
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(ruta), timeout=5, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit ("
+            " clave TEXT NOT NULL, ventana INTEGER NOT NULL, cuenta INTEGER NOT NULL,"
+            " caduca REAL NOT NULL, PRIMARY KEY (clave, ventana)) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+        self._llamadas = 0
+        self._disyuntor = Disyuntor()
+
+    def _admitir(self, key, indice, fraccion, limite, ventana):
+        try:
+            self._disyuntor.comprobar()
+            return self._admitir_en_base(key, indice, fraccion, limite, ventana)
+        except EnEspera:
+            return True
+        except sqlite3.Error as e:
+            self._disyuntor.fallo()
+            logger.warning("Rate limit sin almacen (%s): se deja pasar el request", e)
+            return True
+
+    def _admitir_en_base(self, key, indice, fraccion, limite, ventana):
+        clave = f"{ventana}:{key}"
+        with self._lock:
+            self._llamadas += 1
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cuentas = dict(self._db.execute(
+                    "SELECT ventana, cuenta FROM rate_limit WHERE clave = ? AND ventana IN (?, ?)",
+                    (clave, indice, indice - 1),
+                ).fetchall())
+                admitido = _estimado(cuentas.get(indice, 0), cuentas.get(indice - 1, 0), fraccion) < limite
+                if admitido:
+                    self._db.execute(
+                        "INSERT INTO rate_limit VALUES (?, ?, 1, ?) "
+                        "ON CONFLICT (clave, ventana) DO UPDATE SET cuenta = cuenta + 1",
+                        (clave, indice, (indice + 2) * ventana),
+                    )
+                if self._llamadas % self.PURGA_CADA == 0:
+                    self._db.execute("DELETE FROM rate_limit WHERE caduca < ?", (self._reloj(),))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return admitido
+
+    def _contadores(self, key, indice, ventana):
+        try:
+            self._disyuntor.comprobar()
+            with self._lock:
+                cuentas = dict(self._db.execute(
+                    "SELECT ventana, cuenta FROM rate_limit WHERE clave = ? AND ventana IN (?, ?)",
+                    (f"{ventana}:{key}", indice, indice - 1),
+                ).fetchall())
+        except EnEspera:
+            return 0, 0
+        except sqlite3.Error:
+            self._disyuntor.fallo()
+            return 0, 0
+        return cuentas.get(indice, 0), cuentas.get(indice - 1, 0)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class ErrorRESP(RuntimeError):
+    """El servidor respondio con un error (-ERR ...)."""
+
+
+class ClienteRESP:
+    """
+    Cliente minimo del protocolo de Redis (RESP2), solo lo que usa el
+    rate limiter. ejecutar() manda varios comandos de una vez y lee todas
+    las respuestas despues (pipeline).
+
+    Si no se puede hablar con el servidor, durante ESPERA_TRAS_FALLO
+    segundos ejecutar() lanza EnEspera sin intentarlo (un error del
+    servidor, ErrorRESP, no cuenta: la conexion sigue bien).
+    """
+    def __init__(self, url: str, timeout: float = 0.5):
+        partes = urlparse(url)
+        self.host = partes.hostname or "localhost"
+        self.port = partes.port or 6379
+        self.db = int(partes.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._lector = None
+        self.disyuntor = Disyuntor()
+
+    def _conectar(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lector = self._sock.makefile("rb")
+        if self.db:
+            self._enviar_y_leer([("SELECT", self.db)])
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._lector.close()
+            self._sock.close()
+        self._sock = self._lector = None
+
+    @staticmethod
+    def _codificar(comando: tuple) -> bytes:
+        partes = [str(p).encode() if not isinstance(p, bytes) else p for p in comando]
+        return b"".join([b"*%d\r\n" % len(partes)] + [b"$%d\r\n%s\r\n" % (len(p), p) for p in partes])
+
+    def _leer(self):
+        linea = self._lector.readline()
+        if not linea:
+            raise ConnectionError("El servidor cerro la conexion")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b"+":
+            return resto.decode()
+        if tipo == b"-":
+            return ErrorRESP(resto.decode())
+        if tipo == b":":
+            return int(resto)
+        if tipo == b"$":
+            n = int(resto)
+            if n < 0:
+                return None
+            dato = self._lector.read(n + 2)
+            return dato[:-2]
+        if tipo == b"*":
+            n = int(resto)
+            return None if n < 0 else [self._leer() for _ in range(n)]
+        raise ConnectionError(f"Respuesta RESP no valida: {linea!r}")
+
+    def _enviar_y_leer(self, comandos: list[tuple]) -> list:
+        self._sock.sendall(b"".join(self._codificar(c) for c in comandos))
+        respuestas = [self._leer() for _ in comandos]
+        for r in respuestas:
+            if isinstance(r, ErrorRESP):
+                raise r
+        return respuestas
+
+    def ejecutar(self, *comandos: tuple) -> list:
+        """Respuestas de los comandos, enviados juntos. Reintenta una vez si se cayo la conexion."""
+        self.disyuntor.comprobar()
+        for intento in range(2):
+            try:
+                if self._sock is None:
+                    self._conectar()
+                return self._enviar_y_leer(list(comandos))
+            except (OSError, ConnectionError):
+                self.close()
+                if intento:
+                    self.disyuntor.fallo()
+                    raise
+
+
+class RedisRateLimiter(BaseRateLimiter):
+    """
+    Contadores en un servidor Redis (o compatible), compartidos entre
+    replicas.
+
+    Sin scripts en el servidor, la decision se toma despues de sumar: en
+    un pipeline van GET de la ventana anterior, INCR de la actual y su
+    EXPIRE. Si con este request el estimado pasa del limite, se devuelve
+    el hueco con DECR (un segundo viaje, solo al rechazar). Dos replicas
+    que compiten por el ultimo hueco ven cada una el INCR de la otra, asi
+    que pueden rechazar las dos, pero nunca admitir de mas.
+    """
+    bloqueante = True
+
+    PREFIJO = "aerosafe:rl"
+
+    def __init__(self, url: str, reloj: Callable[[], float] = time.time, timeout: float = 0.5):
+        super().__init__(reloj)
+        self._cliente = ClienteRESP(url, timeout=timeout)
+        self._lock = threading.Lock()
+
+    def _clave(self, key: str, ventana: int, indice: int) -> str:
+        return f"{self.PREFIJO}:{ventana}:{indice}:{key}"
+
+    def _admitir(self, key, indice, fraccion, limite, ventana):
+        actual_clave = self._clave(key, ventana, indice)
+        try:
+            with self._lock:
+                anterior, actual, _ = self._cliente.ejecutar(
+                    ("GET", self._clave(key, ventana, indice - 1)),
+                    ("INCR", actual_clave),
+                    ("EXPIRE", actual_clave, 2 * ventana),
+                )
+                # 'actual' ya incluye este request.
+                if _estimado(actual - 1, int(anterior or 0), fraccion) < limite:
+                    return True
+                self._cliente.ejecutar(("DECR", actual_clave))
+                return False
+        except EnEspera:
+            return True
+        except (OSError, ConnectionError, ErrorRESP) as e:
+            logger.warning("Rate limit sin almacen (%s): se deja pasar el request", e)
+            return True
+
+    def _contadores(self, key, indice, ventana):
+        try:
+            with self._lock:
+                actual, anterior = self._cliente.ejecutar(
+                    ("GET", self._clave(key, ventana, indice)),
+                    ("GET", self._clave(key, ventana, indice - 1)),
+                )
+        except (OSError, ConnectionError, ErrorRESP):
+            return 0, 0
+        return int(actual or 0), int(anterior or 0)
+
+    def close(self) -> None:
+        self._cliente.close()
+
+
+def crear_rate_limiter(backend: str, *, ruta_sqlite: Path, url_redis: str) -> BaseRateLimiter:
+    """El rate limiter del backend configurado (RATE_LIMIT_BACKEND)."""
+    if backend == "memoria":
+        return RateLimiter()
+    if backend == "sqlite":
+        return SQLiteRateLimiter(ruta_sqlite)
+    if backend == "redis":
+        return RedisRateLimiter(url_redis)
+    raise ValueError(f"RATE_LIMIT_BACKEND desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
@@ -0,0 +1,371 @@
+"""
+Cache de respuestas GET por ruta.
+
+Los paneles consultan /risk/stats, /risk/history, /dashboard/status, el
+pronostico y el tiempo cada pocos segundos, y cada consulta volvia a
+agregar la base o a pedir el METAR a NOAA. Aqui cada ruta declara cuanto
+vale su respuesta (TTL_POR_RUTA) y, mientras vale, se sirve guardada.
+
+La clave de una respuesta es la ruta, la query (con los parametros
+ordenados: ?a=1&b=2 y ?b=2&a=1 son la misma) y el id de la API key, asi
+que dos clientes nunca comparten respuesta. Solo se guardan las 200.
+
+Cada respuesta lleva ETag (huella del cuerpo) y Cache-Control con lo que
+le queda de vida; si el cliente manda If-None-Match con el mismo ETag se
+contesta 304 sin cuerpo. Un cliente que pide Cache-Control: no-cache
+recibe una respuesta recien calculada (que renueva la guardada).
+
+Donde viven las respuestas lo decide RESPONSE_CACHE_BACKEND, igual que
+en api/rate_limit.py:
+
+  - "memoria": LRU en el proceso (CacheMemoria), con un maximo de
+    entradas. Cada worker tiene la suya.
+  - "sqlite": una base SQLite local (CacheSQLite), compartida por los
+    workers de la maquina.
+  - "redis": un servidor Redis o compatible (CacheRedis), compartido
+    entre replicas.
+
+Si el almacen compartido falla, la peticion se calcula como si no hubiera
+cache: perder la cache no debe tumbar la API. Tras un fallo no se vuelve
+a intentar durante ESPERA_TRAS_FALLO segundos (el Disyuntor de
+api/rate_limit.py), asi que mientras este caido no cuesta nada.
+
+Los almacenes con E/S (bloqueante = True) se consultan desde el
+middleware con obtener_async()/guardar_async(), en el pool de hilos.
+"""
+import hashlib
+import logging
+import math
+import sqlite3
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from api.api_keys import id_clave
+from api.rate_limit import ClienteRESP, Disyuntor, EnEspera, ErrorRESP
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memoria", "sqlite", "redis")
+
+# Segundos que vale la respuesta de cada ruta. Una ruta terminada en "/"
+# cubre todo lo que cuelga de ella; la ruta exacta manda sobre el prefijo
+# y 0 la deja sin cache.
+TTL_POR_RUTA = {
+    "/api/v1/risk/stats": 60,
+    "/api/v1/risk/history": 10,  # una prediccion nueva aparece en 10 s
+    "/api/v1/dashboard/status": 30,
+    "/api/v1/forecast/": 300,  # el METAR cambia cada 30-60 min
+    "/api/v1/weather/": 120,
+    "/api/v1/weather/test": 0,  # diagnostico: tiene que llegar a la fuente
+}
+
+_PREFIJOS = sorted((r for r in TTL_POR_RUTA if r.endswith("/")), key=len, reverse=True)
+
+
+def ttl_de(ruta: str) -> int:
+    """Segundos de cache de la ruta; 0 si no se cachea."""
+    if ruta in TTL_POR_RUTA:
+        return TTL_POR_RUTA[ruta]
+    for prefijo in _PREFIJOS:
+        if ruta.startswith(prefijo):
+            return TTL_POR_RUTA[prefijo]
+    return 0
+
+
+def clave_de(request: Request) -> str:
+    """Ruta, query normalizada e id de la API key (nunca la clave)."""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    api_key = request.headers.get("x-api-key")
+    return f"{request.url.path}?{query}#{id_clave(api_key) if api_key else '-'}"
+
+
+def sin_cache(request: Request) -> bool:
+    """El cliente pide explicitamente una respuesta nueva."""
+    directivas = request.headers.get("cache-control", "").lower()
+    return "no-cache" in directivas or "no-store" in directivas
+
+
+@dataclass(frozen=True)
+class Entrada:
+    """Una respuesta guardada: cuerpo, content-type, ETag y caducidad (epoch)."""
+    cuerpo: bytes
+    tipo: str
+    etag: str
+    caduca: float
+
+    # Formato en los almacenes compartidos: caducidad (double) y largos
+    # de tipo y etag (uint16), luego tipo, etag y cuerpo tal cual.
+    _CABECERA = struct.Struct("<dHH")
+
+    def a_bytes(self) -> bytes:
+        tipo, etag = self.tipo.encode(), self.etag.encode()
+        return self._CABECERA.pack(self.caduca, len(tipo), len(etag)) + tipo + etag + self.cuerpo
+
+    @classmethod
+    def de_bytes(cls, datos: bytes) -> "Entrada":
+        caduca, n_tipo, n_etag = cls._CABECERA.unpack_from(datos)
+        inicio = cls._CABECERA.size
+        tipo = datos[inicio:inicio + n_tipo].decode()
+        etag = datos[inicio + n_tipo:inicio + n_tipo + n_etag].decode()
+        return cls(datos[inicio + n_tipo + n_etag:], tipo, etag, caduca)
+
+
+def etag(cuerpo: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(cuerpo, digest_size=12).hexdigest()
+
+
+def _coincide(if_none_match: Optional[str], etiqueta: str) -> bool:
+    """If-None-Match acepta una lista de ETags, debiles (W/) o '*'."""
+    if not if_none_match:
+        return False
+    candidatos = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+    return "*" in candidatos or etiqueta in candidatos
+
+
+def responder(entrada: Entrada, request: Request, ahora: float, estado: str) -> Response:
+    """La respuesta de una entrada: 304 si el cliente ya la tiene."""
+    cabeceras = {
+        "ETag": entrada.etag,
+        # private: la respuesta depende de la API key; un proxy
+        # compartido no debe servirla a otro cliente.
+        "Cache-Control": f"private, max-age={max(0, math.ceil(entrada.caduca - ahora))}",
+        "Vary": "X-API-Key",
+        "X-Cache": estado,
+    }
+    if _coincide(request.headers.get("if-none-match"), entrada.etag):
+        return Response(status_code=304, headers=cabeceras)
+    return Response(entrada.cuerpo, headers={**cabeceras, "Content-Type": entrada.tipo})
+
+
+class BaseCacheRespuestas(ABC):
+    """
+    Interfaz comun: obtener(), guardar() y limpiar().
+
+    Las subclases solo leen y escriben bytes; la caducidad la decide la
+    propia entrada, asi que un almacen que tarde en borrar una clave
+    vencida nunca la sirve.
+    """
+    # True si leer y escribir hace E/S (disco o red).
+    bloqueante = False
+
+    def __init__(self, reloj: Callable[[], float] = time.time):
+        self._reloj = reloj
+
+    def ahora(self) -> float:
+        return self._reloj()
+
+    def obtener(self, clave: str) -> Optional[Entrada]:
+        """La entrada vigente de la clave, o None."""
+        entrada = self._leer(clave)
+        if entrada is None or entrada.caduca <= self._reloj():
+            return None
+        return entrada
+
+    def guardar(self, clave: str, cuerpo: bytes, tipo: str, ttl: int) -> Entrada:
+        """Guarda el cuerpo durante ttl segundos y devuelve su entrada."""
+        entrada = Entrada(cuerpo, tipo, etag(cuerpo), self._reloj() + ttl)
+        self._escribir(clave, entrada, ttl)
+        return entrada
+
+    async def _sin_bloquear(self, funcion, *args):
+        """Como en api/rate_limit.py: al pool de hilos solo si hay E/S."""
+        if not self.bloqueante:
+            return funcion(*args)
+        return await run_in_threadpool(funcion, *args)
+
+    async def obtener_async(self, clave: str) -> Optional[Entrada]:
+        """obtener() para codigo async."""
+        return await self._sin_bloquear(self.obtener, clave)
+
+    async def guardar_async(self, clave: str, cuerpo: bytes, tipo: str, ttl: int) -> Entrada:
+        """guardar() para codigo async."""
+        return await self._sin_bloquear(self.guardar, clave, cuerpo, tipo, ttl)
+
+    @abstractmethod
+    def limpiar(self) -> None:
+        """Borra todas las respuestas guardadas."""
+
+    @abstractmethod
+    def _leer(self, clave: str) -> Optional[Entrada]:
+        """La entrada guardada de la clave (vencida o no), o None."""
+
+    @abstractmethod
+    def _escribir(self, clave: str, entrada: Entrada, ttl: int) -> None:
+        """Guarda la entrada; el almacen puede olvidarla pasados ttl segundos."""
+
+
+class CacheMemoria(BaseCacheRespuestas):
+    """
+    LRU en memoria del proceso.
+
+    Las entradas se mantienen en orden de ultimo uso (OrderedDict): al
+    pasar de max_entradas se desaloja la menos usada, sin recorrer las
+    demas. Una entrada vencida se borra cuando se pide.
+    """
+    def __init__(self, max_entradas: int = 1024, reloj: Callable[[], float] = time.time):
+        super().__init__(reloj)
+        self.max_entradas = max_entradas
+        self.entradas: OrderedDict[str, Entrada] = OrderedDict()
+
+    def _leer(self, clave):
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada.caduca <= self._reloj():
+            del self.entradas[clave]
+            return None
+        self.entradas.move_to_end(clave)
+        return entrada
+
+    def _escribir(self, clave, entrada, ttl):
+        self.entradas[clave] = entrada
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+
+    def limpiar(self) -> None:
+        self.entradas.clear()
+
+
+class CacheSQLite(BaseCacheRespuestas):
+    """
+    Respuestas en una base SQLite local, compartida por los workers.
+
+    Una fila por clave; escribir es un INSERT OR REPLACE. Como en el rate
+    limiter, WAL y synchronous=OFF: si la maquina se apaga se pierde como
+    mucho lo ultimo cacheado, que se vuelve a calcular.
+    """
+    bloqueante = True
+
+    # Cada cuantas escrituras se borran las entradas vencidas.
+    PURGA_CADA = 1000
+
+    def __init__(self, ruta: Path, reloj: Callable[[], float] = time.time):
+        super().__init__(reloj)
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(ruta), timeout=5, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_respuestas ("
+            " clave TEXT PRIMARY KEY, caduca REAL NOT NULL, valor BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self._disyuntor = Disyuntor()
+
+    def _leer(self, clave):
+        try:
+            self._disyuntor.comprobar()
+            with self._lock:
+                fila = self._db.execute(
+                    "SELECT valor FROM cache_respuestas WHERE clave = ?", (clave,)
+                ).fetchone()
+        except EnEspera:
+            return None
+        except sqlite3.Error as e:
+            self._disyuntor.fallo()
+            logger.warning("Cache de respuestas sin almacen (%s): se calcula", e)
+            return None
+        return Entrada.de_bytes(fila[0]) if fila else None
+
+    def _escribir(self, clave, entrada, ttl):
+        try:
+            self._disyuntor.comprobar()
+            with self._lock:
+                self._escrituras += 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache_respuestas VALUES (?, ?, ?)",
+                    (clave, entrada.caduca, entrada.a_bytes()),
+                )
+                if self._escrituras % self.PURGA_CADA == 0:
+                    self._db.execute("DELETE FROM cache_respuestas WHERE caduca <= ?", (self._reloj(),))
+        except EnEspera:
+            pass
+        except sqlite3.Error as e:
+            self._disyuntor.fallo()
+            logger.warning("Cache de respuestas sin almacen (%s): no se guarda", e)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM cache_respuestas")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class CacheRedis(BaseCacheRespuestas):
+    """
+    Respuestas en un servidor Redis (o compatible), compartidas entre
+    replicas. Cada entrada es un SET con PX: Redis la borra sola al
+    vencer.
+    """
+    bloqueante = True
+
+    PREFIJO = "aerosafe:rc"
+
+    def __init__(self, url: str, reloj: Callable[[], float] = time.time, timeout: float = 0.5):
+        super().__init__(reloj)
+        self._cliente = ClienteRESP(url, timeout=timeout)
+        self._lock = threading.Lock()
+
+    def _leer(self, clave):
+        try:
+            with self._lock:
+                (valor,) = self._cliente.ejecutar(("GET", f"{self.PREFIJO}:{clave}"))
+        except EnEspera:
+            return None
+        except (OSError, ConnectionError, ErrorRESP) as e:
+            logger.warning("Cache de respuestas sin almacen (%s): se calcula", e)
+            return None
+        return Entrada.de_bytes(valor) if valor is not None else None
+
+    def _escribir(self, clave, entrada, ttl):
+        try:
+            with self._lock:
+                self._cliente.ejecutar(
+                    ("SET", f"{self.PREFIJO}:{clave}", entrada.a_bytes(), "PX", int(ttl * 1000))
+                )
+        except EnEspera:
+            pass
+        except (OSError, ConnectionError, ErrorRESP) as e:
+            logger.warning("Cache de respuestas sin almacen (%s): no se guarda", e)
+
+    def limpiar(self) -> None:
+        with self._lock:
+            cursor = "0"
+            while True:
+                cursor, claves = self._cliente.ejecutar(
+                    ("SCAN", cursor, "MATCH", f"{self.PREFIJO}:*", "COUNT", 500)
+                )[0]
+                if claves:
+                    self._cliente.ejecutar(("DEL", *claves))
+                cursor = cursor.decode()
+                if cursor == "0":
+                    break
+
+    def close(self) -> None:
+        self._cliente.close()
+
+
+def crear_cache_respuestas(
+    backend: str, *, max_entradas: int, ruta_sqlite: Path, url_redis: str
+) -> BaseCacheRespuestas:
+    """La cache del backend configurado (RESPONSE_CACHE_BACKEND)."""
+    if backend == "memoria":
+        return CacheMemoria(max_entradas)
+    if backend == "sqlite":
+        return CacheSQLite(ruta_sqlite)
+    if backend == "redis":
+        return CacheRedis(url_redis)
+    raise ValueError(f"RESPONSE_CACHE_BACKEND desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
@@ -18,7 +18,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import func, text
 from sqlalchemy.orm import Session
 
+from api import api_keys
 from api.dependencies import get_db, validate_icao_code
+from api.json_response import RespuestaJSON
 from models.models import RiskPrediction
 
 router = APIRouter()
@@ -48,7 +50,7 @@ async def get_dashboard_status(db: Session = Depends(get_db)):
         db_ok = False
         total = None
 
-    return {
+    return RespuestaJSON({
         "status": "operational" if (modelo_ok and db_ok) else "degraded",
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "version": settings.VERSION,
@@ -60,7 +62,25 @@ async def get_dashboard_status(db: Session = Depends(get_db)):
         "metrics": {
             "total_predictions": total,
         },
-    }
+    })
+
+
+@router.get("/api-keys")
+async def get_api_key_usage():
+    """
+    Uso y cuota de cada API key desde el arranque del proceso.
+
+    Cada clave se identifica por el principio de su huella sha256, nunca
+    por la clave: este endpoint lo consultan paneles y no debe filtrar
+    credenciales.
+    """
+    from core.config import settings
+
+    return RespuestaJSON({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "require_api_key": settings.REQUIRE_API_KEY,
+        "claves": api_keys.indice(settings).uso(),
+    })
 
 
 @router.get("/airport/{icao}/status")
@@ -76,7 +96,7 @@ async def get_airport_status(icao: str = Depends(validate_icao_code)):
         weather_data = await get_airport_weather_data(icao)
         risk = await predict_risk_from_weather(weather_data)
 
-        return {
+        return RespuestaJSON({
             "airport": {
                 "icao": icao.upper(),
                 "name": weather_data.get("airport_name", "Unknown Airport"),
@@ -102,7 +122,7 @@ async def get_airport_status(icao: str = Depends(validate_icao_code)):
             "operational_impact": _analyze_operational_impact(weather_data, risk),
             "recommendations": risk.get("recommendations", []),
             "last_updated": datetime.now(timezone.utc).isoformat(),
-        }
+        })
 
     except Exception as e:
         logger.error("Error obteniendo estado de aeropuerto %s: %s", icao, e)
@@ -8,8 +8,9 @@ Es distinto de /risk, que clasifica la condición actual. Aquí se predice
 el futuro, con probabilidad calibrada apta para decidir.
 """
 import logging
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException, Path
+from fastapi import APIRouter, HTTPException, Path, Query
 
 from models.schemas import ForecastResponse
 from services.forecast_service import (
@@ -29,6 +30,9 @@ AEROPUERTOS_SOPORTADOS = {"SKBO", "SKRG", "SKPS", "SKMZ"}
 @router.get("/{icao}", response_model=ForecastResponse)
 async def pronostico_aeropuerto(
     icao: str = Path(..., min_length=4, max_length=4, description="Código ICAO"),
+    tier: Literal["full", "fast"] = Query(
+        "full", description="full: modelo calibrado; fast: alumno destilado, inferencia < 1 ms"
+    ),
 ):
     """
     Pronostica niebla o tormenta a 3 horas para un aeropuerto.
@@ -40,6 +44,11 @@ async def pronostico_aeropuerto(
     real, no un score sin escala. El campo `nivel` la traduce a
     MINIMO/BAJO/MODERADO/ALTO para lectura rápida.
 
+    Con `tier=fast` responde un modelo destilado del calibrado, para
+    clientes que consultan todos los aeropuertos con frecuencia y
+    aceptan perder algo de habilidad. `metricas_validacion` compara ambos
+    niveles sobre el mismo test.
+
     Aeropuertos soportados: SKBO, SKRG, SKPS, SKMZ.
     """
     icao = icao.upper().strip()
@@ -57,14 +66,14 @@ async def pronostico_aeropuerto(
         )
 
     servicio = get_forecast_service(icao, HORIZONTE_H)
-    if not servicio.disponible():
+    if not servicio.disponible(tier):
         raise HTTPException(
             status_code=503,
-            detail=f"Modelo de pronóstico de {icao} no cargado.",
+            detail=f"Modelo de pronóstico de {icao} ({tier}) no cargado.",
         )
 
     try:
-        return await servicio.pronosticar(icao)
+        return await servicio.pronosticar(icao, tier)
     except MetarNoDisponible as e:
         # La fuente externa (NOAA) no respondió: no es culpa del cliente.
         raise HTTPException(status_code=503, detail=str(e))
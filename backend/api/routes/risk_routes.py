@@ -7,6 +7,7 @@ from sqlalchemy import desc, func
 from sqlalchemy.orm import Session
 
 from api.dependencies import get_db
+from api.json_response import RespuestaJSON
 from models.models import RiskPrediction
 from models.schemas import RiskRequest, RiskResponse
 from services.ml_service_v2 import RISK_LEVELS
@@ -125,7 +126,7 @@ async def predict_airport_risk(icao: str):
         from services.ml_service_v2 import predict_risk_from_weather
         prediction = await predict_risk_from_weather(weather_data, icao=icao)
 
-        return {
+        return RespuestaJSON({
             "aeropuerto": {
                 "icao": icao,
                 "nombre": weather_data.get("airport_name", "Unknown"),
@@ -142,7 +143,7 @@ async def predict_airport_risk(icao: str):
                 "warning": prediction.get("warning"),
             },
             "timestamp": weather_data.get("timestamp")
-        }
+        })
         
     except HTTPException:
         raise
@@ -177,7 +178,7 @@ async def get_risk_history(
             query.order_by(desc(RiskPrediction.timestamp)).limit(limit).all()
         )
 
-        return {
+        return RespuestaJSON({
             "total": total,
             "returned": len(registros),
             "predictions": [
@@ -198,7 +199,7 @@ async def get_risk_history(
                 }
                 for r in registros
             ],
-        }
+        })
 
     except Exception as e:
         logger.error("Error obteniendo historial: %s", e, exc_info=True)
@@ -242,7 +243,7 @@ async def get_risk_statistics(
             .scalar()
         )
 
-        return {
+        return RespuestaJSON({
             "period_days": days,
             "since": desde.isoformat(),
             "total_predictions": total,
@@ -252,7 +253,7 @@ async def get_risk_statistics(
                 for nivel, cuenta in distribucion.items()
             },
             "average_confidence": round(float(confianza_media), 4) if confianza_media else 0.0,
-        }
+        })
 
     except Exception as e:
         logger.error("Error obteniendo estadísticas: %s", e, exc_info=True)
@@ -30,6 +30,9 @@ class Settings(BaseSettings):
     SCALER_PATH: str = "models/production/scaler.pkl"
     ENCODER_PATH: str = "models/production/label_encoder.pkl"
     FEATURE_NAMES_PATH: str = "models/production/feature_names.txt"
+    # Familia del modelo de pronostico que se sirve: "rf" (RandomForest)
+    # o "hgb" (HistGradientBoosting). Ver services/forecast_engine.py.
+    FORECAST_ENGINE: str = "rf"
     
     # Weather API
     WEATHER_API_KEY: Optional[str] = None
@@ -52,10 +55,34 @@ class Settings(BaseSettings):
     # VALID_API_KEYS tiene que venir del .env o la app no arranca.
     REQUIRE_API_KEY: bool = False
     VALID_API_KEYS: str = ""
+    # Cuota por API key (token bucket, ver api/api_keys.py): peticiones
+    # por minuto y rafaga maxima. 0 = sin cuota propia; la rafaga, si es
+    # 0, es igual a las peticiones por minuto. API_KEY_QUOTAS fija
+    # excepciones por id de clave: "id:por_minuto:rafaga,...".
+    API_KEY_RATE_PER_MINUTE: int = 0
+    API_KEY_BURST: int = 0
+    API_KEY_QUOTAS: str = ""
 
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
     MAX_REQUESTS_PER_MINUTE: int = 100
+    # Donde se cuentan los requests (ver api/rate_limit.py): "memoria"
+    # (cada proceso por su cuenta: con N workers el limite real es N
+    # veces el configurado), "sqlite" (compartido por los workers de una
+    # maquina) o "redis" (compartido entre replicas).
+    RATE_LIMIT_BACKEND: str = "memoria"
+    RATE_LIMIT_SQLITE_PATH: str = "data/rate_limit.db"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Cache de respuestas GET (ver api/response_cache.py; los TTL de cada
+    # ruta estan alli): "memoria" (LRU de RESPONSE_CACHE_MAX_ENTRIES
+    # respuestas por proceso), "sqlite" (compartida por los workers de
+    # una maquina) o "redis" (compartida entre replicas).
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_BACKEND: str = "memoria"
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_SQLITE_PATH: str = "data/response_cache.db"
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
     
     # Batch Processing
     BATCH_INPUT_DIR: str = "data/batch/input"
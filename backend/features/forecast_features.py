@@ -39,12 +39,51 @@ FEATURES_DERIVADAS = [
 # models/forecast/features_<icao>_h<N>.txt.
 FORECAST_FEATURES = FEATURES_BASE + FEATURES_DERIVADAS
 
+# Tipos compactos de los datasets de pronostico en memoria. Por defecto
+# pandas carga todo en float64/int64, el doble o el octuple de lo que
+# hace falta. float32 no cambia el modelo: los arboles de scikit-learn
+# convierten X a float32 antes de entrenar y de predecir, asi que el
+# bosque ve exactamente los mismos numeros. Las enteras caben en int8
+# (hora <= 23, mes <= 12, flags 0/1, intensidad 0-3).
+DTYPES_COMPACTOS = {
+    **{columna: "float32" for columna in FEATURES_BASE},
+    "hora": "int8",
+    "mes": "int8",
+    "es_noche": "int8",
+    "precip_intensidad": "int8",
+    "adverso_actual": "int8",
+    "hora_sin": "float32",
+    "hora_cos": "float32",
+    "mes_sin": "float32",
+    "mes_cos": "float32",
+    "spread_t_td": "float32",
+    "objetivo": "int8",
+}
+
 
 def es_adverso(descripcion: pd.Series) -> pd.Series:
     """1 si la condicion actual es niebla o tormenta."""
     return descripcion.isin(CONDICIONES_ADVERSAS).astype(int)
 
 
+def compactar(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aplica DTYPES_COMPACTOS a las columnas presentes. Las demas (timestamp,
+    descripcion, metar...) no se tocan.
+
+    Una columna entera con nulos no cabe en int8: se deja en float32 en
+    vez de rellenar nada.
+    """
+    tipos = {}
+    for columna, tipo in DTYPES_COMPACTOS.items():
+        if columna not in df.columns:
+            continue
+        if tipo.startswith("int") and df[columna].isna().any():
+            tipo = "float32"
+        tipos[columna] = tipo
+    return df.astype(tipos)
+
+
 def add_forecast_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Anade las 7 features derivadas a un DataFrame que ya trae las base y
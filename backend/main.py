@@ -1,12 +1,14 @@
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, Request, status
+from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 import uvicorn
 
-from api.dependencies import rate_limiter, verify_api_key
+from api import api_keys, response_cache
+from api.dependencies import cache_respuestas, rate_limiter, verify_api_key
+from api.json_response import RespuestaJSON
 from api.routes.risk_routes import router as risk_router
 from api.routes.weather_routes import router as weather_router
 from api.routes.dashboard_routes import router as dashboard_router
@@ -38,7 +40,12 @@ async def lifespan(app: FastAPI):
     logger.info(
         "Autenticación por API key: %s | Rate limit: %s",
         "activa" if settings.REQUIRE_API_KEY else "DESACTIVADA",
-        f"{settings.MAX_REQUESTS_PER_MINUTE}/min" if settings.RATE_LIMIT_ENABLED else "DESACTIVADO",
+        f"{settings.MAX_REQUESTS_PER_MINUTE}/min ({settings.RATE_LIMIT_BACKEND})"
+        if settings.RATE_LIMIT_ENABLED else "DESACTIVADO",
+    )
+    logger.info(
+        "Cache de respuestas: %s",
+        settings.RESPONSE_CACHE_BACKEND if settings.RESPONSE_CACHE_ENABLED else "DESACTIVADA",
     )
 
     try:
@@ -77,6 +84,8 @@ app = FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json",
     lifespan=lifespan,
+    # orjson en vez del json de la libreria estandar (api/json_response.py)
+    default_response_class=RespuestaJSON,
 )
 
 # ==================== MIDDLEWARE ====================
@@ -91,6 +100,48 @@ app.add_middleware(
 )
 
 
+# Va antes que el rate limit para quedar por dentro de el: una respuesta
+# servida de la cache tambien cuenta para el limite de la IP.
+@app.middleware("http")
+async def response_cache_middleware(request: Request, call_next):
+    """
+    Sirve guardadas las respuestas GET de las rutas con TTL.
+
+    Los paneles consultan las mismas rutas cada pocos segundos; mientras
+    la respuesta vale (TTL_POR_RUTA en api/response_cache.py) se sirve
+    sin recalcular, con ETag y Cache-Control, y un If-None-Match que
+    coincide recibe 304. La cabecera X-Cache dice si fue HIT o MISS.
+    """
+    ttl = (
+        response_cache.ttl_de(request.url.path)
+        if settings.RESPONSE_CACHE_ENABLED and request.method == "GET" else 0
+    )
+    if not ttl:
+        return await call_next(request)
+
+    clave = response_cache.clave_de(request)
+    # SQLite y Redis hacen E/S: las llamadas *_async van al pool de hilos.
+    entrada = None if response_cache.sin_cache(request) else await cache_respuestas.obtener_async(clave)
+    if entrada is not None:
+        # Lo guardado no se salta la API key: una clave revocada o sin
+        # cuota no recibe nada, igual que si llegara a la ruta.
+        try:
+            await verify_api_key(request.headers.get("x-api-key"))
+        except HTTPException as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+        return response_cache.responder(entrada, request, cache_respuestas.ahora(), "HIT")
+
+    respuesta = await call_next(request)
+    if respuesta.status_code != 200 or "set-cookie" in respuesta.headers:
+        return respuesta
+
+    cuerpo = b"".join([parte async for parte in respuesta.body_iterator])
+    entrada = await cache_respuestas.guardar_async(
+        clave, cuerpo, respuesta.headers.get("content-type", "application/json"), ttl
+    )
+    return response_cache.responder(entrada, request, cache_respuestas.ahora(), "MISS")
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     """
@@ -101,19 +152,30 @@ async def rate_limit_middleware(request: Request, call_next):
     la configuración, pero nunca se conectó a nada: la API aceptaba
     peticiones sin límite mientras aparentaba tener control de caudal.
 
-    Nota: el contador vive en memoria del proceso. Con varias réplicas
-    cada una lleva su propia cuenta; para eso hace falta Redis.
+    Dónde vive la cuenta lo decide RATE_LIMIT_BACKEND: en memoria
+    (por defecto) cada worker cuenta por separado; "sqlite" la comparte
+    entre los workers de una máquina y "redis" entre réplicas. Ver
+    api/rate_limit.py.
     """
     if not settings.RATE_LIMIT_ENABLED or request.url.path in RUTAS_SIN_LIMITE:
         return await call_next(request)
 
+    # Una API key con cuota propia la gasta en verify_api_key: no cuenta
+    # para la IP, para no castigar a quien comparte NAT con ella.
+    if settings.REQUIRE_API_KEY:
+        cuota = api_keys.indice(settings).buscar(request.headers.get("x-api-key"))
+        if cuota is not None and cuota.por_minuto > 0:
+            return await call_next(request)
+
     cliente = (
         request.headers.get("x-forwarded-for", "").split(",")[0].strip()
         or request.headers.get("x-real-ip")
         or (request.client.host if request.client else "unknown")
     )
 
-    if not rate_limiter.check_rate_limit(
+    # SQLite y Redis hacen E/S: check_rate_limit_async los pasa al pool
+    # de hilos para no parar el bucle de eventos.
+    if not await rate_limiter.check_rate_limit_async(
         key=f"ip:{cliente}",
         max_requests=settings.MAX_REQUESTS_PER_MINUTE,
         window_seconds=60,
@@ -0,0 +1,104 @@
+"""
+Compara los motores del pronostico: RandomForest frente a
+HistGradientBoosting.
+
+Cada familia se entrena y se calibra igual que en calibrate_forecast.py
+(mismos tramos temporales, calibracion isotonica sobre 2021-2022), se
+guarda como se guardaria para servir y se vuelve a cargar con
+services/forecast_engine.py. Sobre el test 2023-2026 se mide:
+
+  - PR-AUC y ECE (habilidad y calibracion),
+  - tamano del artefacto en disco,
+  - latencia de predict_proba con 1 fila (una peticion de la API) y con
+    1000 filas (un lote).
+
+Uso:
+    cd backend
+    python -m ml.scripts.benchmark_forecast --icao SKBO --horizonte 3
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
+from sklearn.metrics import average_precision_score
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ml.scripts.calibrate_forecast import FIN_CALIB, cargar, ece  # noqa: E402
+from ml.utils import busqueda, entrenamiento  # noqa: E402
+from services.forecast_engine import cargar_motor, guardar_calibrado  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def medir(motor: str, icao: str, horizonte: int, datos, directorio: Path) -> dict:
+    train, calib, test, features = datos
+    Xte, yte = test[features].values, test.objetivo.values
+
+    inicio = time.perf_counter()
+    base = entrenamiento.crear_modelo(motor).fit(train[features].values, train.objetivo.values)
+    entreno_s = time.perf_counter() - inicio
+    calibrado = CalibratedClassifierCV(FrozenEstimator(base), method="isotonic").fit(
+        calib[features].values, calib.objetivo.values)
+
+    # Ida y vuelta por disco, como en produccion.
+    ruta = guardar_calibrado(calibrado, directorio, icao, horizonte, motor)
+    servido = cargar_motor(ruta)
+
+    p = servido.predict_proba(Xte)[:, 1]
+    return {
+        "motor": motor,
+        "pr_auc": average_precision_score(yte, p),
+        "ece": ece(yte, p),
+        "mb": servido.metadatos()["tamano_bytes"] / 1e6,
+        "entreno_s": entreno_s,
+        "ms_1": busqueda.latencia_ms(servido, Xte[:1]),
+        "ms_1000": busqueda.latencia_ms(servido, Xte[:1000], repeticiones=10),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de motores del pronostico")
+    parser.add_argument("--icao", default="SKBO")
+    parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--motores", nargs="+", choices=entrenamiento.MOTORES, default=list(entrenamiento.MOTORES))
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"BENCHMARK DE MOTORES  {args.icao.upper()}  (+{args.horizonte}h, test >= {FIN_CALIB})")
+    print("=" * 72)
+
+    datos = cargar(args.icao, args.horizonte)
+    with tempfile.TemporaryDirectory() as tmp:
+        resultados = []
+        for motor in args.motores:
+            print(f"\n  Entrenando y calibrando {motor}...", flush=True)
+            resultados.append(medir(motor, args.icao, args.horizonte, datos, Path(tmp)))
+
+    print(f"\n  {'motor':8s}{'PR-AUC':>9s}{'ECE':>9s}{'MB':>9s}{'train s':>9s}"
+          f"{'ms 1 fila':>12s}{'ms 1000':>10s}")
+    for r in resultados:
+        print(f"  {r['motor']:8s}{r['pr_auc']:>9.3f}{r['ece']:>9.4f}{r['mb']:>9.1f}{r['entreno_s']:>9.1f}"
+              f"{r['ms_1']:>12.2f}{r['ms_1000']:>10.1f}")
+
+    if len(resultados) > 1:
+        ref = resultados[0]
+        print()
+        for r in resultados[1:]:
+            print(f"  {r['motor']} frente a {ref['motor']}: PR-AUC {r['pr_auc'] - ref['pr_auc']:+.3f}, "
+                  f"artefacto x{ref['mb'] / r['mb']:.0f} menor, "
+                  f"1 fila x{ref['ms_1'] / r['ms_1']:.1f} mas rapido, "
+                  f"1000 filas x{ref['ms_1000'] / r['ms_1000']:.1f} mas rapido")
+        print("\n  Para servir otro motor: entrenarlo y calibrarlo con --motor y")
+        print("  definir FORECAST_ENGINE en el .env.")
+
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -36,9 +36,21 @@ Uso:
     cd backend
     python -m ml.scripts.build_forecast_dataset
     python -m ml.scripts.build_forecast_dataset --horizonte 6 --corte 2022
+    python -m ml.scripts.build_forecast_dataset --csv   # exporta tambien CSV
+    python -m ml.scripts.build_forecast_dataset --all-airports --horizontes 1,2,3,6
+
+Con --all-airports / --horizontes se construye la matriz completa de una
+pasada: cada estacion se lee y se prepara UNA vez, se emparejan todos
+los horizontes sobre el mismo historico, y las estaciones se reparten
+entre procesos.
+
+La salida se guarda en Parquet particionado por estacion y anio (ver
+ml/utils/almacen.py); el CSV queda como exportacion opcional.
 """
 import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -52,18 +64,18 @@ from features.forecast_features import (  # noqa: E402
     add_forecast_features,
     es_adverso,
 )
+from ml.utils import almacen, cache_features  # noqa: E402
 
 BACKEND_DIR = Path(__file__).resolve().parents[2]
 METAR_DIR = BACKEND_DIR / "data" / "metar"
 SALIDA_DIR = BACKEND_DIR / "data" / "forecast"
 
 
-def construir(df: pd.DataFrame, horizonte: int) -> pd.DataFrame:
+def preparar(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Empareja cada observacion con la de horizonte horas despues.
-
-    Se hace con un merge por timestamp exacto, no con shift(): shift
-    asume filas equiespaciadas y aqui no lo estan.
+    Ordena el historico, quita duplicados y calcula las features del
+    instante t. No depende del horizonte: se hace una vez por estacion
+    aunque luego se emparejen varios horizontes.
     """
     df = df.sort_values("timestamp").drop_duplicates("timestamp").reset_index(drop=True)
 
@@ -72,23 +84,72 @@ def construir(df: pd.DataFrame, horizonte: int) -> pd.DataFrame:
     # entrenamiento e inferencia coincidan exactamente.
     df = add_forecast_features(df)
     df["adverso"] = df["adverso_actual"]
+    return df
 
-    # Tabla del futuro: la etiqueta objetivo indexada por su propio
-    # timestamp, que luego se busca en t + horizonte.
-    futuro = df[["timestamp", "adverso"]].rename(
-        columns={"timestamp": "t_futuro", "adverso": "objetivo"}
-    )
-    df["t_objetivo"] = df["timestamp"] + pd.Timedelta(hours=horizonte)
 
-    emparejado = df.merge(
-        futuro, left_on="t_objetivo", right_on="t_futuro", how="inner"
-    )
+def emparejar(preparado: pd.DataFrame, horizonte: int) -> pd.DataFrame:
+    """
+    Empareja cada observacion de un historico ya preparado con la de
+    horizonte horas despues.
+
+    Se busca la marca de tiempo exacta t + horizonte, no se usa shift():
+    shift asume filas equiespaciadas y aqui no lo estan. Como los
+    timestamps ya estan ordenados y sin duplicados, la busqueda es un
+    searchsorted sobre el propio indice temporal en vez de un merge por
+    hash: mismo resultado, sin construir tablas intermedias.
+    """
+    ts = preparado["timestamp"].to_numpy()
+    t_objetivo = ts + np.timedelta64(horizonte, "h")
+    posicion = np.searchsorted(ts, t_objetivo)
+    dentro = posicion < len(ts)
+    existe = np.zeros(len(ts), dtype=bool)
+    existe[dentro] = ts[posicion[dentro]] == t_objetivo[dentro]
+
+    emparejado = preparado.loc[existe].copy()
+    emparejado["objetivo"] = preparado["adverso"].to_numpy()[posicion[existe]]
 
     columnas = FEATURES_BASE + FEATURES_DERIVADAS + ["objetivo", "timestamp"]
     resultado = emparejado[columnas].dropna(subset=FEATURES_BASE + ["objetivo"])
     return resultado.reset_index(drop=True)
 
 
+def construir(df: pd.DataFrame, horizonte: int) -> pd.DataFrame:
+    """Empareja cada observacion con la de horizonte horas despues."""
+    return emparejar(preparar(df), horizonte)
+
+
+def preparado_en_cache(icao: str, entrada: Path | None = None) -> pd.DataFrame | None:
+    """
+    Historico preparado de una estacion, via la cache de features.
+
+    La clave incluye el contenido del historico, el codigo de features y
+    este mismo script (preparar() ordena, quita duplicados y define
+    'adverso'): si no cambio nada de eso, no se vuelve a leer ni a
+    calcular nada. Con entrada se usa ese CSV en lugar del almacen.
+    """
+    if entrada is not None:
+        origen = entrada if entrada.exists() else None
+
+        def cargar():
+            return pd.read_csv(entrada, parse_dates=["timestamp"], low_memory=False)
+    else:
+        csv = _entrada_por_defecto(icao)
+        origen = almacen.origen_metar(icao, csv=csv)
+
+        def cargar():
+            return almacen.cargar_metar(icao, csv=csv)
+
+    if origen is None:
+        return None
+    return cache_features.obtener(
+        "preparado",
+        lambda: preparar(cargar()),
+        fuentes=[origen],
+        codigo=[*cache_features.CODIGO_FEATURES, Path(__file__)],
+        params={"icao": icao.upper()},
+    )
+
+
 def _entrada_por_defecto(icao: str) -> Path:
     """
     Localiza el historico mas COMPLETO de un aeropuerto.
@@ -105,15 +166,112 @@ def _entrada_por_defecto(icao: str) -> Path:
     return max(candidatos, key=lambda p: p.stat().st_size)
 
 
+def estaciones_disponibles() -> list[str]:
+    """Estaciones con historico METAR, en CSV o en el almacen Parquet."""
+    icaos = {ruta.name.split("_")[1] for ruta in METAR_DIR.glob("metar_*_*.csv")}
+    icaos |= {ruta.name.split("=", 1)[1].lower() for ruta in almacen.METAR_PARQUET.glob("icao=*")}
+    return sorted(icaos)
+
+
+def _guardar(datos: pd.DataFrame, icao: str, horizonte: int, csv: bool) -> list[Path]:
+    # Se guarda a precision completa; los tipos compactos se aplican al
+    # cargar (almacen.cargar_forecast).
+    SALIDA_DIR.mkdir(parents=True, exist_ok=True)
+    rutas = []
+    if almacen.PARQUET_DISPONIBLE:
+        rutas.append(almacen.escribir(datos, almacen.forecast_parquet(horizonte), icao))
+    if csv or not almacen.PARQUET_DISPONIBLE:
+        ruta = almacen.forecast_csv(icao, horizonte)
+        datos.to_csv(ruta, index=False, encoding="utf-8")
+        rutas.append(ruta)
+    return rutas
+
+
+def procesar_estacion(icao: str, horizontes: list[int], csv: bool = False) -> list[dict]:
+    """
+    Construye y guarda los datasets de todos los horizontes de una
+    estacion. El historico se lee y se prepara una sola vez.
+
+    Es la unidad de trabajo del pool de procesos: devuelve solo un
+    resumen, no los DataFrames, para no serializarlos de vuelta.
+    """
+    preparado = preparado_en_cache(icao)
+    if preparado is None:
+        return [{"icao": icao.upper(), "horizonte": h, "pares": 0, "adversos": float("nan")}
+                for h in horizontes]
+    resumen = []
+    for horizonte in horizontes:
+        datos = emparejar(preparado, horizonte)
+        _guardar(datos, icao, horizonte, csv)
+        resumen.append({
+            "icao": icao.upper(),
+            "horizonte": horizonte,
+            "pares": len(datos),
+            "adversos": float(datos.objetivo.mean()) if len(datos) else float("nan"),
+        })
+    return resumen
+
+
+def _matriz(icaos: list[str], horizontes: list[int], *, csv: bool, procesos: int) -> int:
+    """Modo --all-airports / --horizontes: todas las combinaciones de una pasada."""
+    print("=" * 72)
+    print(f"DATASETS DE PRONOSTICO - {len(icaos)} estaciones x horizontes "
+          f"{', '.join(f'+{h}h' for h in horizontes)}")
+    print("=" * 72 + "\n")
+
+    procesos = max(1, min(procesos, len(icaos)))
+    if procesos == 1:
+        resultados = [procesar_estacion(icao, horizontes, csv) for icao in icaos]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            resultados = list(pool.map(procesar_estacion, icaos,
+                                       [horizontes] * len(icaos), [csv] * len(icaos)))
+
+    print(f"  {'estacion':10s} {'horizonte':>9s} {'pares':>10s} {'adversos':>9s}")
+    faltan = []
+    for filas in resultados:
+        for fila in filas:
+            if not fila["pares"]:
+                faltan.append(fila["icao"])
+                continue
+            print(f"  {fila['icao']:10s} {'+' + str(fila['horizonte']) + 'h':>9s} "
+                  f"{fila['pares']:>10,d} {fila['adversos']:>9.2%}")
+    if faltan:
+        print(f"\n  Sin historico o sin pares: {', '.join(sorted(set(faltan)))}")
+    print(f"\n  Escrito en {SALIDA_DIR.relative_to(BACKEND_DIR)}/\n")
+    return 1 if faltan else 0
+
+
+def _lista_horizontes(texto: str) -> list[int]:
+    return [int(h) for h in texto.split(",") if h.strip()]
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Dataset de pronostico")
     parser.add_argument("--icao", default="SKBO", help="Aeropuerto")
     parser.add_argument("--horizonte", type=int, default=3, help="Horas de anticipacion")
+    parser.add_argument("--horizontes", type=_lista_horizontes, default=None,
+                        help="Varios horizontes de una pasada, p. ej. 1,2,3,6")
+    parser.add_argument("--all-airports", action="store_true",
+                        help="Todas las estaciones con historico METAR")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="Estaciones en paralelo (modo --all-airports)")
     parser.add_argument("--corte", type=int, default=2023,
                         help="Primer anio del conjunto de test (temporal)")
-    parser.add_argument("--entrada", type=Path, default=None)
+    parser.add_argument("--entrada", type=Path, default=None,
+                        help="CSV de METAR (por defecto, el almacen Parquet o el CSV mas completo)")
+    parser.add_argument("--csv", action="store_true",
+                        help="Exporta tambien el dataset en CSV")
     args = parser.parse_args()
 
+    if args.all_airports or args.horizontes:
+        icaos = estaciones_disponibles() if args.all_airports else [args.icao.lower()]
+        if not icaos:
+            print("ERROR: no hay historicos METAR. Ejecutar collect_metar_history o dvc pull.")
+            return 1
+        return _matriz(icaos, args.horizontes or [args.horizonte],
+                       csv=args.csv, procesos=args.procesos)
+
     icao = args.icao.lower()
     entrada = args.entrada or _entrada_por_defecto(icao)
 
@@ -121,14 +279,14 @@ def main() -> int:
     print(f"DATASET DE PRONOSTICO {args.icao.upper()} - niebla/tormenta a +{args.horizonte}h")
     print("=" * 72)
 
-    if not entrada.exists():
+    preparado = preparado_en_cache(icao, args.entrada)
+    if preparado is None:
         print(f"\nERROR: falta {entrada}. Ejecutar collect_metar_history o dvc pull.")
         return 1
 
-    df = pd.read_csv(entrada, parse_dates=["timestamp"], low_memory=False)
-    print(f"\n  Historico: {len(df):,} observaciones")
+    print(f"\n  Historico: {len(preparado):,} observaciones (sin duplicados)")
 
-    datos = construir(df, args.horizonte)
+    datos = emparejar(preparado, args.horizonte)
     print(f"  Pares (t, t+{args.horizonte}h) validos: {len(datos):,}")
     print(f"  Tasa de la clase adversa: {datos.objetivo.mean():.2%}")
 
@@ -142,10 +300,8 @@ def main() -> int:
     print(f"    test : {len(test):>8,d}  ({test.timestamp.dt.year.min()}-{test.timestamp.dt.year.max()})  "
           f"adversos {test.objetivo.mean():.2%}")
 
-    SALIDA_DIR.mkdir(parents=True, exist_ok=True)
-    ruta = SALIDA_DIR / f"forecast_{icao}_h{args.horizonte}.csv"
-    datos.to_csv(ruta, index=False, encoding="utf-8")
-    print(f"\n  Escrito en {ruta.relative_to(BACKEND_DIR)}")
+    for ruta in _guardar(datos, icao, args.horizonte, args.csv):
+        print(f"\n  Escrito en {ruta.relative_to(BACKEND_DIR)}")
     print(f"\n  Siguiente: python -m ml.scripts.train_forecast --icao {args.icao.upper()} "
           f"--horizonte {args.horizonte}\n")
     return 0
@@ -26,27 +26,28 @@ Compara dos metodos:
 Uso:
     cd backend
     python -m ml.scripts.calibrate_forecast --icao SKBO --horizonte 3
+    python -m ml.scripts.calibrate_forecast --icao SKBO --horizonte 3 --motor hgb
+    python -m ml.scripts.calibrate_forecast --icao SKBO --horizonte 3 --compacto
 """
 import argparse
 import sys
 from pathlib import Path
 
-import joblib
-import numpy as np
 import pandas as pd
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.frozen import FrozenEstimator
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import brier_score_loss, f1_score, precision_recall_curve
+from sklearn.metrics import brier_score_loss, f1_score
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, entrenamiento  # noqa: E402
+from ml.utils.contingencia import umbral_optimo_f1  # noqa: E402
+from services.forecast_engine import guardar_calibrado  # noqa: E402
+
 BACKEND_DIR = Path(__file__).resolve().parents[2]
-FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
 MODEL_DIR = BACKEND_DIR / "models" / "forecast"
 
-NO_FEATURES = {"objetivo", "timestamp"}
-
 # Tramos temporales. El de calibracion va entre el de entrenamiento y el
 # de test, sin solaparse con ninguno.
 FIN_TRAIN = 2021   # train: aNios < 2021
@@ -54,17 +55,16 @@ FIN_CALIB = 2023   # calib: 2021-2022 ; test: >= 2023
 
 
 def cargar(icao: str, horizonte: int):
-    ruta = FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
-    if not ruta.exists():
-        print(f"ERROR: falta {ruta}.")
+    features = list(FORECAST_FEATURES)
+    columnas = [*features, "objetivo"]
+    train = almacen.cargar_forecast(icao, horizonte, columnas=columnas, antes_de=FIN_TRAIN)
+    if train is None:
+        print(f"ERROR: falta {almacen.forecast_csv(icao, horizonte)}.")
         sys.exit(1)
-    df = pd.read_csv(ruta, parse_dates=["timestamp"], low_memory=False)
-    features = [c for c in df.columns if c not in NO_FEATURES]
-    anio = df.timestamp.dt.year
     return (
-        df[anio < FIN_TRAIN],
-        df[(anio >= FIN_TRAIN) & (anio < FIN_CALIB)],
-        df[anio >= FIN_CALIB],
+        train,
+        almacen.cargar_forecast(icao, horizonte, columnas=columnas, desde=FIN_TRAIN, antes_de=FIN_CALIB),
+        almacen.cargar_forecast(icao, horizonte, columnas=columnas, desde=FIN_CALIB),
         features,
     )
 
@@ -77,12 +77,6 @@ def ece(y, p, n_bins=10) -> float:
     return float((g.n * (g.real - g.pred).abs()).sum() / len(df))
 
 
-def umbral_optimo_f1(y, p) -> float:
-    pr, rc, th = precision_recall_curve(y, p)
-    f1 = np.divide(2 * pr * rc, pr + rc, out=np.zeros_like(pr), where=(pr + rc) > 0)
-    return float(th[max(np.argmax(f1[:-1]), 0)])
-
-
 def curva_fiabilidad(y, p, n_bins=10) -> pd.DataFrame:
     df = pd.DataFrame({"y": y, "p": p})
     df["bin"] = pd.qcut(df.p, n_bins, duplicates="drop")
@@ -111,8 +105,13 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Calibracion del pronostico")
     parser.add_argument("--icao", default="SKBO")
     parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--motor", choices=entrenamiento.MOTORES, default="rf")
+    parser.add_argument("--compacto", action="store_true",
+                        help="guarda el bosque base en formato compacto (.npy), comprobado sobre test")
     parser.add_argument("--no-mlflow", action="store_true")
     args = parser.parse_args()
+    if args.compacto and args.motor != "rf":
+        parser.error("--compacto solo aplica al bosque (--motor rf)")
 
     print("=" * 72)
     print(f"CALIBRACION DE PROBABILIDADES  {args.icao.upper()}  (+{args.horizonte}h)")
@@ -128,10 +127,7 @@ def main() -> int:
     Xte, yte = test[features].values, test.objetivo.values
 
     # Modelo base: mismos hiperparametros que en produccion.
-    base = RandomForestClassifier(
-        n_estimators=300, max_depth=15, min_samples_leaf=20,
-        class_weight="balanced", n_jobs=-1, random_state=42,
-    )
+    base = entrenamiento.crear_modelo(args.motor)
     base.fit(Xtr, ytr)
 
     # FrozenEstimator: el modelo ya esta entrenado y no se reajusta;
@@ -188,12 +184,20 @@ def main() -> int:
           f"  ocurrencia, que es lo que un despachador necesita para decidir.")
 
     # --- Guardar el modelo calibrado ---
+    # Se guarda el modelo base sin envoltorio y, aparte, el mapa de
+    # calibracion en un .npz que ForecastService aplica con NumPy.
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
     modelo_final = cal_sig if mejor is r_sig else cal_iso
-    ruta = MODEL_DIR / f"forecast_{args.icao.lower()}_h{args.horizonte}_calibrado.pkl"
-    joblib.dump(modelo_final, ruta)
+    compacto = args.compacto
+    try:
+        ruta = guardar_calibrado(modelo_final, MODEL_DIR, args.icao, args.horizonte, args.motor,
+                                 control=Xte if compacto else None)
+    except ValueError as e:
+        print(f"\n  {e}: el base se guarda sin compactar.")
+        compacto = False
+        ruta = guardar_calibrado(modelo_final, MODEL_DIR, args.icao, args.horizonte, args.motor)
     print(f"\n  Modelo calibrado ({mejor['nombre']}) guardado en "
-          f"{ruta.relative_to(BACKEND_DIR)}")
+          f"{ruta.relative_to(BACKEND_DIR)} (+ {ruta.stem}_base{'.npy' if compacto else '.pkl'})")
 
     if not args.no_mlflow:
         try:
@@ -202,9 +206,11 @@ def main() -> int:
 
             mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
             mlflow.set_experiment("aerosafe-pronostico")
-            with mlflow.start_run(run_name=f"calibracion_{args.icao.lower()}_h{args.horizonte}"):
+            with mlflow.start_run(run_name=f"calibracion_{args.icao.lower()}_h{args.horizonte}"
+                                  + ("" if args.motor == "rf" else f"_{args.motor}")):
                 mlflow.log_param("icao", args.icao)
                 mlflow.log_param("metodo", mejor["nombre"])
+                mlflow.log_param("motor", args.motor)
                 for etq, r in [("base", r_base), ("sigmoid", r_sig), ("isotonic", r_iso)]:
                     mlflow.log_metric(f"{etq}_brier", r["brier"])
                     mlflow.log_metric(f"{etq}_ece", r["ece"])
@@ -4,46 +4,87 @@ Descarga el archivo historico de METAR desde el IEM (Iowa State).
 Fuente: mesonet.agron.iastate.edu — archivo ASOS/AWOS mundial. Publica,
 sin API key y sin cuota, pero con throttling: pedir varios anos seguidos
 sin pausa devuelve respuestas vacias en silencio, que es peor que un
-error. Por eso se descarga ano a ano, con pausa y verificacion.
+error. Por eso se descarga ano a ano, con verificacion, y el ritmo de
+peticiones lo regula un cubo de tokens compartido por todas las
+estaciones (ver CuboTokens).
+
+La descarga es reanudable. Cada respuesta cruda se guarda en
+data/metar/raw/<icao>/<ano>.csv y se anota en un manifiesto por
+(estacion, ano); si la ejecucion se corta, la siguiente solo pide lo que
+falta. Antes un fallo en el ano 18 de 21 obligaba a empezar de cero.
+
+Con --incremental no se reconstruye nada: se lee la ultima observacion
+guardada en el CSV de la estacion, se piden al IEM solo las posteriores
+y se anaden al final del fichero. Es el modo del refresco nocturno.
+
+La traduccion va en streaming: los crudos se leen por trozos, cada trozo
+pasa por a_schema y se anade al final del CSV, y el resumen se acumula
+sobre la marcha. La memoria no crece con los anos ni con las estaciones;
+el pico de RSS se informa al terminar.
 
 Salida: un CSV por estacion con las columnas del schema del modelo, mas
-el METAR crudo para poder reparsear sin volver a descargar.
+el METAR crudo para poder reparsear sin volver a descargar. Si pyarrow
+esta disponible se escribe ademas en el almacen Parquet particionado
+(data/metar/parquet, ver ml/utils/almacen.py), que es lo que leen los
+scripts siguientes.
 
 Uso:
     cd backend
     python -m ml.scripts.collect_metar_history --icao SKBO --desde 2005
     python -m ml.scripts.collect_metar_history --icao SKBO --desde 2023 --hasta 2024
+    python -m ml.scripts.collect_metar_history --icao SKBO SKRG SKPS --hilos 3
+    python -m ml.scripts.collect_metar_history --icao SKBO SKRG --incremental
 """
 import argparse
+import csv
 import io
-import math
+import json
 import sys
+from collections import Counter
+from collections.abc import Iterator
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import urlparse
 
+import numpy as np
 import pandas as pd
 import requests
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
-from features.airports import cabecera_activa, obtener as obtener_aeropuerto  # noqa: E402
-from features.defaults import (  # noqa: E402
-    altitud_densidad,
-    riesgo_hielo,
-    viento_cruzado,
-    viento_frente,
-)
+from features.airports import obtener as obtener_aeropuerto  # noqa: E402
+from ml.utils import almacen  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
 
 BACKEND_DIR = Path(__file__).resolve().parents[2]
 SALIDA_DIR = BACKEND_DIR / "data" / "metar"
+# Respuestas crudas del IEM, una por (estacion, ano), y su manifiesto.
+RAW_DIR = SALIDA_DIR / "raw"
 
 IEM_URL = "https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py"
 
 # Pausa entre peticiones. El IEM no publica un limite exacto; con menos
-# de 5 s se empiezan a recibir respuestas vacias.
+# de 5 s se empiezan a recibir respuestas vacias. Es el ritmo inicial del
+# cubo de tokens; PAUSA_MIN_S es el techo al que puede acelerar y
+# PAUSA_MAX_S el suelo al que frena si el IEM sigue devolviendo vacios.
 PAUSA_S = 6.0
+PAUSA_MIN_S = 5.0
+PAUSA_MAX_S = 60.0
 REINTENTOS = 3
+# Ejecuciones que tienen que ver vacio un ano pasado para darlo por
+# cerrado. Una sola no basta: el vacio suele ser throttling.
+CONFIRMAR_VACIO = 2
+HILOS = 3
+# Filas de crudo por trozo al traducir. Un ano de una estacion horaria
+# son ~9.000 filas, asi que normalmente un trozo es un ano.
+TROZO_FILAS = 50_000
 
 NUDOS_A_KMH = 1.852
 MILLAS_A_METROS = 1609.34
@@ -70,13 +111,135 @@ FENOMENOS = [
 ]
 
 
-def descargar_ano(icao: str, ano: int) -> pd.DataFrame | None:
-    """Descarga un ano de observaciones. None si no hay datos."""
+class CuboTokens:
+    """
+    Cubo de tokens por host, compartido entre hilos.
+
+    Todas las estaciones que se descargan a la vez salen al mismo
+    servidor, y el throttling del IEM es por cliente, no por estacion:
+    tres hilos con su propia pausa de 6 s son una peticion cada 2 s. Por
+    eso el ritmo lo marca un unico cubo para el host.
+
+    Es adaptativo (AIMD): cada respuesta vacia, que es la senal de
+    throttling del IEM, reduce la tasa a la mitad; cada respuesta con
+    datos la sube un poco, sin pasar nunca de tasa_max.
+    """
+
+    def __init__(self, tasa: float, *, tasa_min: float, tasa_max: float, capacidad: float = 1.0):
+        self.tasa = tasa
+        self.tasa_min = tasa_min
+        self.tasa_max = tasa_max
+        self.capacidad = capacidad
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _rellenar(self) -> None:
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def tomar(self) -> None:
+        """Bloquea hasta que haya un token disponible y lo consume."""
+        while True:
+            with self._lock:
+                self._rellenar()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
+
+    def penalizar(self) -> None:
+        """Respuesta vacia: el servidor pide frenar."""
+        with self._lock:
+            self._rellenar()
+            self.tasa = max(self.tasa_min, self.tasa / 2)
+
+    def premiar(self) -> None:
+        """Respuesta con datos: se recupera ritmo poco a poco."""
+        with self._lock:
+            self._rellenar()
+            self.tasa = min(self.tasa_max, self.tasa + 0.1 * self.tasa_max)
+
+
+# Un cubo por host: si algun dia se descarga de dos servidores, cada uno
+# lleva su propio ritmo.
+_cubos: dict[str, CuboTokens] = {}
+_cubos_lock = threading.Lock()
+
+
+def cubo_para(url: str) -> CuboTokens:
+    host = urlparse(url).netloc
+    with _cubos_lock:
+        if host not in _cubos:
+            _cubos[host] = CuboTokens(
+                1 / PAUSA_S, tasa_min=1 / PAUSA_MAX_S, tasa_max=1 / PAUSA_MIN_S,
+            )
+        return _cubos[host]
+
+
+class Manifiesto:
+    """
+    Registro de lo ya descargado, por (estacion, ano).
+
+    Solo se da por completo lo que termino bien: un ano con datos ('ok')
+    o uno que llego vacio tras todos los reintentos en CONFIRMAR_VACIO
+    ejecuciones distintas ('vacio'). El primer vacio se anota sin cerrar,
+    porque casi siempre es throttling y no ausencia de datos; la
+    siguiente ejecucion lo vuelve a pedir. Un error de red no se anota.
+    El ano en curso tampoco se da por cerrado: sigue recibiendo METAR.
+    """
+
+    def __init__(self, ruta: Path):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._datos: dict = {}
+        if ruta.exists():
+            self._datos = json.loads(ruta.read_text(encoding="utf-8"))
+
+    def completo(self, icao: str, ano: int) -> bool:
+        entrada = self._datos.get(icao, {}).get(str(ano))
+        return bool(entrada) and entrada.get("completo", False)
+
+    def entrada(self, icao: str, ano: int) -> dict | None:
+        return self._datos.get(icao, {}).get(str(ano))
+
+    def anotar(self, icao: str, ano: int, **datos) -> None:
+        with self._lock:
+            self._datos.setdefault(icao, {})[str(ano)] = datos
+            # Escritura atomica: un corte a mitad no deja un JSON roto que
+            # impida reanudar.
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = self.ruta.with_suffix(".tmp")
+            temporal.write_text(json.dumps(self._datos, indent=1, sort_keys=True), encoding="utf-8")
+            temporal.replace(self.ruta)
+
+
+def _pedir(
+    icao: str,
+    inicio: datetime,
+    fin: datetime,
+    *,
+    url: str,
+    cubo: CuboTokens,
+    vacio_valido: bool = False,
+) -> str | None:
+    """
+    Pide un intervalo al IEM respetando el cubo. Devuelve el CSV crudo,
+    "" si llego vacio tras los reintentos, o None si hubo error de red.
+
+    Con vacio_valido (intervalos que acaban ahora, donde lo normal es que
+    no haya nada nuevo) una respuesta vacia se acepta a la primera, sin
+    reintentar ni frenar el cubo.
+    """
     params = {
         "station": icao,
         "data": "all",
-        "year1": ano, "month1": 1, "day1": 1,
-        "year2": ano + 1, "month2": 1, "day2": 1,
+        "year1": inicio.year, "month1": inicio.month, "day1": inicio.day,
+        "hour1": inicio.hour, "minute1": inicio.minute,
+        "year2": fin.year, "month2": fin.month, "day2": fin.day,
+        "hour2": fin.hour, "minute2": fin.minute,
         "tz": "Etc/UTC",
         "format": "onlycomma",
         "latlon": "no",
@@ -85,59 +248,191 @@ def descargar_ano(icao: str, ano: int) -> pd.DataFrame | None:
     }
 
     for intento in range(1, REINTENTOS + 1):
+        cubo.tomar()
         try:
-            respuesta = requests.get(IEM_URL, params=params, timeout=180)
+            respuesta = requests.get(url, params=params, timeout=180)
             respuesta.raise_for_status()
             texto = respuesta.text
-
-            if texto.count("\n") <= 1:
-                # Respuesta vacia: casi siempre es throttling, no ausencia
-                # real de datos. Se reintenta con pausa mas larga antes de
-                # concluir que el ano no existe.
-                if intento < REINTENTOS:
-                    espera = PAUSA_S * (intento + 1)
-                    print(f"vacio, reintento en {espera:.0f}s ...", end=" ", flush=True)
-                    time.sleep(espera)
-                    continue
-                return None
-
-            return pd.read_csv(io.StringIO(texto), na_values=["M"], low_memory=False)
-
         except requests.RequestException as e:
             if intento == REINTENTOS:
-                print(f"ERROR: {e}")
+                print(f"  {icao} {inicio:%Y-%m-%d %H:%M}: ERROR {e}", flush=True)
                 return None
-            time.sleep(PAUSA_S * (intento + 1))
+            continue
+
+        if texto.count("\n") <= 1:
+            if vacio_valido:
+                return ""
+            # Respuesta vacia: casi siempre es throttling, no ausencia
+            # real de datos. Se frena el cubo y se reintenta antes de
+            # concluir que el ano no existe.
+            cubo.penalizar()
+            continue
+
+        cubo.premiar()
+        return texto
 
-    return None
+    return ""
 
 
-def _techo_nubes(fila) -> float:
-    """Altura de la capa mas baja con cobertura significativa, en pies."""
+def _pedir_ano(icao: str, ano: int, *, url: str, cubo: CuboTokens) -> str | None:
+    return _pedir(icao, datetime(ano, 1, 1), datetime(ano + 1, 1, 1), url=url, cubo=cubo)
+
+
+def descargar_ano(
+    icao: str,
+    ano: int,
+    *,
+    url: str = IEM_URL,
+    cubo: CuboTokens | None = None,
+) -> pd.DataFrame | None:
+    """Descarga un ano de observaciones. None si no hay datos."""
+    texto = _pedir_ano(icao, ano, url=url, cubo=cubo or cubo_para(url))
+    if not texto:
+        return None
+    return pd.read_csv(io.StringIO(texto), na_values=["M"], low_memory=False)
+
+
+def ruta_cruda(raw_dir: Path, icao: str, ano: int) -> Path:
+    return raw_dir / icao.lower() / f"{ano}.csv"
+
+
+def descargar_estaciones(
+    icaos: list[str],
+    desde: int,
+    hasta: int,
+    *,
+    raw_dir: Path = RAW_DIR,
+    url: str = IEM_URL,
+    cubo: CuboTokens | None = None,
+    hilos: int = HILOS,
+    forzar: bool = False,
+) -> Manifiesto:
+    """
+    Descarga (estacion, ano) en paralelo, guardando cada respuesta cruda.
+
+    Lo ya anotado como completo en el manifiesto se salta: una ejecucion
+    interrumpida se reanuda donde quedo. Las peticiones comparten un
+    cubo de tokens por host, de modo que mas hilos no significan mas
+    presion sobre el IEM, sino no esperar en serie.
+    """
+    cubo = cubo or cubo_para(url)
+    manifiesto = Manifiesto(raw_dir / "manifiesto.json")
+    ano_en_curso = datetime.now().year
+
+    pendientes = [
+        (icao, ano)
+        for icao in icaos
+        for ano in range(desde, hasta + 1)
+        if forzar or not manifiesto.completo(icao, ano)
+    ]
+    saltados = len(icaos) * (hasta - desde + 1) - len(pendientes)
+    if saltados:
+        print(f"  Reanudando: {saltados} (estacion, ano) ya descargados, {len(pendientes)} pendientes")
+
+    def tarea(icao: str, ano: int) -> None:
+        texto = _pedir_ano(icao, ano, url=url, cubo=cubo)
+        if texto is None:
+            return  # error de red: sin anotar, se reintenta al reanudar
+        completo = ano < ano_en_curso
+        if not texto:
+            previa = manifiesto.entrada(icao, ano) or {}
+            vacios = previa.get("vacios", 0) + 1 if previa.get("estado") == "vacio" else 1
+            confirmado = vacios >= CONFIRMAR_VACIO
+            manifiesto.anotar(icao, ano, estado="vacio", filas=0, vacios=vacios,
+                              completo=completo and confirmado)
+            print(f"  {icao} {ano}: sin datos"
+                  + ("" if confirmado else " (se volvera a pedir para confirmar)"), flush=True)
+            return
+        destino = ruta_cruda(raw_dir, icao, ano)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        destino.write_text(texto, encoding="utf-8")
+        filas = texto.count("\n") - 1
+        manifiesto.anotar(icao, ano, estado="ok", filas=filas, completo=completo)
+        print(f"  {icao} {ano}: {filas:,} observaciones", flush=True)
+
+    with ThreadPoolExecutor(max_workers=max(1, hilos)) as pool:
+        futuros = [pool.submit(tarea, icao, ano) for icao, ano in pendientes]
+        for futuro in as_completed(futuros):
+            futuro.result()
+
+    return manifiesto
+
+
+def leer_crudos(icao: str, desde: int, hasta: int, *, raw_dir: Path = RAW_DIR) -> list[pd.DataFrame]:
+    """Lee de disco los anos descargados de una estacion, en orden."""
+    trozos = []
+    for ano in range(desde, hasta + 1):
+        ruta = ruta_cruda(raw_dir, icao, ano)
+        if ruta.exists():
+            trozos.append(pd.read_csv(ruta, na_values=["M"], low_memory=False))
+    return trozos
+
+
+def iter_crudos(
+    icao: str,
+    desde: int,
+    hasta: int,
+    *,
+    raw_dir: Path = RAW_DIR,
+    filas: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Como leer_crudos, pero entrega trozos de a lo sumo `filas` filas sin acumularlos."""
+    filas = filas or TROZO_FILAS
+    for ano in range(desde, hasta + 1):
+        ruta = ruta_cruda(raw_dir, icao, ano)
+        if ruta.exists():
+            with pd.read_csv(ruta, na_values=["M"], low_memory=False, chunksize=filas) as lector:
+                yield from lector
+
+
+def _techo_nubes(bruto: pd.DataFrame) -> pd.Series:
+    """
+    Altura de la capa mas baja con cobertura significativa, en pies.
+
+    Minimo enmascarado sobre las cuatro capas skyc/skyl a la vez: las
+    capas sin cobertura significativa o sin altura cuentan como +inf.
+    """
     alturas = []
     for i in (1, 2, 3, 4):
-        cobertura = fila.get(f"skyc{i}")
-        altura = fila.get(f"skyl{i}")
-        if (
-            isinstance(cobertura, str)
-            and cobertura.strip() in COBERTURA_SIGNIFICATIVA
-            and pd.notna(altura)
-        ):
-            alturas.append(float(altura))
-    if alturas:
-        return min(alturas)
+        if f"skyc{i}" not in bruto or f"skyl{i}" not in bruto:
+            continue
+        significativa = bruto[f"skyc{i}"].astype("string").str.strip().isin(COBERTURA_SIGNIFICATIVA)
+        altura = pd.to_numeric(bruto[f"skyl{i}"], errors="coerce").to_numpy(dtype=float)
+        alturas.append(np.where(significativa.to_numpy(dtype=bool) & ~np.isnan(altura), altura, np.inf))
+    if not alturas:
+        return pd.Series(20000.0, index=bruto.index)
+    techo = np.min(alturas, axis=0)
     # Sin capa significativa: cielo practicamente despejado.
-    return 20000.0
+    return pd.Series(np.where(np.isinf(techo), 20000.0, techo), index=bruto.index)
+
+
+def _descripcion(codigos: pd.Series) -> pd.Series:
+    """Categoria del fenomeno mas severo, respetando el orden de FENOMENOS."""
+    texto = codigos.astype("string").str.upper()
+    condiciones = [
+        texto.str.contains(codigo, regex=False).fillna(False).to_numpy(dtype=bool)
+        for codigo, _ in FENOMENOS
+    ]
+    # np.select se queda con la primera condicion cierta: la mas severa.
+    categorias = np.select(condiciones, [c for _, c in FENOMENOS], default="despejado")
+    return pd.Series(categorias, index=codigos.index, dtype=object)
 
 
-def _descripcion(codigos) -> str:
-    if not isinstance(codigos, str):
-        return "despejado"
-    texto = codigos.upper()
-    for codigo, categoria in FENOMENOS:
-        if codigo in texto:
-            return categoria
-    return "despejado"
+def _angulo_relativo(direccion: np.ndarray, rumbo: np.ndarray) -> np.ndarray:
+    """Version por columnas de features.defaults._angulo_relativo."""
+    diff = np.abs(direccion - rumbo)
+    return np.where(diff > 180, 360 - diff, diff)
+
+
+def _cabecera_activa(direccion: pd.Series, aeropuerto) -> np.ndarray:
+    """
+    Version por columnas de features.airports.cabecera_activa. En empate
+    gana rumbo_le, como en min(); sin direccion de viento, rumbo_le.
+    """
+    d = direccion.to_numpy(dtype=float)
+    dif_le = np.abs(((d - aeropuerto.rumbo_le + 180) % 360) - 180)
+    dif_he = np.abs(((d - aeropuerto.rumbo_he + 180) % 360) - 180)
+    return np.where(dif_he < dif_le, aeropuerto.rumbo_he, aeropuerto.rumbo_le)
 
 
 def a_schema(bruto: pd.DataFrame, icao: str) -> pd.DataFrame:
@@ -146,6 +441,11 @@ def a_schema(bruto: pd.DataFrame, icao: str) -> pd.DataFrame:
 
     El IEM reporta en unidades imperiales (F, nudos, millas, pulgadas de
     mercurio); el modelo trabaja en C, km/h, metros y hPa.
+
+    Todo se calcula por columnas, sin apply por fila: 21 anos de una
+    estacion se traducen en lo que antes costaba uno. Las formulas son
+    las de features/defaults.py y features/airports.py, reescritas con
+    NumPy; tests/test_collect_metar.py comprueba que dan lo mismo.
     """
     aeropuerto = obtener_aeropuerto(icao)
     d = pd.DataFrame(index=bruto.index)
@@ -163,14 +463,11 @@ def a_schema(bruto: pd.DataFrame, icao: str) -> pd.DataFrame:
     d["presion"] = bruto["alti"] * 33.8639
     d["precipitacion"] = bruto["p01i"] * 25.4  # pulgadas -> mm
 
-    d["techo_nubes"] = bruto.apply(_techo_nubes, axis=1)
-    d["descripcion"] = bruto["wxcodes"].apply(_descripcion)
+    d["techo_nubes"] = _techo_nubes(bruto)
+    d["descripcion"] = _descripcion(bruto["wxcodes"])
 
     d["altitud_aeropuerto"] = aeropuerto.altitud
-    d["runway_heading"] = d["direccion_viento"].apply(
-        lambda direccion: cabecera_activa(direccion, aeropuerto)
-        if pd.notna(direccion) else aeropuerto.rumbo_le
-    )
+    d["runway_heading"] = _cabecera_activa(d["direccion_viento"], aeropuerto)
 
     d["hora"] = d["timestamp"].dt.hour
     d["mes"] = d["timestamp"].dt.month
@@ -181,28 +478,22 @@ def a_schema(bruto: pd.DataFrame, icao: str) -> pd.DataFrame:
     # calcular derivadas, para no propagar NaN.
     d = d.dropna(subset=["temperatura", "viento", "visibilidad", "presion"])
 
-    d["viento_cruzado"] = d.apply(
-        lambda r: viento_cruzado(r["viento"], r["direccion_viento"], r["runway_heading"])
-        if pd.notna(r["direccion_viento"]) else 0.0,
-        axis=1,
-    )
-    d["viento_frente"] = d.apply(
-        lambda r: viento_frente(r["viento"], r["direccion_viento"], r["runway_heading"])
-        if pd.notna(r["direccion_viento"]) else r["viento"],
-        axis=1,
-    )
-    d["altitud_densidad"] = d.apply(
-        lambda r: altitud_densidad(r["temperatura"], r["presion"], r["altitud_aeropuerto"]),
-        axis=1,
-    )
-    d["riesgo_hielo"] = d.apply(
-        lambda r: riesgo_hielo(
-            r["temperatura"],
-            r["punto_rocio"] if pd.notna(r["punto_rocio"]) else r["temperatura"] - 3,
-            r["precipitacion"] if pd.notna(r["precipitacion"]) else 0.0,
-        ),
-        axis=1,
-    )
+    viento = d["viento"].to_numpy(dtype=float)
+    direccion = d["direccion_viento"].to_numpy(dtype=float)
+    angulo = np.radians(_angulo_relativo(direccion, d["runway_heading"].to_numpy(dtype=float)))
+    sin_direccion = np.isnan(direccion)
+    d["viento_cruzado"] = np.where(sin_direccion, 0.0, np.abs(viento * np.sin(angulo)))
+    d["viento_frente"] = np.where(sin_direccion, viento, viento * np.cos(angulo))
+
+    temperatura_isa = 15 - (aeropuerto.altitud / 1000 * 2)
+    d["altitud_densidad"] = d["altitud_aeropuerto"] + (120 * (d["temperatura"] - temperatura_isa))
+
+    rocio = d["punto_rocio"].fillna(d["temperatura"] - 3)
+    precipitacion = d["precipitacion"].fillna(0.0)
+    d["riesgo_hielo"] = (
+        (d["temperatura"] >= 0) & (d["temperatura"] <= 10)
+        & ((d["temperatura"] - rocio) < 3) & (precipitacion > 0)
+    ).astype(int)
 
     codigos = bruto.loc[d.index, "wxcodes"].fillna("").astype(str).str.upper()
     d["tormenta_electrica"] = codigos.str.contains("TS").astype(int)
@@ -216,78 +507,288 @@ def a_schema(bruto: pd.DataFrame, icao: str) -> pd.DataFrame:
     return d
 
 
+def ultimo_timestamp(ruta: Path) -> pd.Timestamp | None:
+    """
+    Ultima observacion guardada en un CSV del schema, sin leerlo entero.
+
+    Se lee la cabecera y solo el final del fichero: el historico de una
+    estacion pesa cientos de MB y esto se hace cada noche. El CSV esta en
+    orden cronologico, asi que la ultima linea es la mas reciente.
+    """
+    with ruta.open("rb") as f:
+        cabecera = next(csv.reader([f.readline().decode("utf-8")]))
+        inicio_datos = f.tell()
+        f.seek(0, io.SEEK_END)
+        tamano = f.tell()
+
+        bloque = 64 * 1024
+        while True:
+            desde = max(inicio_datos, tamano - bloque)
+            f.seek(desde)
+            lineas = f.read(tamano - desde).decode("utf-8", errors="replace").splitlines()
+            # La primera linea del bloque puede estar cortada por la mitad;
+            # solo vale si el bloque empieza justo tras la cabecera.
+            completas = [l for l in (lineas if desde == inicio_datos else lineas[1:]) if l.strip()]
+            if completas or desde == inicio_datos:
+                break
+            bloque *= 4
+
+    if not completas:
+        return None
+    fila = next(csv.reader([completas[-1]]))
+    return pd.Timestamp(fila[cabecera.index("timestamp")])
+
+
+def historico_existente(icao: str) -> Path | None:
+    """El CSV mas completo de la estacion (mismo criterio que build_forecast_dataset)."""
+    candidatos = list(SALIDA_DIR.glob(f"metar_{icao.lower()}_*.csv"))
+    if not candidatos:
+        return None
+    return max(candidatos, key=lambda p: p.stat().st_size)
+
+
+def anexar_incremental(
+    icao: str,
+    salida: Path,
+    *,
+    url: str = IEM_URL,
+    cubo: CuboTokens | None = None,
+) -> int | None:
+    """
+    Anade al CSV de una estacion las observaciones posteriores a la ultima
+    guardada. Devuelve cuantas filas se anadieron, o None si fallo la red.
+
+    Solo se traducen con a_schema las filas nuevas, y se escriben en modo
+    append con el mismo orden de columnas que la cabecera existente; el
+    resto del fichero no se toca. La peticion empieza en el instante de la
+    ultima observacion (inclusive) y se descarta todo lo que no sea
+    estrictamente posterior, asi que repetir el refresco no duplica nada.
+    """
+    ultimo = ultimo_timestamp(salida)
+    if ultimo is None:
+        raise ValueError(f"{salida} no tiene observaciones; hace falta una descarga completa")
+
+    # Hasta manana: el IEM interpreta el final como exclusivo.
+    fin = datetime.now() + timedelta(days=1)
+    # Una estacion al dia no tiene nada nuevo y el IEM responde vacio: no
+    # es throttling. Si lo fuera, no se pierde nada; el siguiente refresco
+    # vuelve a pedir desde la misma ultima observacion.
+    texto = _pedir(icao, ultimo.to_pydatetime(), fin, url=url, cubo=cubo or cubo_para(url),
+                   vacio_valido=True)
+    if texto is None:
+        return None
+    if not texto:
+        return 0
+
+    bruto = pd.read_csv(io.StringIO(texto), na_values=["M"], low_memory=False)
+    nuevos = a_schema(bruto, icao)
+    nuevos = (
+        nuevos[nuevos["timestamp"] > ultimo]
+        .sort_values("timestamp", kind="stable")
+        .drop_duplicates(subset="timestamp", keep="first")
+    )
+    if nuevos.empty:
+        return 0
+
+    with salida.open("r", encoding="utf-8", newline="") as f:
+        columnas = next(csv.reader(f))
+    with salida.open("rb") as f:
+        f.seek(-1, io.SEEK_END)
+        termina_en_salto = f.read(1) == b"\n"
+    with salida.open("a", encoding="utf-8", newline="") as f:
+        if not termina_en_salto:
+            f.write("\n")
+        nuevos.reindex(columns=columnas).to_csv(f, header=False, index=False, lineterminator="\n")
+    if almacen.existe(almacen.METAR_PARQUET, icao):
+        almacen.escribir(nuevos, almacen.METAR_PARQUET, icao, anexar=True)
+    return len(nuevos)
+
+
+def _refrescar(icaos: list[str], salida: Path | None) -> int:
+    """Modo --incremental: anade a cada historico lo que falta."""
+    codigo = 0
+    for icao in icaos:
+        ruta = salida or historico_existente(icao)
+        if ruta is None or not ruta.exists():
+            print(f"  {icao}: no hay historico previo; lanzar primero sin --incremental")
+            codigo = 1
+            continue
+        try:
+            anadidas = anexar_incremental(icao, ruta)
+        except ValueError as e:
+            print(f"  {icao}: {e}")
+            codigo = 1
+            continue
+        if anadidas is None:
+            codigo = 1
+            continue
+        print(f"  {icao}: +{anadidas:,} observaciones -> {ruta.name} "
+              f"(ultima: {ultimo_timestamp(ruta)})")
+    return codigo
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Descarga historico METAR del IEM")
-    parser.add_argument("--icao", default="SKBO")
+    parser.add_argument("--icao", nargs="+", default=["SKBO"])
     parser.add_argument("--desde", type=int, default=2005)
     parser.add_argument("--hasta", type=int, default=datetime.now().year)
-    parser.add_argument("--salida", type=Path, default=None)
+    parser.add_argument("--salida", type=Path, default=None,
+                        help="Fichero de salida (solo con una estacion)")
+    parser.add_argument("--hilos", type=int, default=HILOS,
+                        help="Peticiones simultaneas (el ritmo lo sigue marcando el cubo)")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Ignora el manifiesto y vuelve a descargar todo")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Solo anade al CSV existente lo posterior a su ultima observacion")
     args = parser.parse_args()
 
-    icao = args.icao.upper()
-    salida = args.salida or SALIDA_DIR / f"metar_{icao.lower()}_{args.desde}_{args.hasta}.csv"
+    icaos = [i.upper() for i in args.icao]
+    if args.salida and len(icaos) > 1:
+        print("ERROR: --salida solo admite una estacion.")
+        return 1
+
+    if args.incremental:
+        print("=" * 72)
+        print(f"REFRESCO INCREMENTAL METAR - {', '.join(icaos)}")
+        print("=" * 72 + "\n")
+        codigo = _refrescar(icaos, args.salida)
+        _informar_memoria()
+        return codigo
 
     print("=" * 72)
-    print(f"HISTORICO METAR - {icao}  ({args.desde}-{args.hasta})")
+    print(f"HISTORICO METAR - {', '.join(icaos)}  ({args.desde}-{args.hasta})")
     print("=" * 72)
-    print(f"\n  Fuente: IEM ASOS  |  pausa entre anos: {PAUSA_S:.0f}s\n")
-
-    trozos = []
-    for ano in range(args.desde, args.hasta + 1):
-        print(f"  {ano} ...", end=" ", flush=True)
-        bruto = descargar_ano(icao, ano)
-
-        if bruto is None or bruto.empty:
-            print("sin datos")
-        else:
-            trozos.append(bruto)
-            print(f"{len(bruto):,} observaciones")
-
-        time.sleep(PAUSA_S)
-
-    if not trozos:
-        print("\n  No se obtuvo ningun dato.")
-        return 1
-
-    bruto = pd.concat(trozos, ignore_index=True)
-    print(f"\n  Total descargado: {len(bruto):,} observaciones")
+    print(f"\n  Fuente: IEM ASOS  |  ritmo inicial: 1 peticion cada {PAUSA_S:.0f}s  "
+          f"|  hilos: {args.hilos}\n")
+
+    descargar_estaciones(icaos, args.desde, args.hasta, hilos=args.hilos, forzar=args.forzar)
+
+    codigo = 0
+    for icao in icaos:
+        salida = args.salida or SALIDA_DIR / f"metar_{icao.lower()}_{args.desde}_{args.hasta}.csv"
+        codigo = max(codigo, _traducir_estacion(icao, args.desde, args.hasta, salida))
+    _informar_memoria()
+    return codigo
+
+
+def pico_memoria_mb() -> float | None:
+    """Pico de memoria residente del proceso, en MB. None si no se puede medir."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB; macOS, en bytes.
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _informar_memoria() -> None:
+    pico = pico_memoria_mb()
+    if pico is not None:
+        print(f"  Pico de memoria (RSS): {pico:,.0f} MB\n")
+
+
+def _relativa(ruta: Path) -> Path:
+    """Ruta relativa a backend/ para los mensajes, si cuelga de ahi."""
+    try:
+        return ruta.resolve().relative_to(BACKEND_DIR)
+    except ValueError:
+        return ruta
+
+
+class Resumen:
+    """Estadisticas del resumen final, acumuladas trozo a trozo."""
+
+    EVENTOS = [
+        ("visibilidad < 550 m (CAT I)", lambda d: d.visibilidad < 550),
+        ("visibilidad < 1500 m", lambda d: d.visibilidad < 1500),
+        ("visibilidad < 5000 m (VFR)", lambda d: d.visibilidad < 5000),
+        ("viento > 25 kt", lambda d: d.viento > 25 * NUDOS_A_KMH),
+        ("tormenta electrica", lambda d: d.tormenta_electrica == 1),
+    ]
+
+    def __init__(self):
+        self.brutas = 0
+        self.filas = 0
+        self.inicio = None
+        self.fin = None
+        self.condiciones: Counter = Counter()
+        self.eventos: Counter = Counter()
+
+    def anadir(self, bruto: pd.DataFrame, datos: pd.DataFrame) -> None:
+        self.brutas += len(bruto)
+        self.filas += len(datos)
+        if datos.empty:
+            return
+        inicio, fin = datos.timestamp.min(), datos.timestamp.max()
+        self.inicio = inicio if self.inicio is None else min(self.inicio, inicio)
+        self.fin = fin if self.fin is None else max(self.fin, fin)
+        self.condiciones.update(datos.descripcion.value_counts().to_dict())
+        for etiqueta, mascara in self.EVENTOS:
+            self.eventos[etiqueta] += int(mascara(datos).sum())
+
+
+def _traducir_estacion(icao: str, desde: int, hasta: int, salida: Path, *, raw_dir: Path = RAW_DIR) -> int:
+    """
+    Traduce los crudos de una estacion al schema y escribe su CSV.
 
-    print("  Traduciendo al schema del modelo ...", end=" ", flush=True)
-    datos = a_schema(bruto, icao)
-    print(f"{len(datos):,} utilizables ({len(bruto) - len(datos):,} descartadas por datos faltantes)")
+    En streaming: cada trozo de crudo se traduce y se anade a un fichero
+    temporal, que sustituye a la salida solo si todo termino bien. En
+    memoria nunca hay mas de un trozo.
+    """
+    print("\n" + "-" * 72)
+    print(f"{icao}")
+    print("-" * 72)
 
     salida.parent.mkdir(parents=True, exist_ok=True)
-    datos.to_csv(salida, index=False, encoding="utf-8")
-    print(f"\n  Escrito en {salida.relative_to(BACKEND_DIR)}")
+    temporal = salida.with_name(salida.name + ".tmp")
+    resumen = Resumen()
+    parquet = almacen.PARQUET_DISPONIBLE
+
+    print("\n  Traduciendo al schema del modelo ...", end=" ", flush=True)
+    with temporal.open("w", encoding="utf-8", newline="") as f:
+        for bruto in iter_crudos(icao, desde, hasta, raw_dir=raw_dir):
+            datos = a_schema(bruto, icao)
+            datos.to_csv(f, index=False, header=resumen.brutas == 0, lineterminator="\n")
+            if parquet and not datos.empty:
+                # El primer trozo reemplaza lo que hubiera de la estacion.
+                almacen.escribir(datos, almacen.METAR_PARQUET, icao, anexar=resumen.filas > 0)
+            resumen.anadir(bruto, datos)
+
+    if resumen.brutas == 0:
+        temporal.unlink()
+        print("\n\n  No se obtuvo ningun dato.")
+        return 1
+    temporal.replace(salida)
+
+    print(f"{resumen.filas:,} utilizables de {resumen.brutas:,} descargadas "
+          f"({resumen.brutas - resumen.filas:,} descartadas por datos faltantes)")
+    print(f"\n  Escrito en {_relativa(salida)}")
+    if parquet and resumen.filas:
+        print(f"  Escrito en {_relativa(almacen.METAR_PARQUET)}/icao={icao.upper()}/")
+    if not resumen.filas:
+        return 1
 
     # ---------- Resumen ----------
     print("\n" + "=" * 72)
     print("RESUMEN")
     print("=" * 72)
-    print(f"\n  Periodo: {datos.timestamp.min()}  ->  {datos.timestamp.max()}")
-    print(f"  Observaciones: {len(datos):,}\n")
+    print(f"\n  Periodo: {resumen.inicio}  ->  {resumen.fin}")
+    print(f"  Observaciones: {resumen.filas:,}\n")
 
     print("  Distribucion de condiciones:")
-    for categoria, cuenta in datos.descripcion.value_counts().items():
-        print(f"    {categoria:16s} {cuenta:8,d}  ({cuenta / len(datos):6.2%})")
+    for categoria, cuenta in resumen.condiciones.most_common():
+        print(f"    {categoria:16s} {cuenta:8,d}  ({cuenta / resumen.filas:6.2%})")
 
     print("\n  Eventos poco frecuentes:")
-    for etiqueta, mascara in [
-        ("visibilidad < 550 m (CAT I)", datos.visibilidad < 550),
-        ("visibilidad < 1500 m", datos.visibilidad < 1500),
-        ("visibilidad < 5000 m (VFR)", datos.visibilidad < 5000),
-        ("viento > 25 kt", datos.viento > 25 * NUDOS_A_KMH),
-        ("tormenta electrica", datos.tormenta_electrica == 1),
-    ]:
-        n = int(mascara.sum())
-        print(f"    {etiqueta:30s} {n:8,d}  ({n / len(datos):6.2%})")
+    for etiqueta, _ in Resumen.EVENTOS:
+        n = resumen.eventos[etiqueta]
+        print(f"    {etiqueta:30s} {n:8,d}  ({n / resumen.filas:6.2%})")
 
     print(
         "\n  Nota: la clase adversa es rara. Con este desbalance la accuracy\n"
         "  deja de ser informativa (predecir siempre BAJO ya acierta >95%).\n"
         "  Usar recall sobre la clase adversa y PR-AUC.\n"
     )
-    print(f"  Siguiente paso:  dvc add {salida.relative_to(BACKEND_DIR)}\n")
+    print(f"  Siguiente paso:  dvc add {_relativa(salida)}\n")
     return 0
 
 
@@ -0,0 +1,163 @@
+"""
+Convierte los bosques de pronostico ya entrenados al formato compacto.
+
+Un bosque de 300 arboles de profundidad 15 guardado con joblib lleva
+umbrales float64, indices int64 y la estructura completa de nodos de
+scikit-learn, y hay que deserializarlo entero al arrancar. El formato
+compacto (services/forecast_engine.compactar_bosque) es un unico .npy
+con umbrales float32, indices int32 y hojas float32 (o float16), que se
+abre con np.load en modo mmap.
+
+Para cada aeropuerto/horizonte se convierten el bosque sin calibrar
+(forecast_skbo_h3.pkl -> .npy) y el base del calibrado (el .npz pasa a
+apuntar al _base.npy). Cada conversion se comprueba sobre el test
+2023-2026: si alguna probabilidad cambia mas que la tolerancia, no se
+escribe nada. Se informa tamano, tiempo de carga y memoria antes y
+despues.
+
+Uso:
+    cd backend
+    python -m ml.scripts.compact_forecast --icao SKBO --horizonte 3
+    python -m ml.scripts.compact_forecast --icao SKBO --horizonte 3 --hojas float16
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen  # noqa: E402
+from services.forecast_engine import (  # noqa: E402
+    FAMILIAS,
+    TOLERANCIA_COMPACTO,
+    MotorCalibrado,
+    cargar_motor,
+    exportar_bosque,
+    nombre_artefacto,
+)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+MODEL_DIR = BACKEND_DIR / "models" / "forecast"
+
+CORTE_TEST = 2023
+
+
+def _segundos_carga(cargar, ruta: Path, repeticiones: int = 5) -> float:
+    """Mejor tiempo de carga de varias (la primera calienta la cache del SO)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cargar(ruta)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def _memoria_sklearn(bosque) -> int:
+    """Bytes de los arrays de nodos y hojas de todos los arboles."""
+    return sum(e.tree_.__getstate__()["nodes"].nbytes + e.tree_.value.nbytes for e in bosque.estimators_)
+
+
+def _memoria_compacto(motor) -> int:
+    """Bytes copiados a RAM al cargar (las hojas se quedan en el mmap)."""
+    return sum(a.nbytes for a in (motor.feature, motor.umbral, motor.nan_izq, motor.hijos, motor.raices))
+
+
+def convertir(ruta_pkl: Path, ruta_npy: Path, control: np.ndarray, hojas: str,
+              calibracion: dict | None = None) -> dict | None:
+    """
+    Exporta un bosque .pkl a .npy y mide ambos; None si no es un bosque.
+    Con el mapa de calibracion, la tolerancia se comprueba tambien sobre
+    la probabilidad calibrada (ver exportar_bosque).
+    """
+    bosque = joblib.load(ruta_pkl)
+    if type(bosque).__name__ != FAMILIAS["rf"]:
+        return None
+    exportar_bosque(bosque, ruta_npy, control, hojas=hojas, calibracion=calibracion)
+    compacto = cargar_motor(ruta_npy)
+    return {
+        "artefacto": ruta_npy.name,
+        "mb": (ruta_pkl.stat().st_size / 1e6, ruta_npy.stat().st_size / 1e6),
+        "carga_ms": (_segundos_carga(joblib.load, ruta_pkl) * 1e3,
+                     _segundos_carga(cargar_motor, ruta_npy) * 1e3),
+        "memoria_mb": (_memoria_sklearn(bosque) / 1e6, _memoria_compacto(compacto) / 1e6),
+        "error_max": compacto.metadatos()["error_max"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convierte bosques de pronostico al formato compacto")
+    parser.add_argument("--icao", default="SKBO")
+    parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--hojas", choices=tuple(TOLERANCIA_COMPACTO), default="float32",
+                        help="precision de las probabilidades de las hojas")
+    args = parser.parse_args()
+    icao = args.icao.upper()
+
+    print("=" * 72)
+    print(f"BOSQUE COMPACTO  {icao}  (+{args.horizonte}h, hojas {args.hojas}, "
+          f"tolerancia {TOLERANCIA_COMPACTO[args.hojas]:.0e})")
+    print("=" * 72)
+
+    test = almacen.cargar_forecast(icao, args.horizonte, columnas=list(FORECAST_FEATURES), desde=CORTE_TEST)
+    if test is None:
+        print(f"ERROR: no hay features de {icao} a +{args.horizonte}h.")
+        return 1
+    control = test.values
+
+    resultados = []
+
+    crudo = MODEL_DIR / nombre_artefacto(icao, args.horizonte)
+    if crudo.exists():
+        r = convertir(crudo, crudo.with_suffix(".npy"), control, args.hojas)
+        if r is not None:
+            resultados.append(r)
+
+    ruta_npz = MODEL_DIR / nombre_artefacto(icao, args.horizonte, calibrado=True, extension=".npz")
+    if ruta_npz.exists():
+        antes = cargar_motor(ruta_npz)
+        # Si ya se convirtio, se reconvierte desde el .pkl (p. ej. para
+        # cambiar la precision de las hojas).
+        base_pkl = antes.ruta_base.with_suffix(".pkl")
+        if base_pkl.exists():
+            with np.load(ruta_npz, allow_pickle=False) as npz:
+                mapa = {k: npz[k] for k in npz.files}
+            calibracion = {k: v for k, v in mapa.items() if k != "base"}
+            r = convertir(base_pkl, base_pkl.with_suffix(".npy"), control, args.hojas, calibracion)
+            if r is not None:
+                # Comprobado ya con la calibracion aplicada: el mapa pasa a
+                # apuntar al base compacto.
+                mapa["base"] = np.array(base_pkl.with_suffix(".npy").name)
+                np.savez(ruta_npz, **mapa)
+                despues = cargar_motor(ruta_npz)
+                assert isinstance(despues, MotorCalibrado)
+                r["error_calibrado"] = float(np.abs(despues.predict_proba(control)
+                                                    - antes.predict_proba(control)).max())
+                resultados.append(r)
+
+    if not resultados:
+        print(f"\n  No hay bosques .pkl de {icao} a +{args.horizonte}h que convertir.")
+        return 1
+
+    print(f"\n  {'artefacto':38s}{'MB':>13s}{'carga ms':>15s}{'RAM MB':>13s}{'error max':>11s}")
+    for r in resultados:
+        print(f"  {r['artefacto']:38s}"
+              f"{r['mb'][0]:>6.1f}>{r['mb'][1]:<6.1f}"
+              f"{r['carga_ms'][0]:>7.0f}>{r['carga_ms'][1]:<7.1f}"
+              f"{r['memoria_mb'][0]:>6.1f}>{r['memoria_mb'][1]:<6.1f}"
+              f"{r['error_max']:>11.1e}")
+        if "error_calibrado" in r:
+            print(f"    (tras la calibracion la probabilidad cambia como mucho {r['error_calibrado']:.1e})")
+
+    print("\n  ForecastService prefiere los .npy; los .pkl pueden borrarse o")
+    print("  conservarse para volver atras.")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,144 @@
+"""
+Destila el modelo de pronostico calibrado en un nivel rapido (tier=fast).
+
+Algunos clientes (alertas automaticas que consultan todos los
+aeropuertos cada pocos minutos) necesitan respuesta en menos de un
+milisegundo y aceptan perder un poco de habilidad. Para ellos se entrena
+un alumno pequeno sobre las 21 FORECAST_FEATURES que imita las
+probabilidades CALIBRADAS del modelo completo (el profesor):
+
+  - hgb: gradient boosting somero (arboles de profundidad 3),
+  - logistica: regresion logistica sobre features estandarizadas.
+
+El objetivo del alumno no es la etiqueta 0/1 sino la probabilidad del
+profesor (entropia cruzada con etiquetas blandas, ver
+entrenamiento.destilar), asi que hereda la calibracion sin calibrarse
+aparte. Se destila sobre el tramo de calibracion (2021-2022): el
+profesor no entreno con el, y en su propio tramo de entrenamiento sus
+probabilidades serian demasiado seguras.
+
+Los dos alumnos se evaluan sobre el test 2023-2026 frente al profesor
+(PR-AUC, Brier, ECE, latencia con 1 fila) y se guarda el de mejor PR-AUC
+entre los que cumplen el presupuesto de latencia. Las metricas de ambos
+niveles quedan junto al alumno (forecast_skbo_h3_rapido.json) y la API
+las devuelve en cada respuesta.
+
+Uso:
+    cd backend
+    python -m ml.scripts.distill_forecast --icao SKBO --horizonte 3
+    python -m ml.scripts.distill_forecast --icao SKBO --horizonte 3 --alumno logistica
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.metrics import average_precision_score, brier_score_loss
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ml.scripts.calibrate_forecast import FIN_CALIB, FIN_TRAIN, cargar, ece  # noqa: E402
+from ml.utils import busqueda, entrenamiento  # noqa: E402
+from services.forecast_engine import RAPIDO, MotorSklearn, cargar_motor, nombre_artefacto  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+MODEL_DIR = BACKEND_DIR / "models" / "forecast"
+
+# Latencia maxima del nivel rapido con una fila (una peticion).
+PRESUPUESTO_MS = 1.0
+
+
+def cargar_profesor(icao: str, horizonte: int, motor: str):
+    """El modelo calibrado que se sirve en el nivel completo, o None."""
+    for extension in (".npz", ".pkl"):
+        ruta = MODEL_DIR / nombre_artefacto(icao, horizonte, motor, calibrado=True, extension=extension)
+        if ruta.exists():
+            return cargar_motor(ruta)
+    return None
+
+
+def medir(modelo, X, y) -> dict:
+    p = modelo.predict_proba(X)[:, 1]
+    return {
+        "pr_auc": round(float(average_precision_score(y, p)), 4),
+        "brier": round(float(brier_score_loss(y, p)), 5),
+        "ece": round(ece(y, p), 4),
+        "ms_1_fila": round(busqueda.latencia_ms(modelo, X[:1], repeticiones=200), 4),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Destila el nivel rapido del pronostico")
+    parser.add_argument("--icao", default="SKBO")
+    parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--motor", choices=entrenamiento.MOTORES, default="rf",
+                        help="familia del profesor calibrado")
+    parser.add_argument("--alumno", choices=entrenamiento.ALUMNOS, default=None,
+                        help="fuerza el alumno; por defecto se elige el mejor dentro del presupuesto")
+    args = parser.parse_args()
+    icao = args.icao.upper()
+
+    print("=" * 72)
+    print(f"DESTILACION DEL NIVEL RAPIDO  {icao}  (+{args.horizonte}h)")
+    print("=" * 72)
+
+    profesor = cargar_profesor(icao, args.horizonte, args.motor)
+    if profesor is None:
+        print(f"\nERROR: falta el modelo calibrado de {icao} a +{args.horizonte}h "
+              f"(python -m ml.scripts.calibrate_forecast).")
+        return 1
+
+    _, calib, test, features = cargar(icao, args.horizonte)
+    Xca = calib[features].values
+    Xte, yte = test[features].values, test.objetivo.values
+    print(f"\n  destilacion  {len(calib):>8,d}  ({FIN_TRAIN}-{FIN_CALIB - 1}, probabilidades del profesor)")
+    print(f"  test         {len(test):>8,d}  (>= {FIN_CALIB})")
+
+    p_profesor = profesor.predict_proba(Xca)[:, 1]
+    p_profesor_test = profesor.predict_proba(Xte)[:, 1]
+    resultados = {"profesor": medir(profesor, Xte, yte)}
+    alumnos = {}
+    for tipo in entrenamiento.ALUMNOS:
+        alumno = entrenamiento.destilar(entrenamiento.crear_alumno(tipo), Xca, p_profesor)
+        alumnos[tipo] = alumno
+        resultados[tipo] = medir(MotorSklearn(alumno), Xte, yte)
+        # Fidelidad: cuanto se separa del profesor, en probabilidad.
+        resultados[tipo]["dif_media"] = round(
+            float(np.abs(alumno.predict_proba(Xte)[:, 1] - p_profesor_test).mean()), 4)
+
+    print(f"\n  {'modelo':12s}{'PR-AUC':>9s}{'Brier':>9s}{'ECE':>9s}{'ms 1 fila':>11s}{'|p - prof|':>12s}")
+    for nombre, r in resultados.items():
+        dif = f"{r['dif_media']:>12.4f}" if "dif_media" in r else f"{'':>12s}"
+        print(f"  {nombre:12s}{r['pr_auc']:>9.3f}{r['brier']:>9.4f}{r['ece']:>9.4f}{r['ms_1_fila']:>11.3f}{dif}")
+
+    if args.alumno:
+        elegido = args.alumno
+    else:
+        validos = [t for t in entrenamiento.ALUMNOS if resultados[t]["ms_1_fila"] <= PRESUPUESTO_MS]
+        if not validos:
+            print(f"\n  Ningun alumno cumple el presupuesto de {PRESUPUESTO_MS} ms; no se guarda nada.")
+            return 1
+        elegido = max(validos, key=lambda t: resultados[t]["pr_auc"])
+
+    ruta = MODEL_DIR / nombre_artefacto(icao, args.horizonte, RAPIDO)
+    joblib.dump(alumnos[elegido], ruta)
+    metricas = {
+        "periodo": f"test >= {FIN_CALIB}",
+        "full": {"motor": args.motor, **resultados["profesor"]},
+        "fast": {"motor": elegido, **resultados[elegido]},
+    }
+    ruta.with_suffix(".json").write_text(json.dumps(metricas, indent=2), encoding="utf-8")
+
+    perdida = resultados["profesor"]["pr_auc"] - resultados[elegido]["pr_auc"]
+    aceleracion = resultados["profesor"]["ms_1_fila"] / resultados[elegido]["ms_1_fila"]
+    print(f"\n  Nivel rapido: {elegido} (PR-AUC {-perdida:+.3f}, x{aceleracion:.0f} mas rapido con 1 fila)")
+    print(f"  Guardado en {ruta.relative_to(BACKEND_DIR)} (+ {ruta.with_suffix('.json').name})")
+    print("  Se sirve con GET /api/v1/forecast/{icao}?tier=fast")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
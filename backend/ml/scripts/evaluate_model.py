@@ -16,17 +16,34 @@ Una accuracy alta, sola, no dice nada. Este script la pone en contexto:
 3. Con validacion cruzada, para separar el rendimiento real del ruido de
    un unico split.
 
+Calculo y lectura van separados. Las features se construyen una vez y
+quedan en la cache de ml/utils/cache_features.py (dependen del CSV y de
+features/build_features.py). Todos los ajustes -los baselines, el
+RandomForest de produccion, los 5 folds de la validacion cruzada y el
+arbol de la prueba de circularidad- son independientes entre si y se
+reparten en un pool de procesos con X e y en memoria compartida. Sus
+predicciones se guardan en data/cache/evaluacion/ bajo una clave de los
+datos, los modelos y la version de scikit-learn: volver a ejecutar para
+cambiar solo el informe no reentrena nada.
+
 Uso:
     cd backend
     python -m ml.scripts.evaluate_model
     python -m ml.scripts.evaluate_model --no-mlflow
+    python -m ml.scripts.evaluate_model --recalcular --procesos 4
 """
 import argparse
+import hashlib
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import joblib
 import numpy as np
 import pandas as pd
+import sklearn
 from sklearn.dummy import DummyClassifier
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import (
@@ -35,66 +52,199 @@ from sklearn.metrics import (
     confusion_matrix,
     f1_score,
 )
-from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from sklearn.tree import DecisionTreeClassifier, export_text
 
 # Permite ejecutar el script directamente, no solo con -m
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 from features.build_features import build_features  # noqa: E402
+from ml.utils import cache_features, entrenamiento, transferencia  # noqa: E402
 
 BACKEND_DIR = Path(__file__).resolve().parents[2]
 DATA_PATH = BACKEND_DIR / "data" / "dataset" / "weather_risk_aviation.csv"
+EVALUACION_DIR = BACKEND_DIR / "data" / "cache" / "evaluacion"
 CLASES = ["BAJO", "MODERADO", "ALTO"]
 RANDOM_STATE = 42
+N_PLIEGUES = 5
+
+BASELINES = ("clase_mayoritaria", "aleatorio_estratificado", "uniforme")
+
+
+def crear_modelo(nombre: str):
+    """Modelo sin ajustar de cada tarea. Un nucleo: el paralelismo lo pone el pool."""
+    if nombre == "clase_mayoritaria":
+        return DummyClassifier(strategy="most_frequent")
+    if nombre == "aleatorio_estratificado":
+        return DummyClassifier(strategy="stratified", random_state=RANDOM_STATE)
+    if nombre == "uniforme":
+        return DummyClassifier(strategy="uniform", random_state=RANDOM_STATE)
+    if nombre == "rf_produccion":
+        return RandomForestClassifier(
+            n_estimators=200,
+            max_depth=20,
+            min_samples_split=10,
+            min_samples_leaf=5,
+            class_weight="balanced",
+            random_state=RANDOM_STATE,
+            n_jobs=1,
+        )
+    if nombre == "arbol_d3":
+        return DecisionTreeClassifier(max_depth=3, random_state=RANDOM_STATE)
+    raise ValueError(f"Modelo desconocido: {nombre!r}")
 
 
 def titulo(texto: str) -> None:
     print(f"\n{'=' * 72}\n{texto}\n{'=' * 72}")
 
 
-def evaluar_baselines(X_train, X_test, y_train, y_test) -> dict:
+# ---------------------------------------------------------------------
+# Calculo
+# ---------------------------------------------------------------------
+
+def cargar_features(ruta: Path) -> tuple[pd.DataFrame, pd.Series]:
+    """Features del dataset (build_features con fit=True), via cache."""
+    def construir():
+        df = pd.read_csv(ruta)
+        X, _ = build_features(df.drop("riesgo", axis=1), fit=True)
+        return X.assign(riesgo=df["riesgo"].values)
+
+    df = cache_features.obtener(
+        "evaluacion_features",
+        construir,
+        fuentes=[ruta],
+        codigo=[BACKEND_DIR / "features" / "build_features.py"],
+    )
+    return df.drop(columns="riesgo"), df["riesgo"]
+
+
+def tareas(y: np.ndarray) -> dict[str, tuple[str, np.ndarray, np.ndarray]]:
+    """Cada ajuste independiente: {tarea: (modelo, filas train, filas test)}."""
+    filas = np.arange(len(y))
+    train, test = train_test_split(filas, test_size=0.2, random_state=RANDOM_STATE, stratify=y)
+    resultado = {nombre: (nombre, train, test) for nombre in BASELINES}
+    resultado["rf_produccion"] = ("rf_produccion", train, test)
+    resultado["arbol_d3"] = ("arbol_d3", train, test)
+    cv = StratifiedKFold(n_splits=N_PLIEGUES, shuffle=True, random_state=RANDOM_STATE)
+    for i, (tr, te) in enumerate(cv.split(filas, y)):
+        resultado[f"cv_{i}"] = ("rf_produccion", tr, te)
+    return resultado
+
+
+def ajustar(tarea: str, nombre: str, train, test, X: transferencia.Descriptor,
+            y: transferencia.Descriptor, columnas: list[str], clases: list[str]) -> tuple[str, dict]:
+    """Ajusta un modelo sobre las filas train y predice las test (tarea del pool)."""
+    X, y = transferencia.mapear(X), transferencia.mapear(y)
+    modelo = crear_modelo(nombre).fit(X[train], y[train])
+    resultado = {"pred": modelo.predict(X[test]).astype(np.int8)}
+    if tarea == "rf_produccion":
+        resultado["importancias"] = modelo.feature_importances_
+    elif tarea == "arbol_d3":
+        resultado["reglas"] = export_text(modelo, feature_names=columnas, class_names=clases, max_depth=3)
+    return tarea, resultado
+
+
+def clave(X: pd.DataFrame, codigos: np.ndarray, clases: list[str], plan: dict) -> str:
+    """Clave de los resultados: datos, modelos, particiones y version de sklearn."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(entrenamiento.huella_datos(X.to_numpy(np.float64), codigos).encode())
+    h.update(json.dumps({
+        "clases": clases,
+        "columnas": list(X.columns),
+        "modelos": {t: crear_modelo(m).get_params() for t, (m, _, _) in plan.items()},
+        "pliegues": N_PLIEGUES,
+        "random_state": RANDOM_STATE,
+        "sklearn": sklearn.__version__,
+    }, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def calcular(
+    X: pd.DataFrame,
+    y: pd.Series,
+    *,
+    procesos: int | None = None,
+    raiz: Path | None = None,
+    recalcular: bool = False,
+) -> dict:
+    """
+    Ajusta todos los modelos de la evaluacion, o recupera sus resultados.
+
+    Returns:
+        {"clases": nombres, "y": codigos, "tareas": {tarea: {"test":
+        filas, "pred": codigos predichos, ...}}, "desde_cache": bool}
+    """
+    # Codigos en el orden en que sklearn ordena las etiquetas de texto
+    # (alfabetico): con otro orden cambian los sorteos de los baselines y
+    # los desempates de los arboles, y el resultado dejaria de ser el de
+    # ajustar con las etiquetas tal cual.
+    clases, codigos = np.unique(np.asarray(y, dtype=str), return_inverse=True)
+    clases, codigos = clases.tolist(), codigos.astype(np.int8)
+    plan = tareas(codigos)
+    ruta = (raiz or EVALUACION_DIR) / f"{clave(X, codigos, clases, plan)}.joblib"
+    if ruta.exists() and not recalcular:
+        return {**joblib.load(ruta), "desde_cache": True}
+
+    bloques = []
+    try:
+        bx, dx = transferencia.publicar(X.to_numpy(np.float64))
+        by, dy = transferencia.publicar(codigos)
+        bloques += [bx, by]
+        with ProcessPoolExecutor(max_workers=procesos or os.cpu_count() or 1) as pool:
+            futuros = [
+                pool.submit(ajustar, tarea, nombre, train, test, dx, dy, list(X.columns), clases)
+                for tarea, (nombre, train, test) in plan.items()
+            ]
+            hechas = dict(f.result() for f in futuros)
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+
+    resultados = {
+        "clases": clases,
+        "y": codigos,
+        "tareas": {t: {"test": plan[t][2], **hechas[t]} for t in plan},
+    }
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(resultados, ruta)
+    return {**resultados, "desde_cache": False}
+
+
+# ---------------------------------------------------------------------
+# Informe
+# ---------------------------------------------------------------------
+
+def _real_y_predicho(resultados: dict, tarea: str) -> tuple[np.ndarray, np.ndarray]:
+    """Etiquetas reales y predichas (nombres de clase) del test de una tarea."""
+    r = resultados["tareas"][tarea]
+    nombres = np.array(resultados["clases"])
+    return nombres[resultados["y"][r["test"]]], nombres[r["pred"]]
+
+
+def evaluar_baselines(resultados: dict) -> dict:
     """
     Baselines triviales. Son el suelo: cualquier modelo tiene que
     superarlos con claridad para justificar su existencia.
     """
     titulo("1. BASELINES TRIVIALES")
 
-    resultados = {}
-    baselines = {
-        "clase_mayoritaria": DummyClassifier(strategy="most_frequent"),
-        "aleatorio_estratificado": DummyClassifier(
-            strategy="stratified", random_state=RANDOM_STATE
-        ),
-        "uniforme": DummyClassifier(strategy="uniform", random_state=RANDOM_STATE),
-    }
-
-    for nombre, modelo in baselines.items():
-        modelo.fit(X_train, y_train)
-        pred = modelo.predict(X_test)
+    metricas = {}
+    for nombre in BASELINES:
+        y_test, pred = _real_y_predicho(resultados, nombre)
         acc = accuracy_score(y_test, pred)
         f1 = f1_score(y_test, pred, average="weighted", zero_division=0)
-        resultados[nombre] = {"accuracy": acc, "f1_weighted": f1}
+        metricas[nombre] = {"accuracy": acc, "f1_weighted": f1}
         print(f"  {nombre:26s} accuracy={acc:.4f}  f1={f1:.4f}")
 
-    return resultados
+    return metricas
 
 
-def evaluar_modelo(X_train, X_test, y_train, y_test, X, y) -> dict:
-    """Entrena el RandomForest de produccion y lo evalua."""
+def evaluar_modelo(resultados: dict, columnas: list[str]) -> dict:
+    """El RandomForest de produccion en el split y en validacion cruzada."""
     titulo("2. MODELO DE PRODUCCION (RandomForest)")
 
-    modelo = RandomForestClassifier(
-        n_estimators=200,
-        max_depth=20,
-        min_samples_split=10,
-        min_samples_leaf=5,
-        class_weight="balanced",
-        random_state=RANDOM_STATE,
-    )
-    modelo.fit(X_train, y_train)
-    pred = modelo.predict(X_test)
-
+    y_test, pred = _real_y_predicho(resultados, "rf_produccion")
     acc = accuracy_score(y_test, pred)
     f1 = f1_score(y_test, pred, average="weighted", zero_division=0)
 
@@ -122,15 +272,15 @@ def evaluar_modelo(X_train, X_test, y_train, y_test, X, y) -> dict:
         f"({tasa:.2%})  <- el error critico"
     )
 
-    print("\n  Validacion cruzada (5 folds estratificados):")
-    cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=RANDOM_STATE)
-    scores = cross_val_score(modelo, X, y, cv=cv, scoring="accuracy")
+    print(f"\n  Validacion cruzada ({N_PLIEGUES} folds estratificados):")
+    scores = np.array([accuracy_score(*_real_y_predicho(resultados, f"cv_{i}")) for i in range(N_PLIEGUES)])
     print(f"    accuracy = {scores.mean():.4f} +/- {scores.std():.4f}")
     print(f"    por fold = {[f'{s:.4f}' for s in scores]}")
 
     print("\n  Top 10 features por importancia:")
     importancias = (
-        pd.DataFrame({"feature": X.columns, "importancia": modelo.feature_importances_})
+        pd.DataFrame({"feature": columnas,
+                      "importancia": resultados["tareas"]["rf_produccion"]["importancias"]})
         .sort_values("importancia", ascending=False)
         .head(10)
     )
@@ -138,7 +288,6 @@ def evaluar_modelo(X_train, X_test, y_train, y_test, X, y) -> dict:
         print(f"    {fila['feature']:24s} {fila['importancia']:.4f}")
 
     return {
-        "modelo": modelo,
         "accuracy": acc,
         "f1_weighted": f1,
         "cv_mean": scores.mean(),
@@ -150,7 +299,7 @@ def evaluar_modelo(X_train, X_test, y_train, y_test, X, y) -> dict:
     }
 
 
-def medir_circularidad(X_train, X_test, y_train, y_test) -> dict:
+def medir_circularidad(resultados: dict) -> dict:
     """
     Cuanta de la senal es simplemente las reglas del generador.
 
@@ -167,15 +316,12 @@ def medir_circularidad(X_train, X_test, y_train, y_test) -> dict:
         "  Se comprueba cuanto de la accuracy se explica solo con eso.\n"
     )
 
-    arbol = DecisionTreeClassifier(max_depth=3, random_state=RANDOM_STATE)
-    arbol.fit(X_train, y_train)
-    acc_arbol = accuracy_score(y_test, arbol.predict(X_test))
+    acc_arbol = accuracy_score(*_real_y_predicho(resultados, "arbol_d3"))
 
     print(f"  Arbol de decision (profundidad 3): accuracy = {acc_arbol:.4f}")
 
     print("\n  Reglas que aprendio:")
-    reglas = export_text(arbol, feature_names=list(X_train.columns), max_depth=3)
-    for linea in reglas.split("\n")[:20]:
+    for linea in resultados["tareas"]["arbol_d3"]["reglas"].split("\n")[:20]:
         print(f"    {linea}")
 
     return {"accuracy_arbol_d3": acc_arbol}
@@ -185,6 +331,10 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Evaluacion honesta del modelo")
     parser.add_argument("--no-mlflow", action="store_true", help="No registrar en MLflow")
     parser.add_argument("--data", type=Path, default=DATA_PATH)
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="procesos para los ajustes; por defecto, los nucleos disponibles")
+    parser.add_argument("--recalcular", action="store_true",
+                        help="reentrena aunque haya resultados guardados")
     args = parser.parse_args()
 
     if not args.data.exists():
@@ -193,24 +343,21 @@ def main() -> int:
 
     titulo("EVALUACION DEL MODELO AEROSAFE")
 
-    df = pd.read_csv(args.data)
-    print(f"  Dataset: {args.data.name}  ({len(df)} muestras)")
-
-    y = df["riesgo"]
-    X, _ = build_features(df.drop("riesgo", axis=1), fit=True)
+    X, y = cargar_features(args.data)
+    print(f"  Dataset: {args.data.name}  ({len(X)} muestras)")
     print(f"  Features: {X.shape[1]}")
     print("\n  Distribucion de clases:")
     for clase in CLASES:
         n = int((y == clase).sum())
         print(f"    {clase:10s} {n:5d}  ({n / len(y):.1%})")
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=RANDOM_STATE, stratify=y
-    )
+    resultados = calcular(X, y, procesos=args.procesos, recalcular=args.recalcular)
+    if resultados["desde_cache"]:
+        print("\n  Resultados de una ejecucion anterior (--recalcular para reentrenar).")
 
-    baselines = evaluar_baselines(X_train, X_test, y_train, y_test)
-    resultado = evaluar_modelo(X_train, X_test, y_train, y_test, X, y)
-    circularidad = medir_circularidad(X_train, X_test, y_train, y_test)
+    baselines = evaluar_baselines(resultados)
+    resultado = evaluar_modelo(resultados, list(X.columns))
+    circularidad = medir_circularidad(resultados)
 
     # ---------- Interpretacion ----------
     titulo("4. INTERPRETACION")
@@ -258,7 +405,7 @@ def main() -> int:
             mlflow.set_experiment("aerosafe-evaluacion")
 
             with mlflow.start_run(run_name="evaluacion_honesta"):
-                mlflow.log_param("n_muestras", len(df))
+                mlflow.log_param("n_muestras", len(X))
                 mlflow.log_param("n_features", X.shape[1])
                 mlflow.log_param("dataset", args.data.name)
                 mlflow.log_param("dataset_tipo", "sintetico")
@@ -32,7 +32,6 @@ from pathlib import Path
 
 import joblib
 import numpy as np
-import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import (
     average_precision_score,
@@ -45,23 +44,25 @@ from sklearn.metrics import (
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, entrenamiento  # noqa: E402
+
 BACKEND_DIR = Path(__file__).resolve().parents[2]
-FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
 MODEL_DIR = BACKEND_DIR / "models" / "forecast"
 
 CORTE_TEST = 2023
-NO_FEATURES = {"objetivo", "timestamp"}
 
 
 def cargar(icao: str, horizonte: int):
-    ruta = FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
-    if not ruta.exists():
-        print(f"ERROR: falta {ruta}. Ejecutar build_forecast_dataset --icao {icao}.")
+    # Mismas columnas en origen y destino: las del modelo.
+    features = list(FORECAST_FEATURES)
+    columnas = [*features, "objetivo"]
+    train = almacen.cargar_forecast(icao, horizonte, columnas=columnas, antes_de=CORTE_TEST)
+    if train is None:
+        print(f"ERROR: falta {almacen.forecast_csv(icao, horizonte)}. "
+              f"Ejecutar build_forecast_dataset --icao {icao}.")
         sys.exit(1)
-    df = pd.read_csv(ruta, parse_dates=["timestamp"], low_memory=False)
-    features = [c for c in df.columns if c not in NO_FEATURES]
-    train = df[df.timestamp.dt.year < CORTE_TEST]
-    test = df[df.timestamp.dt.year >= CORTE_TEST]
+    test = almacen.cargar_forecast(icao, horizonte, columnas=columnas, desde=CORTE_TEST)
     return train, test, features
 
 
@@ -88,13 +89,8 @@ def imprimir(r: dict) -> None:
           f"F1={r['f1']:.3f}  PR-AUC={r['pr_auc']:.3f}")
 
 
-def entrenar(X, y) -> RandomForestClassifier:
-    modelo = RandomForestClassifier(
-        n_estimators=300, max_depth=15, min_samples_leaf=20,
-        class_weight="balanced", n_jobs=-1, random_state=42,
-    )
-    modelo.fit(X, y)
-    return modelo
+def entrenar(X, y, split: str) -> RandomForestClassifier:
+    return entrenamiento.entrenar_rf(X, y, split=split)
 
 
 def main() -> int:
@@ -110,11 +106,7 @@ def main() -> int:
     print("=" * 72)
 
     origen_train, origen_test, features = cargar(args.origen, args.horizonte)
-    destino_train, destino_test, features_d = cargar(args.destino, args.horizonte)
-
-    if features != features_d:
-        print("ERROR: los datasets tienen features distintas.")
-        return 1
+    destino_train, destino_test, _ = cargar(args.destino, args.horizonte)
 
     print(f"\n  {args.origen}: train {len(origen_train):,}  test {len(origen_test):,}")
     print(f"  {args.destino}: train {len(destino_train):,}  test {len(destino_test):,}  "
@@ -131,7 +123,7 @@ def main() -> int:
         print(f"\n  Modelo origen: {ruta_origen.name}")
     else:
         print(f"\n  Entrenando modelo origen con {args.origen} ...")
-        modelo_origen = entrenar(Xo, yo)
+        modelo_origen = entrenar(Xo, yo, f"{args.origen.upper()} h{args.horizonte} anio<{CORTE_TEST}")
 
     # El umbral del modelo origen se fija con SUS datos, no con los del
     # destino: en despliegue real no se tiene el test del destino.
@@ -139,7 +131,7 @@ def main() -> int:
 
     # --- Modelo local del destino (techo de referencia) ---
     print(f"  Entrenando modelo local con {args.destino} ...")
-    modelo_local = entrenar(Xd_tr, yd_tr)
+    modelo_local = entrenar(Xd_tr, yd_tr, f"{args.destino.upper()} h{args.horizonte} anio<{CORTE_TEST}")
     umbral_local = umbral_optimo_f1(yd_tr, modelo_local.predict_proba(Xd_tr)[:, 1])
 
     # ============================================================
@@ -3,11 +3,30 @@ GENERADOR DE DATASET AEROSAFE - VERSIÓN UNIFICADA
 Genera dataset con 3 clases de riesgo: BAJO, MODERADO, ALTO
 30+ variables aeronáuticas realistas
 
+Hay dos implementaciones del mismo generador:
+
+  - generate_realistic_aviation_weather() + calculate_risk_aviation():
+    una muestra por llamada, con random. Es la referencia, y la que usa
+    collect_skbo_balanced.py para completar clases.
+  - generar() + calcular_riesgo(): vectorizada con NumPy. Los sorteos por
+    descripcion salen de la tabla PARAMETROS (un bloque de filas por
+    descripcion) y el etiquetado son mascaras sobre columnas enteras.
+    Mismas distribuciones y mismas etiquetas fila a fila; genera
+    millones de filas en segundos.
+
+El script usa la vectorizada y escribe por lotes (CSV o Parquet segun la
+extension), asi que el tamano no esta limitado por la memoria.
+
+Uso:
+    cd backend
+    python ml/scripts/generate_dataset_UNIFIED.py
+    python ml/scripts/generate_dataset_UNIFIED.py --n 5000000 --salida data/dataset/estres.parquet
 """
-import os
+import argparse
+import math
 import random
 import sys
-from datetime import datetime
+import time
 from pathlib import Path
 
 import numpy as np
@@ -18,7 +37,14 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 # Se reutilizan el catalogo y la seleccion de cabecera de la aplicacion.
 # Duplicar esta logica aqui es exactamente como se genero el desajuste
 # entre entrenamiento e inferencia que hubo que corregir.
-from features.airports import cabecera_activa, catalogo  # noqa: E402
+from features.airports import cabecera_activa, catalogo, diferencia_angular  # noqa: E402
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIBLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    PARQUET_DISPONIBLE = False
 
 # Seed para reproducibilidad
 np.random.seed(42)
@@ -42,6 +68,12 @@ TURBULENCE_LEVELS = ["ninguna", "leve", "moderada", "severa"]
 # 🔧 UNIFICADO: 3 clases de riesgo
 RISK_CLASSES = ["BAJO", "MODERADO", "ALTO"]
 
+# Distribución objetivo: 45% BAJO, 35% MODERADO, 20% ALTO
+TARGET_DISTRIBUTION = {"BAJO": 0.45, "MODERADO": 0.35, "ALTO": 0.20}
+
+# Filas por lote al escribir.
+LOTE = 1_000_000
+
 
 def calculate_crosswind(wind_speed, wind_dir, runway_heading):
     """Calcula componente de viento cruzado"""
@@ -409,82 +441,359 @@ def generate_realistic_aviation_weather():
     }
 
 
-# ================================================================= 
-# GENERACIÓN DEL DATASET
+# =================================================================
+# VERSIÓN VECTORIZADA
 # =================================================================
 
-print("=" * 70)
-print("🚀 GENERADOR DE DATASET AEROSAFE - VERSIÓN UNIFICADA")
-print("=" * 70)
-print(f"📊 Generando {N_SAMPLES} muestras...")
-print(f"🎯 Clases de riesgo: {', '.join(RISK_CLASSES)}")
+# Sorteos de cada descripción, los mismos que en
+# generate_realistic_aviation_weather(): (min, max) para uniform/randint,
+# listas para choice (un valor repetido pesa doble, como en
+# random.choice) y probabilidad para los eventos. No cambiar una sin la
+# otra.
+PARAMETROS = {
+    "despejado": {
+        "temperatura": (15, 35), "humedad": (25, 55), "viento": (0, 20),
+        "visibilidad": (8000, 10000), "precipitacion": (0, 0), "techo_nubes": (5000, 15000),
+        "tipo_nubes": ["despejado"], "turbulencia": ["ninguna", "leve"], "estado_pista": ["seca"],
+        "tormenta_electrica": 0.0, "cizalladura_viento": 0.0, "presion": (1010, 1030),
+    },
+    "nublado": {
+        "temperatura": (12, 28), "humedad": (50, 75), "viento": (5, 25),
+        "visibilidad": (6000, 9000), "precipitacion": (0, 2), "techo_nubes": (1500, 4000),
+        "tipo_nubes": ["dispersas", "nublado"], "turbulencia": ["ninguna", "leve", "leve"],
+        "estado_pista": ["seca", "humeda"],
+        "tormenta_electrica": 0.0, "cizalladura_viento": 0.0, "presion": (1000, 1020),
+    },
+    "lluvia_ligera": {
+        "temperatura": (8, 22), "humedad": (70, 90), "viento": (10, 30),
+        "visibilidad": (3000, 7000), "precipitacion": (2, 8), "techo_nubes": (800, 2500),
+        "tipo_nubes": ["nublado", "cubierto"], "turbulencia": ["leve", "leve", "moderada"],
+        "estado_pista": ["humeda", "mojada"],
+        "tormenta_electrica": 0.1, "cizalladura_viento": 0.05, "presion": (1000, 1020),
+    },
+    "lluvia_fuerte": {
+        "temperatura": (5, 20), "humedad": (85, 100), "viento": (20, 45),
+        "visibilidad": (1000, 4000), "precipitacion": (10, 25), "techo_nubes": (300, 1500),
+        "tipo_nubes": ["cubierto"], "turbulencia": ["moderada", "moderada", "severa"],
+        "estado_pista": ["mojada", "contaminada"],
+        "tormenta_electrica": 0.3, "cizalladura_viento": 0.15, "presion": (980, 1005),
+    },
+    "tormenta": {
+        "temperatura": (5, 18), "humedad": (88, 100), "viento": (30, 55),
+        "visibilidad": (800, 3000), "precipitacion": (15, 35), "techo_nubes": (200, 1000),
+        "tipo_nubes": ["cubierto"], "turbulencia": ["severa", "severa", "moderada"],
+        "estado_pista": ["mojada", "contaminada"],
+        "tormenta_electrica": 1.0, "cizalladura_viento": 0.4, "presion": (980, 1005),
+    },
+    "niebla": {
+        "temperatura": (5, 18), "humedad": (92, 100), "viento": (0, 12),
+        "visibilidad": (500, 2500), "precipitacion": (0, 2), "techo_nubes": (100, 800),
+        "tipo_nubes": ["cubierto"], "turbulencia": ["ninguna"], "estado_pista": ["humeda", "mojada"],
+        "tormenta_electrica": 0.0, "cizalladura_viento": 0.0, "presion": (1000, 1020),
+    },
+    "nieve": {
+        "temperatura": (-8, 5), "humedad": (75, 95), "viento": (10, 35),
+        "visibilidad": (1000, 4000), "precipitacion": (5, 20), "techo_nubes": (400, 2000),
+        "tipo_nubes": ["cubierto"], "turbulencia": ["leve", "moderada"],
+        "estado_pista": ["nevada", "contaminada"],
+        "tormenta_electrica": 0.0, "cizalladura_viento": 0.1, "presion": (1000, 1020),
+    },
+    "granizo": {
+        "temperatura": (10, 25), "humedad": (70, 90), "viento": (25, 50),
+        "visibilidad": (1500, 5000), "precipitacion": (10, 30), "techo_nubes": (500, 2000),
+        "tipo_nubes": ["cubierto"], "turbulencia": ["severa"], "estado_pista": ["mojada", "contaminada"],
+        "tormenta_electrica": 1.0, "cizalladura_viento": 0.3, "presion": (1000, 1020),
+    },
+}
 
-data = []
-risk_counts = {risk: 0 for risk in RISK_CLASSES}
+# Como se sortea cada variable de PARAMETROS.
+_UNIFORMES = ("temperatura", "viento", "precipitacion")           # round(uniform, 1)
+_ENTEROS = ("humedad", "visibilidad", "techo_nubes", "presion")   # randint (inclusive)
+_CATEGORIAS = {"tipo_nubes": CLOUD_TYPES, "turbulencia": TURBULENCE_LEVELS, "estado_pista": RUNWAY_CONDITIONS}
+_EVENTOS = ("tormenta_electrica", "cizalladura_viento")
+
+# Orden de columnas del CSV, el de generate_realistic_aviation_weather().
+COLUMNAS = [
+    "temperatura", "humedad", "viento", "visibilidad", "descripcion", "precipitacion",
+    "direccion_viento", "runway_heading", "viento_cruzado", "viento_frente", "rafagas",
+    "techo_nubes", "tipo_nubes", "turbulencia", "estado_pista", "presion",
+    "altitud_aeropuerto", "altitud_densidad", "punto_rocio", "riesgo_hielo",
+    "tormenta_electrica", "cizalladura_viento", "hora", "es_noche", "mes", "dia_año",
+]
+
+
+def generar(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """n muestras sin etiquetar, como n llamadas a generate_realistic_aviation_weather()."""
+    desc = rng.integers(0, len(DESCRIPTIONS), n)
+    col = {v: np.zeros(n) for v in _UNIFORMES}
+    col.update({v: np.zeros(n, dtype=np.int64) for v in _ENTEROS})
+    col.update({v: np.zeros(n, dtype=np.int8) for v in _CATEGORIAS})
+    col.update({v: np.zeros(n, dtype=bool) for v in _EVENTOS})
+
+    # Un bloque de sorteos por descripcion, con sus parametros.
+    for i, nombre in enumerate(DESCRIPTIONS):
+        filas = np.flatnonzero(desc == i)
+        k = len(filas)
+        p = PARAMETROS[nombre]
+        for v in _UNIFORMES:
+            col[v][filas] = np.round(rng.uniform(*p[v], k), 1)
+        for v in _ENTEROS:
+            col[v][filas] = rng.integers(p[v][0], p[v][1] + 1, k)
+        for v, categorias in _CATEGORIAS.items():
+            codigos = np.array([categorias.index(c) for c in p[v]], dtype=np.int8)
+            col[v][filas] = codigos[rng.integers(0, len(codigos), k)]
+        for v in _EVENTOS:
+            col[v][filas] = rng.random(k) < p[v]
+
+    temp, hum, wind = col["temperatura"], col["humedad"], col["viento"]
+
+    # Aeropuerto real y cabecera en uso segun el viento (cabecera_activa:
+    # la de menor angulo con el viento; a igualdad, rumbo_le).
+    direccion = rng.integers(0, 360, n)
+    aeropuerto = rng.integers(0, len(_AEROPUERTOS), n)
+    rumbo_le = np.array([a.rumbo_le for a in _AEROPUERTOS])[aeropuerto]
+    rumbo_he = np.array([a.rumbo_he for a in _AEROPUERTOS])[aeropuerto]
+    runway = np.where(diferencia_angular(direccion, rumbo_he) < diferencia_angular(direccion, rumbo_le),
+                      rumbo_he, rumbo_le)
+
+    rafagas = np.round(wind * np.round(rng.uniform(1.1, 1.5, n), 1), 1)
+    angulo = np.abs(direccion - runway)
+    angulo = np.where(angulo > 180, 360 - angulo, angulo)
+    cruzado = np.round(np.abs(wind * np.sin(np.radians(angulo))), 1)
+    frente = np.round(wind * np.cos(np.radians(angulo)), 1)
+
+    altitud = np.round(np.array([a.altitud for a in _AEROPUERTOS])[aeropuerto]).astype(np.int64)
+    densidad = np.round(calculate_density_altitude(temp, col["presion"], altitud), 0)
+
+    depresion = np.select([hum > 90, hum > 70], [rng.uniform(0, 2, n), rng.uniform(2, 5, n)],
+                          rng.uniform(5, 15, n))
+    rocio = np.round(temp - depresion, 1)
+    hielo = (0 <= temp) & (temp <= 10) & (temp - rocio < 3) & (col["precipitacion"] > 0)
+
+    hora = rng.integers(0, 24, n)
+    dia = rng.integers(1, 366, n)
+
+    df = pd.DataFrame({
+        **{v: col[v] for v in _UNIFORMES + _ENTEROS + _EVENTOS},
+        **{v: pd.Categorical.from_codes(col[v], categories=c) for v, c in _CATEGORIAS.items()},
+        "descripcion": pd.Categorical.from_codes(desc, categories=DESCRIPTIONS),
+        "direccion_viento": direccion,
+        "runway_heading": runway,
+        "viento_cruzado": cruzado,
+        "viento_frente": frente,
+        "rafagas": rafagas,
+        "altitud_aeropuerto": altitud,
+        "altitud_densidad": densidad,
+        "punto_rocio": rocio,
+        "riesgo_hielo": hielo,
+        "hora": hora,
+        "es_noche": (hora < 6) | (hora > 20),
+        "mes": np.minimum(dia // 30 + 1, 12),
+        "dia_año": dia,
+    })
+    return df[COLUMNAS]
+
+
+def _puntos(x, escalones) -> np.ndarray:
+    """Puntos del primer escalon (umbral, puntos) que x supera, o 0."""
+    return np.select([x > u for u, _ in escalones], [p for _, p in escalones], 0)
+
+
+def _codigos(serie: pd.Series, categorias: list) -> np.ndarray:
+    """Codigo de cada valor en categorias (-1 si no esta), sin pasar por str."""
+    return pd.Categorical(serie, categories=categorias).codes
+
+
+def _tabla(categorias: list, valores: dict) -> np.ndarray:
+    """Array indexable por codigo (el -1 cae en el 0 del final)."""
+    return np.array([valores.get(c, 0) for c in categorias] + [0])
+
+
+def calcular_riesgo(df: pd.DataFrame) -> pd.Categorical:
+    """calculate_risk_aviation() sobre todas las filas a la vez."""
+    temp = df["temperatura"].to_numpy()
+    hum = df["humedad"].to_numpy()
+    wind = df["viento"].to_numpy()
+    vis = df["visibilidad"].to_numpy()
+    crosswind = df["viento_cruzado"].to_numpy()
+    gusts = df["rafagas"].to_numpy()
+    ceiling = df["techo_nubes"].to_numpy()
+    precip = df["precipitacion"].to_numpy()
+    pressure = df["presion"].to_numpy()
+    icing = df["riesgo_hielo"].to_numpy(dtype=bool)
+    # Las categoricas se comparan por codigo: convertirlas a str cuesta
+    # mas que todo el etiquetado.
+    desc = _codigos(df["descripcion"], DESCRIPTIONS)
+    pista = _codigos(df["estado_pista"], RUNWAY_CONDITIONS)
+    turbulencia = _codigos(df["turbulencia"], TURBULENCE_LEVELS)
+
+    def es(codigos, categorias, *valores):
+        return np.isin(codigos, [categorias.index(v) for v in valores])
+
+    lluvia = es(desc, DESCRIPTIONS, "lluvia_ligera", "lluvia_fuerte")
 
-# Distribución objetivo: 45% BAJO, 35% MODERADO, 20% ALTO
-target_distribution = {
-    "BAJO": N_SAMPLES * 0.45,
-    "MODERADO": N_SAMPLES * 0.35,
-    "ALTO": N_SAMPLES * 0.20
-}
+    # NIVEL 1: CONDICIONES CRÍTICAS - ALTO
+    critico = (
+        (crosswind > 35) | (vis < 800)
+        | df["tormenta_electrica"].to_numpy(dtype=bool) | df["cizalladura_viento"].to_numpy(dtype=bool)
+        | es(turbulencia, TURBULENCE_LEVELS, "severa") | (gusts > 60)
+        | ((wind > 35) & es(pista, RUNWAY_CONDITIONS, "mojada", "nevada", "contaminada"))
+        | ((ceiling < 200) & (vis < 1500))
+        | (icing & (0 <= temp) & (temp <= 5) & lluvia)
+        | es(desc, DESCRIPTIONS, "granizo")
+    )
 
-attempts = 0
-max_attempts = N_SAMPLES * 15
+    # NIVEL 2: SCORING PARA MODERADO
+    score = (
+        _puntos(crosswind, [(25, 25), (20, 18), (15, 12), (10, 6)])
+        + _puntos(-vis, [(-1500, 20), (-3000, 15), (-5000, 10), (-8000, 5)])       # vis < umbral
+        + _puntos(-ceiling, [(-300, 15), (-500, 12), (-1000, 8), (-1500, 4)])      # techo < umbral
+        + _puntos(wind, [(40, 15), (30, 10), (20, 6)])
+        + _puntos(gusts - wind, [(20, 12), (15, 8), (10, 5)])
+        + _puntos(precip, [(15, 10), (10, 7), (5, 4)])
+        + _tabla(RUNWAY_CONDITIONS, {"contaminada": 10, "nevada": 8, "mojada": 5, "humeda": 2})[pista]
+        + _tabla(TURBULENCE_LEVELS, {"moderada": 10, "leve": 5})[turbulencia]
+        + np.select([(temp < -5) | (temp > 40), (temp < 0) | (temp > 38), (temp < 5) | (temp > 35)], [8, 5, 3], 0)
+        + _puntos(hum, [(95, 5), (90, 3)])
+        + np.select([(pressure < 980) | (pressure > 1030), (pressure < 990) | (pressure > 1025)], [5, 3], 0)
+        + _tabla(DESCRIPTIONS, {"tormenta": 8, "nieve": 6, "lluvia_fuerte": 5, "niebla": 4,
+                                "lluvia_ligera": 2})[desc]
+        + np.where(icing, 7, 0)
+    )
+
+    codigo = np.where(critico | (score >= 50), 2, np.where(score >= 25, 1, 0))
+    return pd.Categorical.from_codes(codigo, categories=RISK_CLASSES)
+
+
+def generar_balanceado(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    n muestras etiquetadas con la distribución objetivo por clase.
 
-while len(data) < N_SAMPLES and attempts < max_attempts:
-    attempts += 1
-    weather_data = generate_realistic_aviation_weather()
-    risk = calculate_risk_aviation(weather_data)
-    
-    if risk_counts[risk] >= target_distribution[risk]:
-        continue
-    
-    weather_data['riesgo'] = risk
-    data.append(weather_data)
-    risk_counts[risk] += 1
-    
-    if len(data) % 500 == 0:
-        print(f"  ✓ {len(data)}/{N_SAMPLES} muestras...")
-
-# Completar si faltan
-while len(data) < N_SAMPLES:
-    weather_data = generate_realistic_aviation_weather()
-    risk = calculate_risk_aviation(weather_data)
-    weather_data['riesgo'] = risk
-    data.append(weather_data)
-    risk_counts[risk] += 1
-
-# Crear DataFrame
-df = pd.DataFrame(data)
-df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-
-# Guardar
-os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-df.to_csv(OUTPUT_PATH, index=False)
-
-print("\n" + "=" * 70)
-print("✅ DATASET GENERADO EXITOSAMENTE")
-print("=" * 70)
-print(f"\n📁 Archivo: {OUTPUT_PATH}")
-print(f"📊 Registros: {len(df)}")
-print(f"📋 Variables: {len(df.columns)}")
-
-print("\n🎯 DISTRIBUCIÓN DE CLASES:")
-for risk_class in RISK_CLASSES:
-    count = risk_counts[risk_class]
-    pct = (count / len(df)) * 100
-    print(f"  {risk_class}: {count} ({pct:.1f}%)")
-
-print("\n📈 ESTADÍSTICAS POR CLASE:")
-for risk in RISK_CLASSES:
-    subset = df[df["riesgo"] == risk]
-    print(f"\n{risk}:")
-    print(f"  Temp: {subset['temperatura'].mean():.1f}°C")
-    print(f"  Viento: {subset['viento'].mean():.1f} km/h")
-    print(f"  Viento Cruzado: {subset['viento_cruzado'].mean():.1f} km/h")
-    print(f"  Visibilidad: {subset['visibilidad'].mean():.0f} m")
-
-print("\n" + "=" * 70)
-print("🎯 SIGUIENTE PASO: python ml/scripts/train_model_COMPLETE.py")
-print("=" * 70)
\ No newline at end of file
+    Mismo criterio que el bucle de rechazo original: se aceptan las
+    muestras de una clase en el orden en que salen mientras la clase no
+    haya llegado a su cupo, hasta 15 intentos por muestra; lo que falte
+    se completa sin rechazo.
+    """
+    cupos = np.array([math.ceil(n * TARGET_DISTRIBUTION[r]) for r in RISK_CLASSES])
+    partes = []
+    faltan, intentos, max_intentos = n, 0, n * 15
+    while faltan and intentos < max_intentos:
+        # BAJO sale ~1 de cada 4 y se pide casi la mitad: con el doble de
+        # intentos que de faltantes suele bastar una vuelta.
+        lote = min(max(2 * faltan, 1000), max_intentos - intentos)
+        df = generar(lote, rng)
+        intentos += lote
+        riesgo = calcular_riesgo(df)
+        codigo = riesgo.codes
+        # Posicion de cada fila dentro de su clase en este lote.
+        rango = np.zeros(lote, dtype=np.int64)
+        for c in range(len(RISK_CLASSES)):
+            filas = codigo == c
+            rango[filas] = np.arange(filas.sum())
+        aceptadas = np.flatnonzero(rango < cupos[codigo])[:faltan]
+        df = df.iloc[aceptadas].assign(riesgo=riesgo[aceptadas])
+        cupos -= np.bincount(codigo[aceptadas], minlength=len(RISK_CLASSES))
+        faltan -= len(aceptadas)
+        partes.append(df)
+    if faltan:
+        df = generar(faltan, rng)
+        partes.append(df.assign(riesgo=calcular_riesgo(df)))
+    df = pd.concat(partes, ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def escribir_dataset(ruta: Path, n: int, *, semilla: int = 42, lote: int = LOTE, al_escribir=None) -> dict:
+    """
+    Genera n muestras balanceadas por lotes y las escribe en ruta.
+
+    .parquet se escribe con un ParquetWriter (un row group por lote) y
+    cualquier otra extension como CSV anexando. Cada lote se balancea con
+    sus propios cupos. Devuelve, por clase, el numero de filas y la suma
+    de las columnas del resumen.
+    """
+    ruta = Path(ruta)
+    parquet = ruta.suffix == ".parquet"
+    if parquet and not PARQUET_DISPONIBLE:
+        raise RuntimeError("pyarrow no esta instalado: pip install -r requirements-ml.txt")
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+
+    resumen = None
+    escritor = None
+    try:
+        for inicio in range(0, n, lote):
+            df = generar_balanceado(min(lote, n - inicio), rng)
+            if parquet:
+                tabla = pa.Table.from_pandas(df, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(ruta, tabla.schema)
+                escritor.write_table(tabla)
+            else:
+                df.to_csv(ruta, index=False, mode="w" if inicio == 0 else "a", header=inicio == 0)
+            parcial = df.groupby("riesgo", observed=False)[
+                ["temperatura", "viento", "viento_cruzado", "visibilidad"]].agg(["sum", "count"])
+            resumen = parcial if resumen is None else resumen + parcial
+            if al_escribir is not None:
+                al_escribir(inicio + len(df))
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return resumen
+
+
+# =================================================================
+# GENERACIÓN DEL DATASET
+# =================================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generador del dataset sintetico de riesgo")
+    parser.add_argument("--n", type=int, default=N_SAMPLES)
+    parser.add_argument("--salida", default=OUTPUT_PATH, help=".csv o .parquet")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=LOTE)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🚀 GENERADOR DE DATASET AEROSAFE - VERSIÓN UNIFICADA")
+    print("=" * 70)
+    print(f"📊 Generando {args.n:,} muestras...")
+    print(f"🎯 Clases de riesgo: {', '.join(RISK_CLASSES)}")
+
+    inicio = time.perf_counter()
+    resumen = escribir_dataset(
+        Path(args.salida), args.n, semilla=args.semilla, lote=args.lote,
+        al_escribir=lambda hechas: print(f"  ✓ {hechas:,}/{args.n:,} muestras..."),
+    )
+    segundos = time.perf_counter() - inicio
+
+    print("\n" + "=" * 70)
+    print("✅ DATASET GENERADO EXITOSAMENTE")
+    print("=" * 70)
+    print(f"\n📁 Archivo: {args.salida}")
+    print(f"📊 Registros: {args.n:,}  ({segundos:.1f} s)")
+    print(f"📋 Variables: {len(COLUMNAS) + 1}")
+
+    print("\n🎯 DISTRIBUCIÓN DE CLASES:")
+    for risk_class in RISK_CLASSES:
+        count = int(resumen.loc[risk_class, ("temperatura", "count")])
+        print(f"  {risk_class}: {count:,} ({count / args.n * 100:.1f}%)")
+
+    print("\n📈 ESTADÍSTICAS POR CLASE:")
+    for risk in RISK_CLASSES:
+        fila = resumen.loc[risk]
+        media = {c: fila[(c, "sum")] / fila[(c, "count")] if fila[(c, "count")] else float("nan")
+                 for c in ("temperatura", "viento", "viento_cruzado", "visibilidad")}
+        print(f"\n{risk}:")
+        print(f"  Temp: {media['temperatura']:.1f}°C")
+        print(f"  Viento: {media['viento']:.1f} km/h")
+        print(f"  Viento Cruzado: {media['viento_cruzado']:.1f} km/h")
+        print(f"  Visibilidad: {media['visibilidad']:.0f} m")
+
+    print("\n" + "=" * 70)
+    print("🎯 SIGUIENTE PASO: python ml/scripts/train_model_COMPLETE.py")
+    print("=" * 70)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -15,7 +15,9 @@ Uso:
     python -m ml.scripts.make_figures --solo fiabilidad transferencia
 """
 import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import matplotlib
@@ -24,7 +26,6 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.frozen import FrozenEstimator
 from sklearn.metrics import average_precision_score, brier_score_loss
@@ -32,9 +33,9 @@ from sklearn.metrics import average_precision_score, brier_score_loss
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, entrenamiento, transferencia  # noqa: E402
 
 BACKEND = Path(__file__).resolve().parents[2]
-FDIR = BACKEND / "data" / "forecast"
 FIGS = BACKEND / "ml" / "figures"
 
 # --- Paleta (instancia validada, fondo claro para impresion) ---
@@ -77,27 +78,30 @@ def _guardar(fig, nombre):
     print(f"  -> ml/figures/{nombre}.png")
 
 
+COLUMNAS = [*FORECAST_FEATURES, "objetivo"]
+
+
+def _tramo(icao, desde=None, antes_de=None):
+    return almacen.cargar_forecast(icao, 3, columnas=COLUMNAS, desde=desde, antes_de=antes_de)
+
+
 def _cargar(icao):
-    df = pd.read_csv(FDIR / f"forecast_{icao.lower()}_h3.csv",
-                     parse_dates=["timestamp"], low_memory=False)
-    anio = df.timestamp.dt.year
-    return df[anio < CORTE], df[anio >= CORTE]
+    return _tramo(icao, antes_de=CORTE), _tramo(icao, desde=CORTE)
 
 
-def _rf():
-    return RandomForestClassifier(
-        n_estimators=300, max_depth=15, min_samples_leaf=20,
-        class_weight="balanced", n_jobs=-1, random_state=42)
+def _rf(df, split):
+    """Bosque de pronostico entrenado con df, o recuperado de la cache de modelos."""
+    return entrenamiento.entrenar_rf(df[FORECAST_FEATURES].values, df.objetivo.values, split=split)
 
 
 # =========================================================================
 # 1. Diagrama de fiabilidad (antes / despues de calibrar)
 # =========================================================================
 def fig_fiabilidad():
-    df = pd.read_csv(FDIR / "forecast_skbo_h3.csv", parse_dates=["timestamp"], low_memory=False)
-    anio = df.timestamp.dt.year
-    tr = df[anio < 2021]; ca = df[(anio >= 2021) & (anio < 2023)]; te = df[anio >= 2023]
-    base = _rf().fit(tr[FORECAST_FEATURES].values, tr.objetivo.values)
+    tr = _tramo("SKBO", antes_de=2021)
+    ca = _tramo("SKBO", desde=2021, antes_de=2023)
+    te = _tramo("SKBO", desde=2023)
+    base = _rf(tr, "SKBO h3 anio<2021")
     cal = CalibratedClassifierCV(FrozenEstimator(base), method="isotonic").fit(
         ca[FORECAST_FEATURES].values, ca.objetivo.values)
     y = te.objetivo.values
@@ -131,12 +135,12 @@ def fig_fiabilidad():
 # =========================================================================
 def fig_transferencia():
     icaos = ["SKBO", "SKRG", "SKPS", "SKMZ", "SKBQ", "SKCG"]
-    icaos = [i for i in icaos if (FDIR / f"forecast_{i.lower()}_h3.csv").exists()]
+    icaos = [i for i in icaos if almacen.existe_forecast(i, 3)]
     datos, modelos, base_rate = {}, {}, {}
     for ic in icaos:
         tr, te = _cargar(ic)
         datos[ic] = (tr, te)
-        modelos[ic] = _rf().fit(tr[FORECAST_FEATURES].values, tr.objetivo.values)
+        modelos[ic] = _rf(tr, f"{ic} h3 anio<{CORTE}")
         base_rate[ic] = te.objetivo.values.mean()
 
     M = np.zeros((len(icaos), len(icaos)))
@@ -175,10 +179,10 @@ def fig_rendimiento():
     fig, ax = plt.subplots(figsize=(6.4, 5.6))
     colores = {"SKBO": BLUE, "SKRG": ORANGE, "SKPS": GOOD, "SKMZ": CRITICAL}
     for ic, col in colores.items():
-        if not (FDIR / f"forecast_{ic.lower()}_h3.csv").exists():
+        if not almacen.existe_forecast(ic, 3):
             continue
         tr, te = _cargar(ic)
-        m = _rf().fit(tr[FORECAST_FEATURES].values, tr.objetivo.values)
+        m = _rf(tr, f"{ic} h3 anio<{CORTE}")
         y = te.objetivo.values
         p = m.predict_proba(te[FORECAST_FEATURES].values)[:, 1]
         pods, fars = [], []
@@ -201,24 +205,53 @@ def fig_rendimiento():
 # =========================================================================
 # 4. Curva de aprendizaje (mas METAR no ayuda)
 # =========================================================================
+def _punto_aprendizaje(f, seed, n, train, test):
+    """
+    Un punto de la curva (tarea del pool), con los datos por memoria
+    compartida. La submuestra de cada tamano y semilla es la de siempre.
+    No pasa por la cache de modelos: son bosques de un solo uso y
+    guardarlos solo engordaria el directorio.
+    """
+    X, y = transferencia.mapear(train[0]), transferencia.mapear(train[1])
+    idx = np.random.default_rng(seed).choice(len(y), n, replace=False)
+    positivos = int(y[idx].sum())
+    if positivos < 5:
+        return f, None, positivos
+    # Un nucleo por punto: el paralelismo lo pone el pool.
+    m = entrenamiento.crear_modelo("rf", n_jobs=1).fit(X[idx], y[idx])
+    Xte, yte = transferencia.mapear(test[0]), transferencia.mapear(test[1])
+    return f, average_precision_score(yte, m.predict_proba(Xte)[:, 1]), positivos
+
+
 def fig_aprendizaje():
     tr, te = _cargar("SKBO")
-    Xte, yte = te[FORECAST_FEATURES].values, te.objetivo.values
     fracs = [0.02, 0.05, 0.1, 0.2, 0.4, 0.6, 0.8, 1.0]
+    vals = {f: [] for f in fracs}
+    eventos = {f: [] for f in fracs}
+    bloques = []
+    try:
+        for df in (tr, te):
+            for arr in (df[FORECAST_FEATURES].to_numpy(np.float32), df.objetivo.to_numpy()):
+                bloques.append(transferencia.publicar(arr))
+        (_, dx), (_, dy), (_, dxte), (_, dyte) = bloques
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            # Los puntos grandes primero: el pool reparte mejor la carga.
+            futuros = [pool.submit(_punto_aprendizaje, f, seed, int(len(tr) * f), (dx, dy), (dxte, dyte))
+                       for f in reversed(fracs) for seed in range(3)]
+            for futuro in as_completed(futuros):
+                f, pr, positivos = futuro.result()
+                if pr is not None:
+                    vals[f].append(pr)
+                    eventos[f].append(positivos)
+    finally:
+        for bloque, _ in bloques:
+            bloque.close()
+            bloque.unlink()
+
     ns, praucs, pos = [], [], []
     for f in fracs:
-        n = int(len(tr) * f)
-        vals, p = [], []
-        for seed in range(3):
-            idx = np.random.default_rng(seed).choice(len(tr), n, replace=False)
-            sub = tr.iloc[idx]
-            if sub.objetivo.sum() < 5:
-                continue
-            m = _rf().fit(sub[FORECAST_FEATURES].values, sub.objetivo.values)
-            vals.append(average_precision_score(yte, m.predict_proba(Xte)[:, 1]))
-            p.append(int(sub.objetivo.sum()))
-        if vals:
-            ns.append(n); praucs.append(np.mean(vals)); pos.append(int(np.mean(p)))
+        if vals[f]:
+            ns.append(int(len(tr) * f)); praucs.append(np.mean(vals[f])); pos.append(int(np.mean(eventos[f])))
 
     fig, ax = plt.subplots(figsize=(6.6, 5.2))
     ax.plot(ns, praucs, "o-", color=BLUE, lw=2, ms=7)
@@ -16,24 +16,27 @@ es ~5%), asi que:
   - La evaluacion es sobre el conjunto de test TEMPORAL (2023-2026), datos
     posteriores a todo el entrenamiento. Sin fuga de futuro.
 
+  - La mejora sobre la persistencia se da con su intervalo de confianza
+    (bootstrap por dias, ml/utils/bootstrap.py): solo es clara si el
+    intervalo no incluye el 0.
+
 Uso:
     cd backend
     python -m ml.scripts.train_forecast --horizonte 3
     python -m ml.scripts.train_forecast --horizonte 3 --no-mlflow
+    python -m ml.scripts.train_forecast --horizonte 3 --motor hgb
+    python -m ml.scripts.train_forecast --horizonte 3 --bootstrap 0   # sin IC
 """
 import argparse
 import sys
 from pathlib import Path
 
 import joblib
-import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import (
     average_precision_score,
     confusion_matrix,
     f1_score,
-    precision_recall_curve,
     precision_score,
     recall_score,
     roc_auc_score,
@@ -41,27 +44,30 @@ from sklearn.metrics import (
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, bootstrap, entrenamiento  # noqa: E402
+# Umbral que maximiza F1 en train, no el 0.5 por defecto.
+from ml.utils.contingencia import umbral_optimo_f1  # noqa: E402
+from services.forecast_engine import nombre_artefacto  # noqa: E402
+
 BACKEND_DIR = Path(__file__).resolve().parents[2]
-FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
 MODEL_DIR = BACKEND_DIR / "models" / "forecast"
 
 CORTE_TEST = 2023
 
-# Columnas que no son features.
-NO_FEATURES = {"objetivo", "timestamp"}
-
 
 def cargar(horizonte: int, icao: str = "skbo"):
-    ruta = FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
-    if not ruta.exists():
-        print(f"ERROR: falta {ruta}. Ejecutar build_forecast_dataset primero.")
+    # Cada tramo lee solo sus anios y sus columnas; el timestamp solo hace
+    # falta en test (bootstrap por dias).
+    features = list(FORECAST_FEATURES)
+    train = almacen.cargar_forecast(icao, horizonte, columnas=[*features, "objetivo"],
+                                    antes_de=CORTE_TEST)
+    if train is None:
+        print(f"ERROR: falta {almacen.forecast_csv(icao, horizonte)}. "
+              "Ejecutar build_forecast_dataset primero.")
         sys.exit(1)
-
-    df = pd.read_csv(ruta, parse_dates=["timestamp"], low_memory=False)
-    features = [c for c in df.columns if c not in NO_FEATURES]
-
-    train = df[df.timestamp.dt.year < CORTE_TEST]
-    test = df[df.timestamp.dt.year >= CORTE_TEST]
+    test = almacen.cargar_forecast(icao, horizonte, columnas=[*features, "objetivo", "timestamp"],
+                                   desde=CORTE_TEST)
 
     return train, test, features
 
@@ -98,14 +104,6 @@ def evaluar(nombre, y, prob, umbral) -> dict:
     }
 
 
-def umbral_optimo_f1(y, prob) -> float:
-    """Umbral que maximiza F1 en train, no el 0.5 por defecto."""
-    p, r, umbrales = precision_recall_curve(y, prob)
-    f1 = np.divide(2 * p * r, p + r, out=np.zeros_like(p), where=(p + r) > 0)
-    # precision_recall_curve devuelve un umbral menos que puntos.
-    return float(umbrales[max(np.argmax(f1[:-1]), 0)])
-
-
 def imprimir(res: dict) -> None:
     extra = f"  PR-AUC={res['pr_auc']:.3f}" if "roc_auc" in res else ""
     print(
@@ -118,7 +116,11 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Entrena el pronostico")
     parser.add_argument("--icao", default="SKBO")
     parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--motor", choices=entrenamiento.MOTORES, default="rf")
     parser.add_argument("--no-mlflow", action="store_true")
+    parser.add_argument("--bootstrap", type=int, default=2000,
+                        help="replicas del bootstrap por dias para los IC (0 = sin IC)")
+    parser.add_argument("--procesos", type=int, default=None)
     args = parser.parse_args()
 
     print("=" * 72)
@@ -141,18 +143,14 @@ def main() -> int:
     imprimir(base)
 
     # --- Modelo ---
+    familia = "RandomForest" if args.motor == "rf" else "HistGradientBoosting"
     print("\n" + "-" * 72)
-    print("MODELO (RandomForest)")
+    print(f"MODELO ({familia})")
     print("-" * 72)
 
-    modelo = RandomForestClassifier(
-        n_estimators=300,
-        max_depth=15,
-        min_samples_leaf=20,
-        class_weight="balanced",  # compensa el 1:20
-        n_jobs=-1,
-        random_state=42,
-    )
+    # class_weight="balanced" compensa el 1:20. Los hiperparametros
+    # vienen de tune_forecast.py y se mantienen en ml/utils/entrenamiento.py.
+    modelo = entrenamiento.crear_modelo(args.motor)
     modelo.fit(X_train, y_train)
 
     prob_train = modelo.predict_proba(X_train)[:, 1]
@@ -161,11 +159,11 @@ def main() -> int:
     # El umbral se fija en TRAIN y se aplica en TEST: elegirlo en test
     # seria hacer trampa.
     umbral = umbral_optimo_f1(y_train, prob_train)
-    res = evaluar(f"randomforest (umbral {umbral:.2f})", y_test, prob_test, umbral)
+    res = evaluar(f"{familia.lower()} (umbral {umbral:.2f})", y_test, prob_test, umbral)
     imprimir(res)
 
     # Tambien con umbral 0.5, para transparencia.
-    res_05 = evaluar("randomforest (umbral 0.50)", y_test, prob_test, 0.5)
+    res_05 = evaluar(f"{familia.lower()} (umbral 0.50)", y_test, prob_test, 0.5)
     imprimir(res_05)
 
     # --- Comparacion ---
@@ -180,7 +178,27 @@ def main() -> int:
           f"({mejora_recall:+.3f})")
     print(f"  PR-AUC modelo {res['pr_auc']:.3f}  vs  tasa base {base['pr_auc']:.3f}")
 
-    if mejora_f1 > 0.03:
+    # Intervalos por bootstrap de dias (pareado: modelo y persistencia
+    # sobre los mismos dias remuestreados).
+    ic = None
+    if args.bootstrap:
+        ic = bootstrap.intervalos(
+            y_test, prob_test, test.timestamp.dt.floor("D").values,
+            umbral=umbral, referencia=test.adverso_actual.values,
+            replicas=args.bootstrap, procesos=args.procesos,
+        )
+        print(f"\n  IC 95% (bootstrap por dias, {args.bootstrap:,} replicas):")
+        for clave, etiqueta in (("f1", "F1"), ("pr_auc", "PR-AUC"), ("csi", "CSI"), ("bss", "BSS"),
+                                ("dif_f1", "F1 - persistencia"), ("dif_pr_auc", "PR-AUC - tasa base")):
+            inf, sup = ic[clave]["ic"]
+            print(f"    {etiqueta:20s}{ic[clave]['valor']:>+8.3f}   [{inf:+.3f}, {sup:+.3f}]")
+
+    if ic is not None and ic["dif_f1"]["ic"][0] > 0:
+        print("\n  El modelo supera a la persistencia de forma clara (el IC no incluye el 0).")
+    elif ic is not None and mejora_f1 > 0:
+        print("\n  El modelo mejora la persistencia, pero el IC de la mejora incluye el 0:")
+        print("  con este periodo de test no se distingue del ruido.")
+    elif mejora_f1 > 0.03:
         print("\n  El modelo supera a la persistencia de forma clara.")
     elif mejora_f1 > 0:
         print("\n  El modelo supera a la persistencia por margen estrecho.")
@@ -194,15 +212,17 @@ def main() -> int:
     print(f"    {'real: no':16s}{cm[0,0]:>10d}{cm[0,1]:>10d}")
     print(f"    {'real: si':16s}{cm[1,0]:>10d}{cm[1,1]:>10d}")
 
-    print("\n  Top 10 features:")
-    imp = (pd.DataFrame({"f": features, "i": modelo.feature_importances_})
-           .sort_values("i", ascending=False).head(10))
-    for _, row in imp.iterrows():
-        print(f"    {row.f:20s} {row.i:.4f}")
+    # HistGradientBoosting no expone importancias por impureza.
+    if hasattr(modelo, "feature_importances_"):
+        print("\n  Top 10 features:")
+        imp = (pd.DataFrame({"f": features, "i": modelo.feature_importances_})
+               .sort_values("i", ascending=False).head(10))
+        for _, row in imp.iterrows():
+            print(f"    {row.f:20s} {row.i:.4f}")
 
     # --- Guardar ---
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    joblib.dump(modelo, MODEL_DIR / f"forecast_{args.icao.lower()}_h{args.horizonte}.pkl")
+    joblib.dump(modelo, MODEL_DIR / nombre_artefacto(args.icao, args.horizonte, args.motor))
     (MODEL_DIR / f"features_{args.icao.lower()}_h{args.horizonte}.txt").write_text(
         "\n".join(features), encoding="utf-8"
     )
@@ -216,9 +236,10 @@ def main() -> int:
 
             mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
             mlflow.set_experiment("aerosafe-pronostico")
-            with mlflow.start_run(run_name=f"forecast_{args.icao.lower()}_h{args.horizonte}"):
+            with mlflow.start_run(run_name=nombre_artefacto(args.icao, args.horizonte, args.motor, extension="")):
                 mlflow.log_param("icao", args.icao)
                 mlflow.log_param("horizonte_h", args.horizonte)
+                mlflow.log_param("motor", args.motor)
                 mlflow.log_param("n_train", len(train))
                 mlflow.log_param("n_test", len(test))
                 mlflow.log_param("split", "temporal")
@@ -228,6 +249,9 @@ def main() -> int:
                 mlflow.log_metric("baseline_f1", base["f1"])
                 mlflow.log_metric("baseline_recall", base["recall"])
                 mlflow.log_metric("mejora_f1", mejora_f1)
+                if ic is not None:
+                    mlflow.log_metric("mejora_f1_ic_inf", ic["dif_f1"]["ic"][0])
+                    mlflow.log_metric("mejora_f1_ic_sup", ic["dif_f1"]["ic"][1])
             print(f"  Registrado en MLflow: {MLFLOW_TRACKING_URI}")
         except Exception as e:
             print(f"  MLflow no disponible ({e}).")
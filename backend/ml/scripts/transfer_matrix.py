@@ -17,55 +17,61 @@ margen (local - base) alcanza la transferencia. Se usa PR-AUC y no F1
 porque el umbral y la calibracion son especificos del sitio (ya
 demostrado), asi que comparar rankings es lo justo.
 
+Los N modelos locales se entrenan una vez y los N^2 pares se puntuan en
+un pool de procesos con los tests en memoria compartida
+(ml/utils/transferencia.py); la matriz se va llenando segun terminan.
+
 Uso:
     cd backend
     python -m ml.scripts.transfer_matrix --aeropuertos SKBO SKRG SKIP SKPS SKMZ
+    python -m ml.scripts.transfer_matrix --aeropuertos SKBO SKRG --procesos 4
 """
 import argparse
 import sys
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import average_precision_score
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, entrenamiento, transferencia  # noqa: E402
+
 BACKEND_DIR = Path(__file__).resolve().parents[2]
-FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
 
 CORTE_TEST = 2023
-NO_FEATURES = {"objetivo", "timestamp"}
 
 
 def cargar(icao: str, horizonte: int):
-    ruta = FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
-    if not ruta.exists():
+    # Todos los aeropuertos se leen con las mismas columnas (las del
+    # modelo), asi que comparten esquema por construccion.
+    columnas = [*FORECAST_FEATURES, "objetivo"]
+    train = almacen.cargar_forecast(icao, horizonte, columnas=columnas, antes_de=CORTE_TEST)
+    if train is None:
         return None
-    df = pd.read_csv(ruta, parse_dates=["timestamp"], low_memory=False)
-    features = [c for c in df.columns if c not in NO_FEATURES]
-    anio = df.timestamp.dt.year
     return {
-        "train": df[anio < CORTE_TEST],
-        "test": df[anio >= CORTE_TEST],
-        "features": features,
+        "split": f"{icao.upper()} h{horizonte} anio<{CORTE_TEST}",
+        "train": train,
+        "test": almacen.cargar_forecast(icao, horizonte, columnas=columnas, desde=CORTE_TEST),
+        "features": list(FORECAST_FEATURES),
     }
 
 
-def entrenar(datos):
-    m = RandomForestClassifier(
-        n_estimators=300, max_depth=15, min_samples_leaf=20,
-        class_weight="balanced", n_jobs=-1, random_state=42,
-    )
-    m.fit(datos["train"][datos["features"]].values, datos["train"].objetivo.values)
-    return m
+def entrenar(datos) -> Path:
+    """Entrena (o recupera) el modelo local y devuelve su ruta en la cache."""
+    X = datos["train"][datos["features"]].values
+    y = datos["train"].objetivo.values
+    ruta = entrenamiento.ruta_modelo(X, y, split=datos["split"])
+    entrenamiento.entrenar_rf(X, y, split=datos["split"], ruta=ruta)
+    return ruta
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Matriz de transferencia")
     parser.add_argument("--aeropuertos", nargs="+", required=True)
     parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="procesos para puntuar los pares (defecto: todos los nucleos)")
     parser.add_argument("--no-mlflow", action="store_true")
     args = parser.parse_args()
 
@@ -89,13 +95,6 @@ def main() -> int:
         print("\n  Hacen falta al menos 2 aeropuertos con dataset.")
         return 1
 
-    # Verificar que todos comparten el mismo esquema de features.
-    ref_feats = datos[icaos[0]]["features"]
-    for icao in icaos[1:]:
-        if datos[icao]["features"] != ref_feats:
-            print(f"  ERROR: {icao} tiene features distintas.")
-            return 1
-
     # Un aeropuerto es "referencia valida" solo si tiene suficientes
     # eventos positivos en test para que su modelo local sea fiable. Con
     # muy pocos, el PR-AUC local es ruido y las retenciones contra el se
@@ -103,24 +102,42 @@ def main() -> int:
     # a un local infraentrenado, lo que no dice nada bueno del externo).
     MIN_POSITIVOS = 800
 
+    # --- Modelos locales: una vez cada uno, con todos los nucleos ---
+    print(f"\n  Entrenando {len(icaos)} modelos locales...")
+    rutas = {icao: entrenar(datos[icao]) for icao in icaos}
+
+    # --- Los N^2 pares, en paralelo; cada uno se informa al terminar ---
+    total = len(icaos) ** 2
+    hechos = 0
+
+    def al_terminar(origen, destino, pr):
+        nonlocal hechos
+        hechos += 1
+        print(f"    [{hechos:>3d}/{total}] {origen} -> {destino}  {pr:.3f}", flush=True)
+
+    print(f"  Puntuando {total} pares (modelo, test)...")
+    tests = {
+        icao: (datos[icao]["test"][datos[icao]["features"]].values, datos[icao]["test"].objetivo.values)
+        for icao in icaos
+    }
+    matriz = transferencia.evaluar_pares(rutas, tests, procesos=args.procesos,
+                                         al_terminar=al_terminar)
+
     # --- Perfil de cada aeropuerto ---
     print("\n  Perfil (test 2023-2026):")
     print(f"    {'ICAO':6s}{'n_test':>9s}{'adversos':>10s}{'tasa':>8s}"
           f"{'PR-AUC loc':>12s}{'referencia':>12s}")
-    modelos = {}
     base_rate = {}
     pr_local = {}
     n_positivos = {}
     valido = {}
     for icao in icaos:
-        d = datos[icao]
-        te = d["test"]
+        te = datos[icao]["test"]
         y = te.objetivo.values
         base_rate[icao] = y.mean()
         n_positivos[icao] = int(y.sum())
-        modelos[icao] = entrenar(d)
-        p = modelos[icao].predict_proba(te[d["features"]].values)[:, 1]
-        pr_local[icao] = average_precision_score(y, p)
+        # La diagonal de la matriz es el modelo local sobre su propio test.
+        pr_local[icao] = matriz[(icao, icao)]
         valido[icao] = n_positivos[icao] >= MIN_POSITIVOS
         marca = "valida" if valido[icao] else "DEBIL"
         print(f"    {icao:6s}{len(te):>9,d}{n_positivos[icao]:>10,d}{base_rate[icao]:>8.1%}"
@@ -136,19 +153,11 @@ def main() -> int:
     print("\n" + "-" * 72)
     print("PR-AUC:  fila = entrenado en,  columna = evaluado en")
     print("-" * 72)
-    print(f"\n  {'train\\test':>12s}" + "".join(f"{i:>9s}" for i in icaos))
+    cabecera = "train\\test"
+    print(f"\n  {cabecera:>12s}" + "".join(f"{i:>9s}" for i in icaos))
 
-    matriz = {}
     for origen in icaos:
-        fila = []
-        for destino in icaos:
-            d = datos[destino]
-            X = d["test"][d["features"]].values
-            y = d["test"].objetivo.values
-            p = modelos[origen].predict_proba(X)[:, 1]
-            pr = average_precision_score(y, p)
-            matriz[(origen, destino)] = pr
-            fila.append(pr)
+        fila = [matriz[(origen, destino)] for destino in icaos]
         marca = lambda o, de, v: f"{v:.3f}" + ("*" if o == de else " ")
         print(f"  {origen:>12s}" + "".join(f"{marca(origen, icaos[j], fila[j]):>9s}"
                                             for j in range(len(icaos))))
@@ -0,0 +1,231 @@
+"""
+Busqueda de hiperparametros del modelo de pronostico.
+
+Los hiperparametros del bosque (300 arboles, profundidad 15, hoja 20)
+se fijaron a mano. Este script los busca con:
+
+  - validacion temporal de origen movil ANTES del corte de test (el test
+    2023-2026 no se mira: elegir hiperparametros con el seria hacer
+    trampa),
+  - reduccion a la mitad sucesiva sobre el numero de arboles y la
+    fraccion del entrenamiento, para no gastar el presupuesto completo
+    en configuraciones que ya van mal con poco,
+  - un pool de procesos (una tarea por configuracion y pliegue, un
+    nucleo cada una) con los datos en memoria compartida.
+
+Optimiza DOS cosas: PR-AUC (la metrica del proyecto) y la latencia de
+inferencia de una fila (lo que paga la API en cada peticion). No hay
+un unico ganador, asi que se reporta el frente de Pareto: para cada
+latencia, la mejor PR-AUC alcanzable. Si un bosque con la mitad de
+arboles o menos profundo rinde lo mismo, aparece ahi. La latencia se
+mide al final, con el pool cerrado y el estimador de produccion.
+
+Detalle en ml/utils/busqueda.py. El resultado queda en
+models/forecast/busqueda_<icao>_h<N>.json; los hiperparametros en uso
+estan en ml/utils/entrenamiento.py (HIPERPARAMETROS_RF).
+
+Uso:
+    cd backend
+    python -m ml.scripts.tune_forecast --icao SKBO --horizonte 3
+    python -m ml.scripts.tune_forecast --icao SKBO --pliegues 2 --procesos 8 --no-mlflow
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, busqueda, entrenamiento, transferencia  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+MODEL_DIR = BACKEND_DIR / "models" / "forecast"
+
+CORTE_TEST = 2023
+
+
+def _referencia() -> dict:
+    """La configuracion en uso, expresada en los ejes del espacio."""
+    return {k: entrenamiento.HIPERPARAMETROS_RF.get(k, "sqrt") for k in busqueda.ESPACIO}
+
+
+def _nombre(config: dict) -> str:
+    return " ".join(f"{k}={v}" for k, v in config.items())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Busqueda de hiperparametros del pronostico")
+    parser.add_argument("--icao", default="SKBO")
+    parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--pliegues", type=int, default=3)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--arboles-max", type=int, default=max(busqueda.PREFIJOS_ARBOLES))
+    parser.add_argument("--arboles-min", type=int, default=min(busqueda.PREFIJOS_ARBOLES))
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--no-mlflow", action="store_true")
+    args = parser.parse_args()
+
+    icao = args.icao.upper()
+    print("=" * 72)
+    print(f"BUSQUEDA DE HIPERPARAMETROS - {icao} +{args.horizonte}h")
+    print("=" * 72)
+
+    # El test no se lee: la busqueda solo ve los anios anteriores al corte.
+    features = list(FORECAST_FEATURES)
+    df = almacen.cargar_forecast(icao, args.horizonte, columnas=[*features, "objetivo", "timestamp"],
+                                 antes_de=CORTE_TEST)
+    if df is None:
+        print(f"ERROR: falta {almacen.forecast_csv(icao, args.horizonte)}. "
+              "Ejecutar build_forecast_dataset primero.")
+        return 1
+    X = df[features].to_numpy(np.float32)
+    y = df.objetivo.to_numpy(np.int8)
+
+    try:
+        pliegues = busqueda.pliegues_temporales(df.timestamp.dt.year.to_numpy(), CORTE_TEST, args.pliegues)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"\n  Pliegues (validacion < {CORTE_TEST}):")
+    for i, (tr, va) in enumerate(pliegues):
+        anio = int(df.timestamp.dt.year.iloc[va[0]])
+        print(f"    {i + 1}. valida {anio}: train {len(tr):>9,d}  val {len(va):>8,d}")
+
+    candidatos = busqueda.configuraciones()
+    referencia = _referencia()
+    rondas = busqueda.n_rondas(len(candidatos), args.eta)
+    prefijos = tuple(k for k in busqueda.PREFIJOS_ARBOLES if k <= args.arboles_max)
+    procesos = args.procesos or os.cpu_count() or 1
+    print(f"\n  {len(candidatos)} configuraciones, {rondas} rondas (eta={args.eta}), "
+          f"{procesos} procesos")
+
+    finales: dict[str, tuple[dict, list[dict]]] = {}
+    bloques = []
+    try:
+        bx, dx = transferencia.publicar(X)
+        by, dy = transferencia.publicar(y)
+        bloques = [bx, by]
+
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+
+            def puntuar(vivos: list[dict], ronda: int) -> list[float]:
+                arboles, fraccion = busqueda.presupuesto(
+                    ronda, rondas, args.eta, args.arboles_max, args.arboles_min)
+                final = ronda == rondas - 1
+                evaluar = list(vivos)
+                if final and referencia not in evaluar:
+                    # La configuracion en uso se puntua siempre en la
+                    # final, aunque la busqueda la haya descartado antes.
+                    evaluar.append(referencia)
+                print(f"\n  Ronda {ronda + 1}/{rondas}: {len(vivos)} configuraciones, "
+                      f"{arboles} arboles, {fraccion:.0%} del entrenamiento", flush=True)
+
+                futuros = [
+                    [pool.submit(busqueda.evaluar_pliegue, config, arboles, fraccion, tr, va, (dx, dy),
+                                 prefijos=prefijos if final else ())
+                     for tr, va in pliegues]
+                    for config in evaluar
+                ]
+                resultados = [[f.result() for f in fila] for fila in futuros]
+                puntos = [float(np.mean([r["pr_auc"] for r in fila])) for fila in resultados]
+                for config, p in sorted(zip(evaluar, puntos), key=lambda t: -t[1]):
+                    print(f"    {p:.3f}  {_nombre(config)}")
+                if final:
+                    for config, fila in zip(evaluar, resultados):
+                        finales[_nombre(config)] = (config, fila)
+                return puntos[:len(vivos)]
+
+            supervivientes, historial = busqueda.mitad_sucesiva(candidatos, puntuar, eta=args.eta)
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+
+    # --- Latencia de una fila, ya sin el pool compitiendo por la CPU ---
+    # Los finalistas se reentrenan con el estimador de produccion sobre
+    # el entrenamiento del ultimo pliegue, uno a uno.
+    print(f"\n  Midiendo latencia de {len(finales)} finalistas...", flush=True)
+    train, val = pliegues[-1]
+    fila_api = X[val[:1]]
+    latencia = {
+        nombre: busqueda.latencias(config, args.arboles_max, X[train], y[train], fila_api, prefijos)
+        for nombre, (config, _) in finales.items()
+    }
+
+    # --- Frente de Pareto: PR-AUC vs latencia de una fila ---
+    puntos = []
+    for nombre, (_, fila) in finales.items():
+        for k in prefijos:
+            if k not in fila[0].get("por_arboles", {}):
+                continue
+            puntos.append({
+                "config": nombre,
+                "arboles": k,
+                "pr_auc": float(np.mean([r["por_arboles"][k] for r in fila])),
+                "latencia_ms": latencia[nombre][k],
+            })
+    frente = busqueda.frente_pareto(puntos)
+    nombre_ref = _nombre(referencia)
+    actual = next((p for p in puntos if p["config"] == nombre_ref and p["arboles"] == args.arboles_max), None)
+
+    print("\n" + "-" * 72)
+    print("FRENTE DE PARETO  (PR-AUC medio en validacion vs latencia de 1 fila)")
+    print("-" * 72)
+    print(f"\n  {'PR-AUC':>8s}{'ms':>8s}{'arboles':>9s}  configuracion")
+    for p in frente:
+        marca = "  <- actual" if p is actual else ""
+        print(f"  {p['pr_auc']:>8.3f}{p['latencia_ms']:>8.2f}{p['arboles']:>9d}  {p['config']}{marca}")
+    if actual is not None:
+        print(f"\n  Configuracion actual: PR-AUC {actual['pr_auc']:.3f}, {actual['latencia_ms']:.2f} ms")
+        # La opcion mas rapida del frente que no pierde mas de 0.005 de PR-AUC.
+        equivalentes = [p for p in frente if p["pr_auc"] >= actual["pr_auc"] - 0.005]
+        if equivalentes and equivalentes[0] is not actual:
+            mejor = equivalentes[0]
+            print(f"  Igual de precisa y mas rapida: {mejor['config']} con {mejor['arboles']} arboles "
+                  f"(PR-AUC {mejor['pr_auc']:.3f}, {mejor['latencia_ms']:.2f} ms, "
+                  f"x{actual['latencia_ms'] / mejor['latencia_ms']:.1f})")
+
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    salida = MODEL_DIR / f"busqueda_{icao.lower()}_h{args.horizonte}.json"
+    salida.write_text(json.dumps({
+        "icao": icao,
+        "horizonte": args.horizonte,
+        "corte_test": CORTE_TEST,
+        "pliegues": args.pliegues,
+        "eta": args.eta,
+        "mejor_validacion": _nombre(supervivientes[0]),
+        "actual": actual,
+        "frente": frente,
+        "puntos": puntos,
+        "historial": [{"ronda": r, "config": _nombre(c), "pr_auc": p} for r, c, p in historial],
+    }, indent=2), encoding="utf-8")
+    print(f"\n  Resultado en {salida.relative_to(BACKEND_DIR)}")
+
+    if not args.no_mlflow:
+        try:
+            import mlflow
+            from ml.config.mlflow_config import MLFLOW_TRACKING_URI
+
+            mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+            mlflow.set_experiment("aerosafe-pronostico")
+            with mlflow.start_run(run_name=f"busqueda_{icao.lower()}_h{args.horizonte}"):
+                mlflow.log_param("icao", icao)
+                mlflow.log_param("horizonte_h", args.horizonte)
+                mlflow.log_param("mejor_validacion", _nombre(supervivientes[0]))
+                mlflow.log_metric("frente_n", len(frente))
+                mlflow.log_artifact(str(salida))
+            print(f"  Registrado en MLflow: {MLFLOW_TRACKING_URI}")
+        except Exception as e:
+            print(f"  MLflow no disponible ({e}).")
+
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -23,55 +23,54 @@ Metricas:
     PSS  = skill de Peirce (Hanssen-Kuipers) = POD - POFD.
     BSS  = Brier Skill Score vs climatologia. >0 = mejor que la tasa base.
 
+Las tablas de todos los umbrales salen de una sola ordenacion de los
+scores (ml/utils/contingencia.py), asi que verificar todos los
+aeropuertos y horizontes con modelo calibrado (--todos) es barato.
+
+Cada metrica va con su intervalo de confianza por bootstrap de bloques
+por dia (ml/utils/bootstrap.py): sin el, una mejora de +0.02 de CSI
+sobre la persistencia no se distingue del ruido del periodo de test.
+
 Uso:
     cd backend
     python -m ml.scripts.verify_forecast --icao SKBO --horizonte 3
+    python -m ml.scripts.verify_forecast --icao SKBO --horizonte 3 --bootstrap 5000
+    python -m ml.scripts.verify_forecast --todos
 """
 import argparse
+import re
 import sys
 from pathlib import Path
 
-import joblib
 import numpy as np
-import pandas as pd
-from sklearn.metrics import brier_score_loss, precision_recall_curve
+from sklearn.metrics import brier_score_loss
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from features.forecast_features import FORECAST_FEATURES  # noqa: E402
+from ml.utils import almacen, bootstrap, contingencia as curvas  # noqa: E402
+from services.forecast_engine import cargar_motor, nombre_artefacto  # noqa: E402
+
 BACKEND_DIR = Path(__file__).resolve().parents[2]
-FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
 MODEL_DIR = BACKEND_DIR / "models" / "forecast"
 
 CORTE_TEST = 2023
-NO_FEATURES = {"objetivo", "timestamp"}
+
+
+# Umbrales candidatos para el operacional y los de la envolvente.
+UMBRALES_CSI = np.linspace(0.01, 0.95, 95)
+UMBRALES_ENVOLVENTE = (0.05, 0.10, 0.20, 0.30, 0.50, 0.70)
 
 
 def contingencia(y_true, y_pred) -> dict:
-    """Tabla de contingencia y metricas categoricas OMM."""
-    a = int(((y_pred == 1) & (y_true == 1)).sum())  # aciertos
-    b = int(((y_pred == 1) & (y_true == 0)).sum())  # falsas alarmas
-    c = int(((y_pred == 0) & (y_true == 1)).sum())  # fallos
-    d = int(((y_pred == 0) & (y_true == 0)).sum())  # correctos negativos
-    n = a + b + c + d
-
-    pod = a / (a + c) if (a + c) else 0.0
-    far = b / (a + b) if (a + b) else 0.0
-    sr = a / (a + b) if (a + b) else 0.0
-    csi = a / (a + b + c) if (a + b + c) else 0.0
-    bias = (a + b) / (a + c) if (a + c) else 0.0
-    pofd = b / (b + d) if (b + d) else 0.0  # prob. de falsa deteccion
-    pss = pod - pofd  # Peirce / Hanssen-Kuipers
-
-    # Heidke Skill Score: acierto sobre el esperado por azar.
-    exacto = (a + d) / n if n else 0.0
-    azar = ((a + b) * (a + c) + (c + d) * (b + d)) / (n * n) if n else 0.0
-    hss = (exacto - azar) / (1 - azar) if (1 - azar) else 0.0
-
-    return {
-        "a": a, "b": b, "c": c, "d": d,
-        "POD": pod, "FAR": far, "SR": sr, "CSI": csi,
-        "Bias": bias, "HSS": hss, "PSS": pss,
-    }
+    """
+    Tabla de contingencia y metricas categoricas OMM de una prediccion
+    binaria: a aciertos, b falsas alarmas, c fallos, d correctos
+    negativos. POFD es la probabilidad de falsa deteccion y PSS = POD -
+    POFD (Peirce / Hanssen-Kuipers); HSS mide el acierto sobre el
+    esperado por azar.
+    """
+    return curvas.punto(curvas.curva(y_true, y_pred, [1]), 0)
 
 
 def umbral_optimo_csi(y, p) -> float:
@@ -79,20 +78,36 @@ def umbral_optimo_csi(y, p) -> float:
     Umbral que maximiza el CSI (threat score), la metrica operacional de
     referencia para eventos de seguridad. Se elige en TRAIN, no en test.
     """
-    umbrales = np.linspace(0.01, 0.95, 95)
-    mejor_u, mejor_csi = 0.5, -1
-    for u in umbrales:
-        m = contingencia(y, (p >= u).astype(int))
-        if m["CSI"] > mejor_csi:
-            mejor_csi, mejor_u = m["CSI"], u
-    return mejor_u
+    return curvas.umbral_optimo(y, p, "CSI", UMBRALES_CSI)
+
+
+def _tramos(icao, horizonte):
+    """Train y test leidos por separado; None si no hay dataset."""
+    features = list(FORECAST_FEATURES)
+    train = almacen.cargar_forecast(icao, horizonte, columnas=[*features, "objetivo"],
+                                    antes_de=CORTE_TEST)
+    if train is None:
+        return None
+    test = almacen.cargar_forecast(icao, horizonte, columnas=[*features, "objetivo", "timestamp"],
+                                   desde=CORTE_TEST)
+    return train, test, features
 
 
 def cargar(icao, horizonte):
-    ruta = FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
-    df = pd.read_csv(ruta, parse_dates=["timestamp"], low_memory=False)
-    features = [c for c in df.columns if c not in NO_FEATURES]
-    return df[df.timestamp.dt.year < CORTE_TEST], df[df.timestamp.dt.year >= CORTE_TEST], features
+    tramos = _tramos(icao, horizonte)
+    if tramos is None:
+        print(f"ERROR: falta {almacen.forecast_csv(icao, horizonte)}.")
+        sys.exit(1)
+    return tramos
+
+
+def cargar_calibrado(icao: str, horizonte: int):
+    """Motor del modelo calibrado (mapa .npz o envoltorio .pkl), o None."""
+    for ext in (".npz", ".pkl"):
+        ruta = MODEL_DIR / nombre_artefacto(icao, horizonte, calibrado=True, extension=ext)
+        if ruta.exists():
+            return cargar_motor(ruta)
+    return None
 
 
 def imprimir_tabla(nombre, m):
@@ -107,8 +122,16 @@ def main() -> int:
     parser = argparse.ArgumentParser(description="Verificacion OMM del pronostico")
     parser.add_argument("--icao", default="SKBO")
     parser.add_argument("--horizonte", type=int, default=3)
+    parser.add_argument("--todos", action="store_true",
+                        help="resumen de todos los aeropuertos y horizontes con modelo calibrado")
+    parser.add_argument("--bootstrap", type=int, default=2000,
+                        help="replicas del bootstrap por dias para los IC (0 = sin IC)")
+    parser.add_argument("--procesos", type=int, default=None)
     args = parser.parse_args()
 
+    if args.todos:
+        return verificar_todos()
+
     icao = args.icao.upper()
     print("=" * 72)
     print(f"VERIFICACION OMM  {icao}  niebla/tormenta a +{args.horizonte}h")
@@ -118,11 +141,11 @@ def main() -> int:
     y_test = test.objetivo.values
     tasa_base = y_test.mean()
 
-    calibrado = MODEL_DIR / f"forecast_{icao.lower()}_h{args.horizonte}_calibrado.pkl"
-    if not calibrado.exists():
-        print(f"\nERROR: falta el modelo calibrado {calibrado.name}.")
+    modelo = cargar_calibrado(icao, args.horizonte)
+    if modelo is None:
+        print(f"\nERROR: falta el modelo calibrado "
+              f"{nombre_artefacto(icao, args.horizonte, calibrado=True, extension='.npz')}.")
         return 1
-    modelo = joblib.load(calibrado)
 
     prob_train = modelo.predict_proba(train[features].values)[:, 1]
     prob_test = modelo.predict_proba(test[features].values)[:, 1]
@@ -152,6 +175,30 @@ def main() -> int:
     print(f"  Brier de climatologia : {bs_clim:.4f}  (predecir siempre {tasa_base:.1%})")
     print(f"  Brier Skill Score     : {bss:+.3f}   (>0 = mejor que climatologia)")
 
+    # --- Incertidumbre ---
+    # Se remuestrean dias enteros: las horas de un mismo dia no son
+    # independientes (un episodio de niebla dura varias).
+    if args.bootstrap:
+        ic = bootstrap.intervalos(
+            y_test, prob_test, test.timestamp.dt.floor("D").values,
+            umbral=umbral, referencia=test.adverso_actual.values,
+            replicas=args.bootstrap, procesos=args.procesos,
+        )
+        print("\n" + "-" * 72)
+        print(f"INCERTIDUMBRE (IC 95%, bootstrap por dias, {args.bootstrap:,} replicas)")
+        print("-" * 72)
+        for clave, etiqueta in (("pod", "POD"), ("far", "FAR"), ("csi", "CSI"), ("hss", "HSS"),
+                                ("bss", "BSS"), ("dif_csi", "CSI - persistencia"),
+                                ("dif_hss", "HSS - persistencia")):
+            inf, sup = ic[clave]["ic"]
+            print(f"  {etiqueta:20s}{ic[clave]['valor']:>+8.3f}   [{inf:+.3f}, {sup:+.3f}]")
+        inf = ic["dif_csi"]["ic"][0]
+        if inf > 0:
+            print("\n  La mejora de CSI sobre la persistencia es real: el IC no incluye el 0.")
+        else:
+            print("\n  El IC de la diferencia de CSI incluye el 0: con este periodo de test")
+            print("  no se puede afirmar que el modelo supere a la persistencia.")
+
     # --- Envelope de operacion: trade-off POD/FAR por umbral ---
     # Un regulador no quiere un unico punto sino la curva completa: que
     # detecccion se logra a cada nivel de falsas alarmas. La probabilidad
@@ -162,8 +209,9 @@ def main() -> int:
     print("-" * 72)
     anios = max(test.timestamp.dt.year.nunique(), 1)
     print(f"  {'umbral':>7s}{'POD':>7s}{'FAR':>7s}{'CSI':>7s}{'alertas/anio':>13s}")
-    for u in (0.05, 0.10, 0.20, 0.30, 0.50, 0.70):
-        mm = contingencia(y_test, (prob_test >= u).astype(int))
+    envolvente = curvas.curva(y_test, prob_test, UMBRALES_ENVOLVENTE)
+    for i, u in enumerate(UMBRALES_ENVOLVENTE):
+        mm = curvas.punto(envolvente, i)
         alertas = mm["a"] + mm["b"]
         print(f"  {u:>7.2f}{mm['POD']:>7.2f}{mm['FAR']:>7.2f}{mm['CSI']:>7.2f}"
               f"{alertas / anios:>13.0f}")
@@ -188,5 +236,39 @@ def main() -> int:
     return 0
 
 
+def verificar_todos() -> int:
+    """Resumen OMM de cada (aeropuerto, horizonte) con modelo calibrado."""
+    patron = re.compile(r"forecast_([a-z0-9]{4})_h(\d+)_calibrado\.(npz|pkl)$")
+    pares = sorted({(g[1].upper(), int(g[2])) for r in MODEL_DIR.glob("forecast_*_calibrado.*")
+                    if (g := patron.match(r.name))})
+    if not pares:
+        print(f"No hay modelos calibrados en {MODEL_DIR.relative_to(BACKEND_DIR)}/")
+        return 1
+
+    print("=" * 72)
+    print(f"VERIFICACION OMM  {len(pares)} modelos calibrados (test >= {CORTE_TEST})")
+    print("=" * 72)
+    print(f"\n  {'ICAO':6s}{'h':>3s}{'umbral':>8s}{'POD':>7s}{'FAR':>7s}{'CSI':>7s}{'HSS':>7s}"
+          f"{'BSS':>8s}{'CSI pers':>10s}")
+    for icao, horizonte in pares:
+        tramos = _tramos(icao, horizonte)
+        if tramos is None:
+            print(f"  {icao:6s}{horizonte:>3d}  sin dataset")
+            continue
+        train, test, features = tramos
+        modelo = cargar_calibrado(icao, horizonte)
+        y = test.objetivo.values
+        prob_test = modelo.predict_proba(test[features].values)[:, 1]
+        umbral = umbral_optimo_csi(train.objetivo.values, modelo.predict_proba(train[features].values)[:, 1])
+        m = contingencia(y, (prob_test >= umbral).astype(int))
+        pers = contingencia(y, test.adverso_actual.values)
+        bs_clim = brier_score_loss(y, np.full(len(y), y.mean()))
+        bss = 1 - brier_score_loss(y, prob_test) / bs_clim if bs_clim else 0.0
+        print(f"  {icao:6s}{horizonte:>3d}{umbral:>8.2f}{m['POD']:>7.2f}{m['FAR']:>7.2f}{m['CSI']:>7.3f}"
+              f"{m['HSS']:>7.3f}{bss:>+8.3f}{pers['CSI']:>10.3f}")
+    print()
+    return 0
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
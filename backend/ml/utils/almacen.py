@@ -0,0 +1,215 @@
+"""
+Almacen de datasets en Parquet particionado por estacion y anio.
+
+Los scripts de ML releian CSV de cientos de MB en cada ejecucion
+(pd.read_csv con parse_dates tarda segundos y pierde los tipos). Aqui
+se guardan como Parquet con particionado hive:
+
+    <raiz>/icao=SKBO/anio=2005/part-0.parquet
+    <raiz>/icao=SKBO/anio=2006/part-0.parquet
+    ...
+
+Asi leer un tramo temporal solo abre los ficheros de esos anios (el
+filtro por anio se resuelve con los nombres de directorio, sin tocar
+los datos) y leer unas pocas columnas solo descomprime esas columnas.
+
+El CSV sigue existiendo como formato de exportacion y como respaldo: si
+pyarrow no esta instalado o el Parquet aun no se genero, los cargadores
+leen el CSV de siempre y filtran en pandas.
+
+Uso:
+    from ml.utils import almacen
+    train = almacen.cargar_forecast("SKBO", 3, antes_de=2023)
+    test = almacen.cargar_forecast("SKBO", 3, desde=2023, columnas=["timestamp", "objetivo"])
+"""
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from features.forecast_features import compactar
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    PARQUET_DISPONIBLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    PARQUET_DISPONIBLE = False
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+METAR_DIR = BACKEND_DIR / "data" / "metar"
+FORECAST_DIR = BACKEND_DIR / "data" / "forecast"
+
+# Dentro de los directorios que ya versiona DVC, para no tener que
+# registrar otro.
+METAR_PARQUET = METAR_DIR / "parquet"
+
+# Columna de particion: se deriva de 'timestamp' al escribir y se quita
+# al leer, para que el DataFrame tenga las mismas columnas que el CSV.
+ANIO = "anio"
+
+
+def forecast_parquet(horizonte: int) -> Path:
+    return FORECAST_DIR / f"h{horizonte}"
+
+
+def forecast_csv(icao: str, horizonte: int) -> Path:
+    return FORECAST_DIR / f"forecast_{icao.lower()}_h{horizonte}.csv"
+
+
+def _particionado():
+    return ds.partitioning(pa.schema([(ANIO, pa.int16())]), flavor="hive")
+
+
+def _dir_estacion(raiz: Path, icao: str) -> Path:
+    return raiz / f"icao={icao.upper()}"
+
+
+def existe(raiz: Path, icao: str) -> bool:
+    return PARQUET_DISPONIBLE and any(_dir_estacion(raiz, icao).glob(f"{ANIO}=*/*.parquet"))
+
+
+def escribir(df: pd.DataFrame, raiz: Path, icao: str, *, anexar: bool = False) -> Path:
+    """
+    Escribe las observaciones de una estacion, una particion por anio.
+
+    Por defecto reemplaza lo que hubiera de esa estacion (las demas no se
+    tocan). Con anexar=True se anade un fichero nuevo en cada anio
+    afectado, que es lo que necesita el refresco incremental.
+    """
+    if not PARQUET_DISPONIBLE:
+        raise RuntimeError("pyarrow no esta instalado: pip install -r requirements-ml.txt")
+
+    destino = _dir_estacion(raiz, icao)
+    if not anexar and destino.exists():
+        shutil.rmtree(destino)
+
+    # Sin marca de tiempo no hay particion posible (ni uso en pronostico).
+    datos = df[df["timestamp"].notna()].copy()
+    datos[ANIO] = datos["timestamp"].dt.year.astype("int16")
+
+    tabla = pa.Table.from_pandas(datos, preserve_index=False)
+    ds.write_dataset(
+        tabla,
+        destino,
+        format="parquet",
+        partitioning=_particionado(),
+        basename_template=(f"part-{uuid.uuid4().hex}-{{i}}.parquet" if anexar else "part-{i}.parquet"),
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return destino
+
+
+def leer(
+    raiz: Path,
+    icao: str,
+    *,
+    columnas: list[str] | None = None,
+    desde: int | None = None,
+    antes_de: int | None = None,
+) -> pd.DataFrame:
+    """
+    Lee una estacion del almacen.
+
+    desde/antes_de acotan por anio (desde inclusive, antes_de exclusive,
+    igual que los cortes de los scripts: `anio < CORTE_TEST`). Se
+    traducen a un filtro sobre la particion, asi que los anios fuera del
+    rango ni se abren.
+    """
+    dataset = ds.dataset(_dir_estacion(raiz, icao), format="parquet", partitioning=_particionado())
+
+    filtro = None
+    if desde is not None:
+        filtro = ds.field(ANIO) >= desde
+    if antes_de is not None:
+        condicion = ds.field(ANIO) < antes_de
+        filtro = condicion if filtro is None else filtro & condicion
+
+    df = dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+    if ANIO in df.columns and (columnas is None or ANIO not in columnas):
+        df = df.drop(columns=ANIO)
+    # Los fragmentos anadidos en modo incremental pueden salir en
+    # cualquier orden dentro de su anio.
+    if "timestamp" in df.columns and not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", kind="stable")
+    return df.reset_index(drop=True)
+
+
+def _leer_csv(ruta: Path, columnas, desde, antes_de) -> pd.DataFrame:
+    usar = None
+    if columnas is not None:
+        # El filtro por anio necesita la marca de tiempo aunque no se pida.
+        usar = list(dict.fromkeys([*columnas, "timestamp"]))
+    df = pd.read_csv(ruta, usecols=usar, parse_dates=["timestamp"], low_memory=False)
+    anio = df["timestamp"].dt.year
+    dentro = pd.Series(True, index=df.index)
+    if desde is not None:
+        dentro &= anio >= desde
+    if antes_de is not None:
+        dentro &= anio < antes_de
+    df = df[dentro]
+    if columnas is not None:
+        df = df[columnas]
+    return df.reset_index(drop=True)
+
+
+def cargar_forecast(
+    icao: str,
+    horizonte: int,
+    *,
+    columnas: list[str] | None = None,
+    desde: int | None = None,
+    antes_de: int | None = None,
+) -> pd.DataFrame | None:
+    """
+    Dataset de pronostico de una estacion; Parquet si existe, si no CSV.
+    None si no hay ninguno.
+
+    Se devuelve con los tipos compactos de features.forecast_features
+    (float32/int8), venga de donde venga: el CSV no guarda tipos y un
+    Parquet antiguo puede estar en float64.
+    """
+    raiz = forecast_parquet(horizonte)
+    if existe(raiz, icao):
+        return compactar(leer(raiz, icao, columnas=columnas, desde=desde, antes_de=antes_de))
+    ruta = forecast_csv(icao, horizonte)
+    if ruta.exists():
+        return compactar(_leer_csv(ruta, columnas, desde, antes_de))
+    return None
+
+
+def existe_forecast(icao: str, horizonte: int) -> bool:
+    return existe(forecast_parquet(horizonte), icao) or forecast_csv(icao, horizonte).exists()
+
+
+def origen_forecast(icao: str, horizonte: int) -> Path | None:
+    """Fichero o directorio del que leeria cargar_forecast (para huellas de cache)."""
+    raiz = forecast_parquet(horizonte)
+    if existe(raiz, icao):
+        return _dir_estacion(raiz, icao)
+    ruta = forecast_csv(icao, horizonte)
+    return ruta if ruta.exists() else None
+
+
+def origen_metar(icao: str, csv: Path | None = None) -> Path | None:
+    """Fichero o directorio del que leeria cargar_metar."""
+    if existe(METAR_PARQUET, icao):
+        return _dir_estacion(METAR_PARQUET, icao)
+    return csv if csv is not None and csv.exists() else None
+
+
+def cargar_metar(
+    icao: str,
+    *,
+    columnas: list[str] | None = None,
+    desde: int | None = None,
+    antes_de: int | None = None,
+    csv: Path | None = None,
+) -> pd.DataFrame | None:
+    """Historico METAR traducido de una estacion; Parquet si existe, si no el CSV indicado."""
+    if existe(METAR_PARQUET, icao):
+        return leer(METAR_PARQUET, icao, columnas=columnas, desde=desde, antes_de=antes_de)
+    if csv is not None and csv.exists():
+        return _leer_csv(csv, columnas, desde, antes_de)
+    return None
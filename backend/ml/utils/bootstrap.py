@@ -0,0 +1,210 @@
+"""
+Intervalos de confianza por bootstrap de bloques (por dia) para las
+metricas de verificacion.
+
+Un "+0.02 sobre la persistencia" no dice nada sin su incertidumbre. Las
+observaciones horarias de un mismo dia estan muy correladas (una niebla
+dura varias horas), asi que remuestrear filas sueltas subestimaria la
+varianza: se remuestrean DIAS enteros.
+
+Remuestrear D dias con reemplazo equivale a darle a cada dia un peso
+(cuantas veces salio), con los pesos de una replica ~ Multinomial(D,
+1/D). En lugar de copiar datos, cada tanda de replicas es una matriz de
+pesos W (replicas x dias):
+
+  - las metricas de tabla de contingencia (CSI, POD, FAR, HSS, F1) y el
+    Brier solo necesitan sumas por dia, asi que salen de un producto
+    W @ agregados_por_dia,
+  - el PR-AUC necesita el orden de los scores: se ordenan una vez y se
+    acumulan los pesos por fila de toda la tanda a la vez.
+
+Las tandas se reparten en un pool de procesos con los arrays por fila en
+memoria compartida. Cada tanda tiene su propia semilla derivada de la
+global (SeedSequence), asi que el resultado no depende del numero de
+procesos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ml.utils import transferencia
+
+# Replicas por tanda: una matriz de pesos por fila de TANDA x n_test
+# float64 ocupa ~TANDA * n * 8 bytes (100 x 30.000 -> 24 MB).
+TANDA = 100
+
+METRICAS = ("pr_auc", "f1", "csi", "pod", "far", "hss", "bss")
+
+
+def _dividir(num, den):
+    return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=den != 0)
+
+
+def agregados_por_dia(y, p, pred, dias: np.ndarray, n_dias: int) -> np.ndarray:
+    """
+    Sumas por dia (columnas): n, positivos, a, b, c, error cuadratico.
+
+    pred es la prediccion binaria (p >= umbral); p la probabilidad.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    pred = np.asarray(pred, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+
+    def suma(w):
+        return np.bincount(dias, weights=w, minlength=n_dias)
+
+    return np.column_stack([
+        np.bincount(dias, minlength=n_dias).astype(np.float64),
+        suma(y),
+        suma(pred * y),              # a: aciertos
+        suma(pred * (1 - y)),        # b: falsas alarmas
+        suma((1 - pred) * y),        # c: fallos
+        suma((p - y) ** 2),
+    ])
+
+
+def metricas_contingencia(totales: np.ndarray) -> dict[str, np.ndarray]:
+    """Metricas de cada replica a partir de sus totales (replicas x 6)."""
+    n, pos, a, b, c, sq = totales.T
+    d = n - a - b - c
+    pod = _dividir(a, a + c)
+    exacto = _dividir(a + d, n)
+    azar = _dividir((a + b) * (a + c) + (c + d) * (b + d), n * n)
+    tasa = _dividir(pos, n)
+    brier_clim = tasa * (1 - tasa)  # Brier de predecir la tasa base, con y binaria
+    return {
+        "f1": _dividir(2 * a, 2 * a + b + c),
+        "csi": _dividir(a, a + b + c),
+        "pod": pod,
+        "far": _dividir(b, a + b),
+        "hss": _dividir(exacto - azar, 1 - azar),
+        "bss": 1 - _dividir(_dividir(sq, n), brier_clim),
+        "tasa_base": tasa,
+    }
+
+
+def pr_auc_ponderado(pesos: np.ndarray, y_orden: np.ndarray, fin_grupo: np.ndarray) -> np.ndarray:
+    """
+    Average precision de cada fila de pesos (replicas x n).
+
+    y_orden son las etiquetas ordenadas por score DEcreciente y fin_grupo
+    el indice de la ultima fila de cada score distinto (los empates
+    cuentan juntos, como en sklearn). Igual que average_precision_score
+    con sample_weight.
+    """
+    tps = np.cumsum(pesos * y_orden, axis=1)[:, fin_grupo]
+    fps = np.cumsum(pesos * (1 - y_orden), axis=1)[:, fin_grupo]
+    precision = _dividir(tps, tps + fps)
+    recall = _dividir(tps, tps[:, -1:])
+    salto = np.diff(recall, axis=1, prepend=0.0)
+    return (salto * precision).sum(axis=1)
+
+
+def _orden(p: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Orden decreciente de p y fin de cada grupo de scores iguales."""
+    orden = np.argsort(-p, kind="stable")
+    p_orden = p[orden]
+    fin_grupo = np.flatnonzero(np.r_[p_orden[1:] != p_orden[:-1], True])
+    return orden, fin_grupo
+
+
+def _metricas(W: np.ndarray, agregados: dict, dias_orden, y_orden, fin_grupo) -> dict[str, np.ndarray]:
+    """Metricas de cada fila de pesos por dia W (replicas x dias)."""
+    resultado = {}
+    for nombre, agr in agregados.items():
+        for metrica, valores in metricas_contingencia(W @ agr).items():
+            resultado[f"{nombre}.{metrica}"] = valores
+    resultado["modelo.pr_auc"] = pr_auc_ponderado(W[:, dias_orden], y_orden, fin_grupo)
+    return resultado
+
+
+def _tanda(semilla, replicas: int, n_dias: int, agregados: dict, por_fila) -> dict[str, np.ndarray]:
+    """Una tanda de replicas (tarea del pool)."""
+    rng = np.random.default_rng(semilla)
+    W = rng.multinomial(n_dias, np.full(n_dias, 1.0 / n_dias), size=replicas).astype(np.float64)
+    return _metricas(W, agregados, *(transferencia.mapear(d) for d in por_fila))
+
+
+def intervalos(
+    y,
+    p,
+    dias,
+    *,
+    umbral: float,
+    referencia=None,
+    replicas: int = 2000,
+    nivel: float = 0.95,
+    procesos: int | None = None,
+    semilla: int = 0,
+) -> dict[str, dict]:
+    """
+    Valor e intervalo de confianza de las metricas del modelo.
+
+    Args:
+        y: observado (0/1) en test.
+        p: probabilidad del modelo.
+        dias: dia de cada fila (cualquier valor agrupable, p. ej. la
+            fecha); es la unidad que se remuestrea.
+        umbral: umbral de decision para las metricas de contingencia.
+        referencia: prediccion binaria de un rival (la persistencia). Si
+            se da, se anaden las diferencias modelo - referencia,
+            calculadas sobre las MISMAS replicas (bootstrap pareado).
+        replicas, nivel: numero de replicas y nivel del intervalo.
+
+    Returns:
+        {metrica: {"valor": ..., "ic": (inf, sup)}} con las metricas de
+        METRICAS y, con referencia, "dif_f1", "dif_csi", "dif_hss" y
+        "dif_pr_auc" (PR-AUC del modelo menos la tasa base, que es el
+        PR-AUC de un pronostico sin score como la persistencia).
+    """
+    y = np.asarray(y)
+    p = np.asarray(p, dtype=np.float64)
+    dias = np.unique(np.asarray(dias), return_inverse=True)[1].ravel()
+    n_dias = int(dias.max()) + 1
+
+    agregados = {"modelo": agregados_por_dia(y, p, p >= umbral, dias, n_dias)}
+    if referencia is not None:
+        ref = np.asarray(referencia, dtype=np.float64)
+        agregados["referencia"] = agregados_por_dia(y, ref, ref, dias, n_dias)
+
+    # Valor puntual: cada dia una vez (W = 1), que es la metrica de siempre.
+    orden, fin_grupo = _orden(p)
+    por_fila = (dias[orden], y[orden].astype(np.float64), fin_grupo)
+    puntual = _metricas(np.ones((1, n_dias)), agregados, *por_fila)
+
+    semillas = np.random.SeedSequence(semilla).spawn(-(-replicas // TANDA))
+    tamanos = [min(TANDA, replicas - i * TANDA) for i in range(len(semillas))]
+    bloques = []
+    try:
+        descriptores = []
+        for arr in por_fila:
+            bloque, descriptor = transferencia.publicar(arr)
+            bloques.append(bloque)
+            descriptores.append(descriptor)
+        with ProcessPoolExecutor(max_workers=procesos or os.cpu_count() or 1) as pool:
+            tandas = list(pool.map(_tanda, semillas, tamanos, [n_dias] * len(semillas),
+                                   [agregados] * len(semillas), [descriptores] * len(semillas)))
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+    muestras = {k: np.concatenate([t[k] for t in tandas]) for k in tandas[0]}
+
+    series = {m: (puntual[f"modelo.{m}"], muestras[f"modelo.{m}"]) for m in METRICAS}
+    if referencia is not None:
+        for m in ("f1", "csi", "hss"):
+            series[f"dif_{m}"] = tuple(
+                fuente[f"modelo.{m}"] - fuente[f"referencia.{m}"] for fuente in (puntual, muestras))
+        series["dif_pr_auc"] = tuple(
+            fuente["modelo.pr_auc"] - fuente["modelo.tasa_base"] for fuente in (puntual, muestras))
+
+    alfa = (1 - nivel) / 2
+    return {
+        nombre: {
+            "valor": float(np.ravel(valor)[0]),
+            "ic": tuple(float(q) for q in np.quantile(muestra, [alfa, 1 - alfa])),
+        }
+        for nombre, (valor, muestra) in series.items()
+    }
+
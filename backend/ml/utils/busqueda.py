@@ -0,0 +1,210 @@
+"""
+Busqueda de hiperparametros del bosque con validacion temporal y
+reduccion a la mitad sucesiva (successive halving).
+
+Piezas puras (pliegues, rondas, frente de Pareto) y la tarea que ejecuta
+cada proceso del pool. El script que las orquesta es
+ml/scripts/tune_forecast.py.
+
+Pliegues: origen movil, siempre ANTES del corte de test. Con corte 2023
+y 3 pliegues se valida en 2020, 2021 y 2022 entrenando con todo lo
+anterior a cada anio; el test (2023-2026) no se toca nunca.
+
+Reduccion a la mitad sucesiva: todas las configuraciones empiezan con
+pocos arboles y una fraccion pequena del entrenamiento; en cada ronda
+sigue solo el mejor 1/eta y el presupuesto (arboles y fraccion) se
+multiplica por eta, hasta que quedan eta o menos, que se evaluan con el
+presupuesto completo.
+
+En la ronda final cada bosque se puntua tambien con sus primeros k
+arboles (el promedio de un prefijo de arboles es exactamente el bosque
+de k arboles), asi que el numero de arboles se explora sin reentrenar.
+
+La latencia NO se mide en el pool: alli los demas procesos siguen
+entrenando y el reloj mediria la contencion de CPU, no el modelo. Los
+finalistas se reentrenan en el proceso principal, con el pool ya
+cerrado y la misma configuracion que sirve la API (crear_modelo, con
+n_jobs=-1), y se cronometran alli (latencias).
+"""
+import copy
+import math
+import statistics
+import time
+from typing import Callable, Sequence
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import average_precision_score
+
+from ml.utils import entrenamiento, transferencia
+
+# Lo que se explora. Los demas hiperparametros (class_weight,
+# random_state) son los de HIPERPARAMETROS_RF.
+ESPACIO = {
+    "max_depth": [8, 12, 15, None],
+    "min_samples_leaf": [5, 20, 50],
+    "max_features": ["sqrt", 0.5],
+}
+
+# Tamanos de bosque que se puntuan en la ronda final.
+PREFIJOS_ARBOLES = (25, 50, 100, 200, 300)
+
+
+def configuraciones(espacio: dict[str, list] = ESPACIO) -> list[dict]:
+    """Producto cartesiano del espacio, en orden estable."""
+    configs = [{}]
+    for nombre, valores in espacio.items():
+        configs = [{**c, nombre: v} for c in configs for v in valores]
+    return configs
+
+
+def pliegues_temporales(anios: np.ndarray, corte: int, n_pliegues: int = 3) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Pliegues de origen movil: (indices de entrenamiento, indices de validacion).
+
+    El pliegue i valida en el anio corte - n_pliegues + i y entrena con
+    todos los anteriores. Los anios >= corte no aparecen en ninguno.
+    """
+    anios = np.asarray(anios)
+    pliegues = []
+    for anio_val in range(corte - n_pliegues, corte):
+        train = np.flatnonzero(anios < anio_val)
+        val = np.flatnonzero(anios == anio_val)
+        if len(train) == 0 or len(val) == 0:
+            raise ValueError(f"no hay datos para validar en {anio_val} con lo anterior")
+        pliegues.append((train, val))
+    return pliegues
+
+
+def n_rondas(n_candidatos: int, eta: int) -> int:
+    """Rondas necesarias para que queden eta candidatos o menos (mas la final)."""
+    rondas = 1
+    while n_candidatos > eta:
+        n_candidatos = math.ceil(n_candidatos / eta)
+        rondas += 1
+    return rondas
+
+
+def presupuesto(ronda: int, rondas: int, eta: int, arboles_max: int, arboles_min: int) -> tuple[int, float]:
+    """(arboles, fraccion del entrenamiento) de una ronda; la ultima usa todo."""
+    factor = float(eta) ** (ronda - (rondas - 1))
+    return max(arboles_min, round(arboles_max * factor)), factor
+
+
+def mitad_sucesiva(
+    candidatos: Sequence[dict],
+    puntuar: Callable[[list[dict], int], list[float]],
+    *,
+    eta: int = 3,
+) -> tuple[list[dict], list[tuple[int, dict, float]]]:
+    """
+    Reduce los candidatos ronda a ronda.
+
+    puntuar(candidatos, ronda) devuelve una puntuacion por candidato (mas
+    es mejor) y es quien decide el presupuesto de cada ronda. Recibe la
+    ronda entera para poder repartirla en paralelo.
+
+    Devuelve los supervivientes de la ultima ronda, ordenados de mejor a
+    peor, y el historial (ronda, candidato, puntuacion).
+    """
+    vivos = list(candidatos)
+    historial = []
+    for ronda in range(n_rondas(len(vivos), eta)):
+        puntos = puntuar(vivos, ronda)
+        historial += [(ronda, c, p) for c, p in zip(vivos, puntos)]
+        # sorted es estable: a igualdad sigue el orden original.
+        orden = sorted(range(len(vivos)), key=lambda i: -puntos[i])
+        if len(vivos) > eta:
+            orden = orden[:math.ceil(len(vivos) / eta)]
+        vivos = [vivos[i] for i in orden]
+    return vivos, historial
+
+
+def frente_pareto(puntos: list[dict], *, mayor: str = "pr_auc", menor: str = "latencia_ms") -> list[dict]:
+    """
+    Puntos no dominados: ningun otro es a la vez mejor (o igual) en
+    'mayor' y mas rapido (o igual) en 'menor', y estrictamente mejor en
+    alguno. Ordenados de mas rapido a mas lento.
+    """
+    frente = []
+    mejor = -math.inf
+    for p in sorted(puntos, key=lambda p: (p[menor], -p[mayor])):
+        if p[mayor] > mejor:
+            frente.append(p)
+            mejor = p[mayor]
+    return frente
+
+
+def _bosque_prefijo(modelo: RandomForestClassifier, k: int) -> RandomForestClassifier:
+    prefijo = copy.copy(modelo)
+    prefijo.estimators_ = modelo.estimators_[:k]
+    prefijo.n_estimators = k
+    return prefijo
+
+
+def latencia_ms(modelo, X: np.ndarray, repeticiones: int = 30) -> float:
+    """Mediana del tiempo de predict_proba sobre X (con una fila, como en la API)."""
+    modelo.predict_proba(X)  # la primera llamada paga la importacion perezosa
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        modelo.predict_proba(X)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def latencias(
+    config: dict,
+    arboles: int,
+    X: np.ndarray,
+    y: np.ndarray,
+    fila: np.ndarray,
+    prefijos: Sequence[int] = (),
+) -> dict[int, float]:
+    """
+    Latencia de una fila de cada prefijo de arboles de una configuracion.
+
+    Se entrena con crear_modelo("rf"), el mismo estimador (y n_jobs) que
+    sirve la API, y se cronometra en el proceso que llama: hay que
+    llamarla sin otros entrenamientos en marcha.
+    """
+    modelo = entrenamiento.crear_modelo("rf").set_params(**config, n_estimators=arboles).fit(X, y)
+    return {k: latencia_ms(_bosque_prefijo(modelo, k), fila) for k in (prefijos or (arboles,)) if k <= arboles}
+
+
+def evaluar_pliegue(
+    config: dict,
+    arboles: int,
+    fraccion: float,
+    train: np.ndarray,
+    val: np.ndarray,
+    datos: tuple[transferencia.Descriptor, transferencia.Descriptor],
+    *,
+    prefijos: Sequence[int] = (),
+    semilla: int = 42,
+) -> dict:
+    """
+    Entrena una configuracion en un pliegue y la puntua (tarea del pool).
+
+    La fraccion se toma como prefijo de una permutacion fija, asi que la
+    muestra de una ronda contiene a la de la anterior. Con prefijos, se
+    puntua tambien cada bosque de los primeros k arboles.
+    """
+    X, y = transferencia.mapear(datos[0]), transferencia.mapear(datos[1])
+    if fraccion < 1:
+        orden = np.random.default_rng(semilla).permutation(len(train))
+        train = np.sort(train[orden[:max(1, round(len(train) * fraccion))]])
+
+    params = {**entrenamiento.HIPERPARAMETROS_RF, **config, "n_estimators": arboles}
+    modelo = RandomForestClassifier(**params, n_jobs=1).fit(X[train], y[train])
+
+    X_val, y_val = X[val], y[val]
+    resultado = {"pr_auc": float(average_precision_score(y_val, modelo.predict_proba(X_val)[:, 1]))}
+    if prefijos:
+        # Una sola pasada por los arboles: el bosque de k arboles promedia
+        # los k primeros.
+        acumulada = np.cumsum([t.predict_proba(X_val)[:, 1] for t in modelo.estimators_], axis=0)
+        resultado["por_arboles"] = {
+            k: float(average_precision_score(y_val, acumulada[k - 1] / k)) for k in prefijos if k <= arboles
+        }
+    return resultado
@@ -0,0 +1,163 @@
+"""
+Cache de datasets derivados, direccionada por contenido.
+
+Construir los datasets de pronostico y evaluar el modelo legado
+recalculan las mismas features una y otra vez a partir de los mismos
+historicos. Aqui cada dataset derivado se guarda bajo una clave que
+resume TODO lo que lo determina:
+
+  - la huella (sha256) del contenido de los ficheros de origen,
+  - la huella del codigo que calcula las features (por defecto
+    features/forecast_features.py, features/wx_codes.py y
+    features/defaults.py),
+  - los parametros (estacion, horizonte, ...).
+
+No hay que invalidar nada a mano: si cambia el origen, el codigo o un
+parametro, cambia la clave y la entrada vieja simplemente deja de
+encontrarse. Cada entrada declara de que codigo depende, asi que tocar
+defaults.py solo invalida las que lo usan.
+
+Las entradas se guardan en formato Arrow IPC sin comprimir y se leen con
+memory-map: el sistema operativo pagina los datos bajo demanda, sin
+parseo ni descompresion.
+
+    data/cache/<nombre>/<ranura>-<clave>.arrow
+
+'ranura' resume solo los parametros; al escribir una entrada nueva se
+borran las demas de la misma ranura, que por construccion ya son
+obsoletas.
+
+Solo se cachea lo que cuesta calcular (el historico preparado de
+build_forecast_dataset, las features de evaluate_model). Los datasets de
+pronostico finales ya estan en Parquet y se leen con ml/utils/almacen.py
+directamente: copiarlos aqui duplicaria el disco, obligaria a hashear el
+origen entero en cada proceso y perderia la lectura por columnas y anios.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+
+import pandas as pd
+
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    ARROW_DISPONIBLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    ARROW_DISPONIBLE = False
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+CACHE_DIR = BACKEND_DIR / "data" / "cache"
+
+# Codigo del que dependen las features de pronostico. wx_codes entra
+# porque add_forecast_features lo usa para precip_intensidad.
+CODIGO_FEATURES = [
+    BACKEND_DIR / "features" / "forecast_features.py",
+    BACKEND_DIR / "features" / "wx_codes.py",
+    BACKEND_DIR / "features" / "defaults.py",
+]
+
+# Huellas ya calculadas en este proceso, por (ruta, tamano, mtime). Un
+# CSV de cientos de MB tarda en hashearse; si no cambio no se repite.
+_huellas: dict[tuple, str] = {}
+_huellas_lock = threading.Lock()
+
+
+def _ficheros(ruta: Path) -> list[Path]:
+    if ruta.is_dir():
+        return sorted(p for p in ruta.rglob("*") if p.is_file())
+    return [ruta]
+
+
+def huella(ruta: Path) -> str:
+    """sha256 del contenido de un fichero, o de todos los de un directorio."""
+    total = hashlib.sha256()
+    for fichero in _ficheros(ruta):
+        estado = fichero.stat()
+        memo = (str(fichero.resolve()), estado.st_size, estado.st_mtime_ns)
+        with _huellas_lock:
+            digest = _huellas.get(memo)
+        if digest is None:
+            h = hashlib.sha256()
+            with fichero.open("rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    h.update(bloque)
+            digest = h.hexdigest()
+            with _huellas_lock:
+                _huellas[memo] = digest
+        # En un directorio cuenta tambien la estructura (particiones).
+        total.update(str(fichero.relative_to(ruta) if ruta.is_dir() else "").encode())
+        total.update(digest.encode())
+    return total.hexdigest()
+
+
+def _resumen(datos) -> str:
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def clave(*, fuentes: Iterable[Path], codigo: Iterable[Path], params: dict) -> str:
+    """Clave de una entrada. Solo depende del contenido, no de rutas ni fechas."""
+    return _resumen({
+        "fuentes": [huella(Path(f)) for f in fuentes],
+        "codigo": sorted(huella(Path(c)) for c in codigo),
+        "params": params,
+    })
+
+
+def leer(ruta: Path) -> pd.DataFrame:
+    """Lee una entrada con memory-map."""
+    with pa.memory_map(str(ruta), "r") as fuente:
+        tabla = ipc.open_file(fuente).read_all()
+    return tabla.to_pandas(split_blocks=True)
+
+
+def escribir(df: pd.DataFrame, ruta: Path) -> None:
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(temporal), "wb") as destino:
+        with ipc.new_file(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    # Escritura atomica: dos procesos que construyen la misma entrada no
+    # dejan un fichero a medias.
+    temporal.replace(ruta)
+
+
+def obtener(
+    nombre: str,
+    construir: Callable[[], pd.DataFrame | None],
+    *,
+    fuentes: Iterable[Path],
+    codigo: Iterable[Path] = CODIGO_FEATURES,
+    params: dict | None = None,
+    raiz: Path | None = None,
+) -> pd.DataFrame | None:
+    """
+    Devuelve el dataset derivado de la cache, o lo construye y lo guarda.
+
+    Sin pyarrow se limita a llamar a construir(): la cache es una
+    optimizacion, nunca un requisito.
+    """
+    if not ARROW_DISPONIBLE:
+        return construir()
+
+    params = params or {}
+    directorio = (raiz or CACHE_DIR) / nombre
+    ranura = _resumen(params)
+    ruta = directorio / f"{ranura}-{clave(fuentes=fuentes, codigo=codigo, params=params)}.arrow"
+    if ruta.exists():
+        return leer(ruta)
+
+    df = construir()
+    if df is None:
+        return None
+    escribir(df, ruta)
+    for obsoleta in directorio.glob(f"{ranura}-*.arrow"):
+        if obsoleta != ruta:
+            obsoleta.unlink(missing_ok=True)
+    return df
+
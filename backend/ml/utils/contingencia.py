@@ -0,0 +1,108 @@
+"""
+Tabla de contingencia para todos los umbrales de una pasada.
+
+Elegir un umbral (max CSI, max F1) o trazar la envolvente POD/FAR
+obligaba a recalcular la tabla a/b/c/d entera para cada umbral
+candidato: O(n) por umbral. Aqui se ordenan los scores una vez y, con
+sumas acumuladas, se obtiene la tabla de cualquier numero de umbrales
+en O(n log n) total:
+
+    k(u) = numero de scores < u          (busqueda binaria)
+    a(u) = positivos - positivos entre los k primeros
+    b(u) = (n - k) - a
+    c(u) = positivos - a
+    d(u) = negativos - b
+
+Las metricas se calculan con las mismas formulas (y el mismo criterio
+de division por cero) que verify_forecast.contingencia, asi que los
+resultados son identicos a los de umbral a umbral.
+
+Lo usan verify_forecast, train_forecast y calibrate_forecast.
+"""
+import numpy as np
+
+
+def _dividir(num, den) -> np.ndarray:
+    """num / den, y 0.0 donde den es 0 (como el 'if ... else 0.0' escalar)."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    return np.divide(num, den, out=np.zeros(np.broadcast(num, den).shape), where=den != 0)
+
+
+def curva(y, p, umbrales=None) -> dict[str, np.ndarray]:
+    """
+    Tabla de contingencia y metricas OMM para cada umbral (pred = p >= u).
+
+    Args:
+        y: observado (0/1).
+        p: score o probabilidad.
+        umbrales: umbrales a evaluar; por defecto cada valor distinto de
+            p, en orden creciente (la curva completa).
+
+    Returns:
+        dict de arrays alineados con 'umbral': a, b, c, d, POD, FAR, SR,
+        CSI, Bias, HSS, PSS, POFD.
+    """
+    y = np.asarray(y).astype(bool)
+    p = np.asarray(p)
+    orden = np.argsort(p, kind="stable")
+    p_orden = p[orden]
+    # positivos_antes[k] = positivos entre los k scores mas bajos.
+    positivos_antes = np.concatenate([[0], np.cumsum(y[orden], dtype=np.int64)])
+
+    if umbrales is None:
+        umbrales = np.unique(p_orden)
+    umbrales = np.asarray(umbrales)
+
+    n = len(y)
+    positivos = int(positivos_antes[-1])
+    negativos = n - positivos
+    k = np.searchsorted(p_orden, umbrales, side="left")
+
+    a = positivos - positivos_antes[k]
+    b = (n - k) - a
+    c = positivos - a
+    d = negativos - b
+
+    pod = _dividir(a, a + c)
+    pofd = _dividir(b, b + d)
+    exacto = (a + d) / n if n else np.zeros(len(umbrales))
+    azar = ((a + b) * (a + c) + (c + d) * (b + d)) / (n * n) if n else np.zeros(len(umbrales))
+    return {
+        "umbral": umbrales,
+        "a": a, "b": b, "c": c, "d": d,
+        "POD": pod,
+        "FAR": _dividir(b, a + b),
+        "SR": _dividir(a, a + b),
+        "CSI": _dividir(a, a + b + c),
+        "Bias": _dividir(a + b, a + c),
+        "HSS": _dividir(exacto - azar, 1 - azar),
+        "PSS": pod - pofd,
+        "POFD": pofd,
+    }
+
+
+def punto(c: dict[str, np.ndarray], i: int) -> dict:
+    """Fila i de una curva como dict escalar (el formato de contingencia())."""
+    return {k: (int(v[i]) if k in "abcd" else float(v[i])) for k, v in c.items() if k != "umbral"}
+
+
+def umbral_optimo(y, p, metrica: str = "CSI", umbrales=None) -> float:
+    """Umbral que maximiza la metrica; a igualdad, el primero (el mas bajo)."""
+    c = curva(y, p, umbrales)
+    return c["umbral"][int(np.argmax(c[metrica]))]
+
+
+def umbral_optimo_f1(y, p) -> float:
+    """
+    Umbral que maximiza F1 sobre todos los scores distintos.
+
+    Mismo resultado que tomar el maximo de F1 de precision_recall_curve:
+    F1 se calcula con la misma formula (2PR / (P + R)), asi que los
+    empates se resuelven igual, a favor del umbral mas bajo.
+    """
+    c = curva(y, p)
+    precision = c["SR"]
+    recall = c["POD"]
+    f1 = _dividir(2 * precision * recall, precision + recall)
+    return float(c["umbral"][int(np.argmax(f1))])
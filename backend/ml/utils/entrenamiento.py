@@ -0,0 +1,202 @@
+"""
+Entrenamiento comun del bosque de pronostico, con cache de modelos.
+
+transfer_matrix, evaluate_transfer y make_figures reentrenaban en cada
+ejecucion los mismos bosques de 300 arboles sobre los mismos datos, y
+las figuras volvian a hacerlo por aeropuerto. Aqui se entrena una vez y
+el modelo ajustado se guarda en disco bajo una clave formada por:
+
+  - los hiperparametros (y la version de scikit-learn, porque un pickle
+    de otra version no es fiable),
+  - la huella de los datos de entrenamiento (blake2b de X e y),
+  - una etiqueta del tramo (p. ej. 'SKBO h3 anio<2023'), que no cambia
+    el resultado pero hace legible el directorio y evita colisiones
+    entre usos distintos de los mismos datos.
+
+Si los datos o los hiperparametros cambian, la clave cambia y se
+entrena de nuevo; si no, el modelo sale del disco en milisegundos. n_jobs
+no forma parte de la clave: con random_state fijo el bosque es el mismo
+se entrene con los nucleos que se entrene.
+
+    data/cache/modelos/<tramo>-<clave>.joblib
+
+Como en ml/utils/cache_features.py, al guardar un modelo nuevo se borran
+los demas del mismo tramo: son de datos o hiperparametros anteriores y
+ya no se van a pedir.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+MODELOS_DIR = BACKEND_DIR / "data" / "cache" / "modelos"
+
+# Los hiperparametros del modelo de pronostico, en un unico sitio.
+HIPERPARAMETROS_RF = {
+    "n_estimators": 300,
+    "max_depth": 15,
+    "min_samples_leaf": 20,
+    "class_weight": "balanced",
+    "random_state": 42,
+}
+
+# Alternativa con gradient boosting por histogramas: arboles someros
+# construidos sobre features discretizadas en 255 intervalos. El
+# artefacto ocupa una fraccion del bosque y predice mas rapido.
+HIPERPARAMETROS_HGB = {
+    "max_iter": 300,
+    "learning_rate": 0.05,
+    "max_leaf_nodes": 31,
+    "min_samples_leaf": 20,
+    "l2_regularization": 1.0,
+    "class_weight": "balanced",
+    # Sin parada temprana: su tramo de validacion seria aleatorio, no
+    # temporal, y el resultado dependeria de el.
+    "early_stopping": False,
+    "random_state": 42,
+}
+
+# Nombre corto (el de --motor y settings.FORECAST_ENGINE) -> familia.
+MOTORES = ("rf", "hgb")
+
+
+def crear_modelo(motor: str = "rf", *, n_jobs: int = -1):
+    """Estimador sin entrenar de la familia indicada, con sus hiperparametros."""
+    if motor == "rf":
+        return RandomForestClassifier(**HIPERPARAMETROS_RF, n_jobs=n_jobs)
+    if motor == "hgb":
+        # HGB paraleliza con OpenMP por su cuenta; no tiene n_jobs.
+        return HistGradientBoostingClassifier(**HIPERPARAMETROS_HGB)
+    raise ValueError(f"Motor desconocido: {motor!r} (opciones: {', '.join(MOTORES)})")
+
+
+# Alumnos del nivel rapido (ml/scripts/distill_forecast.py): modelos
+# pequenos que imitan las probabilidades calibradas del modelo completo.
+# Sin class_weight: aprenden probabilidades, no a ordenar la clase rara.
+HIPERPARAMETROS_ALUMNO_HGB = {
+    "max_depth": 3,
+    "max_iter": 100,
+    "learning_rate": 0.1,
+    "early_stopping": False,
+    "random_state": 42,
+}
+
+ALUMNOS = ("hgb", "logistica")
+
+
+def crear_alumno(tipo: str = "hgb"):
+    """Estimador sin entrenar para destilar el nivel rapido."""
+    if tipo == "hgb":
+        return HistGradientBoostingClassifier(**HIPERPARAMETROS_ALUMNO_HGB)
+    if tipo == "logistica":
+        # La regresion logistica no admite huecos; el bosque si.
+        return make_pipeline(SimpleImputer(strategy="median"), StandardScaler(),
+                             LogisticRegression(max_iter=1000))
+    raise ValueError(f"Alumno desconocido: {tipo!r} (opciones: {', '.join(ALUMNOS)})")
+
+
+def destilar(alumno, X, p_profesor):
+    """
+    Entrena el alumno con las probabilidades del profesor como objetivo.
+
+    Entropia cruzada con etiquetas blandas: cada fila entra dos veces,
+    como positiva con peso p y como negativa con peso 1 - p, y el
+    clasificador minimiza exactamente -p log q - (1 - p) log (1 - q).
+    """
+    X = np.asarray(X)
+    p = np.asarray(p_profesor, dtype=np.float64)
+    n = len(X)
+    pesos = {"sample_weight": np.concatenate([p, 1.0 - p])}
+    if hasattr(alumno, "steps"):
+        # En un Pipeline el peso va al ultimo paso.
+        pesos = {f"{alumno.steps[-1][0]}__sample_weight": pesos["sample_weight"]}
+    y = np.concatenate([np.ones(n, dtype=np.int8), np.zeros(n, dtype=np.int8)])
+    return alumno.fit(np.vstack([X, X]), y, **pesos)
+
+
+def huella_datos(X, y) -> str:
+    """Huella del contenido de (X, y), independiente de como se construyeron."""
+    h = hashlib.blake2b(digest_size=16)
+    for arr in (np.ascontiguousarray(X), np.ascontiguousarray(y)):
+        h.update(str((arr.shape, arr.dtype.str)).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def clave_modelo(X, y, *, split: str, params: dict) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(
+        {"params": params, "sklearn": sklearn.__version__, "split": split},
+        sort_keys=True,
+    ).encode())
+    h.update(huella_datos(X, y).encode())
+    return h.hexdigest()
+
+
+def _tramo(split: str) -> str:
+    """Etiqueta del tramo apta para nombre de fichero (sin '-')."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", split).strip("_")
+
+
+def ruta_modelo(X, y, *, split: str, params: dict | None = None, raiz: Path | None = None) -> Path:
+    """Donde guarda (o buscaria) entrenar_rf el modelo de estos datos."""
+    params = {**HIPERPARAMETROS_RF, **(params or {})}
+    return (raiz or MODELOS_DIR) / f"{_tramo(split)}-{clave_modelo(X, y, split=split, params=params)}.joblib"
+
+
+def entrenar_rf(
+    X,
+    y,
+    *,
+    split: str,
+    params: dict | None = None,
+    n_jobs: int = -1,
+    cache: bool = True,
+    raiz: Path | None = None,
+    ruta: Path | None = None,
+) -> RandomForestClassifier:
+    """
+    Entrena (o recupera de la cache) el bosque de pronostico.
+
+    Args:
+        X, y: datos de entrenamiento.
+        split: etiqueta del tramo, p. ej. 'SKBO h3 anio<2023'.
+        params: hiperparametros; por defecto HIPERPARAMETROS_RF.
+        n_jobs: nucleos para entrenar y para predecir despues.
+        cache: False para forzar el reentrenamiento sin tocar el disco.
+        ruta: la de ruta_modelo con estos mismos argumentos, si el
+            llamador ya la tiene (evita hashear X e y otra vez).
+    """
+    params = {**HIPERPARAMETROS_RF, **(params or {})}
+    if not cache:
+        return RandomForestClassifier(**params, n_jobs=n_jobs).fit(X, y)
+
+    if ruta is None:
+        ruta = ruta_modelo(X, y, split=split, params=params, raiz=raiz)
+    if ruta.exists():
+        modelo = joblib.load(ruta)
+        modelo.set_params(n_jobs=n_jobs)
+        return modelo
+
+    modelo = RandomForestClassifier(**params, n_jobs=n_jobs).fit(X, y)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # Escritura atomica: dos procesos entrenando lo mismo no dejan un
+    # pickle a medias.
+    temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+    joblib.dump(modelo, temporal)
+    temporal.replace(ruta)
+    for obsoleto in ruta.parent.glob(f"{_tramo(split)}-*.joblib"):
+        if obsoleto != ruta:
+            obsoleto.unlink(missing_ok=True)
+    return modelo
@@ -0,0 +1,116 @@
+"""
+Evaluacion en paralelo de la matriz de transferencia NxN.
+
+transfer_matrix puntuaba los N^2 pares (modelo de A, test de B) uno
+detras de otro, y cada predict_proba pedia todos los nucleos
+(n_jobs=-1): lanzar varias evaluaciones a la vez solo servia para
+pelearse por la CPU. Aqui el trabajo se reparte asi:
+
+  - los N modelos locales se entrenan una sola vez (y quedan en la cache
+    de ml/utils/entrenamiento.py); a los procesos solo viaja su ruta,
+  - las matrices de test se publican una vez en memoria compartida
+    (multiprocessing.shared_memory): cada proceso las mapea, no las
+    copia ni las recibe serializadas,
+  - cada par es una tarea de un pool de procesos que predice con un solo
+    nucleo, y los resultados se devuelven segun terminan.
+
+Asi el tiempo total escala con los nucleos disponibles y no con N^2.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Callable
+
+import joblib
+import numpy as np
+from sklearn.metrics import average_precision_score
+
+# (nombre del bloque, forma, dtype): lo que necesita un proceso para
+# mapear un array publicado.
+Descriptor = tuple[str, tuple[int, ...], str]
+
+# Estado de cada proceso del pool: modelos ya cargados y bloques ya
+# mapeados, para no repetirlo en cada par.
+_modelos: dict[str, object] = {}
+_vistas: dict[str, tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+def publicar(arr: np.ndarray) -> tuple[shared_memory.SharedMemory, Descriptor]:
+    """Copia arr a un bloque de memoria compartida (la unica copia que se hace)."""
+    arr = np.ascontiguousarray(arr)
+    bloque = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=bloque.buf)[...] = arr
+    return bloque, (bloque.name, arr.shape, arr.dtype.str)
+
+
+def mapear(descriptor: Descriptor) -> np.ndarray:
+    """Vista de solo lectura sobre un bloque publicado, sin copiarlo."""
+    nombre, forma, dtype = descriptor
+    if nombre not in _vistas:
+        bloque = shared_memory.SharedMemory(name=nombre)
+        vista = np.ndarray(forma, dtype=np.dtype(dtype), buffer=bloque.buf)
+        vista.flags.writeable = False
+        _vistas[nombre] = (bloque, vista)
+    return _vistas[nombre][1]
+
+
+def _modelo(ruta: str):
+    if ruta not in _modelos:
+        modelo = joblib.load(ruta)
+        # Un nucleo por tarea: el paralelismo lo pone el pool.
+        modelo.set_params(n_jobs=1)
+        _modelos[ruta] = modelo
+    return _modelos[ruta]
+
+
+def puntuar_par(origen: str, ruta: str, destino: str, X: Descriptor, y: Descriptor):
+    """PR-AUC del modelo guardado en ruta sobre el test publicado de destino."""
+    p = _modelo(ruta).predict_proba(mapear(X))[:, 1]
+    return origen, destino, float(average_precision_score(mapear(y), p))
+
+
+def evaluar_pares(
+    rutas: dict[str, Path],
+    tests: dict[str, tuple[np.ndarray, np.ndarray]],
+    *,
+    procesos: int | None = None,
+    al_terminar: Callable[[str, str, float], None] | None = None,
+) -> dict[tuple[str, str], float]:
+    """
+    PR-AUC de cada modelo sobre cada test: {(origen, destino): pr_auc}.
+
+    Args:
+        rutas: modelo ajustado (joblib) de cada aeropuerto de origen.
+        tests: (X, y) de cada aeropuerto de destino.
+        procesos: tamano del pool; por defecto, los nucleos disponibles.
+        al_terminar: se llama con (origen, destino, pr_auc) segun va
+            terminando cada par, en el orden en que terminan.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    bloques = []
+    try:
+        publicados = {}
+        for icao, (X, y) in tests.items():
+            bx, dx = publicar(np.asarray(X, dtype=np.float32))
+            by, dy = publicar(np.asarray(y))
+            bloques += [bx, by]
+            publicados[icao] = (dx, dy)
+
+        matriz = {}
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = [
+                pool.submit(puntuar_par, origen, str(ruta), destino, *publicados[destino])
+                for origen, ruta in rutas.items()
+                for destino in tests
+            ]
+            for futuro in as_completed(futuros):
+                origen, destino, pr = futuro.result()
+                matriz[(origen, destino)] = pr
+                if al_terminar is not None:
+                    al_terminar(origen, destino, pr)
+        return matriz
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
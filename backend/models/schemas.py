@@ -268,6 +268,11 @@ class ForecastResponse(BaseModel):
     condicion_actual: str = Field(..., description="Condición meteorológica actual")
     es_adverso_ahora: bool = Field(..., description="Si ya hay niebla o tormenta ahora mismo")
     modelo_calibrado: bool = Field(..., description="Si la probabilidad proviene de un modelo calibrado")
+    motor: Optional[str] = Field(None, description="Familia del modelo: rf (RandomForest) o hgb (HistGradientBoosting)")
+    tier: str = Field("full", description="Nivel de servicio: full (modelo calibrado) o fast (alumno destilado)")
+    metricas_validacion: Optional[Dict[str, Any]] = Field(
+        None, description="Métricas de validación (test temporal) de ambos niveles, si hay nivel fast"
+    )
     metar: str = Field(..., description="METAR crudo usado")
     observacion: Optional[str] = Field(None, description="Hora de la observación METAR (UTC)")
     features_imputadas: List[str] = Field(default=[], description="Variables estimadas por no venir en el METAR")
@@ -284,6 +289,13 @@ class ForecastResponse(BaseModel):
             "condicion_actual": "niebla",
             "es_adverso_ahora": True,
             "modelo_calibrado": True,
+            "motor": "rf",
+            "tier": "full",
+            "metricas_validacion": {
+                "periodo": "test >= 2023",
+                "full": {"motor": "rf", "pr_auc": 0.318, "brier": 0.0361, "ece": 0.008, "ms_1_fila": 18.5},
+                "fast": {"motor": "hgb", "pr_auc": 0.309, "brier": 0.0364, "ece": 0.009, "ms_1_fila": 0.41}
+            },
             "metar": "METAR SKBO 230600Z 00000KT 0500 FG OVC002 11/11 Q1027",
             "observacion": "2026-07-23T06:00:00+00:00",
             "features_imputadas": ["turbulencia", "estado_pista"],
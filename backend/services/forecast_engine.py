@@ -0,0 +1,403 @@
+"""
+Motores de inferencia del pronostico.
+
+ForecastService solo necesita tres cosas de un modelo: cargarlo,
+pedirle predict_proba y saber que es (familia, si esta calibrado,
+tamano del artefacto). Aqui se define esa interfaz y la implementacion
+para cualquier estimador de scikit-learn guardado con joblib
+(RandomForest, HistGradientBoosting, o cualquiera de ellos envuelto en
+CalibratedClassifierCV). Otro formato de artefacto solo tiene que
+registrar su clase en MOTORES por extension de fichero.
+
+La calibracion se sirve sin CalibratedClassifierCV: calibrate_forecast
+exporta el mapa de calibracion a un .npz pequeno (los puntos de la
+isotonica o los coeficientes de Platt) junto al modelo base sin
+envoltorio, y MotorCalibrado lo aplica con NumPy. Da las mismas
+probabilidades que el envoltorio, con menos carga y menos coste por
+llamada.
+
+El bosque tambien puede servirse sin scikit-learn: compactar_bosque lo
+exporta a un unico .npy de nodos con umbrales float32, indices int32 y
+hojas float32/float16, que se carga con np.load en modo mmap (sin
+deserializar nada) y se recorre con NumPy. exportar_bosque comprueba al
+exportar que las probabilidades no cambian mas de una tolerancia
+declarada.
+
+Vive en services/ y no en models/ porque models/__init__ importa la
+capa de base de datos, y los scripts de entrenamiento (que usan
+nombre_artefacto para guardar) no deben arrastrarla.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+from scipy.special import expit
+
+# Familias que sabe entrenar ml/utils/entrenamiento.py, por su nombre
+# corto en la linea de comandos y en la configuracion.
+FAMILIAS = {
+    "rf": "RandomForestClassifier",
+    "hgb": "HistGradientBoostingClassifier",
+    "logistica": "LogisticRegression",  # solo como alumno del nivel rapido
+}
+
+# Sufijo del modelo destilado del nivel rapido (tier=fast).
+RAPIDO = "rapido"
+
+
+def nombre_artefacto(icao: str, horizonte: int, motor: str = "rf", *, calibrado: bool = False,
+                     extension: str = ".pkl") -> str:
+    """
+    Nombre del fichero de un modelo de pronostico en models/forecast/.
+
+    El bosque conserva los nombres de siempre (forecast_skbo_h3.pkl);
+    las demas familias llevan su sufijo (forecast_skbo_h3_hgb.pkl), y el
+    alumno del nivel rapido el suyo (motor=RAPIDO: forecast_skbo_h3_rapido.pkl).
+    """
+    nombre = f"forecast_{icao.lower()}_h{horizonte}"
+    if motor != "rf":
+        nombre += f"_{motor}"
+    if calibrado:
+        nombre += "_calibrado"
+    return nombre + extension
+
+
+class MotorPronostico(ABC):
+    """Un modelo de pronostico listo para servir."""
+
+    def __init__(self, ruta: Optional[Path] = None):
+        self.ruta = Path(ruta) if ruta is not None else None
+
+    @classmethod
+    @abstractmethod
+    def cargar(cls, ruta: Path) -> "MotorPronostico":
+        """Lee el artefacto del disco."""
+
+    @abstractmethod
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Matriz (n, 2) de probabilidades, como en scikit-learn."""
+
+    @abstractmethod
+    def metadatos(self) -> Dict[str, Any]:
+        """Familia, calibracion y tamano; lo que se informa en las respuestas."""
+
+    def _tamano(self) -> Optional[int]:
+        return self.ruta.stat().st_size if self.ruta is not None and self.ruta.exists() else None
+
+
+class MotorSklearn(MotorPronostico):
+    """Cualquier clasificador de scikit-learn con predict_proba."""
+
+    def __init__(self, modelo, ruta: Optional[Path] = None):
+        super().__init__(ruta)
+        self.modelo = modelo
+
+    @classmethod
+    def cargar(cls, ruta: Path) -> "MotorSklearn":
+        return cls(joblib.load(ruta), ruta)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.modelo.predict_proba(X)
+
+    def _base(self):
+        """El estimador de debajo de la calibracion, si la hay."""
+        calibradores = getattr(self.modelo, "calibrated_classifiers_", None)
+        if not calibradores:
+            # En un Pipeline (imputar, escalar, modelo) cuenta el ultimo paso.
+            return self.modelo.steps[-1][1] if hasattr(self.modelo, "steps") else self.modelo
+        base = calibradores[0].estimator
+        # FrozenEstimator guarda el modelo ya entrenado en .estimator.
+        return getattr(base, "estimator", base)
+
+    def metadatos(self) -> Dict[str, Any]:
+        base = self._base()
+        clase = type(base).__name__
+        familia = next((corto for corto, nombre in FAMILIAS.items() if nombre == clase), clase)
+        return {
+            "familia": familia,
+            "clase": clase,
+            "calibrado": bool(getattr(self.modelo, "calibrated_classifiers_", None)),
+            "n_features": getattr(base, "n_features_in_", None),
+            "tamano_bytes": self._tamano(),
+        }
+
+
+def exportar_calibracion(calibrado) -> Dict[str, np.ndarray]:
+    """
+    Mapa de calibracion de un CalibratedClassifierCV binario, en arrays.
+
+    CalibratedClassifierCV promedia un calibrador por pliegue. Con
+    isotonica, la media de funciones lineales a trozos es otra funcion
+    lineal a trozos con la union de los puntos de corte, asi que se
+    guarda como una sola tabla para np.interp. Con Platt la media de
+    sigmoides no es una sigmoide, y se guardan los coeficientes (a, b)
+    de cada pliegue.
+    """
+    calibradores = [c.calibrators[0] for c in calibrado.calibrated_classifiers_]
+    base = calibrado.calibrated_classifiers_[0].estimator
+    # La misma preferencia que CalibratedClassifierCV: decision_function
+    # si existe (HGB), si no predict_proba (bosque).
+    entrada = "decision_function" if hasattr(base, "decision_function") else "predict_proba"
+    mapa = {"entrada": np.array(entrada)}
+    if calibrado.method == "isotonic":
+        x = np.unique(np.concatenate([c.X_thresholds_ for c in calibradores]))
+        y = np.mean([np.interp(x, c.X_thresholds_, c.y_thresholds_) for c in calibradores], axis=0)
+        mapa.update(metodo=np.array("isotonic"), x=x, y=y)
+    else:
+        mapa.update(metodo=np.array("sigmoid"),
+                    a=np.array([c.a_ for c in calibradores], dtype=np.float64),
+                    b=np.array([c.b_ for c in calibradores], dtype=np.float64))
+    return mapa
+
+
+def guardar_calibrado(calibrado, directorio: Path, icao: str, horizonte: int, motor: str = "rf", *,
+                      control: Optional[np.ndarray] = None, tolerancia: Optional[float] = None) -> Path:
+    """
+    Guarda un CalibratedClassifierCV como modelo base + mapa .npz.
+
+    Con filas de control, un bosque base se guarda compacto (.npy, ver
+    exportar_bosque) comprobado sobre ellas, ya con la calibracion
+    aplicada; si no cumple la tolerancia se lanza ValueError y no se
+    escribe nada. Sin control, el base va con joblib (.pkl). Devuelve la
+    ruta del .npz, que es la que se carga para servir.
+    """
+    base = calibrado.calibrated_classifiers_[0].estimator
+    base = getattr(base, "estimator", base)  # FrozenEstimator
+    ruta = Path(directorio) / nombre_artefacto(icao, horizonte, motor, calibrado=True, extension=".npz")
+    mapa = exportar_calibracion(calibrado)
+    if control is not None and type(base).__name__ == FAMILIAS["rf"]:
+        ruta_base = exportar_bosque(base, ruta.with_name(f"{ruta.stem}_base.npy"), control,
+                                    tolerancia=tolerancia, calibracion=mapa)
+    else:
+        ruta_base = ruta.with_name(f"{ruta.stem}_base.pkl")
+        joblib.dump(base, ruta_base)
+    np.savez(ruta, base=np.array(ruta_base.name), **mapa)
+    return ruta
+
+
+class MotorCalibrado(MotorPronostico):
+    """Modelo base de scikit-learn + mapa de calibracion aplicado con NumPy."""
+
+    def __init__(self, base, mapa: Dict[str, np.ndarray], ruta: Optional[Path] = None,
+                 ruta_base: Optional[Path] = None):
+        super().__init__(ruta)
+        self.base = base
+        self.ruta_base = ruta_base
+        self.metodo = str(mapa["metodo"])
+        self.entrada = str(mapa["entrada"])
+        if self.metodo == "isotonic":
+            self.x, self.y = mapa["x"], mapa["y"]
+        else:
+            # Columnas para difundir contra las filas de X.
+            self.a, self.b = mapa["a"][:, None], mapa["b"][:, None]
+
+    @classmethod
+    def cargar(cls, ruta: Path) -> "MotorCalibrado":
+        with np.load(ruta, allow_pickle=False) as npz:
+            mapa = {k: npz[k] for k in npz.files}
+        ruta_base = Path(ruta).with_name(str(mapa.pop("base")))
+        base = MotorBosqueCompacto.cargar(ruta_base) if ruta_base.suffix == ".npy" else joblib.load(ruta_base)
+        return cls(base, mapa, ruta, ruta_base)
+
+    def calibrar(self, puntuacion: np.ndarray) -> np.ndarray:
+        """Probabilidad calibrada de la clase positiva."""
+        if self.metodo == "isotonic":
+            # np.interp satura en los extremos, como out_of_bounds="clip".
+            return np.interp(puntuacion, self.x, self.y)
+        return expit(-(self.a * puntuacion + self.b)).mean(axis=0)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if self.entrada == "decision_function":
+            puntuacion = self.base.decision_function(X)
+        else:
+            puntuacion = self.base.predict_proba(X)[:, 1]
+        p = self.calibrar(np.asarray(puntuacion, dtype=np.float64))
+        return np.column_stack([1.0 - p, p])
+
+    def metadatos(self) -> Dict[str, Any]:
+        clase = getattr(self.base, "clase", type(self.base).__name__)
+        tamanos = [r.stat().st_size for r in (self.ruta, self.ruta_base) if r is not None and r.exists()]
+        return {
+            "familia": next((corto for corto, nombre in FAMILIAS.items() if nombre == clase), clase),
+            "clase": clase,
+            "calibrado": True,
+            "calibracion": self.metodo,
+            "n_features": getattr(self.base, "n_features_in_", None),
+            "tamano_bytes": sum(tamanos) if tamanos else None,
+        }
+
+
+# Campos de cada nodo del bosque compacto. Los indices de hijos son
+# globales (todos los arboles van seguidos en el mismo array) y una hoja
+# apunta a si misma, asi que el recorrido no necesita distinguirlas.
+# La fila 0 es la cabecera: feature = n_features, izq = numero de
+# arboles, der = profundidad maxima, umbral = error maximo medido al
+# exportar.
+def _dtype_nodo(n_clases: int, hojas: str) -> np.dtype:
+    return np.dtype([
+        ("feature", "<i4"),
+        ("umbral", "<f4"),
+        ("izq", "<i4"),
+        ("der", "<i4"),
+        ("nan_izq", "u1"),
+        ("valor", hojas, (n_clases,)),
+    ])
+
+
+# Diferencia maxima de probabilidad admitida frente al bosque original,
+# segun la precision de las hojas (float16 tiene ~3 cifras).
+TOLERANCIA_COMPACTO = {"float32": 1e-6, "float16": 1e-3}
+
+
+def _umbral_float32(umbral: np.ndarray) -> np.ndarray:
+    """
+    Umbral float32 que separa igual que el float64 original.
+
+    scikit-learn compara X en float32 contra umbrales float64; redondear
+    el umbral al float32 mas cercano podria dejarlo por encima del
+    original y mandar a la izquierda un valor igual a el. Se toma el
+    mayor float32 <= umbral, con el que x <= u da lo mismo para
+    cualquier x float32.
+    """
+    u32 = umbral.astype(np.float32)
+    encima = u32.astype(np.float64) > umbral
+    u32[encima] = np.nextafter(u32[encima], np.float32(-np.inf))
+    return u32
+
+
+def compactar_bosque(bosque, hojas: str = "float32") -> np.ndarray:
+    """Nodos de un RandomForestClassifier entrenado como array estructurado."""
+    arboles = [e.tree_ for e in bosque.estimators_]
+    nodos = np.zeros(1 + sum(t.node_count for t in arboles), dtype=_dtype_nodo(bosque.n_classes_, hojas))
+    inicio = 1
+    for t in arboles:
+        fin = inicio + t.node_count
+        trozo = nodos[inicio:fin]
+        hoja = t.children_left == -1
+        propios = np.arange(inicio, fin)
+        trozo["feature"] = np.where(hoja, 0, t.feature)
+        trozo["umbral"] = _umbral_float32(np.where(hoja, 0.0, t.threshold))
+        trozo["izq"] = np.where(hoja, propios, t.children_left + inicio)
+        trozo["der"] = np.where(hoja, propios, t.children_right + inicio)
+        trozo["nan_izq"] = getattr(t, "missing_go_to_left", np.zeros(t.node_count, dtype=np.uint8))
+        valor = t.value[:, 0, :]
+        trozo["valor"] = valor / valor.sum(axis=1, keepdims=True)
+        inicio = fin
+    nodos["feature"][0] = bosque.n_features_in_
+    nodos["izq"][0] = len(arboles)
+    nodos["der"][0] = max(t.max_depth for t in arboles)
+    return nodos
+
+
+class MotorBosqueCompacto(MotorPronostico):
+    """RandomForest exportado con compactar_bosque, recorrido con NumPy."""
+
+    clase = FAMILIAS["rf"]
+
+    def __init__(self, nodos: np.ndarray, ruta: Optional[Path] = None):
+        super().__init__(ruta)
+        self.nodos = nodos
+        cabecera = nodos[0]
+        self.n_features_in_ = int(cabecera["feature"])
+        self.profundidad = int(cabecera["der"])
+        self.error_max = float(cabecera["umbral"])
+        # Lo que se consulta en cada nivel del recorrido se copia a arrays
+        # contiguos (los campos de un array estructurado son vistas con
+        # saltos de un nodo entero, y leerlos asi es varias veces mas
+        # lento); las hojas, que se leen una vez por arbol, se quedan en
+        # el mmap. Hijos intercalados: hijos[2 * nodo + va_izquierda].
+        izq, der = nodos["izq"], nodos["der"]
+        self.feature = np.ascontiguousarray(nodos["feature"])
+        self.umbral = np.ascontiguousarray(nodos["umbral"])
+        self.nan_izq = nodos["nan_izq"].astype(bool)
+        self.hijos = np.stack([der, izq], axis=1).ravel()
+        self.valor = nodos["valor"]
+        # Raices: los nodos que no son hijo de nadie (sin la cabecera).
+        propios = np.arange(len(nodos))
+        hijo = np.zeros(len(nodos), dtype=bool)
+        for hijos in (izq, der):
+            hijo[hijos[1:][hijos[1:] != propios[1:]]] = True
+        hijo[0] = True
+        self.raices = np.flatnonzero(~hijo).astype(np.int32)
+        if len(self.raices) != int(cabecera["izq"]):
+            raise ValueError("Bosque compacto corrupto: el numero de raices no coincide con la cabecera")
+
+    @classmethod
+    def cargar(cls, ruta: Path) -> "MotorBosqueCompacto":
+        return cls(np.load(ruta, mmap_mode="r"), ruta)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        # Como scikit-learn, se compara en float32.
+        X = np.asarray(X, dtype=np.float32)
+        n, n_features = X.shape
+        planas = X.ravel()
+        inicio_fila = (np.arange(n) * n_features)[:, None]
+        nodo = np.broadcast_to(self.raices, (n, len(self.raices)))
+        # Todos los arboles y filas a la vez, un nivel por iteracion; las
+        # hojas se apuntan a si mismas y se quedan quietas.
+        for _ in range(self.profundidad):
+            x = planas[inicio_fila + self.feature[nodo]]
+            izquierda = (x <= self.umbral[nodo]) | (np.isnan(x) & self.nan_izq[nodo])
+            nodo = self.hijos[2 * nodo + izquierda]
+        return self.valor[nodo].mean(axis=1, dtype=np.float64)
+
+    def metadatos(self) -> Dict[str, Any]:
+        return {
+            "familia": "rf",
+            "clase": self.clase,
+            "calibrado": False,
+            "formato": "compacto",
+            "n_features": self.n_features_in_,
+            "error_max": self.error_max,
+            "tamano_bytes": self._tamano(),
+        }
+
+
+def exportar_bosque(bosque, ruta: Path, control: np.ndarray, *, hojas: str = "float32",
+                    tolerancia: Optional[float] = None,
+                    calibracion: Optional[Dict[str, np.ndarray]] = None) -> Path:
+    """
+    Guarda un bosque compacto tras comprobarlo sobre las filas de control.
+
+    Lanza ValueError si alguna probabilidad difiere de la del bosque
+    original mas que la tolerancia (por defecto TOLERANCIA_COMPACTO de
+    la precision de hojas elegida). Si el bosque es la base de un
+    calibrado, con su mapa (exportar_calibracion) se comprueba tambien la
+    probabilidad calibrada: donde la curva isotonica es empinada, un
+    error minimo del bosque se multiplica. El error medido, el mayor de
+    los dos, queda en la cabecera.
+    """
+    tolerancia = TOLERANCIA_COMPACTO[hojas] if tolerancia is None else tolerancia
+    nodos = compactar_bosque(bosque, hojas)
+    compacto = MotorBosqueCompacto(nodos)
+    error = float(np.abs(compacto.predict_proba(control) - bosque.predict_proba(control)).max())
+    if calibracion is not None:
+        error = max(error, float(np.abs(MotorCalibrado(compacto, calibracion).predict_proba(control)
+                                        - MotorCalibrado(bosque, calibracion).predict_proba(control)).max()))
+    if error > tolerancia:
+        raise ValueError(f"El bosque compacto difiere en {error:.2e} (tolerancia {tolerancia:.0e})")
+    nodos["umbral"][0] = error
+    ruta = Path(ruta)
+    np.save(ruta, nodos)
+    return ruta
+
+
+# Extension del artefacto -> clase que lo sabe cargar.
+MOTORES: Dict[str, type] = {
+    ".pkl": MotorSklearn,
+    ".joblib": MotorSklearn,
+    ".npz": MotorCalibrado,
+    ".npy": MotorBosqueCompacto,
+}
+
+
+def cargar_motor(ruta: Path) -> MotorPronostico:
+    """Carga un artefacto con el motor que corresponde a su extension."""
+    ruta = Path(ruta)
+    try:
+        clase = MOTORES[ruta.suffix]
+    except KeyError:
+        raise ValueError(f"No hay motor para artefactos '{ruta.suffix}' ({ruta.name})") from None
+    return clase.cargar(ruta)
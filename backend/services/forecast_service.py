@@ -16,19 +16,29 @@ introducir desajuste train/serve):
                                               viento cruzado, temporales)
       -> add_forecast_features               (precip, persistencia, ciclicas)
       -> modelo calibrado                    (probabilidad)
+
+El modelo se usa a traves de services/forecast_engine.py, asi que da
+igual la familia que haya detras (settings.FORECAST_ENGINE).
+
+Hay dos niveles de servicio (tier): "full", el modelo calibrado, y
+"fast", un alumno pequeno destilado de el (ml/scripts/distill_forecast.py)
+para clientes que necesitan menos de un milisegundo de inferencia. Las
+respuestas de ambos llevan las metricas de validacion de los dos, para
+que el cliente sepa cuanta habilidad cambia por velocidad.
 """
+import json
 import logging
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
 
-import joblib
 import pandas as pd
 
 from core.config import settings
 from features.adapters.metar_adapter import parsed_metar_to_schema
 from features.defaults import complete_raw_features
 from features.forecast_features import FORECAST_FEATURES, add_forecast_features
+from services.forecast_engine import RAPIDO, cargar_motor, nombre_artefacto
 from services.metar_taf_service import METARTAFService
 
 logger = logging.getLogger(__name__)
@@ -38,6 +48,9 @@ UMBRAL_ALERTA = 0.5  # sobre probabilidad calibrada: 50% de ocurrencia
 
 MODEL_DIR = settings.BASE_DIR / "models" / "forecast"
 
+# Niveles de servicio: modelo completo calibrado y alumno destilado.
+TIERS = ("full", "fast")
+
 
 class MetarNoDisponible(RuntimeError):
     """No se pudo descargar el METAR del aeropuerto (fuente externa)."""
@@ -61,23 +74,33 @@ def _nivel(prob: float) -> str:
 class ForecastService:
     """Carga el modelo calibrado de un aeropuerto y pronostica desde METAR."""
 
-    def __init__(self, icao: str = "SKBO", horizonte: int = HORIZONTE_H):
+    def __init__(self, icao: str = "SKBO", horizonte: int = HORIZONTE_H, motor: Optional[str] = None):
         self.icao = icao.upper()
         self.horizonte = horizonte
+        self.motor = motor or settings.FORECAST_ENGINE
         self.modelo = None
         self._metar = METARTAFService()
 
-        # Se prefiere el modelo calibrado; si no existe, se cae al sin
-        # calibrar avisando, porque sus "probabilidades" no son fiables.
-        calibrado = MODEL_DIR / f"forecast_{self.icao.lower()}_h{horizonte}_calibrado.pkl"
-        crudo = MODEL_DIR / f"forecast_{self.icao.lower()}_h{horizonte}.pkl"
+        # Se prefiere el modelo calibrado (mapa .npz, o el envoltorio
+        # CalibratedClassifierCV .pkl de versiones anteriores); si no
+        # existe, se cae al sin calibrar avisando, porque sus
+        # "probabilidades" no son fiables.
+        calibrados = [
+            MODEL_DIR / nombre_artefacto(self.icao, horizonte, self.motor, calibrado=True, extension=ext)
+            for ext in (".npz", ".pkl")
+        ]
+        calibrado = next((r for r in calibrados if r.exists()), calibrados[0])
+        # Sin calibrar, el bosque compacto (.npy) antes que el pickle.
+        crudos = [MODEL_DIR / nombre_artefacto(self.icao, horizonte, self.motor, extension=ext)
+                  for ext in (".npy", ".pkl")]
+        crudo = next((r for r in crudos if r.exists()), crudos[-1])
 
         if calibrado.exists():
-            self.modelo = joblib.load(calibrado)
+            self.modelo = cargar_motor(calibrado)
             self.calibrado = True
             logger.info("Modelo de pronostico calibrado cargado: %s", calibrado.name)
         elif crudo.exists():
-            self.modelo = joblib.load(crudo)
+            self.modelo = cargar_motor(crudo)
             self.calibrado = False
             logger.warning(
                 "Modelo de pronostico SIN calibrar (%s): las probabilidades "
@@ -87,19 +110,38 @@ class ForecastService:
             self.calibrado = False
             logger.error("No hay modelo de pronostico para %s", self.icao)
 
-    def disponible(self) -> bool:
-        return self.modelo is not None
+        # Nivel rapido, solo si se destilo; con sus metricas y las del
+        # completo sobre el mismo test.
+        rapido = MODEL_DIR / nombre_artefacto(self.icao, horizonte, RAPIDO)
+        self.rapido = cargar_motor(rapido) if rapido.exists() else None
+        metricas = rapido.with_suffix(".json")
+        self.metricas_tiers = json.loads(metricas.read_text(encoding="utf-8")) if metricas.exists() else None
+
+        # Familia de cada nivel, resuelta una vez: metadatos() hace stat()
+        # de los artefactos y no debe correr en cada peticion.
+        self.familias = {
+            tier: modelo.metadatos()["familia"]
+            for tier, modelo in (("full", self.modelo), ("fast", self.rapido))
+            if modelo is not None
+        }
+
+    def disponible(self, tier: str = "full") -> bool:
+        return (self.rapido if tier == "fast" else self.modelo) is not None
 
-    async def pronosticar(self, icao: Optional[str] = None) -> Dict[str, Any]:
+    async def pronosticar(self, icao: Optional[str] = None, tier: str = "full") -> Dict[str, Any]:
         """
         Pronostica niebla/tormenta a +Nh a partir del METAR actual.
 
         Args:
             icao: aeropuerto a consultar. Debe coincidir con el del modelo
                   cargado; se acepta por comodidad de la ruta.
+            tier: "full" (modelo calibrado) o "fast" (alumno destilado).
         """
-        if not self.disponible():
-            raise RuntimeError(f"Modelo de pronostico no disponible para {self.icao}")
+        if tier not in TIERS:
+            raise ValueError(f"Nivel desconocido: {tier!r} (opciones: {', '.join(TIERS)})")
+        if not self.disponible(tier):
+            raise RuntimeError(f"Modelo de pronostico ({tier}) no disponible para {self.icao}")
+        modelo = self.rapido if tier == "fast" else self.modelo
 
         objetivo = (icao or self.icao).upper()
 
@@ -132,7 +174,7 @@ class ForecastService:
         # modelo se entreno con arrays sin nombres de columna; pasar un
         # DataFrame con nombres dispara un UserWarning de sklearn.
         X = completo[FORECAST_FEATURES].values
-        prob = float(self.modelo.predict_proba(X)[:, 1][0])
+        prob = float(modelo.predict_proba(X)[:, 1][0])
 
         return {
             "icao": objetivo,
@@ -143,7 +185,11 @@ class ForecastService:
             "alerta": prob >= UMBRAL_ALERTA,
             "condicion_actual": base["descripcion"],
             "es_adverso_ahora": bool(completo["adverso_actual"].iloc[0]),
+            # El alumno imita probabilidades calibradas: hereda la calibracion.
             "modelo_calibrado": self.calibrado,
+            "motor": self.familias[tier],
+            "tier": tier,
+            "metricas_validacion": self.metricas_tiers,
             "metar": raw,
             "observacion": momento.isoformat() if momento else None,
             "features_imputadas": imputadas,
@@ -71,6 +71,10 @@ class MLServiceV2:
                 )
                 return
 
+            # No pasa por services/forecast_engine.cargar_motor: los motores
+            # de alli sirven el pronostico binario (solo predict_proba de
+            # dos columnas), y este clasificador de tres niveles necesita
+            # predict, classes_ y el scaler/encoders de su pipeline.
             self.model = joblib.load(model_file)
             logger.info("Modelo cargado desde %s", model_file)
 
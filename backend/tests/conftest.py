@@ -1,4 +1,7 @@
+import fnmatch
+import socketserver
 import sys
+import threading
 from pathlib import Path
 
 import numpy as np
@@ -174,3 +177,83 @@ def db_session():
         yield session
     finally:
         session.close()
+
+
+# =========================================================================
+# Almacenes compartidos de la API
+# =========================================================================
+
+@pytest.fixture(autouse=True)
+def cache_respuestas_vacia():
+    """
+    Cada test empieza con la cache de respuestas vacia: si no, una
+    respuesta guardada por un test se serviria en otro que cambio los
+    datos (otro METAR, otra base).
+    """
+    from api.dependencies import cache_respuestas
+
+    cache_respuestas.limpiar()
+    yield cache_respuestas
+
+
+class _ManejadorRESP(socketserver.StreamRequestHandler):
+    """Servidor RESP minimo, con los comandos que usan rate limit y cache."""
+    # Una escritura por respuesta: sin esto, Nagle retiene la segunda
+    # de un pipeline hasta el ACK retardado del cliente (~40 ms).
+    disable_nagle_algorithm = True
+
+    def _leer_comando(self):
+        cabecera = self.rfile.readline()
+        if not cabecera:
+            return None
+        partes = []
+        for _ in range(int(cabecera[1:])):
+            n = int(self.rfile.readline()[1:])
+            partes.append(self.rfile.read(n + 2)[:-2])
+        return partes
+
+    @staticmethod
+    def _cadena(valor):
+        if valor is None:
+            return b"$-1\r\n"
+        valor = valor if isinstance(valor, bytes) else str(valor).encode()
+        return b"$%d\r\n%s\r\n" % (len(valor), valor)
+
+    def handle(self):
+        datos, lock = self.server.datos, self.server.lock
+        while (comando := self._leer_comando()) is not None:
+            nombre, args = comando[0].decode().upper(), [a.decode(errors="replace") for a in comando[1:]]
+            with lock:
+                if nombre in ("INCR", "DECR"):
+                    datos[args[0]] = int(datos.get(args[0], 0)) + (1 if nombre == "INCR" else -1)
+                    respuesta = b":%d\r\n" % datos[args[0]]
+                elif nombre == "GET":
+                    respuesta = self._cadena(datos.get(args[0]))
+                elif nombre == "SET":
+                    # Sin caducidad: las entradas de la cache llevan la suya.
+                    datos[args[0]] = comando[2]
+                    respuesta = b"+OK\r\n"
+                elif nombre == "DEL":
+                    borradas = sum(datos.pop(k, None) is not None for k in args)
+                    respuesta = b":%d\r\n" % borradas
+                elif nombre == "SCAN":
+                    claves = [k for k in datos if fnmatch.fnmatchcase(k, args[args.index("MATCH") + 1])]
+                    respuesta = b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(claves) + b"".join(map(self._cadena, claves))
+                elif nombre in ("EXPIRE", "SELECT"):
+                    respuesta = b":1\r\n" if nombre == "EXPIRE" else b"+OK\r\n"
+                else:
+                    respuesta = b"-ERR unknown command\r\n"
+            self.wfile.write(respuesta)
+
+
+@pytest.fixture
+def servidor_resp():
+    """URL de un servidor RESP en un hilo, en lugar de Redis."""
+    servidor = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _ManejadorRESP)
+    servidor.daemon_threads = True
+    servidor.datos, servidor.lock = {}, threading.Lock()
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield f"redis://127.0.0.1:{servidor.server_address[1]}/0"
+    servidor.shutdown()
+    servidor.server_close()
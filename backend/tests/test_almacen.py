@@ -0,0 +1,84 @@
+"""
+Almacen Parquet de datasets de ML (ml/utils/almacen.py).
+
+Lo que importa fijar: que leer del almacen devuelve lo mismo que se
+escribio (tipos incluidos), que los filtros por anio y columnas son
+equivalentes a filtrar el CSV en pandas, y que sin Parquet se cae al
+CSV de siempre.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from ml.utils import almacen  # noqa: E402
+
+
+def _datos(n=2000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2019-06-01", periods=n, freq="7h"),
+        "visibilidad": rng.uniform(100, 10000, n),
+        "descripcion": rng.choice(["niebla", "despejado"], n),
+        "objetivo": rng.integers(0, 2, n),
+    })
+
+
+def test_ida_y_vuelta_conserva_datos_y_tipos(tmp_path):
+    df = _datos()
+    almacen.escribir(df, tmp_path, "SKBO")
+    leido = almacen.leer(tmp_path, "SKBO")
+    pd.testing.assert_frame_equal(leido, df)
+
+
+def test_filtro_por_anio_y_proyeccion(tmp_path):
+    df = _datos()
+    almacen.escribir(df, tmp_path, "SKBO")
+
+    leido = almacen.leer(tmp_path, "SKBO", columnas=["timestamp", "objetivo"], desde=2020, antes_de=2021)
+    esperado = df.loc[df.timestamp.dt.year == 2020, ["timestamp", "objetivo"]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(leido, esperado)
+
+
+def test_estaciones_separadas_y_reescritura(tmp_path):
+    df = _datos()
+    almacen.escribir(df, tmp_path, "SKBO")
+    almacen.escribir(df.head(10), tmp_path, "SKRG")
+    almacen.escribir(df.head(5), tmp_path, "SKBO")   # reemplaza solo SKBO
+
+    assert len(almacen.leer(tmp_path, "SKBO")) == 5
+    assert len(almacen.leer(tmp_path, "SKRG")) == 10
+
+
+def test_anexar_mantiene_orden_temporal(tmp_path):
+    df = _datos()
+    almacen.escribir(df.iloc[:1500], tmp_path, "SKBO")
+    almacen.escribir(df.iloc[1500:], tmp_path, "SKBO", anexar=True)
+    pd.testing.assert_frame_equal(almacen.leer(tmp_path, "SKBO"), df)
+
+
+def test_cargar_forecast_prefiere_parquet_y_cae_a_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen, "FORECAST_DIR", tmp_path)
+    df = _datos()
+    assert almacen.cargar_forecast("SKBO", 3) is None
+    assert not almacen.existe_forecast("SKBO", 3)
+
+    df.to_csv(almacen.forecast_csv("SKBO", 3), index=False)
+    desde_csv = almacen.cargar_forecast("SKBO", 3, desde=2020, columnas=["visibilidad"])
+
+    almacen.escribir(df, almacen.forecast_parquet(3), "SKBO")
+    desde_parquet = almacen.cargar_forecast("SKBO", 3, desde=2020, columnas=["visibilidad"])
+
+    assert almacen.existe_forecast("SKBO", 3)
+    pd.testing.assert_frame_equal(desde_parquet, desde_csv)
+
+
+def test_cargar_forecast_csv_con_ambos_limites(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen, "FORECAST_DIR", tmp_path)
+    df = _datos()
+    df.to_csv(almacen.forecast_csv("SKBO", 3), index=False)
+
+    leido = almacen.cargar_forecast("SKBO", 3, columnas=["objetivo"], desde=2020, antes_de=2021)
+    assert len(leido) == (df.timestamp.dt.year == 2020).sum()
+    assert list(leido.columns) == ["objetivo"]
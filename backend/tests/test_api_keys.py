@@ -0,0 +1,139 @@
+"""
+Indice de API keys y cuotas por clave (api/api_keys.py).
+
+Las claves se buscan por huella y cada una gasta su propio cubo de
+tokens; ni el indice, ni los logs, ni el endpoint de uso guardan o
+devuelven una clave en claro.
+"""
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from api import api_keys
+from api.api_keys import IndiceClaves, _parsear_cuotas, id_clave
+from api.dependencies import verify_api_key
+
+
+class _Reloj:
+    def __init__(self):
+        self.t = 100.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def con_claves(monkeypatch):
+    """Activa REQUIRE_API_KEY con las claves y cuotas dadas."""
+    from core import config as config_mod
+
+    def configurar(claves, por_minuto=0, rafaga=0, cuotas=""):
+        monkeypatch.setattr(config_mod.settings, "REQUIRE_API_KEY", True)
+        monkeypatch.setattr(config_mod.settings, "VALID_API_KEYS", claves)
+        monkeypatch.setattr(config_mod.settings, "API_KEY_RATE_PER_MINUTE", por_minuto)
+        monkeypatch.setattr(config_mod.settings, "API_KEY_BURST", rafaga)
+        monkeypatch.setattr(config_mod.settings, "API_KEY_QUOTAS", cuotas)
+        return config_mod.settings
+
+    return configurar
+
+
+def test_busca_por_huella_sin_guardar_claves():
+    indice = IndiceClaves({"clave-a", "clave-b"})
+    assert indice.buscar("clave-a").id == id_clave("clave-a")
+    assert indice.buscar("clave-c") is None
+    assert indice.buscar("") is None and indice.buscar(None) is None
+    assert "clave-a" not in repr(vars(indice))
+
+
+def test_cubo_de_tokens_rafaga_y_relleno():
+    reloj = _Reloj()
+    indice = IndiceClaves({"k"}, por_minuto=60, rafaga=3, reloj=reloj)
+    cuota = indice.buscar("k")
+
+    assert [indice.consumir(cuota) for _ in range(3)] == [0, 0, 0]
+    assert indice.consumir(cuota) == pytest.approx(1.0)  # 1 token/s
+
+    reloj.t += 2.5
+    assert indice.consumir(cuota) == 0
+    assert indice.consumir(cuota) == 0
+    assert indice.consumir(cuota) == pytest.approx(0.5)
+
+    reloj.t += 3600  # el cubo no pasa de la rafaga
+    assert sum(indice.consumir(cuota) == 0 for _ in range(10)) == 3
+    assert cuota.admitidas == 8 and cuota.rechazadas == 9
+
+
+def test_sin_cuota_admite_todo():
+    indice = IndiceClaves({"k"})
+    cuota = indice.buscar("k")
+    assert all(indice.consumir(cuota) == 0 for _ in range(1000))
+    assert cuota.uso()["tokens_disponibles"] is None
+
+
+def test_cuotas_por_id():
+    pesada, ligera = id_clave("pesada"), id_clave("ligera")
+    indice = IndiceClaves(
+        {"pesada", "ligera", "normal"}, por_minuto=60, rafaga=10,
+        cuotas=f"{pesada}:600:100, {ligera}:6",
+    )
+    assert (indice.buscar("pesada").por_minuto, indice.buscar("pesada").rafaga) == (600, 100)
+    assert (indice.buscar("ligera").por_minuto, indice.buscar("ligera").rafaga) == (6, 6)
+    assert (indice.buscar("normal").por_minuto, indice.buscar("normal").rafaga) == (60, 10)
+
+    with pytest.raises(ValueError, match="API_KEY_QUOTAS"):
+        _parsear_cuotas("solo-id")
+
+
+def test_indice_se_rehace_al_cambiar_la_configuracion(con_claves):
+    settings = con_claves("a,b")
+    primero = api_keys.indice(settings)
+    assert api_keys.indice(settings) is primero
+
+    con_claves("a,b,c")
+    segundo = api_keys.indice(settings)
+    assert segundo is not primero and len(segundo) == 3
+
+
+@pytest.mark.asyncio
+async def test_cuota_agotada_da_429_con_retry_after(con_claves):
+    con_claves("clave-valida", por_minuto=30, rafaga=2)
+
+    assert await verify_api_key("clave-valida") == "clave-valida"
+    assert await verify_api_key("clave-valida") == "clave-valida"
+    with pytest.raises(HTTPException) as exc:
+        await verify_api_key("clave-valida")
+    assert exc.value.status_code == 429
+    assert 1 <= int(exc.value.headers["Retry-After"]) <= 2
+
+
+def test_clave_con_cuota_no_gasta_el_limite_de_la_ip(con_claves, monkeypatch):
+    """Una NAT con una integracion pesada no deja sin servicio al resto."""
+    import main
+
+    con_claves("integracion", por_minuto=600, rafaga=100)
+    monkeypatch.setattr(main.settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(main.settings, "MAX_REQUESTS_PER_MINUTE", 3)
+    main.rate_limiter.requests.clear()
+
+    client = TestClient(main.app)
+    cabeceras = {"X-API-Key": "integracion"}
+    assert all(client.get("/", headers=cabeceras).status_code == 200 for _ in range(6))
+    assert client.get("/").status_code == 200  # la IP sigue con su cuota
+
+
+def test_endpoint_de_uso_no_expone_claves(con_claves, monkeypatch):
+    import main
+
+    con_claves("secreta-1,secreta-2", por_minuto=60, rafaga=5)
+    monkeypatch.setattr(main.settings, "RATE_LIMIT_ENABLED", False)
+
+    client = TestClient(main.app)
+    respuesta = client.get("/api/v1/dashboard/api-keys", headers={"X-API-Key": "secreta-1"})
+    assert respuesta.status_code == 200
+    assert "secreta" not in respuesta.text
+
+    uso = {c["id"]: c for c in respuesta.json()["claves"]}
+    assert set(uso) == {id_clave("secreta-1"), id_clave("secreta-2")}
+    assert uso[id_clave("secreta-1")]["admitidas"] == 1
+    assert uso[id_clave("secreta-2")]["ultimo_uso"] is None
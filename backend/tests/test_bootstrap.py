@@ -0,0 +1,95 @@
+"""
+Bootstrap de bloques por dia (ml/utils/bootstrap.py).
+
+Una replica con pesos por dia tiene que dar lo mismo que remuestrear los
+dias de verdad y calcular la metrica de siempre sobre las filas copiadas.
+"""
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score, brier_score_loss, f1_score
+
+from ml.utils import bootstrap
+from ml.utils.contingencia import curva, punto
+
+
+def _datos(semilla, n_dias=60, horas=24):
+    rng = np.random.default_rng(semilla)
+    dias = np.repeat(np.arange(n_dias), horas)
+    # Eventos que duran varias horas dentro del dia (autocorrelacion).
+    niebla = rng.uniform(0, 1, n_dias) < 0.3
+    y = (niebla[dias] & (rng.uniform(0, 1, len(dias)) < 0.5)).astype(int)
+    p = np.round(np.clip(0.5 * y + rng.uniform(0, 0.6, len(dias)), 0, 1), 2)  # con empates
+    return y, p, dias
+
+
+def _explicito(y, p, ref, dias, elegidos, umbral):
+    """Referencia: copiar las filas de los dias elegidos y medir."""
+    filas = np.concatenate([np.flatnonzero(dias == d) for d in elegidos])
+    yr, pr, refr = y[filas], p[filas], ref[filas]
+    tabla = punto(curva(yr, pr, [umbral]), 0)
+    tasa = yr.mean()
+    return {
+        "pr_auc": average_precision_score(yr, pr),
+        "f1": f1_score(yr, pr >= umbral),
+        "csi": tabla["CSI"],
+        "pod": tabla["POD"],
+        "far": tabla["FAR"],
+        "hss": tabla["HSS"],
+        "bss": 1 - brier_score_loss(yr, pr) / brier_score_loss(yr, np.full(len(yr), tasa)),
+        "dif_csi": tabla["CSI"] - punto(curva(yr, refr, [1]), 0)["CSI"],
+    }
+
+
+@pytest.mark.parametrize("semilla", range(3))
+def test_pesos_por_dia_igual_que_remuestrear(semilla):
+    y, p, dias = _datos(semilla)
+    ref = np.roll(y, 3)
+    rng = np.random.default_rng(semilla)
+    elegidos = rng.integers(0, dias.max() + 1, dias.max() + 1)
+    W = np.bincount(elegidos, minlength=dias.max() + 1)[None, :].astype(np.float64)
+
+    agregados = {
+        "modelo": bootstrap.agregados_por_dia(y, p, p >= 0.5, dias, dias.max() + 1),
+        "referencia": bootstrap.agregados_por_dia(y, ref, ref, dias, dias.max() + 1),
+    }
+    orden, fin_grupo = bootstrap._orden(p)
+    r = bootstrap._metricas(W, agregados, dias[orden], y[orden].astype(np.float64), fin_grupo)
+
+    esperado = _explicito(y, p, ref, dias, elegidos, 0.5)
+    for m in bootstrap.METRICAS:
+        assert r[f"modelo.{m}"][0] == pytest.approx(esperado[m], abs=1e-12), m
+    assert r["modelo.csi"][0] - r["referencia.csi"][0] == pytest.approx(esperado["dif_csi"], abs=1e-12)
+
+
+def test_pr_auc_ponderado_igual_que_sklearn_con_sample_weight():
+    y, p, _ = _datos(5)
+    rng = np.random.default_rng(0)
+    pesos = rng.integers(0, 4, size=(4, len(y))).astype(np.float64)
+    orden, fin_grupo = bootstrap._orden(p)
+    ap = bootstrap.pr_auc_ponderado(pesos[:, orden], y[orden].astype(np.float64), fin_grupo)
+    for fila, valor in zip(pesos, ap):
+        assert valor == pytest.approx(average_precision_score(y, p, sample_weight=fila), abs=1e-12)
+
+
+def test_intervalos_reproducibles_y_coherentes():
+    y, p, dias = _datos(7, n_dias=120)
+    ref = np.roll(y, 3)
+    r1 = bootstrap.intervalos(y, p, dias, umbral=0.5, referencia=ref, replicas=250, procesos=1, semilla=3)
+    r2 = bootstrap.intervalos(y, p, dias, umbral=0.5, referencia=ref, replicas=250, procesos=2, semilla=3)
+    assert r1 == r2  # no depende del numero de procesos
+
+    assert r1["pr_auc"]["valor"] == pytest.approx(average_precision_score(y, p), abs=1e-12)
+    assert r1["f1"]["valor"] == pytest.approx(f1_score(y, p >= 0.5), abs=1e-12)
+    for nombre, v in r1.items():
+        inf, sup = v["ic"]
+        assert inf <= sup, nombre
+    assert {"dif_f1", "dif_csi", "dif_hss", "dif_pr_auc"} <= set(r1)
+
+
+def test_bloques_por_dia_dan_intervalos_mas_anchos_que_por_hora():
+    """Con eventos de varias horas, remuestrear horas sueltas subestima la varianza."""
+    y, p, dias = _datos(11, n_dias=150)
+    por_dia = bootstrap.intervalos(y, p, dias, umbral=0.5, replicas=300, procesos=1)
+    por_hora = bootstrap.intervalos(y, p, np.arange(len(y)), umbral=0.5, replicas=300, procesos=1)
+    for m in ("csi", "pr_auc"):
+        assert por_dia[m]["ic"][1] - por_dia[m]["ic"][0] > por_hora[m]["ic"][1] - por_hora[m]["ic"][0], m
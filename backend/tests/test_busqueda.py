@@ -0,0 +1,126 @@
+"""
+Busqueda de hiperparametros (ml/utils/busqueda.py).
+
+Lo que importa: los pliegues nunca tocan el test, la reduccion a la
+mitad se queda con los mejores, el frente de Pareto no contiene puntos
+dominados y puntuar un prefijo de arboles equivale a entrenar ese
+bosque mas pequeno.
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import average_precision_score
+
+from ml.utils import busqueda, entrenamiento, transferencia
+
+
+def test_pliegues_de_origen_movil_antes_del_corte():
+    anios = np.repeat(np.arange(2015, 2026), 10)
+    pliegues = busqueda.pliegues_temporales(anios, corte=2023, n_pliegues=3)
+
+    assert [int(anios[va][0]) for _, va in pliegues] == [2020, 2021, 2022]
+    for tr, va in pliegues:
+        assert anios[tr].max() < anios[va].min()
+        assert (anios[va] == anios[va][0]).all()
+        assert (anios[np.concatenate([tr, va])] < 2023).all()
+    # Cada pliegue entrena con todo lo del anterior mas su validacion.
+    assert len(pliegues[1][0]) == len(pliegues[0][0]) + len(pliegues[0][1])
+
+
+def test_pliegues_sin_datos_suficientes():
+    with pytest.raises(ValueError):
+        busqueda.pliegues_temporales(np.array([2021, 2022]), corte=2023, n_pliegues=3)
+
+
+def test_configuraciones_es_el_producto_del_espacio():
+    configs = busqueda.configuraciones({"a": [1, 2], "b": ["x", "y", "z"]})
+    assert len(configs) == 6
+    assert configs[0] == {"a": 1, "b": "x"}
+    assert len({tuple(c.items()) for c in configs}) == 6
+
+
+def test_presupuesto_crece_hasta_el_completo():
+    rondas = busqueda.n_rondas(24, eta=3)
+    assert rondas == 3
+    presupuestos = [busqueda.presupuesto(r, rondas, 3, 300, 25) for r in range(rondas)]
+    assert presupuestos[-1] == (300, 1.0)
+    assert presupuestos[0] == (33, pytest.approx(1 / 9))
+    assert busqueda.presupuesto(0, 5, 3, 300, 25)[0] == 25
+
+
+def test_mitad_sucesiva_conserva_los_mejores():
+    candidatos = [{"v": v} for v in [5, 1, 9, 3, 7, 2, 8, 4, 6]]
+    rondas_vistas = []
+
+    def puntuar(vivos, ronda):
+        rondas_vistas.append((ronda, len(vivos)))
+        return [c["v"] for c in vivos]
+
+    finales, historial = busqueda.mitad_sucesiva(candidatos, puntuar, eta=3)
+
+    assert rondas_vistas == [(0, 9), (1, 3)]
+    assert finales == [{"v": 9}, {"v": 8}, {"v": 7}]
+    assert len(historial) == 12
+
+
+def test_frente_de_pareto_sin_dominados():
+    puntos = [
+        {"pr_auc": 0.50, "latencia_ms": 1.0},
+        {"pr_auc": 0.45, "latencia_ms": 2.0},   # dominado por el primero
+        {"pr_auc": 0.60, "latencia_ms": 3.0},
+        {"pr_auc": 0.60, "latencia_ms": 4.0},   # igual de bueno, mas lento
+        {"pr_auc": 0.65, "latencia_ms": 9.0},
+    ]
+    frente = busqueda.frente_pareto(puntos)
+    assert [(p["pr_auc"], p["latencia_ms"]) for p in frente] == [(0.50, 1.0), (0.60, 3.0), (0.65, 9.0)]
+
+
+def test_prefijo_de_arboles_igual_que_bosque_pequeno():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 4)).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 0.7, 600) > 0.8).astype(np.int8)
+    train, val = np.arange(400), np.arange(400, 600)
+    config = {"max_depth": 4, "min_samples_leaf": 5, "max_features": "sqrt"}
+
+    bx, dx = transferencia.publicar(X)
+    by, dy = transferencia.publicar(y)
+    try:
+        res = busqueda.evaluar_pliegue(config, 20, 1.0, train, val, (dx, dy), prefijos=(5, 20))
+    finally:
+        for bloque in (bx, by):
+            transferencia._vistas.pop(bloque.name)[0].close()
+            bloque.close()
+            bloque.unlink()
+
+    completo = RandomForestClassifier(**{**entrenamiento.HIPERPARAMETROS_RF, **config, "n_estimators": 20},
+                                      n_jobs=1).fit(X[train], y[train])
+    esperado = average_precision_score(y[val], completo.predict_proba(X[val])[:, 1])
+    assert res["pr_auc"] == pytest.approx(esperado)
+    assert res["por_arboles"][20] == pytest.approx(esperado)
+
+    prefijo = busqueda._bosque_prefijo(completo, 5)
+    assert res["por_arboles"][5] == pytest.approx(
+        average_precision_score(y[val], prefijo.predict_proba(X[val])[:, 1]))
+    assert "latencia_ms" not in res
+
+
+def test_latencia_se_mide_con_el_estimador_de_produccion(monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4)).astype(np.float32)
+    y = (X[:, 0] > 0.5).astype(np.int8)
+    config = {"max_depth": 4, "min_samples_leaf": 5, "max_features": "sqrt"}
+    medidos = []
+    original = busqueda.latencia_ms
+    monkeypatch.setattr(busqueda, "latencia_ms",
+                        lambda modelo, fila: medidos.append(modelo) or original(modelo, fila, repeticiones=3))
+
+    lat = busqueda.latencias(config, 20, X, y, X[:1], prefijos=(5, 20, 50))
+
+    assert set(lat) == {5, 20}
+    assert all(v > 0 for v in lat.values())
+    produccion = entrenamiento.crear_modelo("rf")
+    assert [m.n_estimators for m in medidos] == [5, 20]
+    for modelo in medidos:
+        assert modelo.n_jobs == produccion.n_jobs
+        assert modelo.class_weight == produccion.class_weight
+        assert modelo.max_depth == 4
@@ -0,0 +1,110 @@
+"""
+Cache de datasets derivados (ml/utils/cache_features.py).
+
+La cache solo es util si nunca sirve algo obsoleto. Se fija que la
+clave cambia con el contenido del origen, con el codigo declarado y con
+los parametros, y SOLO con eso: una entrada que no depende de un
+fichero de codigo sobrevive a que ese fichero cambie.
+"""
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from ml.utils import cache_features  # noqa: E402
+
+
+@pytest.fixture
+def entorno(tmp_path):
+    origen = tmp_path / "metar.csv"
+    origen.write_text("timestamp,visibilidad\n2020-01-01 00:00,9000\n", encoding="utf-8")
+    codigo_a = tmp_path / "features_a.py"
+    codigo_b = tmp_path / "features_b.py"
+    codigo_a.write_text("X = 1\n", encoding="utf-8")
+    codigo_b.write_text("Y = 1\n", encoding="utf-8")
+    return tmp_path, origen, codigo_a, codigo_b
+
+
+class _Constructor:
+    def __init__(self, origen):
+        self.origen = origen
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        df = pd.read_csv(self.origen, parse_dates=["timestamp"])
+        df["doble"] = df["visibilidad"] * 2
+        return df
+
+
+def _obtener(tmp_path, origen, codigo, construir, **params):
+    return cache_features.obtener(
+        "prueba", construir, fuentes=[origen], codigo=codigo, params=params, raiz=tmp_path / "cache",
+    )
+
+
+def test_segunda_lectura_sale_de_cache(entorno):
+    tmp_path, origen, codigo_a, _ = entorno
+    construir = _Constructor(origen)
+
+    primera = _obtener(tmp_path, origen, [codigo_a], construir, icao="SKBO")
+    segunda = _obtener(tmp_path, origen, [codigo_a], construir, icao="SKBO")
+
+    assert construir.llamadas == 1
+    pd.testing.assert_frame_equal(primera, segunda)
+    assert len(list((tmp_path / "cache" / "prueba").glob("*.arrow"))) == 1
+
+
+def test_cambio_en_el_origen_invalida_y_limpia(entorno):
+    tmp_path, origen, codigo_a, _ = entorno
+    construir = _Constructor(origen)
+    _obtener(tmp_path, origen, [codigo_a], construir, icao="SKBO")
+
+    origen.write_text("timestamp,visibilidad\n2020-01-01 00:00,500\n", encoding="utf-8")
+    df = _obtener(tmp_path, origen, [codigo_a], construir, icao="SKBO")
+
+    assert construir.llamadas == 2
+    assert df["doble"].tolist() == [1000]
+    # La entrada vieja de la misma ranura se borra.
+    assert len(list((tmp_path / "cache" / "prueba").glob("*.arrow"))) == 1
+
+
+def test_cambio_de_codigo_invalida_solo_lo_que_depende_de_el(entorno):
+    tmp_path, origen, codigo_a, codigo_b = entorno
+    depende_de_a = _Constructor(origen)
+    depende_de_b = _Constructor(origen)
+    _obtener(tmp_path, origen, [codigo_a], depende_de_a, entrada="a")
+    _obtener(tmp_path, origen, [codigo_b], depende_de_b, entrada="b")
+
+    codigo_a.write_text("X = 2\n", encoding="utf-8")
+    _obtener(tmp_path, origen, [codigo_a], depende_de_a, entrada="a")
+    _obtener(tmp_path, origen, [codigo_b], depende_de_b, entrada="b")
+
+    assert depende_de_a.llamadas == 2
+    assert depende_de_b.llamadas == 1
+
+
+def test_parametros_distintos_son_entradas_distintas(entorno):
+    tmp_path, origen, codigo_a, _ = entorno
+    construir = _Constructor(origen)
+    _obtener(tmp_path, origen, [codigo_a], construir, horizonte=1)
+    _obtener(tmp_path, origen, [codigo_a], construir, horizonte=3)
+    _obtener(tmp_path, origen, [codigo_a], construir, horizonte=1)
+
+    assert construir.llamadas == 2
+    assert len(list((tmp_path / "cache" / "prueba").glob("*.arrow"))) == 2
+
+
+def test_huella_es_de_contenido_no_de_ruta(tmp_path):
+    a = tmp_path / "a.csv"
+    b = tmp_path / "sub" / "b.csv"
+    b.parent.mkdir()
+    a.write_text("x\n1\n")
+    b.write_text("x\n1\n")
+    assert cache_features.huella(a) == cache_features.huella(b)
+
+    # Un directorio (almacen particionado) cambia si cambia cualquier fichero.
+    antes = cache_features.huella(tmp_path / "sub")
+    (tmp_path / "sub" / "c.csv").write_text("x\n2\n")
+    assert cache_features.huella(tmp_path / "sub") != antes
+
@@ -0,0 +1,404 @@
+"""
+Descarga del historico METAR del IEM.
+
+Se prueba contra un servidor HTTP local que imita al IEM, incluido su
+throttling (respuestas vacias en silencio), para no depender de la red
+ni castigar al servidor real desde la CI. Lo que se fija:
+
+  1. Cada (estacion, ano) descargado se guarda crudo y se anota en el
+     manifiesto; una segunda ejecucion no vuelve a pedirlo.
+  2. Un error de red NO se anota: la ejecucion siguiente lo reintenta.
+  3. Una respuesta vacia frena el cubo de tokens compartido.
+  4. El modo incremental solo anade lo posterior a la ultima observacion
+     guardada, sin duplicar y sin reescribir lo que ya habia.
+  5. a_schema, calculado por columnas, da lo mismo que la traduccion
+     fila a fila con las formulas escalares de features/.
+  6. La traduccion en streaming, trozo a trozo, escribe lo mismo que
+     traducir todo el archivo de una vez.
+"""
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features.airports import cabecera_activa, obtener as obtener_aeropuerto
+from features.defaults import altitud_densidad, riesgo_hielo, viento_cruzado, viento_frente
+
+from ml.scripts import collect_metar_history
+from ml.scripts.collect_metar_history import (
+    COBERTURA_SIGNIFICATIVA,
+    FENOMENOS,
+    CuboTokens,
+    Manifiesto,
+    a_schema,
+    anexar_incremental,
+    descargar_estaciones,
+    iter_crudos,
+    leer_crudos,
+    ruta_cruda,
+    ultimo_timestamp,
+)
+
+CABECERA = "station,valid,tmpf,dwpf,relh,drct,sknt,p01i,alti,vsby,gust,skyc1,skyl1,wxcodes,metar\n"
+
+
+def _csv(estacion, ano):
+    return CABECERA + _fila(estacion, f"{ano}-01-01 00:00")
+
+
+def _fila(estacion, valid):
+    return (
+        f"{estacion},{valid},50,48,90,130,5,0,30.2,6,M,OVC,200,BR,"
+        f"METAR {estacion} {valid[8:10]}{valid[11:13]}{valid[14:16]}Z\n"
+    )
+
+
+class _IEMFalso:
+    """Servidor local con el contrato de asos.py y fallos programables."""
+
+    def __init__(self):
+        self.peticiones = []
+        self.vacios_pendientes = 0   # respuestas vacias antes de servir datos
+        self.fallan = set()          # (estacion, ano) que devuelven 500
+        self.cuerpo = None           # si se fija, se sirve tal cual
+        self.consultas = []
+        falso = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                q = parse_qs(urlparse(self.path).query)
+                clave = (q["station"][0], int(q["year1"][0]))
+                falso.peticiones.append(clave)
+                falso.consultas.append(q)
+                if clave in falso.fallan:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                if falso.cuerpo is not None:
+                    cuerpo = falso.cuerpo
+                elif falso.vacios_pendientes > 0:
+                    falso.vacios_pendientes -= 1
+                    cuerpo = CABECERA
+                else:
+                    cuerpo = _csv(*clave)
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(cuerpo.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.servidor.server_port}/asos.py"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def iem():
+    servidor = _IEMFalso()
+    yield servidor
+    servidor.cerrar()
+
+
+def _cubo():
+    # Ritmo alto para que el test no espere; la logica es la misma.
+    return CuboTokens(1000.0, tasa_min=100.0, tasa_max=1000.0)
+
+
+def test_descarga_varias_estaciones_y_guarda_crudos(iem, tmp_path):
+    manifiesto = descargar_estaciones(
+        ["SKBO", "SKRG"], 2010, 2012, raw_dir=tmp_path, url=iem.url, cubo=_cubo(),
+    )
+
+    assert sorted(iem.peticiones) == [(i, a) for i in ("SKBO", "SKRG") for a in (2010, 2011, 2012)]
+    for icao in ("SKBO", "SKRG"):
+        for ano in (2010, 2011, 2012):
+            assert ruta_cruda(tmp_path, icao, ano).exists()
+            assert manifiesto.completo(icao, ano)
+
+    trozos = leer_crudos("SKBO", 2010, 2012, raw_dir=tmp_path)
+    assert [len(t) for t in trozos] == [1, 1, 1]
+
+
+def test_reanudar_no_repite_lo_descargado(iem, tmp_path):
+    descargar_estaciones(["SKBO"], 2010, 2012, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+    antes = len(iem.peticiones)
+
+    descargar_estaciones(["SKBO"], 2010, 2013, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+
+    assert iem.peticiones[antes:] == [("SKBO", 2013)]
+
+
+def test_error_de_red_no_se_anota_y_se_reintenta(iem, tmp_path):
+    iem.fallan = {("SKBO", 2011)}
+    manifiesto = descargar_estaciones(
+        ["SKBO"], 2010, 2012, raw_dir=tmp_path, url=iem.url, cubo=_cubo(),
+    )
+    assert not manifiesto.completo("SKBO", 2011)
+    assert not ruta_cruda(tmp_path, "SKBO", 2011).exists()
+
+    iem.fallan = set()
+    antes = len(iem.peticiones)
+    manifiesto = descargar_estaciones(
+        ["SKBO"], 2010, 2012, raw_dir=tmp_path, url=iem.url, cubo=_cubo(),
+    )
+    assert iem.peticiones[antes:] == [("SKBO", 2011)]
+    assert manifiesto.completo("SKBO", 2011)
+
+
+def test_respuesta_vacia_frena_el_cubo_y_se_reintenta(iem, tmp_path):
+    iem.vacios_pendientes = 1
+    cubo = _cubo()
+    cubo.tasa_min = 1.0
+    manifiesto = descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=cubo)
+
+    assert iem.peticiones == [("SKBO", 2010), ("SKBO", 2010)]
+    assert manifiesto.entrada("SKBO", 2010)["estado"] == "ok"
+    assert cubo.tasa < 1000.0
+
+
+def test_ano_vacio_solo_se_cierra_si_otra_ejecucion_lo_confirma(iem, tmp_path):
+    """Un vacio suele ser throttling: la primera vez no se da por descargado."""
+    iem.vacios_pendientes = 99
+    manifiesto = descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+    assert manifiesto.entrada("SKBO", 2010)["estado"] == "vacio"
+    assert not manifiesto.completo("SKBO", 2010)
+    assert not ruta_cruda(tmp_path, "SKBO", 2010).exists()
+
+    manifiesto = descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+    assert manifiesto.completo("SKBO", 2010)
+
+    antes = len(iem.peticiones)
+    descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+    assert len(iem.peticiones) == antes
+
+
+def test_vacio_por_throttling_se_recupera_al_reanudar(iem, tmp_path):
+    iem.vacios_pendientes = 3  # agota los reintentos de la primera ejecucion
+    descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+
+    manifiesto = descargar_estaciones(["SKBO"], 2010, 2010, raw_dir=tmp_path, url=iem.url, cubo=_cubo())
+    assert manifiesto.entrada("SKBO", 2010)["estado"] == "ok"
+    assert ruta_cruda(tmp_path, "SKBO", 2010).exists()
+
+
+def test_manifiesto_persiste_entre_instancias(tmp_path):
+    ruta = tmp_path / "manifiesto.json"
+    Manifiesto(ruta).anotar("SKBO", 2015, estado="ok", filas=10, completo=True)
+    assert Manifiesto(ruta).completo("SKBO", 2015)
+    assert not Manifiesto(ruta).completo("SKBO", 2016)
+
+
+def test_cubo_penaliza_y_premia_dentro_de_limites():
+    cubo = CuboTokens(1.0, tasa_min=0.25, tasa_max=2.0)
+    for _ in range(5):
+        cubo.penalizar()
+    assert cubo.tasa == 0.25
+    for _ in range(50):
+        cubo.premiar()
+    assert cubo.tasa == 2.0
+
+
+def _historico(ruta, *valids):
+    bruto = pd.read_csv(
+        io.StringIO(CABECERA + "".join(_fila("SKBO", v) for v in valids)),
+        na_values=["M"],
+    )
+    a_schema(bruto, "SKBO").to_csv(ruta, index=False, encoding="utf-8")
+
+
+def test_incremental_anade_solo_lo_nuevo_sin_duplicar(iem, tmp_path):
+    ruta = tmp_path / "metar_skbo_2024_2024.csv"
+    _historico(ruta, "2024-01-01 00:00", "2024-01-01 01:00")
+    original = ruta.read_bytes()
+
+    # El IEM devuelve tambien la ultima ya guardada y una repetida.
+    iem.cuerpo = CABECERA + "".join(
+        _fila("SKBO", v)
+        for v in ("2024-01-01 01:00", "2024-01-01 02:00", "2024-01-01 02:00", "2024-01-01 03:00")
+    )
+    assert anexar_incremental("SKBO", ruta, url=iem.url, cubo=_cubo()) == 2
+
+    # Se pide desde la ultima observacion, no desde el principio del ano.
+    consulta = iem.consultas[-1]
+    assert (consulta["day1"][0], consulta["hour1"][0]) == ("1", "1")
+
+    # Lo que ya habia queda intacto; solo crece por el final.
+    assert ruta.read_bytes().startswith(original)
+    datos = pd.read_csv(ruta, parse_dates=["timestamp"])
+    assert datos["timestamp"].is_unique and datos["timestamp"].is_monotonic_increasing
+    assert len(datos) == 4
+    assert list(datos.columns) == list(pd.read_csv(ruta, nrows=0).columns)
+    assert ultimo_timestamp(ruta) == pd.Timestamp("2024-01-01 03:00")
+
+    # Repetir el refresco no anade nada.
+    assert anexar_incremental("SKBO", ruta, url=iem.url, cubo=_cubo()) == 0
+    assert len(pd.read_csv(ruta)) == 4
+
+
+def test_incremental_sin_novedades_no_reintenta_ni_frena(iem, tmp_path):
+    ruta = tmp_path / "metar_skbo_2024_2024.csv"
+    _historico(ruta, "2024-01-01 00:00")
+    iem.cuerpo = CABECERA
+    cubo = _cubo()
+
+    assert anexar_incremental("SKBO", ruta, url=iem.url, cubo=cubo) == 0
+    assert len(iem.peticiones) == 1
+    assert cubo.tasa == 1000.0
+
+
+def test_incremental_error_de_red_no_toca_el_fichero(iem, tmp_path):
+    ruta = tmp_path / "metar_skbo_2024_2024.csv"
+    _historico(ruta, "2024-01-01 00:00")
+    original = ruta.read_bytes()
+    iem.fallan = {("SKBO", 2024)}
+
+    assert anexar_incremental("SKBO", ruta, url=iem.url, cubo=_cubo()) is None
+    assert ruta.read_bytes() == original
+
+
+def test_ultimo_timestamp_lee_solo_el_final(tmp_path):
+    ruta = tmp_path / "metar.csv"
+    horas = pd.date_range("2020-01-01", periods=5000, freq="h")
+    pd.DataFrame({"timestamp": horas, "metar": "METAR SKBO " + "X" * 40}).to_csv(ruta, index=False)
+    assert ultimo_timestamp(ruta) == horas[-1]
+
+    vacio = tmp_path / "vacio.csv"
+    vacio.write_text("timestamp,metar\n", encoding="utf-8")
+    assert ultimo_timestamp(vacio) is None
+
+
+def _a_schema_por_filas(bruto, icao):
+    """Traduccion de referencia: la version fila a fila de antes."""
+    aeropuerto = obtener_aeropuerto(icao)
+
+    def techo(fila):
+        alturas = [
+            float(fila.get(f"skyl{i}")) for i in (1, 2, 3, 4)
+            if isinstance(fila.get(f"skyc{i}"), str)
+            and fila.get(f"skyc{i}").strip() in COBERTURA_SIGNIFICATIVA
+            and pd.notna(fila.get(f"skyl{i}"))
+        ]
+        return min(alturas) if alturas else 20000.0
+
+    def descripcion(codigos):
+        if not isinstance(codigos, str):
+            return "despejado"
+        return next((c for codigo, c in FENOMENOS if codigo in codigos.upper()), "despejado")
+
+    d = pd.DataFrame(index=bruto.index)
+    d["direccion_viento"] = bruto["drct"]
+    d["techo_nubes"] = bruto.apply(techo, axis=1)
+    d["descripcion"] = bruto["wxcodes"].apply(descripcion)
+    d["runway_heading"] = d["direccion_viento"].apply(
+        lambda x: cabecera_activa(x, aeropuerto) if pd.notna(x) else aeropuerto.rumbo_le
+    )
+    d["temperatura"] = (bruto["tmpf"] - 32) * 5 / 9
+    d["punto_rocio"] = (bruto["dwpf"] - 32) * 5 / 9
+    d["viento"] = bruto["sknt"] * 1.852
+    d["presion"] = bruto["alti"] * 33.8639
+    d["precipitacion"] = bruto["p01i"] * 25.4
+    d = d.dropna(subset=["temperatura", "viento", "presion"])
+    d["viento_cruzado"] = d.apply(
+        lambda r: viento_cruzado(r["viento"], r["direccion_viento"], r["runway_heading"])
+        if pd.notna(r["direccion_viento"]) else 0.0, axis=1)
+    d["viento_frente"] = d.apply(
+        lambda r: viento_frente(r["viento"], r["direccion_viento"], r["runway_heading"])
+        if pd.notna(r["direccion_viento"]) else r["viento"], axis=1)
+    d["altitud_densidad"] = d.apply(
+        lambda r: altitud_densidad(r["temperatura"], r["presion"], aeropuerto.altitud), axis=1)
+    d["riesgo_hielo"] = d.apply(
+        lambda r: riesgo_hielo(
+            r["temperatura"],
+            r["punto_rocio"] if pd.notna(r["punto_rocio"]) else r["temperatura"] - 3,
+            r["precipitacion"] if pd.notna(r["precipitacion"]) else 0.0,
+        ), axis=1)
+    return d
+
+
+def _bruto_aleatorio(n=3000):
+    rng = np.random.default_rng(7)
+
+    def con_huecos(valores, fraccion=0.1):
+        valores = np.asarray(valores, dtype=object if valores.dtype.kind in "OU" else float)
+        valores[rng.random(n) < fraccion] = np.nan
+        return valores
+
+    coberturas = np.array(["FEW", "SCT", "BKN", "OVC", "VV ", " BKN", "CLR"])
+    codigos = np.array(["", "-RA", "+RA BR", "TSRA", "VCTS", "SHRA", "FG", "HZ", "DZ", "-SN", "GR", "BR"])
+    bruto = pd.DataFrame({
+        "valid": pd.date_range("2020-01-01", periods=n, freq="h").strftime("%Y-%m-%d %H:%M"),
+        "tmpf": con_huecos(rng.uniform(20, 90, n), 0.02),
+        "dwpf": con_huecos(rng.uniform(15, 80, n)),
+        "relh": rng.uniform(20, 100, n),
+        # Direcciones enteras: incluye empates exactos entre cabeceras.
+        "drct": con_huecos(rng.integers(0, 37, n) * 10.0),
+        "sknt": con_huecos(rng.uniform(0, 30, n), 0.02),
+        "p01i": con_huecos(rng.uniform(0, 0.3, n) * (rng.random(n) < 0.3), 0.3),
+        "alti": rng.uniform(29.8, 30.4, n),
+        "vsby": rng.uniform(0.1, 10, n),
+        "gust": con_huecos(rng.uniform(10, 40, n), 0.8),
+        "wxcodes": con_huecos(rng.choice(codigos, n), 0.4),
+        "metar": "METAR",
+    })
+    for i in (1, 2, 3, 4):
+        bruto[f"skyc{i}"] = con_huecos(rng.choice(coberturas, n), 0.3)
+        bruto[f"skyl{i}"] = con_huecos(rng.integers(2, 250, n) * 100.0, 0.2)
+    return bruto
+
+
+@pytest.mark.parametrize("icao", ["SKBO", "SKRG"])
+def test_a_schema_por_columnas_equivale_a_fila_a_fila(icao):
+    bruto = _bruto_aleatorio()
+    nuevo = a_schema(bruto, icao)
+    referencia = _a_schema_por_filas(bruto, icao)
+
+    assert list(nuevo.index) == list(referencia.index)
+    for columna in ("techo_nubes", "runway_heading", "altitud_densidad"):
+        np.testing.assert_array_equal(nuevo[columna].to_numpy(), referencia[columna].to_numpy())
+    for columna in ("viento_cruzado", "viento_frente"):
+        # np.sin/np.cos frente a math.sin/math.cos: iguales salvo el ultimo bit.
+        np.testing.assert_allclose(nuevo[columna], referencia[columna], rtol=1e-12, atol=1e-12)
+    assert nuevo["descripcion"].tolist() == referencia["descripcion"].tolist()
+    assert nuevo["riesgo_hielo"].tolist() == referencia["riesgo_hielo"].tolist()
+    assert nuevo["riesgo_hielo"].sum() > 0
+
+
+def test_traduccion_en_streaming_equivale_a_todo_de_una_vez(tmp_path, monkeypatch):
+    monkeypatch.setattr(collect_metar_history.almacen, "PARQUET_DISPONIBLE", False)
+    raw_dir = tmp_path / "raw"
+    bruto = _bruto_aleatorio(12000)   # 2020 y parte de 2021
+    anos = pd.to_datetime(bruto["valid"]).dt.year
+    for ano, grupo in bruto.groupby(anos):
+        destino = ruta_cruda(raw_dir, "SKBO", ano)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        grupo.to_csv(destino, index=False)
+
+    # Trozos pequenos para que cada ano se parta en varios.
+    trozos = list(iter_crudos("SKBO", 2020, 2020, raw_dir=raw_dir, filas=700))
+    assert len(trozos) > 1 and max(len(t) for t in trozos) <= 700
+
+    monkeypatch.setattr(collect_metar_history, "TROZO_FILAS", 700)
+    salida = tmp_path / "metar_skbo.csv"
+    assert collect_metar_history._traducir_estacion("SKBO", 2020, 2021, salida, raw_dir=raw_dir) == 0
+
+    completo = a_schema(pd.concat(leer_crudos("SKBO", 2020, 2021, raw_dir=raw_dir), ignore_index=True), "SKBO")
+    esperado = tmp_path / "esperado.csv"
+    completo.to_csv(esperado, index=False)
+    pd.testing.assert_frame_equal(pd.read_csv(salida), pd.read_csv(esperado))
+    assert not (tmp_path / "metar_skbo.csv.tmp").exists()
+
+
+def test_traduccion_sin_crudos_no_deja_fichero(tmp_path):
+    salida = tmp_path / "metar_skbo.csv"
+    assert collect_metar_history._traducir_estacion("SKBO", 2020, 2021, salida, raw_dir=tmp_path) == 1
+    assert not salida.exists()
+    assert not (tmp_path / "metar_skbo.csv.tmp").exists()
@@ -0,0 +1,89 @@
+"""
+Tabla de contingencia vectorizada (ml/utils/contingencia.py).
+
+La curva de una pasada tiene que dar EXACTAMENTE lo mismo que calcular
+la tabla umbral a umbral, y los umbrales optimos no pueden cambiar.
+"""
+import numpy as np
+import pytest
+from sklearn.metrics import precision_recall_curve
+
+from ml.utils import contingencia
+
+
+def _tabla(y, pred) -> dict:
+    """Referencia: la tabla de un umbral, contando a mano."""
+    a = int(((pred == 1) & (y == 1)).sum())
+    b = int(((pred == 1) & (y == 0)).sum())
+    c = int(((pred == 0) & (y == 1)).sum())
+    d = int(((pred == 0) & (y == 0)).sum())
+    n = a + b + c + d
+    pod = a / (a + c) if (a + c) else 0.0
+    pofd = b / (b + d) if (b + d) else 0.0
+    exacto = (a + d) / n
+    azar = ((a + b) * (a + c) + (c + d) * (b + d)) / (n * n)
+    return {
+        "a": a, "b": b, "c": c, "d": d,
+        "POD": pod,
+        "FAR": b / (a + b) if (a + b) else 0.0,
+        "SR": a / (a + b) if (a + b) else 0.0,
+        "CSI": a / (a + b + c) if (a + b + c) else 0.0,
+        "Bias": (a + b) / (a + c) if (a + c) else 0.0,
+        "HSS": (exacto - azar) / (1 - azar) if (1 - azar) else 0.0,
+        "PSS": pod - pofd,
+        "POFD": pofd,
+    }
+
+
+def _datos(semilla, decimales=None, n=2000):
+    rng = np.random.default_rng(semilla)
+    p = rng.uniform(0, 1, n)
+    if decimales is not None:
+        p = np.round(p, decimales)  # muchos empates
+    y = (rng.uniform(0, 1, n) < 0.3 * p).astype(int)
+    return y, p
+
+
+@pytest.mark.parametrize("decimales", [None, 2])
+def test_curva_identica_a_umbral_por_umbral(decimales):
+    y, p = _datos(0, decimales)
+    umbrales = np.concatenate([[-1.0, 0.0], np.linspace(0.01, 0.95, 95), [1.0, 2.0]])
+    curva = contingencia.curva(y, p, umbrales)
+    for i, u in enumerate(umbrales):
+        assert contingencia.punto(curva, i) == _tabla(y, (p >= u).astype(int))
+
+
+def test_curva_completa_recorre_cada_score_distinto():
+    y, p = _datos(1, 2)
+    curva = contingencia.curva(y, p)
+    np.testing.assert_array_equal(curva["umbral"], np.unique(p))
+    # Al subir el umbral solo se pueden perder alertas.
+    assert (np.diff(curva["a"] + curva["b"]) < 0).all()
+
+
+@pytest.mark.parametrize("semilla", range(5))
+@pytest.mark.parametrize("decimales", [None, 2])
+def test_umbral_optimo_f1_igual_que_precision_recall_curve(semilla, decimales):
+    y, p = _datos(semilla, decimales)
+    pr, rc, th = precision_recall_curve(y, p)
+    f1 = np.divide(2 * pr * rc, pr + rc, out=np.zeros_like(pr), where=(pr + rc) > 0)
+    assert contingencia.umbral_optimo_f1(y, p) == float(th[max(np.argmax(f1[:-1]), 0)])
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_umbral_optimo_csi_igual_que_el_bucle(semilla):
+    y, p = _datos(semilla, 3)
+    umbrales = np.linspace(0.01, 0.95, 95)
+    mejor_u, mejor_csi = 0.5, -1
+    for u in umbrales:
+        csi = _tabla(y, (p >= u).astype(int))["CSI"]
+        if csi > mejor_csi:
+            mejor_csi, mejor_u = csi, u
+    assert contingencia.umbral_optimo(y, p, "CSI", umbrales) == mejor_u
+
+
+def test_prediccion_binaria_como_umbral_uno():
+    """Asi verifica verify_forecast la persistencia (0/1, sin score)."""
+    y, p = _datos(2)
+    pred = (p > 0.7).astype(np.int8)
+    assert contingencia.punto(contingencia.curva(y, pred, [1]), 0) == _tabla(y, pred)
@@ -0,0 +1,85 @@
+"""
+Cache de modelos ajustados (ml/utils/entrenamiento.py).
+
+Un modelo recuperado de la cache tiene que ser indistinguible de uno
+recien entrenado, y cualquier cambio en datos, hiperparametros o tramo
+tiene que provocar un reentrenamiento.
+"""
+import numpy as np
+import pytest
+
+from ml.utils import entrenamiento
+
+PEQUENO = {"n_estimators": 10, "max_depth": 4, "min_samples_leaf": 5}
+
+
+@pytest.fixture
+def datos():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 5)).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 0.5, 400) > 1).astype(np.int8)
+    return X, y
+
+
+def _entrenar(X, y, raiz, split="SKBO h3 anio<2023", **params):
+    return entrenamiento.entrenar_rf(X, y, split=split, params={**PEQUENO, **params}, n_jobs=1, raiz=raiz)
+
+
+def _modelos(raiz):
+    return sorted(raiz.glob("*.joblib"))
+
+
+def test_modelo_de_cache_igual_que_recien_entrenado(datos, tmp_path):
+    X, y = datos
+    nuevo = _entrenar(X, y, tmp_path)
+    de_cache = _entrenar(X, y, tmp_path)
+
+    assert len(_modelos(tmp_path)) == 1
+    np.testing.assert_array_equal(nuevo.predict_proba(X), de_cache.predict_proba(X))
+    sin_cache = entrenamiento.entrenar_rf(X, y, split="x", params=PEQUENO, n_jobs=1, cache=False)
+    np.testing.assert_array_equal(nuevo.predict_proba(X), sin_cache.predict_proba(X))
+
+
+def test_reentrena_si_cambian_datos_parametros_o_tramo(datos, tmp_path):
+    X, y = datos
+    X2 = X.copy()
+    X2[0, 0] += 1
+    rutas = [
+        entrenamiento.ruta_modelo(X, y, split="SKBO h3 anio<2023", params=PEQUENO, raiz=tmp_path),
+        entrenamiento.ruta_modelo(X2, y, split="SKBO h3 anio<2023", params=PEQUENO, raiz=tmp_path),
+        entrenamiento.ruta_modelo(X, y, split="SKBO h3 anio<2023", params={**PEQUENO, "max_depth": 6},
+                                  raiz=tmp_path),
+        entrenamiento.ruta_modelo(X, y, split="SKRG h3 anio<2023", params=PEQUENO, raiz=tmp_path),
+    ]
+    assert len(set(rutas)) == 4
+
+
+def test_modelo_nuevo_borra_los_obsoletos_de_su_tramo(datos, tmp_path):
+    X, y = datos
+    X2 = X.copy()
+    X2[0, 0] += 1
+    _entrenar(X, y, tmp_path, split="SKRG h3 anio<2023")
+    _entrenar(X, y, tmp_path)
+    _entrenar(X2, y, tmp_path)
+    _entrenar(X2, y, tmp_path, max_depth=6)
+
+    # Solo queda el ultimo de SKBO; el de SKRG no se toca.
+    assert _modelos(tmp_path) == sorted([
+        entrenamiento.ruta_modelo(X2, y, split="SKBO h3 anio<2023", params={**PEQUENO, "max_depth": 6},
+                                  raiz=tmp_path),
+        entrenamiento.ruta_modelo(X, y, split="SKRG h3 anio<2023", params=PEQUENO, raiz=tmp_path),
+    ])
+
+
+def test_n_jobs_no_forma_parte_de_la_clave(datos, tmp_path):
+    X, y = datos
+    _entrenar(X, y, tmp_path)
+    modelo = entrenamiento.entrenar_rf(X, y, split="SKBO h3 anio<2023", params=PEQUENO, n_jobs=2, raiz=tmp_path)
+    assert len(_modelos(tmp_path)) == 1
+    assert modelo.n_jobs == 2
+
+
+def test_huella_depende_del_contenido(datos):
+    X, y = datos
+    assert entrenamiento.huella_datos(X, y) == entrenamiento.huella_datos(X.copy(), y.copy())
+    assert entrenamiento.huella_datos(X, y) != entrenamiento.huella_datos(X.astype(np.float64), y)
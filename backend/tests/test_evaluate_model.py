@@ -0,0 +1,58 @@
+"""
+Evaluacion del clasificador legado en paralelo y con resultados guardados
+(ml/scripts/evaluate_model.py).
+
+Repartir los ajustes en procesos no puede cambiar ningun numero: cada
+tarea tiene que dar lo mismo que ajustar en secuencia como antes.
+"""
+import numpy as np
+import pytest
+from sklearn.dummy import DummyClassifier
+from sklearn.model_selection import StratifiedKFold, cross_val_score, train_test_split
+
+from features.build_features import build_features
+from ml.scripts import evaluate_model as ev
+from ml.scripts import generate_dataset_UNIFIED as gen
+
+
+@pytest.fixture(scope="module")
+def datos():
+    df = gen.generar_balanceado(400, np.random.default_rng(3))
+    df = df.astype({c: str for c in ("descripcion", "tipo_nubes", "turbulencia", "estado_pista", "riesgo")})
+    X, _ = build_features(df.drop(columns="riesgo"), fit=True)
+    return X, df["riesgo"]
+
+
+def test_igual_que_en_secuencia(datos, tmp_path):
+    X, y = datos
+    r = ev.calcular(X, y, procesos=2, raiz=tmp_path)
+    assert r["desde_cache"] is False
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=ev.RANDOM_STATE, stratify=y)
+    real, pred = ev._real_y_predicho(r, "rf_produccion")
+    esperado = ev.crear_modelo("rf_produccion").fit(X_train, y_train).predict(X_test)
+    assert list(real) == list(y_test)
+    assert list(pred) == list(esperado)
+
+    real, pred = ev._real_y_predicho(r, "aleatorio_estratificado")
+    dummy = DummyClassifier(strategy="stratified", random_state=ev.RANDOM_STATE).fit(X_train, y_train)
+    assert list(pred) == list(dummy.predict(X_test))
+
+    cv = StratifiedKFold(n_splits=ev.N_PLIEGUES, shuffle=True, random_state=ev.RANDOM_STATE)
+    scores = cross_val_score(ev.crear_modelo("rf_produccion"), X, y, cv=cv, scoring="accuracy")
+    paralelo = [np.mean(np.equal(*ev._real_y_predicho(r, f"cv_{i}"))) for i in range(ev.N_PLIEGUES)]
+    np.testing.assert_allclose(paralelo, scores)
+
+
+def test_resultados_guardados(datos, tmp_path):
+    X, y = datos
+    primera = ev.calcular(X, y, procesos=1, raiz=tmp_path)
+    segunda = ev.calcular(X, y, procesos=1, raiz=tmp_path)
+    assert segunda["desde_cache"] is True
+    assert segunda["tareas"]["arbol_d3"]["reglas"] == primera["tareas"]["arbol_d3"]["reglas"]
+
+    # Otros datos, otra clave: no se reutiliza nada.
+    otra = ev.calcular(X.iloc[:-10], y.iloc[:-10], procesos=1, raiz=tmp_path)
+    assert otra["desde_cache"] is False
+    assert len(list(tmp_path.glob("*.joblib"))) == 2
@@ -25,9 +25,13 @@ requiere_modelo = pytest.mark.skipif(
 
 
 @pytest.fixture
-def mock_metar(monkeypatch):
-    """Inyecta un METAR fijo en el servicio, saltándose la red."""
+def mock_metar(monkeypatch, cache_respuestas_vacia):
+    """
+    Inyecta un METAR fijo en el servicio, saltándose la red. Un METAR
+    nuevo vacía la cache de respuestas, como lo haría el TTL.
+    """
     def _set(raw):
+        cache_respuestas_vacia.limpiar()
         async def fake_get(self, icao):
             return {"raw": raw}
         monkeypatch.setattr(
@@ -123,6 +127,10 @@ def test_metar_incompleto_da_422(mock_metar):
     assert r.status_code == 422
 
 
+def test_tier_desconocido_da_422():
+    assert client.get("/api/v1/forecast/SKBO?tier=turbo").status_code == 422
+
+
 def test_listado_de_soportados():
     r = client.get("/api/v1/forecast/")
     assert r.status_code == 200
@@ -12,15 +12,25 @@ El resultado del proyecto depende de dos invariantes que se prueban aqui:
      la que sale la etiqueta. Incluirla reintroduce la circularidad que
      todo este trabajo busca eliminar.
 """
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 import pytest
 
+from features.forecast_features import compactar
+from ml.scripts import build_forecast_dataset
 from ml.scripts.build_forecast_dataset import (
     FEATURES_BASE,
+    FEATURES_DERIVADAS,
+    add_forecast_features,
     construir,
+    emparejar,
     es_adverso,
+    preparar,
+    procesar_estacion,
 )
+from ml.utils import almacen, cache_features
 
 
 def _historico(condiciones, inicio="2020-01-01", freq="1h"):
@@ -143,3 +153,160 @@ def test_sin_nulos_en_features():
 def test_objetivo_es_binario():
     datos = construir(_historico(["despejado", "niebla", "tormenta"] * 10), horizonte=3)
     assert set(datos.objetivo.unique()) <= {0, 1}
+
+
+# =========================================================================
+# Varios horizontes de una pasada
+# =========================================================================
+
+def _construir_con_merge(df, horizonte):
+    """Referencia: el emparejamiento por merge de tablas que se usaba antes."""
+    df = add_forecast_features(
+        df.sort_values("timestamp").drop_duplicates("timestamp").reset_index(drop=True)
+    )
+    futuro = df[["timestamp", "adverso_actual"]].rename(
+        columns={"timestamp": "t_futuro", "adverso_actual": "objetivo"})
+    df["t_objetivo"] = df["timestamp"] + pd.Timedelta(hours=horizonte)
+    emparejado = df.merge(futuro, left_on="t_objetivo", right_on="t_futuro", how="inner")
+    columnas = FEATURES_BASE + FEATURES_DERIVADAS + ["objetivo", "timestamp"]
+    return emparejado[columnas].dropna(subset=FEATURES_BASE + ["objetivo"]).reset_index(drop=True)
+
+
+def _historico_irregular():
+    rng = np.random.default_rng(3)
+    cond = rng.choice(["despejado", "niebla", "tormenta", "lluvia_ligera"], 600)
+    hist = _historico(list(cond))
+    # Huecos, observaciones fuera de la hora en punto, duplicados y desorden.
+    hist = hist.drop(index=rng.choice(600, 80, replace=False))
+    hist.loc[hist.index[::37], "timestamp"] += pd.Timedelta(minutes=30)
+    hist = pd.concat([hist, hist.iloc[:5]]).sample(frac=1, random_state=0)
+    hist.loc[hist.index[::50], "visibilidad"] = np.nan
+    return hist
+
+
+@pytest.mark.parametrize("horizonte", [1, 2, 3, 6])
+def test_searchsorted_equivale_al_merge(horizonte):
+    hist = _historico_irregular()
+    pd.testing.assert_frame_equal(construir(hist, horizonte), _construir_con_merge(hist, horizonte))
+
+
+def test_preparar_una_vez_sirve_para_todos_los_horizontes():
+    hist = _historico_irregular()
+    preparado = preparar(hist)
+    for horizonte in (1, 3, 6):
+        pd.testing.assert_frame_equal(emparejar(preparado, horizonte), construir(hist, horizonte))
+
+
+def _estacion_en(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_forecast_dataset, "METAR_DIR", tmp_path / "metar")
+    monkeypatch.setattr(build_forecast_dataset, "SALIDA_DIR", tmp_path / "forecast")
+    monkeypatch.setattr(almacen, "METAR_PARQUET", tmp_path / "metar" / "parquet")
+    monkeypatch.setattr(almacen, "FORECAST_DIR", tmp_path / "forecast")
+    monkeypatch.setattr(cache_features, "CACHE_DIR", tmp_path / "cache")
+    (tmp_path / "metar").mkdir()
+    hist = _historico_irregular()
+    hist.to_csv(tmp_path / "metar" / "metar_skbo_2020_2020.csv", index=False)
+
+
+def test_procesar_estacion_escribe_cada_horizonte(tmp_path, monkeypatch):
+    _estacion_en(tmp_path, monkeypatch)
+
+    assert build_forecast_dataset.estaciones_disponibles() == ["skbo"]
+    resumen = procesar_estacion("skbo", [1, 3])
+    assert list((tmp_path / "cache" / "preparado").glob("*.arrow"))
+
+    assert [fila["horizonte"] for fila in resumen] == [1, 3]
+    for fila in resumen:
+        datos = almacen.cargar_forecast("SKBO", fila["horizonte"])
+        assert len(datos) == fila["pares"] > 0
+        assert datos["objetivo"].mean() == pytest.approx(fila["adversos"])
+
+    # En disco a precision completa; compacto solo al cargar.
+    guardado = almacen.leer(almacen.forecast_parquet(3), "SKBO")
+    assert guardado["temperatura"].dtype == np.float64
+    assert almacen.cargar_forecast("SKBO", 3)["temperatura"].dtype == np.float32
+
+
+def test_cambio_en_el_script_reconstruye_el_preparado(tmp_path, monkeypatch):
+    # preparar() vive en el propio script: si se edita, la entrada vieja
+    # no puede seguir sirviendose.
+    _estacion_en(tmp_path, monkeypatch)
+    llamadas = []
+    original = build_forecast_dataset.preparar
+    monkeypatch.setattr(build_forecast_dataset, "preparar",
+                        lambda df: llamadas.append(1) or original(df))
+
+    build_forecast_dataset.preparado_en_cache("skbo")
+    build_forecast_dataset.preparado_en_cache("skbo")
+    antes = list((tmp_path / "cache" / "preparado").glob("*.arrow"))
+    assert len(llamadas) == 1
+
+    script = Path(build_forecast_dataset.__file__)
+    huella = cache_features.huella
+    monkeypatch.setattr(cache_features, "huella",
+                        lambda ruta: huella(ruta) + ("editado" if Path(ruta) == script else ""))
+
+    build_forecast_dataset.preparado_en_cache("skbo")
+    despues = list((tmp_path / "cache" / "preparado").glob("*.arrow"))
+    assert len(llamadas) == 2
+    assert len(despues) == 1 and despues != antes
+
+
+# =========================================================================
+# Tipos compactos
+# =========================================================================
+
+def _dataset_sintetico(n=4000):
+    rng = np.random.default_rng(11)
+    cond = rng.choice(["despejado", "niebla", "tormenta"], n, p=[0.8, 0.15, 0.05])
+    hist = _historico(list(cond))
+    for columna in ("temperatura", "punto_rocio", "humedad", "visibilidad", "presion", "viento"):
+        hist[columna] = hist[columna] + rng.normal(0, 3, n)
+    return construir(hist, horizonte=3)
+
+
+def test_compactar_reduce_memoria_y_conserva_valores():
+    datos = _dataset_sintetico()
+    compacto = compactar(datos)
+
+    assert compacto["hora"].dtype == np.int8
+    assert compacto["objetivo"].dtype == np.int8
+    assert compacto["temperatura"].dtype == np.float32
+    assert compacto["timestamp"].dtype == datos["timestamp"].dtype
+    assert compacto.memory_usage(deep=True).sum() < 0.55 * datos.memory_usage(deep=True).sum()
+    np.testing.assert_array_equal(compacto["mes"], datos["mes"])
+    np.testing.assert_array_equal(compacto["temperatura"], datos["temperatura"].astype(np.float32))
+
+
+def test_compactar_no_mete_enteros_con_nulos():
+    df = pd.DataFrame({"hora": [1.0, np.nan], "otra": ["a", "b"]})
+    compacto = compactar(df)
+    assert compacto["hora"].dtype == np.float32
+    assert compacto["otra"].dtype == object
+
+
+def test_tipos_compactos_no_cambian_el_modelo():
+    """
+    El bosque convierte X a float32 internamente: entrenar con el dataset
+    compacto debe dar exactamente las mismas probabilidades y metricas.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import average_precision_score
+
+    from features.forecast_features import FORECAST_FEATURES
+
+    datos = _dataset_sintetico()
+    compacto = compactar(datos)
+    corte = len(datos) * 3 // 4
+
+    def probabilidades(df):
+        X, y = df[FORECAST_FEATURES].values, df["objetivo"].values
+        modelo = RandomForestClassifier(
+            n_estimators=30, max_depth=8, min_samples_leaf=5, random_state=42, n_jobs=1,
+        ).fit(X[:corte], y[:corte])
+        return modelo.predict_proba(X[corte:])[:, 1], y[corte:]
+
+    p64, y64 = probabilidades(datos)
+    p32, y32 = probabilidades(compacto)
+    np.testing.assert_array_equal(p32, p64)
+    assert average_precision_score(y32, p32) == average_precision_score(y64, p64)
@@ -0,0 +1,262 @@
+"""
+Motores de inferencia del pronostico (services/forecast_engine.py).
+
+ForecastService no sabe que familia de modelo hay detras: tiene que
+servir igual un bosque que un HistGradientBoosting, calibrados o no, y
+decir cual es.
+"""
+import asyncio
+import json
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
+
+from features.forecast_features import FORECAST_FEATURES
+from ml.utils import entrenamiento
+from services import forecast_service
+from services.forecast_engine import (
+    MotorBosqueCompacto,
+    MotorCalibrado,
+    RAPIDO,
+    MotorSklearn,
+    cargar_motor,
+    compactar_bosque,
+    exportar_bosque,
+    guardar_calibrado,
+    nombre_artefacto,
+)
+
+
+@pytest.fixture(scope="module")
+def datos():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, len(FORECAST_FEATURES))).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 0.5, 500) > 1).astype(np.int8)
+    return X, y
+
+
+def _entrenar(motor, X, y):
+    modelo = entrenamiento.crear_modelo(motor, n_jobs=1)
+    if motor == "rf":
+        modelo.set_params(n_estimators=10)
+    else:
+        modelo.set_params(max_iter=20)
+    return modelo.fit(X, y)
+
+
+def test_nombres_de_artefacto():
+    assert nombre_artefacto("SKBO", 3) == "forecast_skbo_h3.pkl"
+    assert nombre_artefacto("SKBO", 3, calibrado=True) == "forecast_skbo_h3_calibrado.pkl"
+    assert nombre_artefacto("skrg", 6, "hgb") == "forecast_skrg_h6_hgb.pkl"
+    assert nombre_artefacto("SKRG", 6, "hgb", calibrado=True) == "forecast_skrg_h6_hgb_calibrado.pkl"
+
+
+def test_crear_modelo_motor_desconocido():
+    with pytest.raises(ValueError):
+        entrenamiento.crear_modelo("xgb")
+
+
+@pytest.mark.parametrize("motor", ["rf", "hgb"])
+def test_motor_sirve_igual_que_el_estimador(motor, datos, tmp_path):
+    X, y = datos
+    modelo = _entrenar(motor, X, y)
+    ruta = tmp_path / nombre_artefacto("SKBO", 3, motor)
+    joblib.dump(modelo, ruta)
+
+    servido = cargar_motor(ruta)
+    np.testing.assert_array_equal(servido.predict_proba(X), modelo.predict_proba(X))
+    meta = servido.metadatos()
+    assert meta["familia"] == motor
+    assert meta["calibrado"] is False
+    assert meta["n_features"] == len(FORECAST_FEATURES)
+    assert meta["tamano_bytes"] == ruta.stat().st_size
+
+
+def test_motor_calibrado_informa_la_familia_de_debajo(datos):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("hgb", X, y)), method="isotonic").fit(X, y)
+    meta = MotorSklearn(calibrado).metadatos()
+    assert meta["familia"] == "hgb"
+    assert meta["calibrado"] is True
+    assert meta["tamano_bytes"] is None
+
+
+def test_extension_desconocida(tmp_path):
+    with pytest.raises(ValueError):
+        cargar_motor(tmp_path / "modelo.onnx")
+
+
+def test_forecast_service_con_motor_hgb(datos, tmp_path, monkeypatch):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("hgb", X, y)), method="isotonic").fit(X, y)
+    joblib.dump(calibrado, tmp_path / nombre_artefacto("SKBO", 3, "hgb", calibrado=True))
+    monkeypatch.setattr(forecast_service, "MODEL_DIR", tmp_path)
+
+    async def fake_get(self, icao):
+        return {"raw": "METAR SKBO 230600Z 00000KT 0500 FG OVC002 11/11 Q1027"}
+    monkeypatch.setattr("services.metar_taf_service.METARTAFService.get_metar_data", fake_get)
+
+    assert not forecast_service.ForecastService("SKBO", 3, motor="rf").disponible()
+    servicio = forecast_service.ForecastService("SKBO", 3, motor="hgb")
+    assert servicio.disponible() and servicio.calibrado
+
+    respuesta = asyncio.run(servicio.pronosticar("SKBO"))
+    assert respuesta["motor"] == "hgb"
+    assert 0.0 <= respuesta["probabilidad"] <= 1.0
+
+
+@pytest.mark.parametrize("motor", ["rf", "hgb"])
+@pytest.mark.parametrize("metodo", ["isotonic", "sigmoid"])
+def test_mapa_de_calibracion_igual_que_el_envoltorio(motor, metodo, datos, tmp_path):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar(motor, X, y)), method=metodo).fit(X, y)
+
+    ruta = guardar_calibrado(calibrado, tmp_path, "SKBO", 3, motor)
+    assert ruta.name == nombre_artefacto("SKBO", 3, motor, calibrado=True, extension=".npz")
+    servido = cargar_motor(ruta)
+
+    assert isinstance(servido, MotorCalibrado)
+    # Fuera del rango de calibracion tambien (np.interp satura igual que clip).
+    X_prueba = np.vstack([X, X * 5])
+    np.testing.assert_allclose(servido.predict_proba(X_prueba), calibrado.predict_proba(X_prueba),
+                               rtol=0, atol=1e-9)
+    meta = servido.metadatos()
+    assert meta["familia"] == motor and meta["calibrado"] and meta["calibracion"] == metodo
+
+
+def test_forecast_service_prefiere_el_mapa_npz(datos, tmp_path, monkeypatch):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("rf", X, y)), method="isotonic").fit(X, y)
+    joblib.dump(calibrado, tmp_path / nombre_artefacto("SKBO", 3, calibrado=True))
+    guardar_calibrado(calibrado, tmp_path, "SKBO", 3)
+    monkeypatch.setattr(forecast_service, "MODEL_DIR", tmp_path)
+
+    servicio = forecast_service.ForecastService("SKBO", 3, motor="rf")
+    assert isinstance(servicio.modelo, MotorCalibrado)
+    assert servicio.calibrado
+
+
+@pytest.mark.parametrize("hojas", ["float32", "float16"])
+def test_bosque_compacto_igual_que_el_bosque(hojas, datos, tmp_path):
+    X, y = datos
+    X = X.copy()
+    X[::7, 1] = np.nan  # huecos: el bosque aprende a donde mandarlos
+    bosque = _entrenar("rf", X, y)
+    ruta = exportar_bosque(bosque, tmp_path / nombre_artefacto("SKBO", 3, extension=".npy"), X[:100], hojas=hojas)
+
+    servido = cargar_motor(ruta)
+    assert isinstance(servido, MotorBosqueCompacto)
+    assert isinstance(servido.valor, np.memmap)
+    # Sobre filas que no se usaron en la comprobacion al exportar.
+    tolerancia = 1e-6 if hojas == "float32" else 1e-3
+    np.testing.assert_allclose(servido.predict_proba(X), bosque.predict_proba(X), rtol=0, atol=tolerancia)
+    meta = servido.metadatos()
+    assert meta["familia"] == "rf" and meta["formato"] == "compacto"
+    assert meta["n_features"] == len(FORECAST_FEATURES)
+    assert meta["error_max"] <= tolerancia
+
+
+def test_bosque_compacto_umbrales_float32_no_cambian_de_rama(datos):
+    """Un valor justo en el umbral float32 redondeado tiene que ir al mismo lado."""
+    X, y = datos
+    bosque = _entrenar("rf", X, y)
+    compacto = MotorBosqueCompacto(compactar_bosque(bosque))
+    # Filas con cada feature puesta en los umbrales (y sus vecinos float32).
+    umbrales = bosque.estimators_[0].tree_.threshold[bosque.estimators_[0].tree_.feature >= 0]
+    casos = np.concatenate([umbrales.astype(np.float32), np.nextafter(umbrales.astype(np.float32), np.inf)])
+    X_borde = np.repeat(casos[:, None], X.shape[1], axis=1)
+    np.testing.assert_allclose(compacto.predict_proba(X_borde), bosque.predict_proba(X_borde), rtol=0, atol=1e-6)
+
+
+def test_bosque_compacto_fuera_de_tolerancia_no_se_escribe(datos, tmp_path):
+    X, y = datos
+    ruta = tmp_path / "bosque.npy"
+    with pytest.raises(ValueError):
+        exportar_bosque(_entrenar("rf", X, y), ruta, X, hojas="float16", tolerancia=1e-9)
+    assert not ruta.exists()
+
+
+def test_calibrado_con_base_compacto(datos, tmp_path, monkeypatch):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("rf", X, y)), method="isotonic").fit(X, y)
+    ruta = guardar_calibrado(calibrado, tmp_path, "SKBO", 3, control=X)
+    assert (tmp_path / f"{ruta.stem}_base.npy").exists()
+
+    servido = cargar_motor(ruta)
+    assert isinstance(servido.base, MotorBosqueCompacto)
+    assert servido.metadatos()["familia"] == "rf"
+    # La tolerancia del float32 se cumple ya calibrada, y es ese error el
+    # que queda en la cabecera.
+    error = np.abs(servido.predict_proba(X) - calibrado.predict_proba(X)).max()
+    assert error <= 1e-6
+    assert servido.base.error_max == pytest.approx(error, rel=1e-6)
+
+    # Sin calibrar, ForecastService prefiere el .npy al .pkl.
+    (tmp_path / ruta.name).unlink()
+    joblib.dump(_entrenar("rf", X, y), tmp_path / nombre_artefacto("SKBO", 3))
+    exportar_bosque(_entrenar("rf", X, y), tmp_path / nombre_artefacto("SKBO", 3, extension=".npy"), X)
+    monkeypatch.setattr(forecast_service, "MODEL_DIR", tmp_path)
+    assert isinstance(forecast_service.ForecastService("SKBO", 3, motor="rf").modelo, MotorBosqueCompacto)
+
+
+def test_calibrado_fuera_de_tolerancia_no_se_escribe(datos, tmp_path):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("rf", X, y)), method="isotonic").fit(X, y)
+    with pytest.raises(ValueError):
+        guardar_calibrado(calibrado, tmp_path, "SKBO", 3, control=X, tolerancia=1e-12)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("tipo", entrenamiento.ALUMNOS)
+def test_alumno_destilado_imita_al_profesor(tipo, datos):
+    X, y = datos
+    profesor = CalibratedClassifierCV(FrozenEstimator(_entrenar("rf", X, y)), method="sigmoid").fit(X, y)
+    p = profesor.predict_proba(X)[:, 1]
+    alumno = entrenamiento.destilar(entrenamiento.crear_alumno(tipo), X, p)
+    con_etiquetas = entrenamiento.crear_alumno(tipo).fit(X, y)
+    # Aprende la probabilidad del profesor, no la etiqueta: se le parece
+    # mas que el mismo modelo entrenado con las etiquetas 0/1.
+    distancia = np.abs(alumno.predict_proba(X)[:, 1] - p).mean()
+    assert distancia < np.abs(con_etiquetas.predict_proba(X)[:, 1] - p).mean()
+    assert distancia < 0.1
+    assert MotorSklearn(alumno).metadatos()["familia"] == tipo
+
+
+def test_crear_alumno_desconocido():
+    with pytest.raises(ValueError):
+        entrenamiento.crear_alumno("svm")
+
+
+def test_forecast_service_tier_fast(datos, tmp_path, monkeypatch):
+    X, y = datos
+    calibrado = CalibratedClassifierCV(FrozenEstimator(_entrenar("rf", X, y)), method="isotonic").fit(X, y)
+    guardar_calibrado(calibrado, tmp_path, "SKBO", 3)
+    monkeypatch.setattr(forecast_service, "MODEL_DIR", tmp_path)
+
+    async def fake_get(self, icao):
+        return {"raw": "METAR SKBO 230600Z 00000KT 0500 FG OVC002 11/11 Q1027"}
+    monkeypatch.setattr("services.metar_taf_service.METARTAFService.get_metar_data", fake_get)
+
+    sin_rapido = forecast_service.ForecastService("SKBO", 3, motor="rf")
+    assert sin_rapido.disponible("full") and not sin_rapido.disponible("fast")
+
+    alumno = entrenamiento.destilar(entrenamiento.crear_alumno("hgb"), X, calibrado.predict_proba(X)[:, 1])
+    ruta = tmp_path / nombre_artefacto("SKBO", 3, RAPIDO)
+    joblib.dump(alumno, ruta)
+    metricas = {"periodo": "test >= 2023", "full": {"pr_auc": 0.3}, "fast": {"pr_auc": 0.29}}
+    ruta.with_suffix(".json").write_text(json.dumps(metricas))
+
+    servicio = forecast_service.ForecastService("SKBO", 3, motor="rf")
+    # La familia se resuelve al cargar: pronosticar no toca los artefactos.
+    for modelo in (servicio.modelo, servicio.rapido):
+        monkeypatch.setattr(modelo, "metadatos", lambda: pytest.fail("metadatos() en la peticion"))
+    rapida = asyncio.run(servicio.pronosticar("SKBO", "fast"))
+    completa = asyncio.run(servicio.pronosticar("SKBO"))
+    assert (rapida["tier"], rapida["motor"]) == ("fast", "hgb")
+    assert (completa["tier"], completa["motor"]) == ("full", "rf")
+    assert rapida["metricas_validacion"] == completa["metricas_validacion"] == metricas
+    with pytest.raises(ValueError):
+        asyncio.run(servicio.pronosticar("SKBO", "turbo"))
@@ -0,0 +1,77 @@
+"""
+Generador vectorizado del dataset sintetico (ml/scripts/generate_dataset_UNIFIED.py).
+
+La version vectorizada tiene que etiquetar igual que la escalar fila a
+fila y muestrear las mismas distribuciones; se comprueba contra la
+escalar, que es la referencia.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.scripts import generate_dataset_UNIFIED as gen
+
+
+def test_etiquetas_iguales_a_la_version_escalar():
+    df = gen.generar(20_000, np.random.default_rng(0))
+    escalar = [gen.calculate_risk_aviation(fila) for fila in df.to_dict("records")]
+    assert list(gen.calcular_riesgo(df)) == escalar
+
+
+def test_etiquetas_en_los_bordes_de_los_escalones():
+    """Valores justo en los umbrales, donde > y >= se distinguen."""
+    rng = np.random.default_rng(1)
+    df = gen.generar(2_000, rng)
+    df["viento_cruzado"] = rng.choice([10, 15, 20, 25, 35], len(df)).astype(float)
+    df["visibilidad"] = rng.choice([800, 1500, 3000, 5000, 8000], len(df))
+    df["techo_nubes"] = rng.choice([200, 300, 500, 1000, 1500], len(df))
+    df["presion"] = rng.choice([980, 990, 1025, 1030], len(df))
+    df["temperatura"] = rng.choice([-5.0, 0.0, 5.0, 35.0, 38.0, 40.0], len(df))
+    escalar = [gen.calculate_risk_aviation(fila) for fila in df.to_dict("records")]
+    assert list(gen.calcular_riesgo(df)) == escalar
+
+
+def test_misma_distribucion_de_etiquetas_que_la_escalar():
+    random.seed(42)
+    escalar = pd.Series([gen.calculate_risk_aviation(gen.generate_realistic_aviation_weather())
+                         for _ in range(20_000)]).value_counts(normalize=True)
+    vectorizada = pd.Series(gen.calcular_riesgo(gen.generar(200_000, np.random.default_rng(42))))
+    vectorizada = vectorizada.value_counts(normalize=True)
+    for clase in gen.RISK_CLASSES:
+        assert vectorizada[clase] == pytest.approx(escalar[clase], abs=0.02)
+
+
+def test_mismas_columnas_que_la_escalar():
+    random.seed(0)
+    escalar = pd.DataFrame([gen.generate_realistic_aviation_weather() for _ in range(50)])
+    df = gen.generar(50, np.random.default_rng(0))
+    assert list(df.columns) == list(escalar.columns)
+    # Rumbo de pista: siempre la cabecera activa del aeropuerto.
+    assert (df.viento_frente >= -1e-9).all()
+
+
+def test_balanceado_respeta_la_distribucion_objetivo():
+    df = gen.generar_balanceado(1_000, np.random.default_rng(0))
+    assert df.riesgo.value_counts().to_dict() == {"BAJO": 450, "MODERADO": 350, "ALTO": 200}
+    assert list(df.riesgo) == list(gen.calcular_riesgo(df))
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_escritura_por_lotes(tmp_path, extension):
+    if extension == ".parquet" and not gen.PARQUET_DISPONIBLE:
+        pytest.skip("pyarrow no instalado")
+    leer = pd.read_parquet if extension == ".parquet" else pd.read_csv
+
+    ruta = tmp_path / f"dataset{extension}"
+    resumen = gen.escribir_dataset(ruta, 2_500, lote=1_000, semilla=7)
+    df = leer(ruta)
+    assert len(df) == 2_500
+    assert list(df.columns) == gen.COLUMNAS + ["riesgo"]
+    assert df.riesgo.value_counts().to_dict() == resumen[("temperatura", "count")].to_dict()
+
+    # Misma semilla, mismo archivo.
+    otra = tmp_path / f"otra{extension}"
+    gen.escribir_dataset(otra, 2_500, lote=1_000, semilla=7)
+    pd.testing.assert_frame_equal(leer(otra), df)
@@ -0,0 +1,92 @@
+"""
+Respuestas JSON con orjson (api/json_response.py).
+
+Lo que se escapa de predict_batch son tipos de NumPy y pandas; tienen
+que salir como los numeros y fechas que el cliente espera, no tumbar la
+respuesta.
+"""
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from api.json_response import RespuestaJSON, a_json
+
+
+class _Modelo(BaseModel):
+    riesgo: str
+    instante: datetime
+
+
+def test_tipos_de_numpy_y_pandas():
+    contenido = {
+        "confianza": np.float64(0.875),
+        "clase": np.int64(2),
+        "media": np.float16(0.5),
+        "alto": np.bool_(True),
+        "probabilidades": np.array([0.1, 0.2, 0.7]),
+        "instante": pd.Timestamp("2025-03-01T12:00:00Z"),
+        "sin_fecha": pd.NaT,
+        "nan": np.float64("nan"),
+    }
+    assert orjson.loads(a_json(contenido)) == {
+        "confianza": 0.875,
+        "clase": 2,
+        "media": 0.5,
+        "alto": True,
+        "probabilidades": [0.1, 0.2, 0.7],
+        "instante": "2025-03-01T12:00:00+00:00",
+        "sin_fecha": None,
+        "nan": None,
+    }
+
+
+def test_otros_tipos():
+    instante = datetime(2025, 3, 1, 12, tzinfo=timezone.utc)
+    contenido = {"decimal": Decimal("1.5"), "conjunto": {3}, "modelo": _Modelo(riesgo="ALTO", instante=instante)}
+    assert orjson.loads(a_json(contenido)) == {
+        "decimal": 1.5,
+        "conjunto": [3],
+        "modelo": {"riesgo": "ALTO", "instante": "2025-03-01T12:00:00Z"},
+    }
+    with pytest.raises(TypeError):
+        a_json({"x": object()})
+
+
+def test_igual_que_el_json_de_starlette():
+    """Para contenido primitivo el cuerpo no cambia: compacto y en UTF-8."""
+    from fastapi.responses import JSONResponse
+
+    contenido = {"ciudad": "Bogotá", "riesgo": "BAJO", "probabilidades": {"BAJO": 0.9}, "n": [1, None]}
+    assert RespuestaJSON(contenido).body == JSONResponse(contenido).body
+
+
+def test_clase_por_defecto_de_la_app(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.settings, "RATE_LIMIT_ENABLED", False)
+    assert main.app.router.default_response_class is RespuestaJSON
+    r = TestClient(main.app).get("/")
+    assert r.status_code == 200 and r.headers["content-type"] == "application/json"
+
+
+def test_ruta_que_devuelve_numpy_sin_jsonable_encoder():
+    """
+    jsonable_encoder no sabe de np.int64: una ruta con salida de
+    predict_batch tiene que devolver RespuestaJSON directamente.
+    """
+    app = FastAPI(default_response_class=RespuestaJSON)
+
+    @app.get("/prediccion")
+    async def prediccion():
+        return RespuestaJSON({"clase": np.int64(2), "confianza": np.float64(0.91)})
+
+    r = TestClient(app).get("/prediccion")
+    assert r.status_code == 200
+    assert r.json() == {"clase": 2, "confianza": 0.91}
@@ -0,0 +1,145 @@
+"""
+Backends del rate limiter (api/rate_limit.py).
+
+Los tres tienen que limitar igual; los compartidos, ademas, tienen que
+repartir la cuota entre procesos. Redis se sustituye por el servidor
+RESP minimo de conftest.py (fixture servidor_resp).
+"""
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from api.rate_limit import (
+    BaseRateLimiter,
+    ClienteRESP,
+    ErrorRESP,
+    RateLimiter,
+    RedisRateLimiter,
+    SQLiteRateLimiter,
+    crear_rate_limiter,
+)
+
+
+class _Reloj:
+    def __init__(self):
+        self.t = 960.0  # inicio de una ventana de 60 s
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def fabrica(request, tmp_path):
+    """Crea limiters del backend; los compartidos, sobre el mismo almacen."""
+    creados = []
+
+    def crear(reloj):
+        if request.param == "memoria":
+            limiter = RateLimiter(reloj=reloj)
+        elif request.param == "sqlite":
+            limiter = SQLiteRateLimiter(tmp_path / "rl.db", reloj=reloj)
+        else:
+            limiter = RedisRateLimiter(request.getfixturevalue("servidor_resp"), reloj=reloj)
+        creados.append(limiter)
+        return limiter
+
+    crear.backend = request.param
+    yield crear
+    for limiter in creados:
+        if hasattr(limiter, "close"):
+            limiter.close()
+
+
+def test_limita_y_aisla_por_clave(fabrica):
+    limiter = fabrica(_Reloj())
+    assert all(limiter.check_rate_limit("ip:1", max_requests=3) for _ in range(3))
+    assert limiter.check_rate_limit("ip:1", max_requests=3) is False
+    assert limiter.check_rate_limit("ip:2", max_requests=3) is True
+    assert limiter.get_remaining_requests("ip:1", max_requests=3) == 0
+    assert limiter.get_remaining_requests("ip:2", max_requests=3) == 2
+
+
+def test_ventana_deslizante(fabrica):
+    reloj = _Reloj()
+    limiter = fabrica(reloj)
+    for _ in range(10):
+        limiter.check_rate_limit("ip:1", max_requests=10)
+
+    reloj.t += 90  # mitad de la ventana siguiente: cuentan 5 de los 10
+    assert sum(limiter.check_rate_limit("ip:1", max_requests=10) for _ in range(10)) == 5
+
+    reloj.t += 120  # dos ventanas sin requests: cuota entera
+    assert limiter.get_remaining_requests("ip:1", max_requests=10) == 10
+
+
+def test_cuota_compartida_entre_workers(fabrica):
+    """Dos limiters sobre el mismo almacen son dos workers de la misma API."""
+    if fabrica.backend == "memoria":
+        pytest.skip("en memoria cada proceso cuenta por separado")
+    reloj = _Reloj()
+    a, b = fabrica(reloj), fabrica(reloj)
+    admitidos = sum(limiter.check_rate_limit("ip:1", max_requests=6) for _ in range(6) for limiter in (a, b))
+    assert admitidos == 6
+
+
+def test_redis_caido_deja_pasar(caplog, monkeypatch):
+    # Puerto 9 (discard): nadie escucha.
+    limiter = RedisRateLimiter("redis://127.0.0.1:9/0", timeout=0.1)
+    assert limiter.check_rate_limit("ip:1", max_requests=1) is True
+    assert "se deja pasar" in caplog.text
+
+    # Durante la espera tras el fallo ni se intenta conectar ni se registra.
+    intentos = []
+    monkeypatch.setattr(socket, "create_connection", lambda *a, **k: intentos.append(a) or None)
+    caplog.clear()
+    assert all(limiter.check_rate_limit("ip:1", max_requests=1) for _ in range(3))
+    assert intentos == [] and caplog.text == ""
+
+
+def test_sqlite_caido_deja_pasar_y_espera(tmp_path, caplog):
+    limiter = SQLiteRateLimiter(tmp_path / "rl.db")
+    limiter.close()  # cualquier consulta da sqlite3.ProgrammingError
+    assert limiter.check_rate_limit("ip:1", max_requests=1) is True
+    assert "se deja pasar" in caplog.text
+    caplog.clear()
+    assert limiter.check_rate_limit("ip:1", max_requests=1) is True
+    assert limiter.get_remaining_requests("ip:1", max_requests=1) == 1
+    assert caplog.text == ""
+
+
+def test_async_no_bloquea_el_bucle(fabrica):
+    """Los backends con E/S se ejecutan en el pool de hilos; el de memoria, en el bucle."""
+    limiter = fabrica(_Reloj())
+    hilos = []
+    admitir = limiter._admitir
+    limiter._admitir = lambda *args: hilos.append(threading.current_thread()) or admitir(*args)
+
+    async def pedir():
+        admitidos = [await limiter.check_rate_limit_async("ip:1", max_requests=2) for _ in range(3)]
+        return admitidos, await limiter.get_remaining_requests_async("ip:1", max_requests=2)
+
+    assert asyncio.run(pedir()) == ([True, True, False], 0)
+    en_el_bucle = [h is threading.main_thread() for h in hilos]
+    assert en_el_bucle == [not limiter.bloqueante] * 3
+
+
+def test_base_es_abstracta():
+    with pytest.raises(TypeError):
+        BaseRateLimiter()
+
+
+def test_cliente_resp_pipeline_y_errores(servidor_resp):
+    cliente = ClienteRESP(servidor_resp)
+    assert cliente.ejecutar(("INCR", "a"), ("INCR", "a"), ("GET", "a"), ("GET", "b")) == [1, 2, b"2", None]
+    with pytest.raises(ErrorRESP):
+        cliente.ejecutar(("FLUSHALL",))
+    # La conexion sigue utilizable tras un error del servidor.
+    assert cliente.ejecutar(("DECR", "a")) == [1]
+    cliente.close()
+
+
+def test_backend_desconocido(tmp_path):
+    with pytest.raises(ValueError, match="RATE_LIMIT_BACKEND"):
+        crear_rate_limiter("memcached", ruta_sqlite=tmp_path / "x.db", url_redis="redis://localhost")
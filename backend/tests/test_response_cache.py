@@ -0,0 +1,252 @@
+"""
+Cache de respuestas GET (api/response_cache.py y su middleware).
+
+Lo guardado tiene que ser indistinguible de lo recien calculado salvo
+por X-Cache, no puede cruzarse entre API keys y no puede saltarse la
+autenticacion. Los tres backends guardan igual; Redis se sustituye por
+el servidor RESP de conftest.py.
+"""
+import asyncio
+import socket
+import threading
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from api import response_cache
+from api.api_keys import id_clave
+from api.response_cache import (
+    BaseCacheRespuestas,
+    CacheMemoria,
+    CacheRedis,
+    CacheSQLite,
+    Entrada,
+    crear_cache_respuestas,
+)
+
+
+class _Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def _request(ruta, query=b"", api_key=None):
+    cabeceras = [(b"x-api-key", api_key.encode())] if api_key else []
+    return Request({"type": "http", "method": "GET", "path": ruta, "query_string": query, "headers": cabeceras})
+
+
+# =========================================================================
+# Rutas y claves
+# =========================================================================
+
+def test_ttl_por_ruta():
+    assert response_cache.ttl_de("/api/v1/risk/stats") == 60
+    assert response_cache.ttl_de("/api/v1/forecast/SKBO") == 300
+    assert response_cache.ttl_de("/api/v1/weather/airport/SKBO/metar") == 120
+    # La ruta exacta manda sobre el prefijo.
+    assert response_cache.ttl_de("/api/v1/weather/test") == 0
+    assert response_cache.ttl_de("/api/v1/risk/predict") == 0
+    assert response_cache.ttl_de("/api/v1/dashboard/api-keys") == 0
+
+
+def test_clave_normaliza_query_y_no_guarda_la_api_key():
+    a = response_cache.clave_de(_request("/api/v1/risk/history", b"limit=5&icao=SKBO", "secreta"))
+    b = response_cache.clave_de(_request("/api/v1/risk/history", b"icao=SKBO&limit=5", "secreta"))
+    otra = response_cache.clave_de(_request("/api/v1/risk/history", b"icao=SKBO&limit=5", "otra"))
+    assert a == b != otra
+    assert "secreta" not in a and id_clave("secreta") in a
+
+
+def test_entrada_ida_y_vuelta_en_bytes():
+    entrada = Entrada(b'{"ok":true}\x00\xff', "application/json", '"abc"', 1234.5)
+    assert Entrada.de_bytes(entrada.a_bytes()) == entrada
+
+
+# =========================================================================
+# Backends
+# =========================================================================
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def fabrica(request, tmp_path):
+    """Crea caches del backend; las compartidas, sobre el mismo almacen."""
+    creadas = []
+
+    def crear(reloj):
+        if request.param == "memoria":
+            cache = CacheMemoria(reloj=reloj)
+        elif request.param == "sqlite":
+            cache = CacheSQLite(tmp_path / "rc.db", reloj=reloj)
+        else:
+            cache = CacheRedis(request.getfixturevalue("servidor_resp"), reloj=reloj)
+        creadas.append(cache)
+        return cache
+
+    crear.backend = request.param
+    yield crear
+    for cache in creadas:
+        if hasattr(cache, "close"):
+            cache.close()
+
+
+def test_guarda_caduca_y_limpia(fabrica):
+    reloj = _Reloj()
+    cache = fabrica(reloj)
+    guardada = cache.guardar("/a?#-", b"[1,2]", "application/json", ttl=30)
+    assert cache.obtener("/a?#-") == guardada
+    assert cache.obtener("/b?#-") is None
+
+    reloj.t += 30
+    assert cache.obtener("/a?#-") is None
+
+    cache.guardar("/a?#-", b"[3]", "application/json", ttl=30)
+    cache.limpiar()
+    assert cache.obtener("/a?#-") is None
+
+
+def test_compartida_entre_workers(fabrica):
+    if fabrica.backend == "memoria":
+        pytest.skip("en memoria cada proceso tiene su cache")
+    reloj = _Reloj()
+    a, b = fabrica(reloj), fabrica(reloj)
+    a.guardar("/a?#-", b"[1]", "application/json", ttl=30)
+    assert b.obtener("/a?#-").cuerpo == b"[1]"
+
+
+def test_lru_desaloja_la_menos_usada():
+    cache = CacheMemoria(max_entradas=2)
+    for clave in ("a", "b"):
+        cache.guardar(clave, b"{}", "application/json", ttl=60)
+    cache.obtener("a")
+    cache.guardar("c", b"{}", "application/json", ttl=60)
+    assert list(cache.entradas) == ["a", "c"]
+
+
+def test_redis_caido_calcula(caplog, monkeypatch):
+    # Puerto 9 (discard): nadie escucha.
+    cache = CacheRedis("redis://127.0.0.1:9/0", timeout=0.1)
+    assert cache.obtener("/a?#-") is None
+    assert "se calcula" in caplog.text
+
+    # Durante la espera tras el fallo ni se intenta conectar ni se registra.
+    intentos = []
+    monkeypatch.setattr(socket, "create_connection", lambda *a, **k: intentos.append(a) or None)
+    caplog.clear()
+    cache.guardar("/a?#-", b"{}", "application/json", ttl=30)
+    assert cache.obtener("/a?#-") is None
+    assert intentos == [] and caplog.text == ""
+
+
+def test_sqlite_caida_calcula_y_espera(tmp_path, caplog):
+    cache = CacheSQLite(tmp_path / "rc.db")
+    cache.close()  # cualquier consulta da sqlite3.ProgrammingError
+    assert cache.obtener("/a?#-") is None
+    assert "se calcula" in caplog.text
+    caplog.clear()
+    cache.guardar("/a?#-", b"{}", "application/json", ttl=30)
+    assert cache.obtener("/a?#-") is None
+    assert caplog.text == ""
+
+
+def test_async_no_bloquea_el_bucle(fabrica):
+    """Los almacenes con E/S se consultan en el pool de hilos; el de memoria, en el bucle."""
+    cache = fabrica(_Reloj())
+    hilos = []
+    leer, escribir = cache._leer, cache._escribir
+    cache._leer = lambda *args: hilos.append(threading.current_thread()) or leer(*args)
+    cache._escribir = lambda *args: hilos.append(threading.current_thread()) or escribir(*args)
+
+    async def pedir():
+        guardada = await cache.guardar_async("/a?#-", b"[1]", "application/json", 30)
+        return guardada, await cache.obtener_async("/a?#-")
+
+    guardada, leida = asyncio.run(pedir())
+    assert leida == guardada
+    assert [h is threading.main_thread() for h in hilos] == [not cache.bloqueante] * 2
+
+
+def test_base_es_abstracta():
+    with pytest.raises(TypeError):
+        BaseCacheRespuestas()
+
+
+def test_backend_desconocido(tmp_path):
+    with pytest.raises(ValueError, match="RESPONSE_CACHE_BACKEND"):
+        crear_cache_respuestas("memcached", max_entradas=1, ruta_sqlite=tmp_path / "x.db", url_redis="")
+
+
+# =========================================================================
+# Middleware
+# =========================================================================
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(main.settings, "RATE_LIMIT_ENABLED", False)
+    return TestClient(main.app)
+
+
+def test_hit_sin_recalcular(client, monkeypatch):
+    from api.routes import forecast_routes
+
+    primera = client.get("/api/v1/forecast/")
+    assert primera.headers["x-cache"] == "MISS"
+    assert primera.headers["cache-control"] == "private, max-age=300"
+
+    # Si se recalculara, la lista cambiaria.
+    monkeypatch.setattr(forecast_routes, "AEROPUERTOS_SOPORTADOS", {"SKXX"})
+    segunda = client.get("/api/v1/forecast/")
+    assert segunda.headers["x-cache"] == "HIT"
+    assert segunda.json() == primera.json()
+    assert segunda.headers["etag"] == primera.headers["etag"]
+    assert segunda.headers["content-type"] == "application/json"
+
+    nueva = client.get("/api/v1/forecast/", headers={"Cache-Control": "no-cache"})
+    assert nueva.headers["x-cache"] == "MISS"
+    assert nueva.json()["aeropuertos_soportados"] == ["SKXX"]
+
+
+def test_if_none_match_da_304(client):
+    etag = client.get("/api/v1/forecast/").headers["etag"]
+
+    r = client.get("/api/v1/forecast/", headers={"If-None-Match": f'W/"otro", {etag}'})
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+    assert client.get("/api/v1/forecast/", headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_solo_se_guardan_las_200(client, cache_respuestas_vacia):
+    assert client.get("/api/v1/forecast/XXXX").status_code == 404
+    r = client.get("/api/v1/forecast/XXXX")
+    assert r.status_code == 404 and "x-cache" not in r.headers
+    assert len(cache_respuestas_vacia.entradas) == 0
+
+
+def test_no_se_cruza_entre_api_keys_ni_salta_la_autenticacion(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.settings, "REQUIRE_API_KEY", True)
+    monkeypatch.setattr(main.settings, "VALID_API_KEYS", "clave-a,clave-b")
+
+    assert client.get("/api/v1/forecast/", headers={"X-API-Key": "clave-a"}).headers["x-cache"] == "MISS"
+    assert client.get("/api/v1/forecast/", headers={"X-API-Key": "clave-b"}).headers["x-cache"] == "MISS"
+    assert client.get("/api/v1/forecast/", headers={"X-API-Key": "clave-a"}).headers["x-cache"] == "HIT"
+
+    # Revocada: lo guardado para ella ya no se sirve.
+    monkeypatch.setattr(main.settings, "VALID_API_KEYS", "clave-b")
+    assert client.get("/api/v1/forecast/", headers={"X-API-Key": "clave-a"}).status_code == 401
+
+
+def test_desactivada(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.settings, "RESPONSE_CACHE_ENABLED", False)
+    r = client.get("/api/v1/forecast/")
+    assert r.status_code == 200 and "etag" not in r.headers
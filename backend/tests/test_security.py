@@ -158,6 +158,54 @@ def test_rate_limiter_expira_la_ventana():
     assert limiter.check_rate_limit("ip:1.2.3.4", max_requests=1, window_seconds=0) is True
 
 
+class _Reloj:
+    """Reloj manual para mover el tiempo en los tests."""
+    def __init__(self):
+        self.t = 960.0  # inicio de una ventana de 60 s
+
+    def __call__(self):
+        return self.t
+
+
+def test_rate_limiter_ventana_deslizante():
+    """
+    A mitad de la ventana siguiente, la mitad de los requests de la
+    anterior sigue contando: no se puede gastar la cuota dos veces
+    seguidas en el cambio de ventana.
+    """
+    reloj = _Reloj()
+    limiter = RateLimiter(reloj=reloj)
+    for _ in range(10):
+        assert limiter.check_rate_limit("ip:1.2.3.4", max_requests=10, window_seconds=60)
+
+    reloj.t += 90  # mitad de la ventana siguiente: cuentan ~5 de los 10
+    permitidos = sum(limiter.check_rate_limit("ip:1.2.3.4", max_requests=10, window_seconds=60)
+                     for _ in range(10))
+    assert permitidos == 5
+    assert limiter.get_remaining_requests("ip:1.2.3.4", max_requests=10) == 0
+
+    reloj.t += 120  # dos ventanas sin requests: cuota entera
+    assert limiter.get_remaining_requests("ip:1.2.3.4", max_requests=10) == 10
+
+
+def test_rate_limiter_memoria_constante_y_desalojo():
+    reloj = _Reloj()
+    limiter = RateLimiter(reloj=reloj)
+    for _ in range(1000):
+        limiter.check_rate_limit("ip:1.2.3.4", max_requests=10_000)
+    assert limiter.requests["ip:1.2.3.4"][1] == 1000  # un contador, no 1000 instantes
+
+    for i in range(100):
+        limiter.check_rate_limit(f"ip:10.0.0.{i}")
+    reloj.t += 90
+    limiter.check_rate_limit("ip:10.0.0.5")  # sigue activa
+
+    # Pasadas dos ventanas sin requests, las claves desaparecen.
+    reloj.t += 40
+    limiter.check_rate_limit("ip:9.9.9.9")
+    assert set(limiter.requests) == {"ip:10.0.0.5", "ip:9.9.9.9"}
+
+
 def test_middleware_de_rate_limit_responde_429(monkeypatch):
     """
     Regresión: RATE_LIMIT_ENABLED y MAX_REQUESTS_PER_MINUTE existían en la
@@ -0,0 +1,79 @@
+"""
+Evaluacion NxN en paralelo (ml/utils/transferencia.py).
+
+El pool con memoria compartida tiene que dar exactamente la misma
+matriz que puntuar cada par en secuencia, y no dejar bloques vivos.
+"""
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score
+
+from ml.utils import entrenamiento, transferencia
+
+PEQUENO = {"n_estimators": 10, "max_depth": 4, "min_samples_leaf": 5}
+
+
+def _aeropuerto(semilla):
+    rng = np.random.default_rng(semilla)
+    X = rng.normal(size=(300, 4)).astype(np.float32)
+    y = (X[:, 0] + rng.normal(0, 0.7, 300) > 0.8).astype(np.int8)
+    return X, y
+
+
+def test_publicar_y_mapear_sin_copia():
+    arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+    bloque, descriptor = transferencia.publicar(arr)
+    try:
+        vista = transferencia.mapear(descriptor)
+        np.testing.assert_array_equal(vista, arr)
+        assert not vista.flags.writeable
+        assert not vista.flags.owndata
+    finally:
+        transferencia._vistas.pop(bloque.name)[0].close()
+        bloque.close()
+        bloque.unlink()
+
+
+def test_matriz_en_paralelo_igual_que_secuencial(tmp_path):
+    icaos = ["SKBO", "SKRG", "SKIP"]
+    train = {icao: _aeropuerto(i) for i, icao in enumerate(icaos)}
+    tests = {icao: _aeropuerto(10 + i) for i, icao in enumerate(icaos)}
+
+    rutas, modelos = {}, {}
+    for icao, (X, y) in train.items():
+        rutas[icao] = entrenamiento.ruta_modelo(X, y, split=icao, params=PEQUENO, raiz=tmp_path)
+        modelos[icao] = entrenamiento.entrenar_rf(X, y, split=icao, params=PEQUENO, n_jobs=1, ruta=rutas[icao])
+        assert rutas[icao].exists()
+
+    vistos = []
+    matriz = transferencia.evaluar_pares(
+        rutas, tests, procesos=2, al_terminar=lambda o, d, pr: vistos.append((o, d)),
+    )
+
+    assert sorted(vistos) == sorted(matriz) == sorted((o, d) for o in icaos for d in icaos)
+    for (origen, destino), pr in matriz.items():
+        X, y = tests[destino]
+        esperado = average_precision_score(y, modelos[origen].predict_proba(X)[:, 1])
+        assert pr == pytest.approx(esperado, abs=1e-12)
+
+
+def test_bloques_liberados_aunque_falle(tmp_path, monkeypatch):
+    X, y = _aeropuerto(0)
+    creados = []
+    original = transferencia.publicar
+
+    def publicar(arr):
+        bloque, descriptor = original(arr)
+        creados.append(bloque.name)
+        return bloque, descriptor
+
+    monkeypatch.setattr(transferencia, "publicar", publicar)
+    with pytest.raises(FileNotFoundError):
+        transferencia.evaluar_pares({"SKBO": tmp_path / "no-existe.joblib"}, {"SKBO": (X, y)}, procesos=1)
+
+    assert creados
+    for nombre in creados:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=nombre)